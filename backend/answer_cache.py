@@ -0,0 +1,236 @@
+"""
+Answer Cache
+In-process cache of generated chat answers
+
+An entry is only reused when the new request retrieved exactly the same
+evidence: the same chunk IDs with the same text hashes, under the same
+conversation history and chat model. Within that evidence the question must
+either match after normalization or be semantically close (cosine similarity
+of the question embeddings above a threshold). Because the evidence is part
+of the key, an answer can never outlive the chunks it was generated from:
+re-parsed text changes the hashes and deleted documents are no longer
+retrieved, in every worker process. invalidate_documents() additionally
+frees entries early in the process that saw the change.
+"""
+
+import re
+import json
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_question(question: str) -> str:
+    """Case-, spacing- and trailing-punctuation-insensitive form of a question"""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", question.strip().lower()))
+
+
+def history_hash(history: Iterable[Tuple[str, str]]) -> str:
+    """Hash of (role, content) pairs of the conversation history sent to the LLM"""
+    return hashlib.sha256(json.dumps(list(history)).encode('utf-8')).hexdigest()
+
+
+class CachedAnswer:
+    """One cached answer"""
+    
+    __slots__ = ('answer', 'question', 'doc_ids', 'evidence_key', 'embedding', 'created_at')
+    
+    def __init__(
+        self,
+        answer: str,
+        question: str,
+        doc_ids: Set[str],
+        evidence_key: str,
+        embedding: Optional[np.ndarray] = None
+    ):
+        self.answer = answer
+        self.question = question
+        self.doc_ids = doc_ids
+        self.evidence_key = evidence_key
+        self.embedding = embedding
+        self.created_at = time.monotonic()
+
+
+class AnswerCache:
+    """Thread-safe LRU + TTL cache of chat answers keyed by question and evidence"""
+    
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600.0, similarity_threshold: float = 0.95):
+        """
+        Args:
+            max_entries: LRU capacity (0 disables the cache)
+            ttl_seconds: Entry lifetime
+            similarity_threshold: Minimum question-embedding cosine similarity
+                for a semantic hit (above 1.0 allows exact matches only)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        
+        self._entries: "OrderedDict[str, CachedAnswer]" = OrderedDict()
+        self._by_evidence: Dict[str, Set[str]] = {}
+        self._by_document: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    @staticmethod
+    def evidence_key(evidence: List[Tuple[str, str, str]], history: str, model: str) -> str:
+        """
+        Key of what an answer was generated from
+        
+        Args:
+            evidence: (doc_id, chunk_id, text_hash) of every retrieved chunk
+            history: history_hash() of the conversation
+            model: Chat model name
+        """
+        material = json.dumps([sorted(evidence), history, model])
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+    
+    def get(self, question: str, evidence_key: str, embedding: Optional[List[float]] = None) -> Optional[str]:
+        """
+        Look up an answer for this question and evidence
+        
+        Args:
+            question: Raw question text
+            evidence_key: evidence_key() of the current retrieval
+            embedding: Question embedding, enables semantic matching
+        
+        Returns:
+            Cached answer, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        
+        exact_key = self._entry_key(question, evidence_key)
+        now = time.monotonic()
+        
+        with self._lock:
+            entry = self._entries.get(exact_key)
+            if entry is not None and now - entry.created_at > self.ttl_seconds:
+                self._remove(exact_key)
+                entry = None
+            
+            if entry is None and embedding is not None and self.similarity_threshold <= 1.0:
+                exact_key, entry = self._closest(evidence_key, embedding, now)
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(exact_key)
+            self.hits += 1
+            return entry.answer
+    
+    def put(
+        self,
+        question: str,
+        evidence_key: str,
+        answer: str,
+        doc_ids: Iterable[str],
+        embedding: Optional[List[float]] = None
+    ):
+        """Store an answer generated from the given evidence"""
+        if not self.enabled:
+            return
+        
+        exact_key = self._entry_key(question, evidence_key)
+        entry = CachedAnswer(
+            answer=answer,
+            question=question,
+            doc_ids=set(doc_ids),
+            evidence_key=evidence_key,
+            embedding=self._unit(embedding) if embedding is not None else None
+        )
+        
+        with self._lock:
+            if exact_key in self._entries:
+                self._remove(exact_key)
+            self._entries[exact_key] = entry
+            self._by_evidence.setdefault(evidence_key, set()).add(exact_key)
+            for doc_id in entry.doc_ids:
+                self._by_document.setdefault(doc_id, set()).add(exact_key)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def invalidate_documents(self, doc_ids: Iterable[str]) -> int:
+        """Drop every answer that cites one of the documents, returns number dropped"""
+        with self._lock:
+            keys = set()
+            for doc_id in doc_ids:
+                keys |= self._by_document.get(doc_id, set())
+            for key in keys:
+                self._remove(key)
+        
+        if keys:
+            logger.info(f"🧹 Invalidated {len(keys)} cached answers")
+        return len(keys)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_evidence.clear()
+            self._by_document.clear()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+    
+    @staticmethod
+    def _entry_key(question: str, evidence_key: str) -> str:
+        return hashlib.sha256(f"{evidence_key}\n{normalize_question(question)}".encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def _closest(self, evidence_key: str, embedding: List[float], now: float) -> Tuple[Optional[str], Optional[CachedAnswer]]:
+        """Most similar live entry with the same evidence, if above the threshold (lock held)"""
+        keys = [
+            key for key in self._by_evidence.get(evidence_key, ())
+            if self._entries[key].embedding is not None and now - self._entries[key].created_at <= self.ttl_seconds
+        ]
+        if not keys:
+            return None, None
+        
+        matrix = np.stack([self._entries[key].embedding for key in keys])
+        similarities = matrix @ self._unit(embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None, None
+        return keys[best], self._entries[keys[best]]
+    
+    def _remove(self, key: str):
+        """Remove one entry and its index references (lock held)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        
+        evidence_keys = self._by_evidence.get(entry.evidence_key)
+        if evidence_keys is not None:
+            evidence_keys.discard(key)
+            if not evidence_keys:
+                del self._by_evidence[entry.evidence_key]
+        
+        for doc_id in entry.doc_ids:
+            doc_keys = self._by_document.get(doc_id)
+            if doc_keys is not None:
+                doc_keys.discard(key)
+                if not doc_keys:
+                    del self._by_document[doc_id]
@@ -0,0 +1,127 @@
+"""
+Chunk Text Store
+Compressed side store for chunk text, keyed by (collection, point ID)
+
+Vector payloads only keep the small filterable fields; the (often large)
+markdown of each chunk lives here and is read in one batch for the final
+top results of a search. SQLite in WAL mode lets several worker processes
+read while one writes.
+"""
+
+import zlib
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# SQLite host-parameter limit is 999 on older builds
+_MAX_PARAMS = 900
+
+
+class ChunkTextStore:
+    """zlib-compressed chunk text in SQLite"""
+    
+    def __init__(self, db_path: str, collection_name: str):
+        """
+        Open (or create) the text store
+        
+        Args:
+            db_path: SQLite database file (shared by every collection at that location)
+            collection_name: Collection whose texts this instance reads and writes
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.collection_name = collection_name
+        self._local = threading.local()
+        
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunk_text (
+                    collection TEXT NOT NULL,
+                    point_id   TEXT NOT NULL,
+                    doc_id     TEXT NOT NULL,
+                    text       BLOB NOT NULL,
+                    PRIMARY KEY (collection, point_id)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chunk_text_doc ON chunk_text (collection, doc_id)")
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections are not shareable across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def put_many(self, rows: Iterable[Tuple[str, str, str]]):
+        """
+        Insert or replace texts
+        
+        Args:
+            rows: (point_id, doc_id, text) tuples
+        """
+        records = [
+            (self.collection_name, point_id, doc_id, zlib.compress(text.encode('utf-8'), 6))
+            for point_id, doc_id, text in rows
+        ]
+        if not records:
+            return
+        
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunk_text (collection, point_id, doc_id, text) VALUES (?, ?, ?, ?)",
+                records
+            )
+    
+    def get_many(self, point_ids: List[str]) -> Dict[str, str]:
+        """Fetch texts for the given point IDs (missing IDs are omitted)"""
+        texts = {}
+        unique_ids = list(dict.fromkeys(point_ids))
+        conn = self._connection()
+        
+        for start in range(0, len(unique_ids), _MAX_PARAMS):
+            batch = unique_ids[start:start + _MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT point_id, text FROM chunk_text WHERE collection = ? AND point_id IN ({placeholders})",
+                [self.collection_name, *batch]
+            )
+            for point_id, blob in rows:
+                texts[point_id] = zlib.decompress(blob).decode('utf-8')
+        
+        return texts
+    
+    def delete_points(self, point_ids: List[str]):
+        """Delete texts by point ID"""
+        with self._connection() as conn:
+            for start in range(0, len(point_ids), _MAX_PARAMS):
+                batch = point_ids[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                conn.execute(
+                    f"DELETE FROM chunk_text WHERE collection = ? AND point_id IN ({placeholders})",
+                    [self.collection_name, *batch]
+                )
+    
+    def delete_documents(self, doc_ids: List[str]):
+        """Delete every text of the given documents"""
+        with self._connection() as conn:
+            for start in range(0, len(doc_ids), _MAX_PARAMS):
+                batch = doc_ids[start:start + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                conn.execute(
+                    f"DELETE FROM chunk_text WHERE collection = ? AND doc_id IN ({placeholders})",
+                    [self.collection_name, *batch]
+                )
+    
+    def clear(self):
+        """Delete every text of this collection"""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM chunk_text WHERE collection = ?", (self.collection_name,))
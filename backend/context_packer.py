@@ -0,0 +1,143 @@
+"""
+Context Packer
+Fits retrieved chunks and conversation history into fixed token budgets
+
+Chunks are taken in relevance order until the context budget is spent.
+Oversized chunks (long tables) are cut at a line boundary so one chunk cannot
+crowd out the rest, and history keeps only the most recent messages that
+fit. Token counts come from tiktoken when installed, otherwise from a
+conservative characters-per-token estimate.
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Estimate used without tiktoken (English prose averages ~4 characters per token;
+# 3 keeps tables with many short cells under budget)
+CHARS_PER_TOKEN = 3
+TRUNCATION_MARKER = "\n[... truncated]"
+# Smallest useful piece of a chunk when the budget is nearly spent
+MIN_CHUNK_TOKENS = 64
+
+_encodings: Dict[str, object] = {}
+
+
+def _encoding(model: str):
+    """Cached tiktoken encoding for a model (None without tiktoken)"""
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Number of tokens text takes for the model"""
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """
+    Cut text to at most max_tokens, preferring a line boundary
+    
+    Table rows and list items stay whole; a marker tells the LLM that the
+    excerpt continues.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    
+    keep_tokens = max(max_tokens - count_tokens(TRUNCATION_MARKER, model), 0)
+    encoding = _encoding(model)
+    if encoding is None:
+        head = text[:keep_tokens * CHARS_PER_TOKEN]
+    else:
+        head = encoding.decode(encoding.encode(text, disallowed_special=())[:keep_tokens])
+    
+    line_end = head.rfind("\n")
+    if line_end > len(head) // 2:
+        head = head[:line_end]
+    return head.rstrip() + TRUNCATION_MARKER
+
+
+def pack_chunks(
+    chunks: List[Tuple[str, str]],
+    budget: int,
+    max_chunk_tokens: int,
+    model: str = "gpt-4o-mini"
+) -> Tuple[List[str], int]:
+    """
+    Fill a token budget with chunks, most relevant first
+    
+    Args:
+        chunks: (header, text) pairs in relevance order
+        budget: Tokens available for the whole context
+        max_chunk_tokens: Cap for a single chunk's text
+        model: Model whose tokenizer is used
+    
+    Returns:
+        (packed, used) - "header + text" blocks that fit and the tokens they take
+    """
+    packed = []
+    used = 0
+    
+    for header, text in chunks:
+        header_tokens = count_tokens(header, model)
+        remaining = budget - used - header_tokens
+        if remaining < MIN_CHUNK_TOKENS:
+            break
+        
+        text = truncate_to_tokens(text, min(max_chunk_tokens, remaining), model)
+        block = f"{header}{text}\n"
+        packed.append(block)
+        used += header_tokens + count_tokens(text, model) + 1
+    
+    if len(packed) < len(chunks):
+        logger.info(f"✂️ Packed {len(packed)}/{len(chunks)} chunks into {used}/{budget} context tokens")
+    return packed, used
+
+
+def trim_history(
+    messages: List[Dict[str, str]],
+    budget: int,
+    model: str = "gpt-4o-mini",
+    max_messages: Optional[int] = None
+) -> List[Dict[str, str]]:
+    """
+    Keep the most recent messages whose contents fit in the budget
+    
+    Args:
+        messages: {"role", "content"} dicts, oldest first
+        budget: Tokens available for the history
+        model: Model whose tokenizer is used
+        max_messages: Optional cap on the number of messages
+    
+    Returns:
+        Suffix of messages, oldest first
+    """
+    if max_messages is not None:
+        messages = messages[-max_messages:] if max_messages > 0 else []
+    
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        # ~4 tokens of per-message overhead in the chat format
+        tokens = count_tokens(message["content"], model) + 4
+        if used + tokens > budget:
+            break
+        kept.append(message)
+        used += tokens
+    return kept[::-1]
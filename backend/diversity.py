@@ -0,0 +1,144 @@
+"""
+Result Diversification
+Near-duplicate suppression and maximal marginal relevance (MMR) for search results
+
+Templated documents (inspection checklists, repeated table headers) produce
+many chunks with practically the same text, and a plain top-k search can
+spend every slot on copies of one of them. A diversified search over-fetches
+candidates, drops chunks whose normalized text was already seen and then
+picks the final results with MMR, so each slot adds new evidence.
+"""
+
+import re
+import hashlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Candidates fetched per requested result when diversifying
+CANDIDATE_FACTOR = 4
+MAX_CANDIDATES = 200
+
+RESULT_FIELDS = ('ids', 'documents', 'metadatas', 'distances')
+
+_MARKUP = re.compile(r"<[^>]+>")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def text_fingerprint(text: str) -> str:
+    """
+    Fingerprint of a chunk's text that ignores case, markup, punctuation and spacing
+    
+    Two copies of the same table header or checklist line get the same
+    fingerprint even when their HTML/markdown formatting differs.
+    """
+    words = _NON_WORD.sub(" ", _MARKUP.sub(" ", text).lower()).split()
+    return hashlib.blake2b(" ".join(words).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def candidate_count(n_results: int, mmr_lambda: Optional[float] = None, dedup: bool = False) -> int:
+    """Number of candidates a search should fetch to return n_results"""
+    if mmr_lambda is None and not dedup:
+        return n_results
+    return max(n_results, min(n_results * CANDIDATE_FACTOR, MAX_CANDIDATES))
+
+
+def search_candidate_count(search: Dict) -> int:
+    """candidate_count() for one query_batch search dict"""
+    return candidate_count(search.get('n_results', 5), search.get('mmr_lambda'), search.get('dedup', False))
+
+
+def diversify_search(results: Dict, search: Dict) -> Dict:
+    """Apply one query_batch search's mmr_lambda / dedup options to its candidates"""
+    if search.get('mmr_lambda') is None and not search.get('dedup'):
+        return results
+    return diversify_results(results, search.get('n_results', 5), search.get('mmr_lambda'), search.get('dedup', False))
+
+
+def mmr_select(
+    vectors: np.ndarray,
+    relevance: np.ndarray,
+    k: int,
+    mmr_lambda: float
+) -> List[int]:
+    """
+    Greedy maximal marginal relevance selection
+    
+    Args:
+        vectors: (n, dim) candidate vectors
+        relevance: (n,) similarity of each candidate to the query
+        k: Number of candidates to pick
+        mmr_lambda: 1.0 ranks by relevance only, 0.0 by novelty only
+    
+    Returns:
+        Indexes of the picked candidates, in pick order
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    # (n, n) pairwise similarities; n is bounded by MAX_CANDIDATES
+    similarity = vectors @ vectors.T
+    
+    first = int(np.argmax(relevance))
+    selected = [first]
+    max_similarity = similarity[first].copy()
+    available = np.ones(n, dtype=bool)
+    available[first] = False
+    
+    for _ in range(k - 1):
+        scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    
+    return selected
+
+
+def diversify_results(
+    results: Dict,
+    n_results: int,
+    mmr_lambda: Optional[float] = None,
+    dedup: bool = False
+) -> Dict:
+    """
+    Reduce over-fetched search results to n_results distinct ones
+    
+    Args:
+        results: ChromaDB-style result dict, best first; needs 'embeddings' when mmr_lambda is set
+        n_results: Number of results to keep
+        mmr_lambda: MMR trade-off in [0, 1]; None skips MMR
+        dedup: Drop results whose text fingerprint was already kept
+    
+    Returns:
+        Result dict with ids, documents, metadatas and distances (no embeddings)
+    """
+    if mmr_lambda is not None and not 0.0 <= mmr_lambda <= 1.0:
+        raise ValueError(f"mmr_lambda must be between 0 and 1, got {mmr_lambda}")
+    
+    keep = list(range(len(results['ids'])))
+    
+    if dedup:
+        seen = set()
+        unique = []
+        for i in keep:
+            fingerprint = text_fingerprint(results['documents'][i] or '')
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                unique.append(i)
+        keep = unique
+    
+    if mmr_lambda is not None and len(keep) > 1:
+        vectors = np.asarray([results['embeddings'][i] for i in keep], dtype=np.float32)
+        relevance = 1.0 - np.asarray([results['distances'][i] for i in keep], dtype=np.float32)
+        keep = [keep[j] for j in mmr_select(vectors, relevance, n_results, mmr_lambda)]
+    else:
+        keep = keep[:n_results]
+    
+    return {field: [results[field][i] for i in keep] for field in RESULT_FIELDS}
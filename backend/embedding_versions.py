@@ -0,0 +1,492 @@
+"""
+Embedding Versions Module
+Tracks which embedding model (provider, model, dim) serves queries and
+migrates the corpus between models without downtime
+
+Every version has its own collection. The registry is a small JSON file
+shared by all worker processes; switching versions is one atomic file
+replace, so every worker moves to the new collection on its next request.
+
+Migration flow:
+1. start_migration() registers the target version (status "building")
+2. while it builds, new uploads and deletes are applied to both the active
+   and the target collection (see get_index_targets)
+3. a background thread re-embeds the active collection's chunks into the
+   target in throttled batches, repeating diff passes until nothing changed
+4. the target becomes active; the old collection is kept for rollback
+
+The migrating process records its host and pid and refreshes a heartbeat in
+the registry. A running migration whose owner died or stopped heartbeating
+is marked failed by the next worker that looks at it, which stops the
+dual writes and lets a new migration start.
+"""
+
+import os
+import time
+import json
+import fcntl
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from embeddings import (
+    EmbeddingProvider,
+    EmbeddingService,
+    DEFAULT_MODELS,
+    MODEL_DIMENSIONS,
+    embedding_version_key,
+    get_embedding_service,
+)
+from vector_store import (
+    VectorBackend,
+    DEFAULT_COLLECTION_NAME,
+    chunk_from_payload,
+    get_collection_store,
+    text_hash,
+)
+
+logger = logging.getLogger(__name__)
+
+# Diff passes before giving up on reaching a fully caught-up target
+MAX_MIGRATION_PASSES = 5
+
+# Seconds between heartbeats of a running migration...
+MIGRATION_HEARTBEAT_SECONDS = 10.0
+# ...and without one before other workers treat it as crashed
+MIGRATION_STALE_SECONDS = float(os.getenv("EMBEDDING_MIGRATION_STALE_SECONDS", "120"))
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def migration_stalled(migration: Dict, now: Optional[float] = None) -> bool:
+    """Whether a "running" migration's owner died (same host) or stopped heartbeating"""
+    if migration.get('host') == socket.gethostname() and not _pid_alive(migration.get('pid', 0)):
+        return True
+    heartbeat = migration.get('heartbeat_at')
+    return heartbeat is None or (now or time.time()) - heartbeat > MIGRATION_STALE_SECONDS
+
+
+def _fail_migration(state: Dict, error: str):
+    """Mark the registry's migration and its target version failed"""
+    state['migration'].update(status='failed', error=error, finished_at=datetime.utcnow().isoformat())
+    state['versions'][state['migration']['target']]['status'] = 'failed'
+
+
+class VersionRegistry:
+    """Embedding versions and the active one, persisted as JSON shared by all workers"""
+    
+    def __init__(self, path: Path):
+        """
+        Load (or initialize) the registry
+        
+        Args:
+            path: JSON file holding the registry
+        """
+        self.path = Path(path)
+        self._lock_path = self.path.with_name(f"{self.path.name}.lock")
+        self._thread_lock = threading.RLock()
+        self._stamp = None
+        self._state: Dict = {}
+        
+        with self._write_lock():
+            if not self.path.exists():
+                self._write(self._initial_state())
+        self.refresh()
+    
+    @staticmethod
+    def _initial_state() -> Dict:
+        """First version comes from the environment and keeps the original collection"""
+        provider = EmbeddingProvider(os.getenv("EMBEDDING_PROVIDER", EmbeddingProvider.LOCAL.value))
+        model_name = os.getenv("EMBEDDING_MODEL") or DEFAULT_MODELS[provider]
+        dim = MODEL_DIMENSIONS.get(model_name) or get_embedding_service(provider, model_name).embedding_dim
+        
+        version = {
+            'key': embedding_version_key(provider.value, model_name, dim),
+            'provider': provider.value,
+            'model_name': model_name,
+            'dim': dim,
+            'collection': DEFAULT_COLLECTION_NAME,
+            'status': 'active',
+            'created_at': datetime.utcnow().isoformat()
+        }
+        return {'active': version['key'], 'versions': {version['key']: version}, 'migration': None}
+    
+    @contextmanager
+    def _write_lock(self):
+        """Serialize read-modify-write cycles across threads and processes"""
+        with self._thread_lock:
+            with open(self._lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _write(self, state: Dict):
+        """Atomically replace the registry file"""
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+    
+    def refresh(self):
+        """Reload the registry if another process changed it"""
+        stat = self.path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_ino)
+        if stamp == self._stamp:
+            return
+        
+        with self._thread_lock:
+            with open(self.path, 'r') as f:
+                self._state = json.load(f)
+            self._stamp = stamp
+    
+    def update(self, mutate: Callable[[Dict], None]) -> Dict:
+        """Apply mutate(state) to the latest state and publish it"""
+        with self._write_lock():
+            self._stamp = None
+            self.refresh()
+            state = json.loads(json.dumps(self._state))
+            mutate(state)
+            self._write(state)
+            self.refresh()
+            return state
+    
+    def state(self) -> Dict:
+        """Full registry contents"""
+        self.refresh()
+        return self._state
+    
+    def active(self) -> Dict:
+        """The version that serves queries"""
+        state = self.state()
+        return state['versions'][state['active']]
+    
+    def migration_target(self) -> Optional[Dict]:
+        """The version being built, while a migration is running (and its owner is alive)"""
+        state = self.state()
+        migration = state.get('migration')
+        if not migration or migration.get('status') != 'running':
+            return None
+        if migration_stalled(migration):
+            self.fail_stalled_migration()
+            return None
+        return state['versions'][migration['target']]
+    
+    def fail_stalled_migration(self) -> bool:
+        """Mark a running migration failed if its owner is gone; returns whether it was"""
+        failed = []
+        
+        def mutate(state):
+            migration = state.get('migration')
+            if migration and migration.get('status') == 'running' and migration_stalled(migration):
+                _fail_migration(state, f"Migration owner (pid {migration.get('pid')} on {migration.get('host')}) stopped")
+                failed.append(migration['target'])
+        
+        self.update(mutate)
+        if failed:
+            logger.error(f"❌ Embedding migration to {failed[0]} stalled; marked failed")
+        return bool(failed)
+
+
+# Singleton instance
+_registry: Optional[VersionRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_version_registry() -> VersionRegistry:
+    """Get or create the version registry singleton"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = VersionRegistry(Path(os.getenv("EMBEDDING_REGISTRY_PATH", "./embedding_versions.json")))
+        return _registry
+
+
+def _index_for(version: Dict) -> Tuple[EmbeddingService, VectorBackend]:
+    return (
+        get_embedding_service(version['provider'], version['model_name']),
+        get_collection_store(version['collection'], version['dim'])
+    )
+
+
+def get_active_index() -> Tuple[EmbeddingService, VectorBackend]:
+    """Embedding service and vector store of the active version (always a matching pair)"""
+    return _index_for(get_version_registry().active())
+
+
+def get_index_targets() -> List[Tuple[EmbeddingService, VectorBackend]]:
+    """Indexes that writes must reach: the active one, plus the migration target while it builds"""
+    registry = get_version_registry()
+    targets = [_index_for(registry.active())]
+    
+    target = registry.migration_target()
+    if target:
+        targets.append(_index_for(target))
+    return targets
+
+
+class EmbeddingMigration:
+    """Background re-embedding of the active collection into a new version"""
+    
+    def __init__(
+        self,
+        registry: VersionRegistry,
+        source: Dict,
+        target: Dict,
+        batch_size: int = 256,
+        pause_seconds: float = 0.5
+    ):
+        """
+        Args:
+            registry: Version registry to report progress to and activate in
+            source: Version the chunks are read from (the active one)
+            target: Version the chunks are re-embedded into
+            batch_size: Chunks embedded per batch
+            pause_seconds: Sleep between batches (keeps the embedder available for live traffic)
+        """
+        self.registry = registry
+        self.source = source
+        self.target = target
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.thread = threading.Thread(target=self._run, name=f"embedding-migration-{target['key']}", daemon=True)
+        self._finished = threading.Event()
+    
+    def start(self):
+        self.thread.start()
+        threading.Thread(target=self._heartbeat, name=f"{self.thread.name}-heartbeat", daemon=True).start()
+    
+    def _report(self, **fields):
+        """Record progress (and a heartbeat); raises if this migration was failed meanwhile"""
+        def mutate(state):
+            migration = state.get('migration') or {}
+            if migration.get('target') != self.target['key'] or migration.get('status') != 'running':
+                raise RuntimeError(f"Migration to {self.target['key']} is no longer running")
+            migration.update(fields, heartbeat_at=time.time())
+        self.registry.update(mutate)
+    
+    def _heartbeat(self):
+        # Covers long gaps between progress reports (slow embedding batches)
+        while not self._finished.wait(MIGRATION_HEARTBEAT_SECONDS):
+            try:
+                self._report()
+            except Exception:
+                return
+    
+    def _run(self):
+        try:
+            for attempt in range(1, MAX_MIGRATION_PASSES + 1):
+                changes = self._sync_pass(attempt)
+                logger.info(f"🔄 Migration pass {attempt} to {self.target['key']}: {changes} changes")
+                if changes == 0:
+                    break
+            else:
+                raise RuntimeError(f"Target still changing after {MAX_MIGRATION_PASSES} passes")
+            
+            activate_version(self.target['key'], expected_source=self.source['key'], _from_migration=True)
+        
+        except Exception as e:
+            logger.error(f"❌ Embedding migration to {self.target['key']} failed: {e}")
+            
+            def mutate(state):
+                migration = state.get('migration') or {}
+                if migration.get('target') == self.target['key'] and migration.get('status') == 'running':
+                    _fail_migration(state, str(e))
+            self.registry.update(mutate)
+        
+        finally:
+            self._finished.set()
+    
+    def _sync_pass(self, attempt: int) -> int:
+        """Make the target match the source; returns number of chunks written or deleted"""
+        _, source_store = _index_for(self.source)
+        target_service, target_store = _index_for(self.target)
+        
+        target_hashes = {
+            (p.get('organization_id'), p['doc_id'], p['chunk_id']): p.get('text_hash')
+            for batch in target_store.iter_payloads()
+            for p in batch
+        }
+        
+        self._report(passes=attempt, processed=0, total=source_store.get_stats()['total_chunks'])
+        
+        seen = set()
+        processed = 0
+        changes = 0
+        
+        for batch in source_store.iter_payloads(self.batch_size):
+            pending = []
+            for payload in batch:
+                key = (payload.get('organization_id'), payload['doc_id'], payload['chunk_id'])
+                seen.add(key)
+                if target_hashes.get(key) != (payload.get('text_hash') or text_hash(payload.get('text', ''))):
+                    pending.append(payload)
+            
+            if pending:
+                self._write_batch(target_service, target_store, source_store.hydrate_payloads(pending))
+                changes += len(pending)
+            
+            processed += len(batch)
+            self._report(processed=processed)
+            
+            if pending and self.pause_seconds:
+                time.sleep(self.pause_seconds)
+        
+        # Chunks deleted from the source since the target copied them
+        stale: Dict[Tuple, List[str]] = {}
+        for organization_id, doc_id, chunk_id in target_hashes.keys() - seen:
+            stale.setdefault((organization_id, doc_id), []).append(chunk_id)
+        for (organization_id, doc_id), chunk_ids in stale.items():
+            changes += target_store.delete_chunks(doc_id, chunk_ids, organization_id)
+        
+        return changes
+    
+    @staticmethod
+    def _write_batch(service: EmbeddingService, store: VectorBackend, payloads: List[Dict]):
+        """Re-embed stored chunks and write them (grouped per organization and document)"""
+        groups: Dict[Optional[str], Dict[str, List[Dict]]] = {}
+        for payload in payloads:
+            groups.setdefault(payload.get('organization_id'), {}).setdefault(payload['doc_id'], []).append(
+                chunk_from_payload(payload)
+            )
+        
+        for organization_id, documents in groups.items():
+            texts = [chunk['text'] for chunks in documents.values() for chunk in chunks]
+            embeddings = service.embed_batch(texts, show_progress=False)
+            store.add_documents(list(documents.items()), embeddings, organization_id=organization_id)
+
+
+_migration: Optional[EmbeddingMigration] = None
+
+
+def start_migration(
+    provider: EmbeddingProvider,
+    model_name: Optional[str] = None,
+    batch_size: int = 256,
+    pause_seconds: float = 0.5
+) -> Dict:
+    """
+    Register a new embedding version and start building it in the background
+    
+    Args:
+        provider: Embedding provider of the new version
+        model_name: Model of the new version (default: the provider's default)
+        batch_size: Chunks re-embedded per batch
+        pause_seconds: Throttle between batches
+    
+    Returns:
+        The migration record
+    
+    Raises:
+        ValueError: If a migration is already running or the version is already active
+    """
+    global _migration
+    registry = get_version_registry()
+    service = get_embedding_service(provider, model_name)
+    key = service.version_key
+    
+    def mutate(state):
+        migration = state.get('migration')
+        if migration and migration.get('status') == 'running':
+            if not migration_stalled(migration):
+                raise ValueError(f"Migration to {migration['target']} is already running")
+            _fail_migration(state, f"Migration owner (pid {migration.get('pid')} on {migration.get('host')}) stopped")
+        if state['active'] == key:
+            raise ValueError(f"{key} is already the active embedding version")
+        
+        version = state['versions'].get(key) or {
+            'key': key,
+            'provider': service.provider.value,
+            'model_name': service.model_name,
+            'dim': service.embedding_dim,
+            'collection': f"{DEFAULT_COLLECTION_NAME}__{key.replace('-', '_')}",
+            'created_at': datetime.utcnow().isoformat()
+        }
+        version['status'] = 'building'
+        state['versions'][key] = version
+        state['migration'] = {
+            'source': state['active'],
+            'target': key,
+            'status': 'running',
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'heartbeat_at': time.time(),
+            'passes': 0,
+            'processed': 0,
+            'total': 0,
+            'error': None,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None
+        }
+    
+    state = registry.update(mutate)
+    
+    _migration = EmbeddingMigration(
+        registry,
+        source=state['versions'][state['active']],
+        target=state['versions'][key],
+        batch_size=batch_size,
+        pause_seconds=pause_seconds
+    )
+    _migration.start()
+    
+    logger.info(f"🚚 Started embedding migration {state['active']} → {key}")
+    return state['migration']
+
+
+def activate_version(key: str, expected_source: Optional[str] = None, _from_migration: bool = False) -> Dict:
+    """
+    Atomically make a built version the active one (also used for rollback)
+    
+    Args:
+        key: Version to activate
+        expected_source: When set, only switch if this version is still active
+        _from_migration: Internal; lets the migration thread activate the
+            "building" target it has just finished (never set by the admin API)
+    
+    Returns:
+        The activated version
+    
+    Raises:
+        ValueError: If the version is unknown, not built, or the active version changed
+    """
+    def mutate(state):
+        version = state['versions'].get(key)
+        if version is None:
+            raise ValueError(f"Unknown embedding version: {key}")
+        
+        migration = state.get('migration') or {}
+        finishing = _from_migration and migration.get('status') == 'running' and migration.get('target') == key
+        if _from_migration and not finishing:
+            raise ValueError(f"Migration to {key} is no longer running")
+        if version['status'] not in ('ready', 'active') and not finishing:
+            raise ValueError(f"Embedding version {key} is {version['status']}, not ready")
+        if expected_source and state['active'] != expected_source:
+            raise ValueError(f"Active version changed to {state['active']} during migration")
+        
+        state['versions'][state['active']]['status'] = 'ready'
+        version['status'] = 'active'
+        state['active'] = key
+        if finishing:
+            migration.update(status='completed', finished_at=datetime.utcnow().isoformat())
+    
+    state = get_version_registry().update(mutate)
+    logger.info(f"✅ Active embedding version: {key}")
+    return state['versions'][key]
@@ -1,13 +1,17 @@
 """
 Embeddings Module
-Handles text embedding generation using sentence-transformers or OpenAI
+Handles text embedding generation using sentence-transformers, OpenAI or the offline stand-in
 """
 
 import os
+import re
 import logging
-from typing import List, Optional
+import threading
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
 
+from offline_provider import OFFLINE_MODEL, OFFLINE_EMBEDDING_DIM, OfflineEmbeddingModel
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,25 +19,53 @@ class EmbeddingProvider(str, Enum):
     """Embedding provider options"""
     LOCAL = "local"  # sentence-transformers
     OPENAI = "openai"  # OpenAI API
+    OFFLINE = "offline"  # Deterministic hashed embeddings (load tests / CI, no network)
+
+
+# Default model per provider
+DEFAULT_MODELS = {
+    EmbeddingProvider.LOCAL: "all-MiniLM-L6-v2",  # 384 dimensions, fast
+    EmbeddingProvider.OPENAI: "text-embedding-3-small",
+    EmbeddingProvider.OFFLINE: OFFLINE_MODEL,
+}
+
+# Known output dimensions (local models report their own when loaded)
+MODEL_DIMENSIONS = {
+    "all-MiniLM-L6-v2": 384,
+    "all-mpnet-base-v2": 768,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+    OFFLINE_MODEL: OFFLINE_EMBEDDING_DIM,
+}
+
+
+def embedding_version_key(provider: str, model_name: str, dim: int) -> str:
+    """Stable identifier for an embedding space, e.g. local-all-minilm-l6-v2-384"""
+    raw = f"{provider}-{model_name}-{dim}".lower()
+    return re.sub(r'[^a-z0-9]+', '-', raw).strip('-')
 
 
 class EmbeddingService:
     """Service for generating text embeddings"""
     
-    def __init__(self, provider: EmbeddingProvider = EmbeddingProvider.LOCAL):
+    def __init__(self, provider: EmbeddingProvider = EmbeddingProvider.LOCAL, model_name: Optional[str] = None):
         """
         Initialize embedding service
         
         Args:
             provider: Which embedding provider to use
+            model_name: Model to load (default: the provider's default model)
         """
-        self.provider = provider
+        self.provider = EmbeddingProvider(provider)
+        self.model_name = model_name or DEFAULT_MODELS[self.provider]
         self.model = None
         
         if provider == EmbeddingProvider.LOCAL:
             self._init_local()
         elif provider == EmbeddingProvider.OPENAI:
             self._init_openai()
+        elif provider == EmbeddingProvider.OFFLINE:
+            self._init_offline()
         else:
             raise ValueError(f"Unknown provider: {provider}")
     
@@ -42,13 +74,9 @@ class EmbeddingService:
         try:
             from sentence_transformers import SentenceTransformer
             
-            # Use a fast, efficient model
-            model_name = "all-MiniLM-L6-v2"  # 384 dimensions, fast
-            # Alternative: "all-mpnet-base-v2"  # 768 dimensions, slower but better
-            
-            logger.info(f"Loading sentence-transformers model: {model_name}")
-            self.model = SentenceTransformer(model_name)
-            self.embedding_dim = 384
+            logger.info(f"Loading sentence-transformers model: {self.model_name}")
+            self.model = SentenceTransformer(self.model_name)
+            self.embedding_dim = self.model.get_sentence_embedding_dimension()
             
             logger.info(f"✅ Local embeddings initialized ({self.embedding_dim}d)")
             
@@ -66,7 +94,9 @@ class EmbeddingService:
                 raise ValueError("OPENAI_API_KEY not found in environment")
             
             self.model = OpenAI(api_key=api_key)
-            self.embedding_dim = 1536  # text-embedding-3-small
+            if self.model_name not in MODEL_DIMENSIONS:
+                raise ValueError(f"Unknown OpenAI embedding model: {self.model_name}")
+            self.embedding_dim = MODEL_DIMENSIONS[self.model_name]
             
             logger.info(f"✅ OpenAI embeddings initialized ({self.embedding_dim}d)")
             
@@ -74,6 +104,19 @@ class EmbeddingService:
             logger.error("openai not installed. Run: pip install openai")
             raise
     
+    def _init_offline(self):
+        """Initialize the deterministic offline stand-in (OFFLINE_EMBEDDING_LATENCY_MS per call)"""
+        self.embedding_dim = MODEL_DIMENSIONS.get(self.model_name, OFFLINE_EMBEDDING_DIM)
+        latency_ms = float(os.getenv("OFFLINE_EMBEDDING_LATENCY_MS", "0"))
+        self.model = OfflineEmbeddingModel(dim=self.embedding_dim, latency_ms=latency_ms)
+        
+        logger.info(f"✅ Offline embeddings initialized ({self.embedding_dim}d, {latency_ms:.0f}ms latency)")
+    
+    @property
+    def version_key(self) -> str:
+        """Identifier of the vector space this service produces"""
+        return embedding_version_key(self.provider.value, self.model_name, self.embedding_dim)
+    
     def embed_text(self, text: str) -> List[float]:
         """
         Generate embedding for a single text
@@ -88,17 +131,18 @@ class EmbeddingService:
             logger.warning("Empty text provided for embedding")
             return [0.0] * self.embedding_dim
         
-        if self.provider == EmbeddingProvider.LOCAL:
+        if self.provider in (EmbeddingProvider.LOCAL, EmbeddingProvider.OFFLINE):
             return self._embed_local(text)
         elif self.provider == EmbeddingProvider.OPENAI:
             return self._embed_openai(text)
     
-    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+    def embed_batch(self, texts: List[str], show_progress: bool = True) -> List[List[float]]:
         """
         Generate embeddings for multiple texts (batched for efficiency)
         
         Args:
             texts: List of texts to embed
+            show_progress: Show the local model's progress bar (off for bulk jobs)
             
         Returns:
             List of embedding vectors
@@ -106,8 +150,8 @@ class EmbeddingService:
         if not texts:
             return []
         
-        if self.provider == EmbeddingProvider.LOCAL:
-            return self._embed_local_batch(texts)
+        if self.provider in (EmbeddingProvider.LOCAL, EmbeddingProvider.OFFLINE):
+            return self._embed_local_batch(texts, show_progress)
         elif self.provider == EmbeddingProvider.OPENAI:
             return self._embed_openai_batch(texts)
     
@@ -116,16 +160,16 @@ class EmbeddingService:
         embedding = self.model.encode(text, convert_to_tensor=False)
         return embedding.tolist()
     
-    def _embed_local_batch(self, texts: List[str]) -> List[List[float]]:
+    def _embed_local_batch(self, texts: List[str], show_progress: bool = True) -> List[List[float]]:
         """Generate embeddings in batch using sentence-transformers"""
-        logger.info(f"Generating embeddings for {len(texts)} texts (local)")
-        embeddings = self.model.encode(texts, convert_to_tensor=False, show_progress_bar=True)
+        logger.info(f"Generating embeddings for {len(texts)} texts ({self.provider.value})")
+        embeddings = self.model.encode(texts, convert_to_tensor=False, show_progress_bar=show_progress)
         return embeddings.tolist()
     
     def _embed_openai(self, text: str) -> List[float]:
         """Generate embedding using OpenAI"""
         response = self.model.embeddings.create(
-            model="text-embedding-3-small",
+            model=self.model_name,
             input=text
         )
         return response.data[0].embedding
@@ -136,7 +180,7 @@ class EmbeddingService:
         
         # OpenAI supports batch embedding
         response = self.model.embeddings.create(
-            model="text-embedding-3-small",
+            model=self.model_name,
             input=texts
         )
         
@@ -144,30 +188,37 @@ class EmbeddingService:
         return [item.embedding for item in response.data]
 
 
-# Singleton instance
-_embedding_service: Optional[EmbeddingService] = None
+# Instances per (provider, model): the active version and a migration target can coexist
+_embedding_services: Dict[Tuple[str, str], EmbeddingService] = {}
+_embedding_services_lock = threading.Lock()
 
 
-def get_embedding_service(provider: Optional[EmbeddingProvider] = None) -> EmbeddingService:
+def get_embedding_service(
+    provider: Optional[EmbeddingProvider] = None,
+    model_name: Optional[str] = None
+) -> EmbeddingService:
     """
-    Get or create embedding service singleton
+    Get or create an embedding service
     
     Args:
-        provider: Provider to use (only used on first call)
+        provider: Provider to use (default: the active embedding version)
+        model_name: Model to use (default: the provider's default model)
         
     Returns:
         EmbeddingService instance
     """
-    global _embedding_service
+    if provider is None:
+        from embedding_versions import get_version_registry
+        active = get_version_registry().active()
+        provider, model_name = active['provider'], active['model_name']
     
-    if _embedding_service is None:
-        # Default to local if not specified
-        if provider is None:
-            provider = EmbeddingProvider.LOCAL
-        
-        _embedding_service = EmbeddingService(provider=provider)
+    provider = EmbeddingProvider(provider)
+    key = (provider.value, model_name or DEFAULT_MODELS[provider])
     
-    return _embedding_service
+    with _embedding_services_lock:
+        if key not in _embedding_services:
+            _embedding_services[key] = EmbeddingService(provider=provider, model_name=key[1])
+        return _embedding_services[key]
 
 
 def embed_chunk_text(text: str, provider: Optional[EmbeddingProvider] = None) -> List[float]:
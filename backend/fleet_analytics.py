@@ -0,0 +1,438 @@
+"""
+Fleet Analytics
+Incremental rollups of validated inspections for fleet dashboards
+
+Every validated checklist adds its observations (see
+inspection_index.inspection_observations) to rollup tables of counts per
+(kind, subject, phase, value) and
+
+- day and vehicle (filtered by vehicle and date)
+- day (fleet-wide trends)
+- vehicle (all-time per-vehicle totals)
+
+plus an inspection count per (day, vehicle). Each query reads the
+coarsest rollup that can answer it, grouped in SQL down to the columns it
+needs; the rows are then bucketed (day / week / month / year) and summed
+with NumPy. Rollups grow with days, vehicles and distinct answers, not
+with the number of inspections.
+
+Each inspection's contribution is kept too, so re-validating or deleting a
+document subtracts exactly what it added. The tables live in SQLite (WAL),
+shared by every worker process.
+"""
+
+import sqlite3
+import logging
+import threading
+from collections import Counter
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from inspection_index import (
+    ITEM, TYRE, CONSUMABLE, BEFORE, AFTER,
+    inspection_observations, normalize_reg_no, normalize_subject, parse_day,
+)
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = ("day", "week", "month", "year")
+PHASES = {"before": BEFORE, "after": AFTER}
+
+FUEL_SUBJECT = normalize_subject("Amount of Fuel")
+
+# Rollup table -> (its key columns, columns scoping the cleanup of zero counts)
+ROLLUPS = {
+    'observation_rollup': (('kind', 'day', 'vehicle_key', 'subject', 'phase', 'value'), ('day', 'vehicle_key')),
+    'fleet_rollup': (('kind', 'day', 'subject', 'phase', 'value'), ('day',)),
+    'vehicle_rollup': (('kind', 'vehicle_key', 'subject', 'phase', 'value'), ('vehicle_key',)),
+}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# SQLite host-parameter limit is 999 on older builds
+_MAX_PARAMS = 900
+
+
+def bucket_labels(days: np.ndarray, bucket: Optional[str]) -> np.ndarray:
+    """
+    Bucket label of each day ordinal ('2026-03-09', week of '2026-03-09',
+    '2026-03', '2026'); None buckets everything together as 'all'
+    """
+    if bucket is None:
+        return np.full(days.shape[0], "all", dtype=object)
+    epoch_days = days.astype(np.int64) - _EPOCH_ORDINAL
+    if bucket == "week":
+        # 1970-01-01 was a Thursday: shift back to the week's Monday
+        epoch_days = epoch_days - (epoch_days + 3) % 7
+    dates = epoch_days.astype("datetime64[D]")
+    unit = {"day": "D", "week": "D", "month": "M", "year": "Y"}[bucket]
+    return np.datetime_as_string(dates.astype(f"datetime64[{unit}]"), unit=unit).astype(object)
+
+
+def group_sum(keys: List[np.ndarray], counts: np.ndarray) -> List[tuple]:
+    """
+    Sum counts per distinct combination of key columns
+    
+    Returns:
+        [(key_1, ..., key_n, total)] sorted by the keys
+    """
+    if not counts.shape[0]:
+        return []
+    codes, uniques = [], []
+    for column in keys:
+        values, inverse = np.unique(column, return_inverse=True)
+        uniques.append(values)
+        codes.append(inverse)
+    combined = np.ravel_multi_index(codes, [len(values) for values in uniques])
+    groups, inverse = np.unique(combined, return_inverse=True)
+    totals = np.bincount(inverse, weights=counts)
+    positions = np.unravel_index(groups, [len(values) for values in uniques])
+    return [
+        tuple(values[position[i]] for values, position in zip(uniques, positions)) + (int(totals[i]),)
+        for i in range(len(groups))
+    ]
+
+
+class FleetRollups:
+    """Incrementally maintained inspection rollups in SQLite"""
+    
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the rollup tables
+        
+        Args:
+            db_path: SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        
+        conn = self._connection()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS inspections (
+                doc_id       TEXT PRIMARY KEY,
+                day          INTEGER NOT NULL,
+                vehicle_key  TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS contributions (
+                doc_id   TEXT NOT NULL,
+                kind     INTEGER NOT NULL,
+                subject  TEXT NOT NULL,
+                phase    INTEGER NOT NULL,
+                value    TEXT NOT NULL,
+                count    INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS contributions_doc ON contributions (doc_id);
+            CREATE TABLE IF NOT EXISTS observation_rollup (
+                kind         INTEGER NOT NULL,
+                day          INTEGER NOT NULL,
+                vehicle_key  TEXT NOT NULL,
+                subject      TEXT NOT NULL,
+                phase        INTEGER NOT NULL,
+                value        TEXT NOT NULL,
+                count        INTEGER NOT NULL,
+                PRIMARY KEY (kind, day, vehicle_key, subject, phase, value)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS fleet_rollup (
+                kind     INTEGER NOT NULL,
+                day      INTEGER NOT NULL,
+                subject  TEXT NOT NULL,
+                phase    INTEGER NOT NULL,
+                value    TEXT NOT NULL,
+                count    INTEGER NOT NULL,
+                PRIMARY KEY (kind, day, subject, phase, value)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS vehicle_rollup (
+                kind         INTEGER NOT NULL,
+                vehicle_key  TEXT NOT NULL,
+                subject      TEXT NOT NULL,
+                phase        INTEGER NOT NULL,
+                value        TEXT NOT NULL,
+                count        INTEGER NOT NULL,
+                PRIMARY KEY (kind, vehicle_key, subject, phase, value)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS inspection_rollup (
+                day          INTEGER NOT NULL,
+                vehicle_key  TEXT NOT NULL,
+                count        INTEGER NOT NULL,
+                PRIMARY KEY (day, vehicle_key)
+            ) WITHOUT ROWID;
+            """
+        )
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections are not shareable across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def upsert(self, doc_id: str, validated_data: Dict, validated_at: Optional[str] = None):
+        """Add (or replace) one validated inspection's contribution"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._subtract(conn, doc_id)
+            self._add(conn, doc_id, validated_data, validated_at)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def remove(self, doc_id: str):
+        """Subtract a deleted inspection's contribution"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._subtract(conn, doc_id)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def rebuild(self, records: Iterable[Dict]) -> int:
+        """
+        Replace the rollups with the given inspections
+        
+        Args:
+            records: {'doc_id', 'validated_at', 'data'} of every validated inspection
+        
+        Returns:
+            Number of inspections rolled up
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("inspections", "contributions", "inspection_rollup", *ROLLUPS):
+                conn.execute(f"DELETE FROM {table}")
+            added = 0
+            for record in records:
+                if record.get('doc_id'):
+                    self._add(conn, record['doc_id'], record.get('data') or {}, record.get('validated_at'))
+                    added += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"📈 Fleet rollups rebuilt from {added} inspections")
+        return added
+    
+    def count(self) -> int:
+        """Inspections rolled up"""
+        return self._connection().execute("SELECT COUNT(*) FROM inspections").fetchone()[0]
+    
+    def _add(self, conn: sqlite3.Connection, doc_id: str, data: Dict, validated_at: Optional[str]):
+        day = (parse_day(data.get('date')) or parse_day(validated_at) or datetime.utcnow().date()).toordinal()
+        vehicle_key = normalize_reg_no(data.get('vehicle_reg_no'))
+        contributions = [
+            (kind, subject, phase, value, n)
+            for (kind, subject, phase, value), n in Counter(inspection_observations(data)).items()
+        ]
+        
+        conn.execute("INSERT INTO inspections (doc_id, day, vehicle_key) VALUES (?, ?, ?)", (doc_id, day, vehicle_key))
+        conn.executemany(
+            "INSERT INTO contributions (doc_id, kind, subject, phase, value, count) VALUES (?, ?, ?, ?, ?, ?)",
+            [(doc_id, *contribution) for contribution in contributions]
+        )
+        self._apply(conn, day, vehicle_key, contributions, 1)
+    
+    def _subtract(self, conn: sqlite3.Connection, doc_id: str):
+        previous = conn.execute("SELECT day, vehicle_key FROM inspections WHERE doc_id = ?", (doc_id,)).fetchone()
+        if previous is None:
+            return
+        day, vehicle_key = previous
+        
+        contributions = conn.execute(
+            "SELECT kind, subject, phase, value, count FROM contributions WHERE doc_id = ?", (doc_id,)
+        ).fetchall()
+        self._apply(conn, day, vehicle_key, contributions, -1)
+        conn.execute("DELETE FROM contributions WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM inspections WHERE doc_id = ?", (doc_id,))
+    
+    @staticmethod
+    def _apply(conn: sqlite3.Connection, day: int, vehicle_key: str, contributions: List[tuple], sign: int):
+        """Add (sign 1) or subtract (sign -1) one inspection's contributions to every rollup"""
+        scope = {'day': day, 'vehicle_key': vehicle_key}
+        conn.execute(
+            "INSERT INTO inspection_rollup (day, vehicle_key, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (day, vehicle_key) DO UPDATE SET count = count + excluded.count",
+            (day, vehicle_key, sign)
+        )
+        for table, (columns, cleanup) in ROLLUPS.items():
+            rows = []
+            for kind, subject, phase, value, n in contributions:
+                fields = {**scope, 'kind': kind, 'subject': subject, 'phase': phase, 'value': value}
+                rows.append(tuple(fields[column] for column in columns) + (sign * n,))
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}, count) VALUES ({', '.join('?' * (len(columns) + 1))}) "
+                f"ON CONFLICT ({', '.join(columns)}) DO UPDATE SET count = count + excluded.count",
+                rows
+            )
+            if sign < 0:
+                conn.execute(
+                    f"DELETE FROM {table} WHERE count <= 0 AND {' AND '.join(f'{column} = ?' for column in cleanup)}",
+                    [scope[column] for column in cleanup]
+                )
+        if sign < 0:
+            conn.execute("DELETE FROM inspection_rollup WHERE count <= 0 AND day = ? AND vehicle_key = ?", (day, vehicle_key))
+    
+    @staticmethod
+    def _filters(
+        vehicles: Optional[List[str]],
+        day_from: Optional[date],
+        day_to: Optional[date]
+    ) -> tuple:
+        clauses, params = [], []
+        if vehicles:
+            keys = [normalize_reg_no(vehicle) for vehicle in vehicles][:_MAX_PARAMS]
+            clauses.append(f"vehicle_key IN ({', '.join('?' * len(keys))})")
+            params += keys
+        if day_from:
+            clauses.append("day >= ?")
+            params.append(day_from.toordinal())
+        if day_to:
+            clauses.append("day <= ?")
+            params.append(day_to.toordinal())
+        return clauses, params
+    
+    def aggregate(
+        self,
+        kind: int,
+        subjects: Optional[List[str]] = None,
+        values: Optional[List[str]] = None,
+        phase: Optional[int] = None,
+        vehicles: Optional[List[str]] = None,
+        day_from: Optional[date] = None,
+        day_to: Optional[date] = None,
+        bucket: Optional[str] = "month",
+        by_vehicle: bool = False
+    ) -> List[Dict]:
+        """
+        Observation counts per bucket (and vehicle), subject and value
+        
+        Args:
+            kind: ITEM, TYRE or CONSUMABLE
+            subjects: Only these subjects (normalized names, e.g. "rear left")
+            values: Only these values (e.g. ["no"])
+            phase: BEFORE or AFTER (default: both)
+            vehicles: Only these registration numbers
+            day_from: First inspection day (inclusive)
+            day_to: Last inspection day (inclusive)
+            bucket: "day", "week", "month", "year", or None for one bucket
+            by_vehicle: Split counts per vehicle
+        
+        Returns:
+            [{'bucket', 'vehicle' (by_vehicle only), 'subject', 'value', 'count'}]
+        """
+        # Coarsest rollup that has the needed columns
+        per_vehicle = by_vehicle or bool(vehicles)
+        dated = bucket is not None or day_from is not None or day_to is not None
+        if per_vehicle and not dated:
+            table = 'vehicle_rollup'
+        elif per_vehicle:
+            table = 'observation_rollup'
+        else:
+            table = 'fleet_rollup'
+        
+        clauses, params = self._filters(vehicles, day_from, day_to)
+        clauses.insert(0, "kind = ?")
+        params.insert(0, kind)
+        if phase is not None:
+            clauses.append("phase = ?")
+            params.append(phase)
+        for column, wanted in (("subject", subjects), ("value", values)):
+            if wanted:
+                clauses.append(f"{column} IN ({', '.join('?' * len(wanted))})")
+                params += list(wanted)
+        
+        group = (['day'] if dated else []) + (['vehicle_key'] if by_vehicle else []) + ['subject', 'value']
+        rows = self._connection().execute(
+            f"SELECT {', '.join(group)}, SUM(count) FROM {table} WHERE {' AND '.join(clauses)} "
+            f"GROUP BY {', '.join(group)}",
+            params
+        ).fetchall()
+        if not rows:
+            return []
+        
+        columns = list(zip(*rows))
+        counts = np.asarray(columns.pop(), dtype=np.int64)
+        if dated:
+            keys = [bucket_labels(np.asarray(columns.pop(0)), bucket)]
+        else:
+            keys = [bucket_labels(counts, None)]
+        keys += [np.asarray(column, dtype=object) for column in columns]
+        
+        names = ['bucket'] + (['vehicle'] if by_vehicle else []) + ['subject', 'value', 'count']
+        return [dict(zip(names, group)) for group in group_sum(keys, counts)]
+    
+    def inspection_counts(
+        self,
+        vehicles: Optional[List[str]] = None,
+        day_from: Optional[date] = None,
+        day_to: Optional[date] = None,
+        bucket: Optional[str] = "month",
+        by_vehicle: bool = False
+    ) -> List[Dict]:
+        """Inspections per bucket (and vehicle): [{'bucket', 'vehicle' (by_vehicle only), 'count'}]"""
+        clauses, params = self._filters(vehicles, day_from, day_to)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        group = (['day'] if bucket is not None else []) + (['vehicle_key'] if by_vehicle else [])
+        select = ', '.join(group + ['SUM(count)'])
+        group_by = f"GROUP BY {', '.join(group)}" if group else ""
+        rows = self._connection().execute(f"SELECT {select} FROM inspection_rollup {where} {group_by}", params).fetchall()
+        if not rows or rows[0][-1] is None:
+            return []
+        
+        columns = list(zip(*rows))
+        counts = np.asarray(columns.pop(), dtype=np.int64)
+        if bucket is not None:
+            keys = [bucket_labels(np.asarray(columns.pop(0)), bucket)]
+        else:
+            keys = [bucket_labels(counts, None)]
+        keys += [np.asarray(column, dtype=object) for column in columns]
+        
+        names = ['bucket'] + (['vehicle'] if by_vehicle else []) + ['count']
+        return [dict(zip(names, group)) for group in group_sum(keys, counts)]
+    
+    def fuel_levels(self, phase: int = BEFORE, **filters) -> List[Dict]:
+        """Fuel level distribution per bucket: [{'bucket', 'inspections', 'levels': {level: count}}]"""
+        inspections = {row['bucket']: row['count'] for row in self.inspection_counts(**filters)}
+        series: Dict[str, Dict] = {}
+        for row in self.aggregate(CONSUMABLE, subjects=[FUEL_SUBJECT], phase=phase, **filters):
+            entry = series.setdefault(row['bucket'], {
+                'bucket': row['bucket'], 'inspections': inspections.get(row['bucket'], 0), 'levels': {}
+            })
+            entry['levels'][row['value']] = row['count']
+        return [series[key] for key in sorted(series)]
+    
+    def tyre_conditions(self, phase: Optional[int] = None, **filters) -> List[Dict]:
+        """Tyre conditions by position per bucket: [{'bucket', 'positions': {position: {condition: count}}}]"""
+        series: Dict[str, Dict] = {}
+        for row in self.aggregate(TYRE, phase=phase, **filters):
+            entry = series.setdefault(row['bucket'], {'bucket': row['bucket'], 'positions': {}})
+            entry['positions'].setdefault(row['subject'], {})[row['value']] = row['count']
+        return [series[key] for key in sorted(series)]
+    
+    def failed_items(self, phase: Optional[int] = None, **filters) -> List[Dict]:
+        """
+        Items marked NO per vehicle, most failures first:
+        [{'vehicle', 'inspections', 'failed', 'items': {item: count}}]
+        """
+        filters = {**filters, 'bucket': None, 'by_vehicle': True}
+        inspections = {row['vehicle']: row['count'] for row in self.inspection_counts(**filters)}
+        vehicles: Dict[str, Dict] = {}
+        for row in self.aggregate(ITEM, values=["no"], phase=phase, **filters):
+            entry = vehicles.setdefault(row['vehicle'], {
+                'vehicle': row['vehicle'], 'inspections': inspections.get(row['vehicle'], 0), 'failed': 0, 'items': {}
+            })
+            entry['failed'] += row['count']
+            entry['items'][row['subject']] = row['count']
+        for entry in vehicles.values():
+            entry['items'] = dict(sorted(entry['items'].items(), key=lambda item: -item[1]))
+        return sorted(vehicles.values(), key=lambda entry: -entry['failed'])
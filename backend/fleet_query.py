@@ -0,0 +1,275 @@
+"""
+Fleet Query Router
+Answers aggregate / filter questions about inspections from the InspectionIndex
+
+"How many inspections had the rear-left tyre marked Bad in March?" needs an
+exact count over every validated checklist, which top-k chunk retrieval
+cannot give. parse_fleet_question() recognizes such questions with a small
+rule-based parser driven by the index's own vocabulary (known items, tyre
+positions, values, vehicles and drivers); answer_fleet_question() runs them
+against the index. Only questions that ask for a count or a list of
+vehicles / inspections and filter on an answer (a value such as Bad or NO,
+or a date range for a kind of check) are taken; questions asking for an
+attribute ("which tyre brand", "the fuel level for KKJ 770 NW") and anything
+the parser does not understand return None and go through the normal RAG path.
+"""
+
+import re
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from inspection_index import (
+    InspectionIndex,
+    ITEM, TYRE, CONSUMABLE, BEFORE, AFTER,
+    normalize_reg_no,
+)
+
+# Rows listed in an answer (the count always covers every match)
+MAX_LISTED = 20
+
+_NOUNS = r"(?:vehicles?|trucks?|buses|inspections?|checklists?|drivers?)"
+_INTENT = re.compile(
+    r"\b(how many|number of|count"
+    r"|(?:which|what) " + _NOUNS +
+    r"|(?:list|show)(?: me)?(?: all)?(?: the)? " + _NOUNS + r")\b"
+)
+_COUNT_INTENT = re.compile(r"\b(how many|number of|count)\b")
+# The question is about the inspections themselves, so any filter will do
+_INSPECTION_WORDS = re.compile(r"\b(inspections?|checklists?)\b")
+# Attributes the index does not hold: these are value questions for RAG
+_ATTRIBUTE_WORDS = re.compile(
+    r"\b(brands?|makes?|models?|sizes?|pressures?|tread|readings?|remarks?|comments?|notes?"
+    r"|signatures?|odometer|mileage|km|kilomet(?:er|re)s?|serial)\b"
+)
+
+_TYRE_WORDS = re.compile(r"\b(tyres?|tires?)\b")
+_CONSUMABLE_WORDS = re.compile(r"\b(fuel|brake fluid|engine oil|oil|water|fluid levels?)\b")
+
+# Phrases -> normalized tyre position
+_POSITIONS = {
+    "front left": ("front left", "front-left", "left front", "left-front", "front l", "fl tyre"),
+    "front right": ("front right", "front-right", "right front", "right-front", "front r", "fr tyre"),
+    "rear left": ("rear left", "rear-left", "left rear", "left-rear", "back left", "rear l", "rl tyre"),
+    "rear right": ("rear right", "rear-right", "right rear", "right-rear", "back right", "rear r", "rr tyre"),
+}
+
+# Phrases -> stored value; item answers are only recognized as "marked yes/no"
+_TYRE_VALUES = {"bad": ("bad", "poor", "worn"), "fair": ("fair",), "good": ("good",)}
+_ITEM_VALUES = re.compile(r"\b(?:marked|ticked|checked|answered|with)\s+(yes|no)\b")
+_LEVEL_VALUES = {"e": ("empty",), "f": ("full",), "1/4": ("1/4", "quarter"), "1/2": ("1/2", "half"), "3/4": ("3/4",)}
+
+_PHASES = {
+    BEFORE: re.compile(r"\b(before|pre[- ]?trip)\b"),
+    AFTER: re.compile(r"\b(after|post[- ]?trip)\b"),
+}
+
+_MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+_MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+_MONTH_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")\b(?:\s+(\d{4}))?"
+)
+_ISO_DATE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+_YEAR = re.compile(r"\b(?:in|during)\s+(\d{4})\b")
+
+
+class FleetQuery:
+    """Parsed structured question"""
+    
+    def __init__(self):
+        self.kind: Optional[int] = None
+        self.subjects: List[str] = []
+        self.values: List[str] = []
+        self.phase: Optional[int] = None
+        self.vehicles: List[str] = []
+        self.drivers: List[str] = []
+        self.day_from: Optional[date] = None
+        self.day_to: Optional[date] = None
+        self.count_only = False
+    
+    @property
+    def has_filter(self) -> bool:
+        return bool(
+            self.kind is not None or self.subjects or self.values or self.vehicles
+            or self.drivers or self.day_from or self.day_to
+        )
+    
+    def filters(self) -> Dict:
+        """Keyword arguments for InspectionIndex.select()"""
+        return {
+            'kind': self.kind,
+            'subjects': self.subjects,
+            'values': self.values,
+            'phase': self.phase,
+            'vehicles': self.vehicles,
+            'drivers': self.drivers,
+            'day_from': self.day_from,
+            'day_to': self.day_to,
+        }
+    
+    def describe(self) -> str:
+        """Human-readable summary of the filters"""
+        parts = []
+        what = {ITEM: "item", TYRE: "tyre", CONSUMABLE: "level"}.get(self.kind, "")
+        if self.subjects or what:
+            subject = " / ".join(s.title() for s in self.subjects)
+            parts.append(f"{subject} {what}".strip())
+        if self.values:
+            parts.append("marked " + " or ".join(v.title() if len(v) > 1 else v.upper() for v in self.values))
+        if self.phase is not None:
+            parts.append("before the trip" if self.phase == BEFORE else "after the trip")
+        if self.vehicles:
+            parts.append("for " + ", ".join(self.vehicles))
+        if self.drivers:
+            parts.append("driven by " + ", ".join(d.title() for d in self.drivers))
+        if self.day_from and self.day_to:
+            parts.append(f"between {self.day_from.isoformat()} and {self.day_to.isoformat()}")
+        elif self.day_from:
+            parts.append(f"since {self.day_from.isoformat()}")
+        elif self.day_to:
+            parts.append(f"until {self.day_to.isoformat()}")
+        return " ".join(parts)
+
+
+def _contains(text: str, phrase: str) -> bool:
+    return re.search(r"(?<![\w-])" + re.escape(phrase) + r"(?![\w-])", text) is not None
+
+
+def _date_range(question: str, today: date) -> Tuple[Optional[date], Optional[date]]:
+    """Date range mentioned in a question (relative phrases, month names, ISO dates)"""
+    if "today" in question:
+        return today, today
+    if "yesterday" in question:
+        return today - timedelta(days=1), today - timedelta(days=1)
+    if re.search(r"\b(last|past) week\b", question):
+        return today - timedelta(days=7), today
+    if re.search(r"\bthis week\b", question):
+        return today - timedelta(days=today.weekday()), today
+    if re.search(r"\b(last|past) month\b", question):
+        last_day = today.replace(day=1) - timedelta(days=1)
+        return last_day.replace(day=1), last_day
+    if re.search(r"\bthis month\b", question):
+        return today.replace(day=1), today
+    match = re.search(r"\b(?:last|past) (\d+) days\b", question)
+    if match:
+        return today - timedelta(days=int(match.group(1))), today
+    
+    dates = _ISO_DATE.findall(question)
+    if dates:
+        days = sorted(date.fromisoformat(d) for d in dates)
+        return days[0], days[-1]
+    
+    match = _MONTH_PATTERN.search(question)
+    # "may" is also a verb: only trust it next to a year or after in/during
+    if match and (match.group(1) != "may" or match.group(2) or re.search(r"\b(in|during) may\b", question)):
+        month = _MONTHS[match.group(1)]
+        # Without a year, the most recent such month
+        year = int(match.group(2)) if match.group(2) else (today.year if month <= today.month else today.year - 1)
+        return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    
+    match = _YEAR.search(question)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year, 12, 31)
+    
+    return None, None
+
+
+def parse_fleet_question(question: str, index: InspectionIndex, today: Optional[date] = None) -> Optional[FleetQuery]:
+    """
+    Recognize an aggregate / filter question about inspections
+    
+    Args:
+        question: User question
+        index: Inspection index (its vocabulary drives item, vehicle and driver matching)
+        today: Reference date for relative phrases (default: today)
+    
+    Returns:
+        FleetQuery, or None if the question should go through RAG
+    """
+    text = " " + question.lower() + " "
+    if not _INTENT.search(text) or _ATTRIBUTE_WORDS.search(text):
+        return None
+    
+    index.ensure_fresh()
+    query = FleetQuery()
+    query.count_only = bool(_COUNT_INTENT.search(text))
+    
+    # Tyres: explicit positions and/or the word tyre, with Good/Fair/Bad
+    positions = [position for position, phrases in _POSITIONS.items() if any(_contains(text, p) for p in phrases)]
+    if positions or _TYRE_WORDS.search(text):
+        query.kind = TYRE
+        query.subjects = positions
+        query.values = [value for value, phrases in _TYRE_VALUES.items() if any(_contains(text, p) for p in phrases)]
+    
+    # Checklist items by name (longest names first so "brake lights" beats "lights")
+    if query.kind is None:
+        items = []
+        for subject in sorted(index.known_subjects(ITEM), key=len, reverse=True):
+            if _contains(text, subject) and not any(subject in found for found in items):
+                items.append(subject)
+        if items:
+            query.kind = ITEM
+            query.subjects = items
+            query.values = _ITEM_VALUES.findall(text)
+    
+    # Consumable levels
+    if query.kind is None and _CONSUMABLE_WORDS.search(text):
+        subjects = [s for s in index.known_subjects(CONSUMABLE) if _contains(text, s) or _contains(text, s.split(" ")[-1])]
+        levels = [value for value, phrases in _LEVEL_VALUES.items() if any(_contains(text, p) for p in phrases)]
+        if subjects or levels:
+            query.kind = CONSUMABLE
+            query.subjects = subjects
+            query.values = levels
+    
+    for phase, pattern in _PHASES.items():
+        if pattern.search(text):
+            query.phase = phase if query.phase is None else None
+    
+    compact = normalize_reg_no(question)
+    query.vehicles = [reg for reg in index.known_vehicles() if normalize_reg_no(reg) in compact]
+    query.drivers = [name for name in index.known_drivers() if len(name) > 2 and _contains(text, name)]
+    query.day_from, query.day_to = _date_range(text, today or date.today())
+    
+    # Counting matches only answers questions that filter on answers
+    dated = query.day_from is not None or query.day_to is not None
+    if query.values or (query.kind is not None and dated):
+        return query
+    if _INSPECTION_WORDS.search(text) and query.has_filter:
+        return query
+    return None
+
+
+def answer_fleet_question(question: str, index: InspectionIndex, today: Optional[date] = None) -> Optional[Dict]:
+    """
+    Answer a structured question straight from the index
+    
+    Returns:
+        {'answer', 'inspections', 'count', 'total'} or None when the question is not structured
+    """
+    query = parse_fleet_question(question, index, today)
+    if query is None:
+        return None
+    
+    rows = index.select(**query.filters())
+    inspections = index.describe_rows(rows)
+    total = index.live_count()
+    description = query.describe()
+    
+    answer = f"**{len(inspections)}** of {total} validated inspections match: {description}."
+    vehicles = sorted({i['vehicle_reg_no'] for i in inspections if i['vehicle_reg_no']})
+    if vehicles:
+        answer += f" They cover {len(vehicles)} vehicle{'s' if len(vehicles) != 1 else ''}."
+    
+    if inspections and not (query.count_only and len(inspections) > MAX_LISTED):
+        lines = [
+            f"- {i['vehicle_reg_no'] or 'Unknown vehicle'} — {i['date'] or 'no date'}"
+            + (f" ({i['drivers_name'].title()})" if i['drivers_name'] else "")
+            for i in inspections[:MAX_LISTED]
+        ]
+        if len(inspections) > MAX_LISTED:
+            lines.append(f"- … and {len(inspections) - MAX_LISTED} more")
+        answer += "\n\n" + "\n".join(lines)
+    
+    answer += "\n\n_Answered exactly from validated inspection data._"
+    return {'answer': answer, 'inspections': inspections, 'count': len(inspections), 'total': total}
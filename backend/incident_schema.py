@@ -0,0 +1,72 @@
+"""
+Transport Incident Extraction Schema
+Matches the incident report fields TransportIncidentDB stores
+"""
+
+from pydantic import BaseModel, Field
+from typing import Optional, List
+
+
+class DriverInfo(BaseModel):
+    """Driver and vehicle involved"""
+    driver_name: Optional[str] = Field(None, description="Driver's full name")
+    driver_id: Optional[str] = Field(None, description="Driver or employee ID number")
+    license_number: Optional[str] = Field(None, description="Driver's license number")
+    vehicle_registration: Optional[str] = Field(None, description="Vehicle registration number (e.g., KKJ 770 NW)")
+    vehicle_type: Optional[str] = Field(None, description="Vehicle type or make/model")
+
+
+class IncidentDetails(BaseModel):
+    """When, where and what happened"""
+    incident_date: Optional[str] = Field(None, description="Date of the incident in format DD/MM/YY or YYYY-MM-DD")
+    incident_time: Optional[str] = Field(None, description="Time of the incident (HH:MM)")
+    location: Optional[str] = Field(None, description="Location or address of the incident")
+    gps_coordinates: Optional[str] = Field(None, description="GPS coordinates if recorded")
+    incident_type: Optional[str] = Field(None, description="Type of incident (e.g., Collision, Breakdown, Theft, Hijacking)")
+    description: Optional[str] = Field(None, description="Description of how the incident happened")
+
+
+class DamageAssessment(BaseModel):
+    """Damage to the vehicle and third parties"""
+    vehicle_damage: Optional[str] = Field(None, description="Damage to the company vehicle")
+    third_party_damage: Optional[str] = Field(None, description="Damage to third-party vehicles or property")
+    estimated_cost: Optional[float] = Field(None, description="Estimated repair cost (number only)")
+
+
+class Injuries(BaseModel):
+    """Injuries and medical attention"""
+    injuries_reported: Optional[str] = Field(None, description="Were injuries reported? (yes or no)")
+    injury_details: Optional[str] = Field(None, description="Who was injured and how")
+    medical_attention: Optional[str] = Field(None, description="Was medical attention required? (yes or no)")
+
+
+class WitnessDetail(BaseModel):
+    """Single witness"""
+    name: Optional[str] = Field(None, description="Witness name")
+    contact: Optional[str] = Field(None, description="Witness phone number or address")
+
+
+class Witnesses(BaseModel):
+    """Witnesses present"""
+    witness_present: Optional[str] = Field(None, description="Were there witnesses? (yes or no)")
+    witness_details: Optional[List[WitnessDetail]] = Field(None, description="Witness names and contact details")
+
+
+class AdditionalInfo(BaseModel):
+    """Police report"""
+    police_reported: Optional[str] = Field(None, description="Was the incident reported to the police? (yes or no)")
+    case_number: Optional[str] = Field(None, description="Police case number")
+    police_station: Optional[str] = Field(None, description="Police station the case was reported at")
+
+
+class TransportIncidentExtraction(BaseModel):
+    """
+    Complete schema for a transport incident / accident report
+    Field names match what TransportIncidentDB.create() reads
+    """
+    driver_info: Optional[DriverInfo] = Field(None, description="Driver and vehicle involved")
+    incident_details: Optional[IncidentDetails] = Field(None, description="Date, time, location and description of the incident")
+    damage_assessment: Optional[DamageAssessment] = Field(None, description="Vehicle and third-party damage and estimated cost")
+    injuries: Optional[Injuries] = Field(None, description="Injuries and medical attention")
+    witnesses: Optional[Witnesses] = Field(None, description="Witnesses present and their details")
+    additional_info: Optional[AdditionalInfo] = Field(None, description="Police report details")
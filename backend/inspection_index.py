@@ -0,0 +1,318 @@
+"""
+Inspection Index
+In-memory columnar index over validated vehicle inspections
+
+Validated checklists are flattened into NumPy columns so aggregate questions
+("how many inspections had the rear-left tyre marked Bad in March") are
+answered with a few vectorized comparisons instead of scanning JSON:
+
+- one row per inspection: vehicle, driver, inspection day
+- one row per observation: inspection row, kind (item / tyre / consumable),
+  subject (e.g. "rear left", "wiper blades"), phase (before / after trip)
+  and value (e.g. "bad", "no", "3/4")
+
+Strings are dictionary-encoded, so every filter compares small integers.
+The index is rebuilt from the inspection source (Supabase or the local
+inspections store) when it gets older than its refresh interval,
+and validations made by this process are added immediately.
+"""
+
+import re
+import time
+import threading
+import logging
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Observation kinds
+ITEM, TYRE, CONSUMABLE = 0, 1, 2
+KIND_NAMES = {ITEM: "item", TYRE: "tyre", CONSUMABLE: "consumable"}
+
+# Observation phases
+BEFORE, AFTER = 0, 1
+
+# Inspection day stored for inspections without a readable date
+NO_DAY = np.iinfo(np.int64).min
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d/%m/%y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y/%m/%d")
+_ITEM_NUMBER = re.compile(r"^\s*\d+\.\s*")
+_SPACES = re.compile(r"\s+")
+_SIDES = {"l": "left", "r": "right"}
+
+
+def normalize_value(value) -> str:
+    """Lowercase, single-spaced string form used for every dictionary-encoded column"""
+    return _SPACES.sub(" ", str(value)).strip().lower()
+
+
+def normalize_subject(name: str) -> str:
+    """'1. BODY WORK' -> 'body work', 'Rear L' -> 'rear left'"""
+    words = normalize_value(_ITEM_NUMBER.sub("", name or "")).split(" ")
+    return " ".join(_SIDES.get(word, word) for word in words)
+
+
+def normalize_reg_no(reg_no: str) -> str:
+    """Registration numbers compare without spaces or dashes"""
+    return re.sub(r"[\s\-]+", "", reg_no or "").upper()
+
+
+def parse_day(value) -> Optional[date]:
+    """Parse a checklist date in any of the formats the extractor produces"""
+    if not value:
+        return None
+    text = str(value).strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).date()
+    except ValueError:
+        return None
+
+
+def inspection_observations(data: Dict) -> Iterator[Tuple[int, str, int, str]]:
+    """(kind, subject, phase, value) of every filled-in answer of a validated checklist"""
+    for item in data.get('inspection_items') or []:
+        subject = normalize_subject(item.get('item_name'))
+        for phase, prefix in ((BEFORE, 'pre_trip'), (AFTER, 'post_trip')):
+            if item.get(f'{prefix}_yes'):
+                yield ITEM, subject, phase, "yes"
+            elif item.get(f'{prefix}_no'):
+                yield ITEM, subject, phase, "no"
+    
+    for tyre in data.get('tyres') or []:
+        subject = normalize_subject(tyre.get('position'))
+        for phase, field in ((BEFORE, 'before_condition'), (AFTER, 'after_condition')):
+            if tyre.get(field):
+                yield TYRE, subject, phase, normalize_value(tyre[field])
+    
+    for consumable in data.get('consumables') or []:
+        subject = normalize_subject(consumable.get('item_name'))
+        for phase, field in ((BEFORE, 'before_level'), (AFTER, 'after_level')):
+            if consumable.get(field):
+                yield CONSUMABLE, subject, phase, normalize_value(consumable[field])
+
+
+class Vocabulary:
+    """Dictionary encoding of strings to dense integer codes"""
+    
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+    
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+    
+    def lookup(self, values: Iterable[str]) -> np.ndarray:
+        """Codes of the known values (unknown values are skipped)"""
+        return np.asarray([self.codes[v] for v in values if v in self.codes], dtype=np.int32)
+
+
+class InspectionIndex:
+    """Columnar index over validated inspections"""
+    
+    def __init__(self, loader: Callable[[], List[Dict]], refresh_seconds: float = 60.0):
+        """
+        Args:
+            loader: Returns every validated inspection as {'doc_id', 'validated_at', 'data'}
+            refresh_seconds: Rebuild from the loader when the index is older than this
+        """
+        self.loader = loader
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._reset()
+    
+    def _reset(self):
+        self.vehicles = Vocabulary()
+        self.drivers = Vocabulary()
+        self.subjects = Vocabulary()
+        self.values = Vocabulary()
+        
+        # Growable row buffers; columns() exposes them as NumPy arrays
+        self._doc_rows: Dict[str, int] = {}
+        self._doc_ids: List[str] = []
+        self._reg_nos: List[str] = []
+        self._live: List[bool] = []
+        self._inspection_cols = {'vehicle': [], 'driver': [], 'day': []}
+        self._observation_cols = {'inspection': [], 'kind': [], 'subject': [], 'phase': [], 'value': []}
+        self._arrays = None
+    
+    def ensure_fresh(self):
+        """Rebuild from the loader when the index is stale"""
+        with self._lock:
+            if self._built_at is not None and time.monotonic() - self._built_at < self.refresh_seconds:
+                return
+            
+            started = time.perf_counter()
+            try:
+                records = self.loader()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load inspections for the index: {e}")
+                if self._built_at is None:
+                    self._built_at = time.monotonic()
+                return
+            
+            self._reset()
+            for record in records:
+                self._add(record.get('doc_id'), record.get('data') or {}, record.get('validated_at'))
+            self._built_at = time.monotonic()
+            logger.info(
+                f"📊 Inspection index built: {len(self._doc_ids)} inspections, "
+                f"{len(self._observation_cols['inspection'])} observations in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+    
+    def upsert(self, doc_id: str, validated_data: Dict, validated_at: Optional[str] = None):
+        """Add (or replace) one inspection right after it is validated"""
+        with self._lock:
+            self._add(doc_id, validated_data, validated_at or datetime.utcnow().isoformat())
+    
+    def remove(self, doc_id: str):
+        """Drop an inspection (its rows are masked out until the next rebuild)"""
+        with self._lock:
+            row = self._doc_rows.pop(doc_id, None)
+            if row is not None:
+                self._live[row] = False
+                self._arrays = None
+    
+    def _add(self, doc_id: Optional[str], data: Dict, validated_at: Optional[str]):
+        if not doc_id:
+            return
+        self.remove(doc_id)
+        
+        row = len(self._doc_ids)
+        self._doc_rows[doc_id] = row
+        self._doc_ids.append(doc_id)
+        self._live.append(True)
+        
+        reg_no = data.get('vehicle_reg_no') or ''
+        self._reg_nos.append(reg_no)
+        day = parse_day(data.get('date')) or parse_day(validated_at)
+        self._inspection_cols['vehicle'].append(self.vehicles.encode(normalize_reg_no(reg_no)))
+        self._inspection_cols['driver'].append(self.drivers.encode(normalize_value(data.get('drivers_name') or '')))
+        self._inspection_cols['day'].append(day.toordinal() if day else NO_DAY)
+        
+        for kind, subject, phase, value in inspection_observations(data):
+            self._observe(row, kind, subject, phase, value)
+        
+        self._arrays = None
+    
+    def _observe(self, row: int, kind: int, subject: str, phase: int, value: str):
+        cols = self._observation_cols
+        cols['inspection'].append(row)
+        cols['kind'].append(kind)
+        cols['subject'].append(self.subjects.encode(subject))
+        cols['phase'].append(phase)
+        cols['value'].append(self.values.encode(value))
+    
+    def columns(self) -> Dict[str, np.ndarray]:
+        """NumPy views of every column (materialized once per change)"""
+        with self._lock:
+            if self._arrays is None:
+                arrays = {
+                    'live': np.asarray(self._live, dtype=bool),
+                    'vehicle': np.asarray(self._inspection_cols['vehicle'], dtype=np.int32),
+                    'driver': np.asarray(self._inspection_cols['driver'], dtype=np.int32),
+                    'day': np.asarray(self._inspection_cols['day'], dtype=np.int64),
+                }
+                for name in ('inspection', 'subject', 'value'):
+                    arrays[f'obs_{name}'] = np.asarray(self._observation_cols[name], dtype=np.int32)
+                for name in ('kind', 'phase'):
+                    arrays[f'obs_{name}'] = np.asarray(self._observation_cols[name], dtype=np.int8)
+                self._arrays = arrays
+            return self._arrays
+    
+    def select(
+        self,
+        kind: Optional[int] = None,
+        subjects: Optional[List[str]] = None,
+        values: Optional[List[str]] = None,
+        phase: Optional[int] = None,
+        vehicles: Optional[List[str]] = None,
+        drivers: Optional[List[str]] = None,
+        day_from: Optional[date] = None,
+        day_to: Optional[date] = None
+    ) -> np.ndarray:
+        """
+        Inspection rows matching every given filter
+        
+        Observation filters (kind, subjects, values, phase) must all hold for
+        the same observation; list filters match any of their values.
+        
+        Returns:
+            Sorted array of inspection row numbers
+        """
+        self.ensure_fresh()
+        cols = self.columns()
+        mask = cols['live'].copy()
+        
+        if vehicles:
+            mask &= np.isin(cols['vehicle'], self.vehicles.lookup(normalize_reg_no(v) for v in vehicles))
+        if drivers:
+            mask &= np.isin(cols['driver'], self.drivers.lookup(normalize_value(d) for d in drivers))
+        if day_from or day_to:
+            days = cols['day']
+            mask &= days != NO_DAY
+            if day_from:
+                mask &= days >= day_from.toordinal()
+            if day_to:
+                mask &= days <= day_to.toordinal()
+        
+        if kind is not None or subjects or values or phase is not None:
+            obs = np.ones(cols['obs_inspection'].shape[0], dtype=bool)
+            if kind is not None:
+                obs &= cols['obs_kind'] == kind
+            if subjects:
+                obs &= np.isin(cols['obs_subject'], self.subjects.lookup(subjects))
+            if values:
+                obs &= np.isin(cols['obs_value'], self.values.lookup(values))
+            if phase is not None:
+                obs &= cols['obs_phase'] == phase
+            
+            matched = np.zeros(mask.shape[0], dtype=bool)
+            matched[cols['obs_inspection'][obs]] = True
+            mask &= matched
+        
+        return np.flatnonzero(mask)
+    
+    def describe_rows(self, rows: np.ndarray) -> List[Dict]:
+        """doc_id, vehicle, driver and date of inspection rows, newest first"""
+        cols = self.columns()
+        described = []
+        for row in rows:
+            day = int(cols['day'][row])
+            described.append({
+                'doc_id': self._doc_ids[row],
+                'vehicle_reg_no': self._reg_nos[row],
+                'drivers_name': self.drivers.values[cols['driver'][row]],
+                'date': date.fromordinal(day).isoformat() if day != NO_DAY else None,
+            })
+        described.sort(key=lambda r: r['date'] or '', reverse=True)
+        return described
+    
+    def live_count(self) -> int:
+        self.ensure_fresh()
+        return int(self.columns()['live'].sum())
+    
+    def known_vehicles(self) -> List[str]:
+        """Registration numbers as written on the checklists"""
+        return sorted({reg for reg, live in zip(self._reg_nos, self._live) if reg and live})
+    
+    def known_subjects(self, kind: Optional[int] = None) -> List[str]:
+        cols = self.columns()
+        codes = cols['obs_subject'] if kind is None else cols['obs_subject'][cols['obs_kind'] == kind]
+        return [self.subjects.values[code] for code in np.unique(codes)]
+    
+    def known_drivers(self) -> List[str]:
+        return [name for name in self.drivers.values if name]
@@ -0,0 +1,220 @@
+"""
+Local Inspections Store
+Indexed SQLite store for validated inspections saved while Supabase is unavailable
+
+Replaces the one-JSON-file-per-inspection fallback. Each validation is a
+row keyed by doc_id with the columns /api/inspections filters on (vehicle,
+driver, inspection day, validated_at) kept indexed as they are written, so
+a filtered, paginated page costs an index range scan instead of opening
+every file. Rows also remember whether they have been replayed into the
+Supabase write-behind journal.
+"""
+
+import json
+import sqlite3
+import logging
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from inspection_index import normalize_reg_no, parse_day
+
+logger = logging.getLogger(__name__)
+
+# Largest page /api/inspections can ask for
+MAX_PAGE_SIZE = 1000
+
+
+def driver_key(name: Optional[str]) -> str:
+    """Driver names compare case- and spacing-insensitively"""
+    return " ".join((name or "").lower().split())
+
+
+class LocalInspectionStore:
+    """Validated inspections in SQLite with indexed filters"""
+    
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the store
+        
+        Args:
+            db_path: SQLite database file
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS inspections (
+                    doc_id          TEXT PRIMARY KEY,
+                    validated_at    TEXT NOT NULL,
+                    vehicle_key     TEXT NOT NULL,
+                    driver_key      TEXT NOT NULL,
+                    inspection_day  TEXT,
+                    replayed        INTEGER NOT NULL DEFAULT 0,
+                    data            TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS inspections_recent ON inspections (validated_at, doc_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS inspections_vehicle ON inspections (vehicle_key, validated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS inspections_driver ON inspections (driver_key, validated_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS inspections_day ON inspections (inspection_day)")
+            conn.execute("CREATE INDEX IF NOT EXISTS inspections_unreplayed ON inspections (replayed) WHERE replayed = 0")
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections are not shareable across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    @staticmethod
+    def _row(doc_id: str, validated_data: Dict, validated_at: str) -> tuple:
+        day = parse_day(validated_data.get('date'))
+        return (
+            doc_id,
+            validated_at,
+            normalize_reg_no(validated_data.get('vehicle_reg_no')),
+            driver_key(validated_data.get('drivers_name')),
+            day.isoformat() if day else None,
+            json.dumps(validated_data, default=str)
+        )
+    
+    def save(self, doc_id: str, validated_data: Dict, validated_at: Optional[str] = None) -> Dict:
+        """
+        Store (or replace) a validated inspection
+        
+        Returns:
+            The stored record {'doc_id', 'validated_at', 'data'}
+        """
+        validated_at = validated_at or datetime.utcnow().isoformat()
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO inspections "
+                "(doc_id, validated_at, vehicle_key, driver_key, inspection_day, data) VALUES (?, ?, ?, ?, ?, ?)",
+                self._row(doc_id, validated_data, validated_at)
+            )
+        return {'doc_id': doc_id, 'validated_at': validated_at, 'data': validated_data}
+    
+    def remove(self, doc_id: str):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM inspections WHERE doc_id = ?", (doc_id,))
+    
+    def page(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        vehicle: Optional[str] = None,
+        driver: Optional[str] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None
+    ) -> Tuple[List[Dict], int]:
+        """
+        Newest inspections matching the filters
+        
+        Args:
+            limit: Page size (capped at MAX_PAGE_SIZE)
+            offset: Rows to skip
+            vehicle: Registration number (spacing / case insensitive)
+            driver: Driver name or its beginning (case insensitive)
+            date_from: First inspection day (inclusive)
+            date_to: Last inspection day (inclusive)
+        
+        Returns:
+            (records as {'doc_id', 'validated_at', 'data'}, total matching)
+        """
+        clauses, params = [], []
+        if vehicle:
+            clauses.append("vehicle_key = ?")
+            params.append(normalize_reg_no(vehicle))
+        if driver:
+            # Prefix range scan on the driver index
+            prefix = driver_key(driver)
+            clauses.append("driver_key >= ? AND driver_key < ?")
+            params += [prefix, prefix + "\uffff"]
+        if date_from:
+            clauses.append("inspection_day >= ?")
+            params.append(date_from.isoformat())
+        if date_to:
+            clauses.append("inspection_day <= ?")
+            params.append(date_to.isoformat())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM inspections {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT doc_id, validated_at, data FROM inspections {where} "
+            "ORDER BY validated_at DESC, doc_id DESC LIMIT ? OFFSET ?",
+            params + [max(0, min(limit, MAX_PAGE_SIZE)), max(0, offset)]
+        ).fetchall()
+        return [self._record(row) for row in rows], total
+    
+    def iter_all(self) -> Iterator[Dict]:
+        """Every stored inspection, oldest first"""
+        cursor = self._connection().execute("SELECT doc_id, validated_at, data FROM inspections ORDER BY validated_at")
+        for row in cursor:
+            yield self._record(row)
+    
+    def unreplayed(self) -> List[Dict]:
+        """Inspections not yet queued for Supabase"""
+        rows = self._connection().execute(
+            "SELECT doc_id, validated_at, data FROM inspections WHERE replayed = 0 ORDER BY validated_at"
+        ).fetchall()
+        return [self._record(row) for row in rows]
+    
+    def mark_replayed(self, doc_ids: List[str]):
+        with self._connection() as conn:
+            conn.executemany("UPDATE inspections SET replayed = 1 WHERE doc_id = ?", [(doc_id,) for doc_id in doc_ids])
+    
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM inspections").fetchone()[0]
+    
+    def import_files(self, validated_dir: Path) -> int:
+        """
+        One-time import of the legacy *_validated.json fallback files
+        
+        Imported files are renamed to *.imported.
+        
+        Returns:
+            Number of files imported
+        """
+        if not validated_dir.exists():
+            return 0
+        
+        imported = []
+        rows = []
+        for filepath in sorted(validated_dir.glob("*_validated.json")):
+            try:
+                with open(filepath, 'r') as f:
+                    record = json.load(f)
+                rows.append(self._row(
+                    record['doc_id'], record.get('data') or {},
+                    record.get('validated_at') or datetime.utcnow().isoformat()
+                ))
+                imported.append(filepath)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not import {filepath.name}: {e}")
+        
+        if rows:
+            with self._connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO inspections "
+                    "(doc_id, validated_at, vehicle_key, driver_key, inspection_day, data) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            for filepath in imported:
+                filepath.rename(filepath.with_name(f"{filepath.name}.imported"))
+            logger.info(f"📥 Imported {len(rows)} local validation files into {self.db_path.name}")
+        return len(rows)
+    
+    @staticmethod
+    def _record(row: tuple) -> Dict:
+        doc_id, validated_at, data = row
+        return {'doc_id': doc_id, 'validated_at': validated_at, 'data': json.loads(data)}
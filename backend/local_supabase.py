@@ -0,0 +1,224 @@
+"""
+Local Supabase
+SQLite stand-in for the Supabase tables (SUPABASE_BACKEND=local)
+
+Implements the part of the supabase-py async query builder this backend
+uses, so the validate / inspections paths and the write-behind journal can
+be profiled and load-tested without a Supabase project:
+
+    await client.table('vehicle_inspections')
+        .select('doc_id, validated_at')
+        .eq('organization_id', org_id)
+        .order('validated_at', desc=True)
+        .limit(100)
+        .execute()
+
+Rows are stored schemaless as JSON; filters and ordering use json_extract,
+with expression indexes on the key columns we filter by. Queries run on a
+worker thread (like a network call, they never block the event loop), and
+latency_ms adds a simulated round-trip.
+"""
+
+import re
+import json
+import uuid
+import asyncio
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Columns given an expression index (the ones SupabaseDB / DocumentDB filter on)
+INDEXED_COLUMNS = ("id", "doc_id", "organization_id", "document_id")
+
+_COLUMN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _path(column: str) -> str:
+    """json_extract expression for a column (inlined so expression indexes apply)"""
+    if not _COLUMN.match(column):
+        raise ValueError(f"Invalid column name: {column!r}")
+    return f"json_extract(data, '$.{column}')"
+
+
+class LocalResponse:
+    """Mirrors the .data / .count of a postgrest APIResponse"""
+    
+    def __init__(self, data: List[Dict]):
+        self.data = data
+        self.count = None
+
+
+class LocalQuery:
+    """One query against a table; builder methods return self, like postgrest's"""
+    
+    def __init__(self, client: "LocalSupabaseClient", table: str):
+        self.client = client
+        self.table_name = table
+        self._operation = "select"
+        self._columns: Optional[List[str]] = None
+        self._payload: Union[Dict, List[Dict], None] = None
+        self._filters: List[tuple] = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset = 0
+    
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "LocalQuery":
+        self._operation = "select"
+        names = [name.strip() for name in columns.split(",") if name.strip()]
+        self._columns = None if "*" in names else names
+        return self
+    
+    def insert(self, rows: Union[Dict, List[Dict]]) -> "LocalQuery":
+        self._operation = "insert"
+        self._payload = rows
+        return self
+    
+    def update(self, changes: Dict) -> "LocalQuery":
+        self._operation = "update"
+        self._payload = changes
+        return self
+    
+    def eq(self, column: str, value: Any) -> "LocalQuery":
+        self._filters.append((f"{_path(column)} = ?", [_param(value)]))
+        return self
+    
+    def in_(self, column: str, values: List[Any]) -> "LocalQuery":
+        values = [_param(value) for value in values]
+        placeholders = ", ".join("?" * len(values)) or "NULL"
+        self._filters.append((f"{_path(column)} IN ({placeholders})", values))
+        return self
+    
+    def order(self, column: str, desc: bool = False) -> "LocalQuery":
+        # Postgres puts NULLs last ascending and first descending
+        direction = "DESC NULLS FIRST" if desc else "ASC NULLS LAST"
+        self._order.append(f"{_path(column)} {direction}")
+        return self
+    
+    def limit(self, size: int) -> "LocalQuery":
+        self._limit = size
+        return self
+    
+    def range(self, start: int, end: int) -> "LocalQuery":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+    
+    async def execute(self) -> LocalResponse:
+        if self.client.latency:
+            await asyncio.sleep(self.client.latency)
+        return LocalResponse(await asyncio.to_thread(self._run))
+    
+    def _where(self) -> tuple:
+        clauses = ["table_name = ?"] + [clause for clause, _ in self._filters]
+        params = [self.table_name] + [param for _, values in self._filters for param in values]
+        return " AND ".join(clauses), params
+    
+    def _run(self) -> List[Dict]:
+        conn = self.client._connection()
+        if self._operation == "insert":
+            return self.client._insert(conn, self.table_name, self._payload)
+        
+        where, params = self._where()
+        if self._operation == "update":
+            return self.client._update(conn, where, params, self._payload)
+        
+        sql = f"SELECT data FROM rows WHERE {where}"
+        if self._order:
+            sql += " ORDER BY " + ", ".join(self._order)
+        if self._limit is not None or self._offset:
+            sql += " LIMIT ? OFFSET ?"
+            params += [self._limit if self._limit is not None else -1, self._offset]
+        
+        rows = [json.loads(data) for (data,) in conn.execute(sql, params)]
+        if self._columns is not None:
+            rows = [{column: row.get(column) for column in self._columns} for row in rows]
+        return rows
+
+
+class LocalSupabaseClient:
+    """SQLite-backed client exposing table() like supabase-py's AsyncClient"""
+    
+    def __init__(self, db_path: str, latency_ms: float = 0.0):
+        """
+        Open (or create) the database
+        
+        Args:
+            db_path: SQLite file holding every table
+            latency_ms: Simulated network round-trip added to each query
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.latency = latency_ms / 1000.0
+        self._local = threading.local()
+        # postgrest.aclose() is how the gateway releases a client's connections
+        self.postgrest = self
+        
+        with self._connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rows (
+                    row_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name  TEXT NOT NULL,
+                    data        TEXT NOT NULL
+                )
+                """
+            )
+            for column in INDEXED_COLUMNS:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS rows_{column} ON rows (table_name, {_path(column)})")
+        logger.info(f"✅ Local Supabase stand-in: {self.db_path}")
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections are not shareable across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self, name)
+    
+    async def aclose(self):
+        """Nothing to release: connections belong to worker threads and close with them"""
+    
+    def _insert(self, conn: sqlite3.Connection, table: str, payload: Union[Dict, List[Dict]]) -> List[Dict]:
+        rows = [dict(row) for row in (payload if isinstance(payload, list) else [payload])]
+        now = datetime.utcnow().isoformat()
+        for row in rows:
+            # Column defaults of the Supabase tables
+            row.setdefault('id', str(uuid.uuid4()))
+            row.setdefault('created_at', now)
+        with conn:
+            conn.executemany(
+                "INSERT INTO rows (table_name, data) VALUES (?, ?)",
+                [(table, json.dumps(row, default=str)) for row in rows]
+            )
+        return rows
+    
+    def _update(self, conn: sqlite3.Connection, where: str, params: List, changes: Dict) -> List[Dict]:
+        changes = json.loads(json.dumps(changes, default=str))
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            matched = conn.execute(f"SELECT row_id, data FROM rows WHERE {where}", params).fetchall()
+            updated = []
+            for row_id, data in matched:
+                row = {**json.loads(data), **changes}
+                updated.append((json.dumps(row), row_id))
+            conn.executemany("UPDATE rows SET data = ? WHERE row_id = ?", updated)
+        return [json.loads(data) for data, _ in updated]
+
+
+def _param(value: Any) -> Any:
+    """Filter value as json_extract returns it (booleans are 1/0)"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
@@ -16,24 +16,48 @@ BASE_DIR = Path(__file__).resolve().parent
 ENV_PATH = BASE_DIR / ".env"
 
 load_dotenv(dotenv_path=ENV_PATH)
-print(f"DEBUG: OPENAI_API_KEY loaded: {os.getenv('OPENAI_API_KEY', 'NOT SET')[:20]}...")
 
+import time
 import uuid
 import json
 import shutil
+import fcntl
+import asyncio
+import tempfile
+import threading
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 #from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
 from typing import Dict, List, Optional
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 # Vector store and embeddings
-from vector_store import get_vector_store
-from embeddings import get_embedding_service, EmbeddingProvider
+from vector_store import get_vector_store, clean_parsed_chunks
+from embeddings import EmbeddingProvider
+from embedding_versions import (
+    get_active_index,
+    get_index_targets,
+    get_version_registry,
+    start_migration,
+    activate_version,
+)
+from answer_cache import AnswerCache, history_hash
+from context_packer import pack_chunks, trim_history
+from inspection_index import InspectionIndex
+from fleet_analytics import FleetRollups, BUCKETS, PHASES
+from fleet_query import answer_fleet_question, MAX_LISTED
+from offline_provider import OfflineChatClient
+from rate_limiter import AsyncRateLimiter
+from template_extractor import extract_pretrip_checklist
+from write_journal import WriteJournal
+from local_inspections import LocalInspectionStore, MAX_PAGE_SIZE
+from schema_registry import get_schema_registry, DEFAULT_DOCUMENT_TYPE, PRETRIP_CHECKLIST
 
 # Configure logging AFTER dotenv
 logging.basicConfig(
@@ -42,14 +66,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-if not os.getenv("OPENAI_API_KEY"):
-    raise RuntimeError("OPENAI_API_KEY is missing. Check backend/.env")
-
 
 # LandingAI imports
 try:
     from landingai_ade import LandingAIADE
-    from landingai_ade.lib import pydantic_to_json_schema
     AGENTIC_DOC_AVAILABLE = True
     logger.info("✅ LandingAI landingai_ade module loaded successfully")
 except ImportError as e:
@@ -58,19 +78,17 @@ except ImportError as e:
     logger.error("Install with: pip install landingai-ade")
     sys.exit(1)
 
-# Supabase imports
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
+# Supabase imports (async client, shared with supabase_client's helpers)
+from supabase_client import get_supabase_gateway, SUPABASE_AVAILABLE
+if SUPABASE_AVAILABLE:
     logger.info("✅ Supabase module loaded successfully")
-except ImportError as e:
-    SUPABASE_AVAILABLE = False
-    logger.warning(f"⚠️ Supabase not available: {e}")
+else:
+    logger.warning("⚠️ Supabase not available")
     logger.warning("Run: pip install supabase")
 
 # OpenAI imports (for chat)
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI
     OPENAI_AVAILABLE = True
     logger.info("✅ OpenAI module loaded successfully")
 except ImportError as e:
@@ -91,15 +109,77 @@ class Config:
     # Supabase settings
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # Use service_role key for backend
+    # (the gateway in supabase_client.py reads these, plus SUPABASE_MAX_CONCURRENCY
+    # and SUPABASE_TIMEOUT_SECONDS; SUPABASE_BACKEND=local uses a SQLite stand-in
+    # at SUPABASE_LOCAL_PATH with SUPABASE_LOCAL_LATENCY_MS simulated latency)
     ORGANIZATION_ID = os.getenv("ORGANIZATION_ID", "default_org")
     
+    # Supabase writes are journaled locally and flushed in the background
+    SUPABASE_JOURNAL_PATH = os.getenv("SUPABASE_JOURNAL_PATH", "./supabase_journal.sqlite3")
+    SUPABASE_FLUSH_INTERVAL_SECONDS = float(os.getenv("SUPABASE_FLUSH_INTERVAL_SECONDS", "1"))
+    SUPABASE_FLUSH_BATCH_SIZE = int(os.getenv("SUPABASE_FLUSH_BATCH_SIZE", "100"))
+    SUPABASE_WRITE_MAX_ATTEMPTS = int(os.getenv("SUPABASE_WRITE_MAX_ATTEMPTS", "10"))
+    
+    # Validations saved while Supabase is unavailable (indexed SQLite store)
+    LOCAL_INSPECTIONS_PATH = os.getenv("LOCAL_INSPECTIONS_PATH", "./local_inspections.sqlite3")
+    
+    # Fleet analytics rollups (updated as inspections are validated)
+    FLEET_ANALYTICS_PATH = os.getenv("FLEET_ANALYTICS_PATH", "./fleet_analytics.sqlite3")
+    
     # OpenAI settings
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     
+    # Chat LLM: "openai", or "offline" for the deterministic stand-in (load tests / CI, no key needed)
+    CHAT_PROVIDER = os.getenv("CHAT_PROVIDER", "openai").lower()
+    OFFLINE_LLM_LATENCY_MS = float(os.getenv("OFFLINE_LLM_LATENCY_MS", "0"))
+    OFFLINE_LLM_TOKEN_LATENCY_MS = float(os.getenv("OFFLINE_LLM_TOKEN_LATENCY_MS", "0"))
+    
     # Application settings
     MAX_FILE_SIZE_MB = int(os.getenv("MAX_FILE_SIZE_MB", "50"))
+    MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "1000"))
+    
+    # Embedding / vector search run on a bounded thread pool; LLM calls are async
+    BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "8"))
+    SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "30"))
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    
+    # Embedding migration throttle (chunks per batch, pause between batches)
+    MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "256"))
+    MIGRATION_PAUSE_SECONDS = float(os.getenv("MIGRATION_PAUSE_SECONDS", "0.5"))
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff'}
     
+    # Chat retrieval diversity, off by default: MMR trade-off (1.0 = relevance only,
+    # e.g. 0.7; unset = plain top-k) and duplicate-text suppression
+    CHAT_MMR_LAMBDA = float(os.getenv("CHAT_MMR_LAMBDA")) if os.getenv("CHAT_MMR_LAMBDA") else None
+    CHAT_DEDUP = os.getenv("CHAT_DEDUP", "false").lower() in ("1", "true", "yes", "on")
+    
+    # Answer aggregate inspection questions from the inspection index instead of RAG
+    CHAT_STRUCTURED_ROUTING = os.getenv("CHAT_STRUCTURED_ROUTING", "true").lower() in ("1", "true", "yes", "on")
+    INSPECTION_INDEX_REFRESH_SECONDS = float(os.getenv("INSPECTION_INDEX_REFRESH_SECONDS", "60"))
+    
+    # Batch extraction: concurrent LandingAI calls, calls per minute (0 = unlimited), documents per batch
+    EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "4"))
+    EXTRACT_RATE_PER_MINUTE = float(os.getenv("EXTRACT_RATE_PER_MINUTE", "30"))
+    EXTRACT_TIMEOUT_SECONDS = float(os.getenv("EXTRACT_TIMEOUT_SECONDS", "300"))
+    MAX_BATCH_EXTRACT = int(os.getenv("MAX_BATCH_EXTRACT", "500"))
+    
+    # Template extraction of fixed-layout checklists (below the confidence, LandingAI is used)
+    LOCAL_EXTRACTION = os.getenv("LOCAL_EXTRACTION", "true").lower() in ("1", "true", "yes", "on")
+    LOCAL_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("LOCAL_EXTRACTION_MIN_CONFIDENCE", "0.85"))
+    
+    # Parsed chunks embedded to classify documents indexed before classification existed
+    CLASSIFIER_MAX_CHUNKS = int(os.getenv("CLASSIFIER_MAX_CHUNKS", "16"))
+    
+    # Chat prompt token budgets (retrieved context, conversation history, single chunk)
+    CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "3000"))
+    CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1000"))
+    CHAT_MAX_CHUNK_TOKENS = int(os.getenv("CHAT_MAX_CHUNK_TOKENS", "800"))
+    
+    # Chat answer cache (size 0 disables; similarity above 1.0 = exact question matches only)
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+    
     # Server settings
     HOST = os.getenv("HOST", "0.0.0.0")
     PORT = int(os.getenv("PORT", "8001"))
@@ -109,33 +189,83 @@ if not Config.LANDING_AI_API_KEY and not Config.VISION_AGENT_API_KEY:
     logger.error("❌ No API key found. Set LANDING_AI_API_KEY or VISION_AGENT_API_KEY in .env")
     sys.exit(1)
 
-# Initialize Supabase client
-supabase: Optional[Client] = None
-if SUPABASE_AVAILABLE and Config.SUPABASE_URL and Config.SUPABASE_KEY:
-    try:
-        supabase = create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY)
-        logger.info("✅ Supabase client initialized")
-    except Exception as e:
-        logger.warning(f"⚠️ Failed to initialize Supabase: {e}")
-        SUPABASE_AVAILABLE = False
-else:
-    if SUPABASE_AVAILABLE:
-        logger.warning("⚠️ SUPABASE_URL or SUPABASE_KEY not set")
-    SUPABASE_AVAILABLE = False
+# Supabase gateway: one async client with pooled connections, bounded
+# concurrency and per-call timeouts (the client is created in startup_event)
+supabase = get_supabase_gateway()
+if SUPABASE_AVAILABLE and not supabase.configured:
+    logger.warning("⚠️ SUPABASE_URL or SUPABASE_KEY not set")
+SUPABASE_AVAILABLE = supabase.configured
+
+# Write-behind journal: request handlers queue Supabase writes locally (durable,
+# sub-millisecond) and a background thread flushes them in batches
+supabase_journal: Optional[WriteJournal] = None
+if SUPABASE_AVAILABLE:
+    supabase_journal = WriteJournal(
+        Config.SUPABASE_JOURNAL_PATH,
+        gateway=supabase,
+        flush_interval=Config.SUPABASE_FLUSH_INTERVAL_SECONDS,
+        batch_size=Config.SUPABASE_FLUSH_BATCH_SIZE,
+        max_attempts=Config.SUPABASE_WRITE_MAX_ATTEMPTS
+    )
 
-# Initialize OpenAI client (for chat)
-openai_client: Optional[OpenAI] = None
-if OPENAI_AVAILABLE and Config.OPENAI_API_KEY:
+# Local fallback for validated inspections (replayed into the journal once Supabase is configured)
+local_inspections = LocalInspectionStore(Config.LOCAL_INSPECTIONS_PATH)
+
+# Initialize the chat LLM client - async, so a slow completion only suspends
+# its own request instead of blocking the worker. Without a client, chat
+# answers with the retrieved excerpts (fallback mode).
+llm_client = None
+if Config.CHAT_PROVIDER == "offline":
+    llm_client = OfflineChatClient(
+        latency_ms=Config.OFFLINE_LLM_LATENCY_MS,
+        token_latency_ms=Config.OFFLINE_LLM_TOKEN_LATENCY_MS
+    )
+elif OPENAI_AVAILABLE and Config.OPENAI_API_KEY:
     try:
-        openai_client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        llm_client = AsyncOpenAI(api_key=Config.OPENAI_API_KEY, timeout=Config.LLM_TIMEOUT_SECONDS)
         logger.info("✅ OpenAI client initialized for chat")
     except Exception as e:
         logger.warning(f"⚠️ Failed to initialize OpenAI: {e}")
-        openai_client = None
+        llm_client = None
 else:
     if OPENAI_AVAILABLE and not Config.OPENAI_API_KEY:
         logger.warning("⚠️ OPENAI_API_KEY not set - chat will use fallback mode")
 
+# Generated chat answers, reused while the retrieved evidence is unchanged
+answer_cache = AnswerCache(
+    max_entries=Config.ANSWER_CACHE_SIZE,
+    ttl_seconds=Config.ANSWER_CACHE_TTL_SECONDS,
+    similarity_threshold=Config.ANSWER_CACHE_SIMILARITY
+)
+
+# Bounded pool for blocking calls made from async handlers (embedding, vector search)
+blocking_executor = ThreadPoolExecutor(max_workers=Config.BLOCKING_WORKERS, thread_name_prefix="blocking")
+
+# LandingAI extract calls from /api/extract/batch, shared by all batches
+extract_semaphore = asyncio.Semaphore(Config.EXTRACT_CONCURRENCY)
+extract_rate_limiter = AsyncRateLimiter(Config.EXTRACT_RATE_PER_MINUTE)
+
+
+async def run_blocking(func, *args, timeout: Optional[float] = None, **kwargs):
+    """
+    Run a blocking call on blocking_executor without stalling the event loop
+    
+    Args:
+        func: Callable to run
+        timeout: Seconds to wait (default Config.SEARCH_TIMEOUT_SECONDS); the
+            call keeps its worker thread until it returns, but the request
+            stops waiting for it
+    
+    Returns:
+        The call's return value
+    
+    Raises:
+        asyncio.TimeoutError: The call did not finish in time
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout or Config.SEARCH_TIMEOUT_SECONDS)
+
 # =============================================================================
 # FASTAPI APPLICATION
 # =============================================================================
@@ -155,6 +285,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def sync_document_store(request, call_next):
+    """Keep this worker's document index in step with other workers (uvicorn --workers N)"""
+    # Only the stat runs on the loop; reloading waits for the index lock
+    if _document_store_stamp() != _document_store_loaded_stamp:
+        await run_blocking(refresh_document_store)
+    return await call_next(request)
+
 # Directories
 BASE_DIR = Path(__file__).parent
 OUTPUTS_DIR = BASE_DIR / "outputs"
@@ -162,6 +300,11 @@ OUTPUTS_DIR.mkdir(exist_ok=True)
 
 # Persistent document store (JSON file - backup)
 DOCUMENT_INDEX_PATH = Path("./document_index.json")
+# Serializes read-merge-write of the index across worker processes
+DOCUMENT_INDEX_LOCK_PATH = DOCUMENT_INDEX_PATH.with_name(f"{DOCUMENT_INDEX_PATH.name}.lock")
+# Serializes changes to documents_store within this process (batch extraction
+# saves from blocking_executor threads while requests refresh it on the loop)
+_document_store_lock = threading.RLock()
 
 def load_document_store() -> Dict[str, dict]:
     """Load document index from disk"""
@@ -174,15 +317,94 @@ def load_document_store() -> Dict[str, dict]:
             return {}
     return {}
 
+def _document_store_stamp():
+    """Identity of the index file on disk (changes on every save)"""
+    try:
+        stat = DOCUMENT_INDEX_PATH.stat()
+        return (stat.st_mtime_ns, stat.st_ino)
+    except FileNotFoundError:
+        return None
+
 def save_document_store(store: Dict[str, dict]):
-    """Save document index to disk"""
+    """Save document index to disk (atomic replace, other workers never see a partial file)"""
+    fd, tmp_path = tempfile.mkstemp(
+        dir=DOCUMENT_INDEX_PATH.resolve().parent, prefix=f"{DOCUMENT_INDEX_PATH.name}.", suffix=".tmp"
+    )
     try:
-        with open(DOCUMENT_INDEX_PATH, 'w') as f:
+        with os.fdopen(fd, 'w') as f:
             json.dump(store, f, indent=2, default=str)
-    except Exception as e:
-        logger.error(f"Error saving document index: {e}")
+        os.replace(tmp_path, DOCUMENT_INDEX_PATH)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _replace_documents_store(store: Dict[str, dict]):
+    """
+    Make documents_store equal to store without emptying it first, so a
+    concurrent documents_store[doc_id] never misses a document that exists
+    """
+    documents_store.update(store)
+    for doc_id in [doc_id for doc_id in documents_store if doc_id not in store]:
+        del documents_store[doc_id]
+
+def update_document_store(doc_id: str, fields: Optional[dict] = None, replace: bool = False) -> Optional[dict]:
+    """
+    Apply one document's change to the index (read-merge-write across workers)
+    
+    Under an exclusive lock the index is reloaded from disk, so documents saved
+    by other workers since this one last loaded it are kept; the change is
+    applied and the file replaced atomically. This worker's copy becomes the
+    saved index.
+    
+    Args:
+        doc_id: Document ID
+        fields: Fields to set on the document (None deletes it)
+        replace: Replace the whole entry with fields instead of merging them in
+            (without it, a document another worker deleted stays deleted)
+    
+    Returns:
+        The document's entry after the change (None once deleted)
+    
+    Blocks on the index locks and disk: async handlers call it through
+    run_blocking.
+    """
+    global _document_store_loaded_stamp
+    with _document_store_lock, open(DOCUMENT_INDEX_LOCK_PATH, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Not load_document_store(): an unreadable index must fail the save, not be overwritten
+            store = {}
+            if DOCUMENT_INDEX_PATH.exists():
+                with open(DOCUMENT_INDEX_PATH, 'r') as f:
+                    store = json.load(f)
+            if fields is None:
+                store.pop(doc_id, None)
+            elif replace:
+                store[doc_id] = dict(fields)
+            elif doc_id in store:
+                store[doc_id] = {**store[doc_id], **fields}
+            try:
+                save_document_store(store)
+            except Exception as e:
+                logger.error(f"Error saving document index: {e}")
+                raise
+            _replace_documents_store(store)
+            _document_store_loaded_stamp = _document_store_stamp()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return store.get(doc_id)
+
+def refresh_document_store():
+    """Reload the index if another worker process saved a newer copy"""
+    global _document_store_loaded_stamp
+    with _document_store_lock:
+        stamp = _document_store_stamp()
+        if stamp is not None and stamp != _document_store_loaded_stamp:
+            _replace_documents_store(load_document_store())
+            _document_store_loaded_stamp = stamp
 
 # Load document store on startup
+_document_store_loaded_stamp = _document_store_stamp()
 documents_store: Dict[str, dict] = load_document_store()
 logger.info(f"📂 Loaded {len(documents_store)} documents from index")
 
@@ -201,68 +423,16 @@ class DocumentResponse(BaseModel):
     num_chunks: Optional[int] = None
     indexed: Optional[bool] = None
     indexed_chunks: Optional[int] = None
+    document_type: Optional[str] = None
 
 class ChunkResponse(BaseModel):
     chunks: List[dict]
 
-# =============================================================================
-# PRE-TRIP CHECKLIST EXTRACTION SCHEMA
-# =============================================================================
-
-class VehicleHeader(BaseModel):
-    """Header information from the checklist"""
-    vehicle_reg_no: Optional[str] = Field(None, description="Vehicle registration number (e.g., KKJ 770 NW)")
-    drivers_name: Optional[str] = Field(None, description="Driver's full name")
-    date: Optional[str] = Field(None, description="Date of inspection in format DD/MM/YY or YYYY-MM-DD")
-    vehicle_mileage: Optional[str] = Field(None, description="Vehicle mileage reading")
-
-
-class InspectionItem(BaseModel):
-    """Single inspection item with pre-trip and post-trip status"""
-    item_name: Optional[str] = Field(None, description="Name of the inspection item (e.g., BODY WORK, LICENSE DISK)")
-    condition: Optional[str] = Field(None, description="Condition description (e.g., Scratched, Valid, Working)")
-    pre_trip_yes: Optional[bool] = Field(None, description="Pre-trip inspection: YES checked")
-    pre_trip_no: Optional[bool] = Field(None, description="Pre-trip inspection: NO checked")
-    remarks: Optional[str] = Field(None, description="Remarks or notes for this item")
-    post_trip_yes: Optional[bool] = Field(None, description="Post-trip inspection: YES checked")
-    post_trip_no: Optional[bool] = Field(None, description="Post-trip inspection: NO checked")
-
-
-class ConsumableLevel(BaseModel):
-    """Consumable/fluid level item with before and after readings"""
-    item_name: Optional[str] = Field(None, description="Item name (e.g., Amount of Fuel, Brake Fluid, Engine Oil)")
-    before_trip_level: Optional[str] = Field(None, description="Level before trip (F, 3/4, 1/2, 1/4, E)")
-    after_trip_level: Optional[str] = Field(None, description="Level after trip (F, 3/4, 1/2, 1/4, E)")
-
-
-class TyreCondition(BaseModel):
-    """Tyre condition with brand and status"""
-    position: Optional[str] = Field(None, description="Tyre position (Front L, Front R, Rear L, Rear R)")
-    before_condition: Optional[str] = Field(None, description="Condition before trip (Good, Fair, Bad)")
-    before_brand: Optional[str] = Field(None, description="Tyre brand before trip")
-    after_condition: Optional[str] = Field(None, description="Condition after trip (Good, Fair, Bad)")
-    after_brand: Optional[str] = Field(None, description="Tyre brand after trip")
-
-
-class Signatures(BaseModel):
-    """Signature fields"""
-    receiver_name: Optional[str] = Field(None, description="Name of Receiver")
-    dept_representative_name: Optional[str] = Field(None, description="Name of Dept Representative")
-    fuel_card_issued: Optional[bool] = Field(None, description="Was fuel card issued?")
-    keys_issued: Optional[bool] = Field(None, description="Were keys issued?")
-
-
-class PreTripChecklistExtraction(BaseModel):
-    """
-    Complete schema for Yarona Pool Vehicle Inspection Checklist
-    Captures pre-trip and post-trip inspection data
-    """
-    vehicle_header: Optional[VehicleHeader] = Field(None, description="Vehicle and driver header information")
-    inspection_items: Optional[List[InspectionItem]] = Field(None, description="List of inspection items with pre/post trip status")
-    consumable_levels: Optional[List[ConsumableLevel]] = Field(None, description="Fluid/consumable levels before and after trip")
-    tyre_conditions: Optional[List[TyreCondition]] = Field(None, description="Tyre condition and brand for each position")
-    signatures: Optional[Signatures] = Field(None, description="Signature information")
-
+class ExtractBatchRequest(BaseModel):
+    doc_ids: Optional[List[str]] = Field(None, description="Documents to extract")
+    status: Optional[str] = Field(None, description="Extract every document with this status instead (e.g. 'parsed')")
+    force: bool = False
+    document_type: Optional[str] = Field(None, description="Schema for every document (default: each document's classified type)")
 
 # =============================================================================
 # RAG MODELS
@@ -273,6 +443,8 @@ class QueryRequest(BaseModel):
     n_results: int = 5
     doc_id: Optional[str] = None
     chunk_type: Optional[str] = None
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0, description="MMR trade-off: 1.0 = relevance only, lower = more diverse")
+    dedup: bool = False
 
 class SearchResult(BaseModel):
     chunk_id: str
@@ -288,11 +460,22 @@ class QueryResponse(BaseModel):
     results: List[SearchResult]
     total_results: int
 
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse]
+    total_queries: int
+
 class VectorStoreStats(BaseModel):
     total_chunks: int
     total_documents: int
     indexed_doc_ids: List[str]
 
+class EmbeddingMigrationRequest(BaseModel):
+    provider: EmbeddingProvider
+    model_name: Optional[str] = None
+
 # =============================================================================
 # CHAT MODELS (for /api/chat endpoint)
 # =============================================================================
@@ -329,8 +512,8 @@ class SupabaseDB:
     
     @staticmethod
     def save_document(doc_id: str, filename: str, organization_id: str, status: str = 'uploaded'):
-        """Save document metadata to Supabase"""
-        if not supabase:
+        """Queue document metadata for Supabase"""
+        if not supabase_journal:
             return None
         
         try:
@@ -342,122 +525,251 @@ class SupabaseDB:
                 'created_at': datetime.utcnow().isoformat(),
                 'updated_at': datetime.utcnow().isoformat()
             }
-            result = supabase.table('documents').insert(data).execute()
-            return result.data[0] if result.data else None
+            supabase_journal.enqueue_insert('documents', data, key_column='doc_id')
+            supabase.invalidate('documents')
+            return data
         except Exception as e:
-            logger.error(f"Error saving document to Supabase: {e}")
+            logger.error(f"Error queueing document for Supabase: {e}")
             return None
     
     @staticmethod
     def update_document(doc_id: str, **kwargs):
-        """Update document in Supabase"""
-        if not supabase:
+        """Queue a document update (merged into the document's queued write if it has one)"""
+        if not supabase_journal:
             return None
         
         try:
             kwargs['updated_at'] = datetime.utcnow().isoformat()
-            result = supabase.table('documents').update(kwargs).eq('doc_id', doc_id).execute()
-            return result.data[0] if result.data else None
+            supabase_journal.enqueue_update('documents', 'doc_id', doc_id, kwargs)
+            supabase.invalidate('documents')
+            return {'doc_id': doc_id, **kwargs}
         except Exception as e:
-            logger.error(f"Error updating document in Supabase: {e}")
+            logger.error(f"Error queueing document update for Supabase: {e}")
             return None
     
     @staticmethod
-    def get_document(doc_id: str):
-        """Get document from Supabase"""
-        if not supabase:
+    async def get_document(doc_id: str, columns: str = '*'):
+        """Get document from Supabase (columns: comma-separated projection)"""
+        if not supabase.ready:
             return None
         
         try:
-            result = supabase.table('documents').select('*').eq('doc_id', doc_id).execute()
-            return result.data[0] if result.data else None
+            rows = await supabase.fetch(
+                'documents', ('doc_id', doc_id, columns),
+                lambda db: db.table('documents').select(columns).eq('doc_id', doc_id)
+            )
+            return rows[0] if rows else None
         except Exception as e:
             logger.error(f"Error getting document from Supabase: {e}")
             return None
     
+    @staticmethod
+    def _inspection_row(doc_id: str, organization_id: str, validated_data: dict, validated_by: str,
+                        validated_at: Optional[str] = None) -> dict:
+        """Flatten validated data into a vehicle_inspections row"""
+        return {
+            'doc_id': doc_id,
+            'organization_id': organization_id,
+            'validated_by': validated_by,
+            'validated_at': validated_at or datetime.utcnow().isoformat(),
+            
+            # Header fields
+            'vehicle_reg_no': validated_data.get('vehicle_reg_no'),
+            'drivers_name': validated_data.get('drivers_name'),
+            'inspection_date': validated_data.get('date'),
+            'vehicle_mileage': validated_data.get('vehicle_mileage'),
+            
+            # Store complex data as JSONB
+            'inspection_items': validated_data.get('inspection_items', []),
+            'consumables': validated_data.get('consumables', []),
+            'tyres': validated_data.get('tyres', []),
+            
+            # Signatures
+            'fuel_card_issued': validated_data.get('fuel_card_issued', False),
+            'keys_issued': validated_data.get('keys_issued', False),
+            'receiver_name': validated_data.get('receiver_name'),
+            'dept_representative_name': validated_data.get('dept_representative_name'),
+            
+            # Full data backup
+            'raw_validated_data': validated_data
+        }
+    
     @staticmethod
     def save_vehicle_inspection(doc_id: str, organization_id: str, validated_data: dict, validated_by: str):
-        """Save validated vehicle inspection to Supabase"""
-        if not supabase:
+        """Queue a validated vehicle inspection for Supabase"""
+        if not supabase_journal:
             logger.warning("Supabase not available - saving to local file")
             return SupabaseDB._save_to_local(doc_id, validated_data)
         
         try:
-            # Flatten the data for storage
-            data = {
-                'doc_id': doc_id,
-                'organization_id': organization_id,
-                'validated_by': validated_by,
-                'validated_at': datetime.utcnow().isoformat(),
-                
-                # Header fields
-                'vehicle_reg_no': validated_data.get('vehicle_reg_no'),
-                'drivers_name': validated_data.get('drivers_name'),
-                'inspection_date': validated_data.get('date'),
-                'vehicle_mileage': validated_data.get('vehicle_mileage'),
-                
-                # Store complex data as JSONB
-                'inspection_items': validated_data.get('inspection_items', []),
-                'consumables': validated_data.get('consumables', []),
-                'tyres': validated_data.get('tyres', []),
-                
-                # Signatures
-                'fuel_card_issued': validated_data.get('fuel_card_issued', False),
-                'keys_issued': validated_data.get('keys_issued', False),
-                'receiver_name': validated_data.get('receiver_name'),
-                'dept_representative_name': validated_data.get('dept_representative_name'),
-                
-                # Full data backup
-                'raw_validated_data': validated_data
-            }
-            
-            result = supabase.table('vehicle_inspections').insert(data).execute()
-            logger.info(f"✅ Saved vehicle inspection to Supabase: {doc_id}")
-            return result.data[0] if result.data else None
+            data = SupabaseDB._inspection_row(doc_id, organization_id, validated_data, validated_by)
+            supabase_journal.enqueue_insert('vehicle_inspections', data, key_column='doc_id')
+            supabase.invalidate('vehicle_inspections')
+            logger.info(f"✅ Queued vehicle inspection for Supabase: {doc_id}")
+            return data
             
         except Exception as e:
-            logger.error(f"Error saving to Supabase: {e}")
-            # Fallback to local storage
+            logger.error(f"Error queueing inspection for Supabase: {e}")
+            # Fallback to local storage (replayed into the journal at next startup)
             return SupabaseDB._save_to_local(doc_id, validated_data)
     
     @staticmethod
     def _save_to_local(doc_id: str, validated_data: dict):
-        """Fallback: Save to local JSON file"""
+        """Fallback: Save to the local inspections store"""
         try:
-            validated_dir = OUTPUTS_DIR / "validated"
-            validated_dir.mkdir(exist_ok=True)
-            
-            filepath = validated_dir / f"{doc_id}_validated.json"
-            with open(filepath, 'w') as f:
-                json.dump({
-                    'doc_id': doc_id,
-                    'validated_at': datetime.utcnow().isoformat(),
-                    'data': validated_data
-                }, f, indent=2)
-            
-            logger.info(f"✅ Saved validation to local file: {filepath}")
+            local_inspections.save(doc_id, validated_data)
+            logger.info(f"✅ Saved validation to local store: {doc_id}")
             return {'doc_id': doc_id, 'storage': 'local'}
         except Exception as e:
-            logger.error(f"Error saving to local file: {e}")
+            logger.error(f"Error saving to local store: {e}")
             return None
     
     @staticmethod
-    def get_inspections(organization_id: str, limit: int = 100):
-        """Get vehicle inspections from Supabase"""
-        if not supabase:
+    def pending_inspections(organization_id: str) -> List[dict]:
+        """Queued inspections not yet flushed to Supabase, newest first"""
+        if not supabase_journal:
+            return []
+        return [
+            row for row in supabase_journal.pending_rows('vehicle_inspections')
+            if row.get('organization_id') == organization_id
+        ]
+    
+    @staticmethod
+    async def get_inspections(organization_id: str, limit: int = 100, columns: Optional[List[str]] = None):
+        """
+        Get vehicle inspections from Supabase, including ones still queued for it
+        
+        Args:
+            organization_id: Organization to list
+            limit: Newest inspections returned
+            columns: Columns to fetch (default: all, including the raw_validated_data JSONB)
+        """
+        if not supabase.ready:
             return []
         
+        select = '*'
+        if columns:
+            # doc_id / validated_at are needed to merge in queued inspections
+            columns = list(dict.fromkeys(['doc_id', 'validated_at', *columns]))
+            select = ', '.join(columns)
+        
         try:
-            result = supabase.table('vehicle_inspections')\
-                .select('*')\
-                .eq('organization_id', organization_id)\
-                .order('validated_at', desc=True)\
-                .limit(limit)\
-                .execute()
-            return result.data
+            rows = await supabase.fetch(
+                'vehicle_inspections', ('organization_id', organization_id, select, limit),
+                lambda db: db.table('vehicle_inspections')
+                .select(select)
+                .eq('organization_id', organization_id)
+                .order('validated_at', desc=True)
+                .limit(limit)
+            )
         except Exception as e:
             logger.error(f"Error getting inspections: {e}")
+            rows = []
+        
+        pending = SupabaseDB.pending_inspections(organization_id)
+        if pending:
+            if columns:
+                pending = [{column: row.get(column) for column in columns} for row in pending]
+            flushed = {row['doc_id'] for row in rows}
+            rows = [row for row in pending if row['doc_id'] not in flushed] + rows
+            rows.sort(key=lambda row: row.get('validated_at') or '', reverse=True)
+        return rows[:limit]
+    
+    @staticmethod
+    def get_all_inspection_data(organization_id: str, page_size: int = 1000) -> List[dict]:
+        """
+        Every validated inspection's raw data, paged through (for the inspection index)
+        Runs in a worker thread; each page is fetched on the event loop through the gateway
+        """
+        if not supabase.ready:
             return []
+        
+        rows = []
+        while True:
+            start = len(rows)
+            page = supabase.call_sync(
+                lambda db: db.table('vehicle_inspections')
+                .select('doc_id, validated_at, raw_validated_data')
+                .eq('organization_id', organization_id)
+                .order('validated_at')
+                .range(start, start + page_size - 1)
+            )
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+
+# Columns of vehicle_inspections (rows written by SupabaseDB._inspection_row)
+INSPECTION_COLUMNS = ('id', 'created_at') + tuple(SupabaseDB._inspection_row('', '', {}, '').keys())
+
+
+def load_validated_inspections() -> List[dict]:
+    """
+    Every validated inspection as {'doc_id', 'validated_at', 'data'}
+    The local store is read too, since saves fall back to it when Supabase fails
+    """
+    records = {record['doc_id']: record for record in local_inspections.iter_all()}
+    
+    rows = SupabaseDB.get_all_inspection_data(Config.ORGANIZATION_ID)
+    rows += reversed(SupabaseDB.pending_inspections(Config.ORGANIZATION_ID))
+    for row in rows:
+        records[row['doc_id']] = {
+            'doc_id': row['doc_id'],
+            'validated_at': row.get('validated_at'),
+            'data': row.get('raw_validated_data') or {}
+        }
+    
+    return list(records.values())
+
+
+def replay_local_fallbacks() -> int:
+    """
+    Queue validations saved to the local store while Supabase was unavailable
+    
+    Replayed inspections stay in the store, marked so they are queued only once.
+    
+    Returns:
+        Number of inspections queued
+    """
+    if not supabase_journal:
+        return 0
+    
+    replayed = []
+    for record in local_inspections.unreplayed():
+        try:
+            data = SupabaseDB._inspection_row(
+                record['doc_id'], Config.ORGANIZATION_ID, record['data'],
+                validated_by='local-replay', validated_at=record['validated_at']
+            )
+            supabase_journal.enqueue_insert('vehicle_inspections', data, key_column='doc_id')
+            replayed.append(record['doc_id'])
+        except Exception as e:
+            logger.warning(f"⚠️ Could not replay {record['doc_id']}: {e}")
+    
+    if replayed:
+        local_inspections.mark_replayed(replayed)
+        supabase.invalidate('vehicle_inspections')
+        logger.info(f"📤 Queued {len(replayed)} locally saved validations for Supabase")
+    return len(replayed)
+
+
+# Columnar index over validated inspections (aggregate chat questions)
+inspection_index = InspectionIndex(
+    load_validated_inspections,
+    refresh_seconds=Config.INSPECTION_INDEX_REFRESH_SECONDS
+)
+
+# Rollups behind the fleet analytics dashboards
+fleet_rollups = FleetRollups(Config.FLEET_ANALYTICS_PATH)
+
+
+def rebuild_fleet_rollups() -> int:
+    """Recompute the fleet analytics rollups from every validated inspection"""
+    try:
+        return fleet_rollups.rebuild(load_validated_inspections())
+    except Exception as e:
+        logger.error(f"❌ Fleet analytics rebuild failed: {e}")
+        raise
 
 # =============================================================================
 # DOCUMENT PROCESSOR
@@ -540,7 +852,9 @@ async def root():
         "features": {
             "landingai": AGENTIC_DOC_AVAILABLE,
             "supabase": SUPABASE_AVAILABLE,
-            "openai_chat": openai_client is not None
+            "supabase_backend": supabase.backend,
+            "openai_chat": llm_client is not None,
+            "chat_provider": Config.CHAT_PROVIDER
         }
     }
 
@@ -553,7 +867,11 @@ async def health_check():
         "version": "2.1.0",
         "landingai_available": AGENTIC_DOC_AVAILABLE,
         "supabase_available": SUPABASE_AVAILABLE,
-        "openai_available": openai_client is not None,
+        "openai_available": llm_client is not None,
+        "chat_provider": Config.CHAT_PROVIDER,
+        "answer_cache": answer_cache.stats(),
+        "supabase_client": supabase.stats(),
+        "supabase_journal": supabase_journal.stats() if supabase_journal else None,
         "organization_id": Config.ORGANIZATION_ID
     }
 
@@ -561,6 +879,102 @@ async def health_check():
 # API ENDPOINTS - DOCUMENT WORKFLOW
 # =============================================================================
 
+def index_document_chunks(doc_id: str, parsed_chunks: List[dict]) -> int:
+    """
+    Index a document's parsed chunks, embedding only new or changed text
+    
+    Args:
+        doc_id: Document ID
+        parsed_chunks: The 'chunks' list from metadata.json
+        
+    Returns:
+        Number of chunks the document now has in the vector store
+    """
+    cleaned_chunks = clean_parsed_chunks(doc_id, parsed_chunks)
+    targets = get_index_targets()
+    
+    # Keep the active version's fresh embeddings to classify the document for free
+    active_service = targets[0][0]
+    new_embeddings = []
+    
+    def embed_and_keep(texts: List[str]) -> List[List[float]]:
+        embeddings = active_service.embed_batch(texts)
+        new_embeddings.extend(embeddings)
+        return embeddings
+    
+    # During an embedding migration the new version's collection is kept current too
+    for embedding_service, vector_store in targets:
+        vector_store.sync_document_chunks(
+            doc_id=doc_id,
+            chunks=cleaned_chunks,
+            embed_fn=embed_and_keep if embedding_service is active_service else embedding_service.embed_batch,
+            organization_id=Config.ORGANIZATION_ID
+        )
+    
+    # Classify on first indexing, or when every chunk changed; a few edited chunks keep the type
+    doc_info = documents_store.get(doc_id)
+    if doc_info is not None and new_embeddings and (
+        'document_type' not in doc_info or len(new_embeddings) == len(cleaned_chunks)
+    ):
+        record_document_type(dict(doc_info), get_schema_registry().classify(new_embeddings, active_service))
+    
+    answer_cache.invalidate_documents([doc_id])
+    return len(cleaned_chunks)
+
+
+def record_document_type(doc_info: dict, classification: Optional[dict]):
+    """Store a classifier result on a copy of a document's entry and in the saved index"""
+    if classification is None:
+        return
+    doc_info['document_type'] = classification['document_type']
+    doc_info['document_type_confidence'] = classification['confidence']
+    update_document_store(doc_info['doc_id'], {
+        'document_type': doc_info['document_type'],
+        'document_type_confidence': doc_info['document_type_confidence']
+    })
+    logger.info(
+        f"🏷️ Classified {doc_info['doc_id']} as {classification['document_type']} "
+        f"(confidence {classification['confidence']}, scores {classification['scores']})"
+    )
+
+
+def resolve_document_type(doc_id: str, requested: Optional[str] = None) -> str:
+    """
+    Document type to extract a document as
+    
+    An explicit request wins, then the type recorded at indexing time. Documents
+    indexed before classification existed are classified from their first parsed
+    chunks (local embedding only, no LLM call).
+    """
+    registry = get_schema_registry()
+    if requested:
+        if requested not in registry.names():
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown document_type '{requested}'. Known types: {', '.join(registry.names())}"
+            )
+        return requested
+    
+    # A copy: record_document_type fills it in on a worker thread
+    doc_info = dict(documents_store[doc_id])
+    if doc_info.get('document_type') in registry.names():
+        return doc_info['document_type']
+    
+    try:
+        with open(doc_info['metadata_path'], 'r') as f:
+            chunks = clean_parsed_chunks(doc_id, json.load(f).get('chunks', []))
+        texts = [chunk['text'] for chunk in chunks[:Config.CLASSIFIER_MAX_CHUNKS] if chunk.get('text')]
+        embedding_service, _ = get_active_index()
+        record_document_type(
+            doc_info,
+            registry.classify(embedding_service.embed_batch(texts, show_progress=False), embedding_service) if texts else None
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Could not classify document {doc_id}: {e}")
+    
+    return doc_info.get('document_type', DEFAULT_DOCUMENT_TYPE)
+
+
 @app.post("/api/upload", response_model=DocumentResponse)
 async def upload_document(file: UploadFile = File(...)):
     """
@@ -628,59 +1042,29 @@ async def upload_document(file: UploadFile = File(...)):
             "metadata_path": str(metadata_path)
         }
         
-        documents_store[doc_id] = doc_info
-        save_document_store(documents_store)
+        await run_blocking(update_document_store, doc_id, doc_info, replace=True)
         
         logger.info(f"✅ Document processed: {doc_id}")
         
         # Auto-index for RAG
+        index_status = {}
         try:
             logger.info(f"🔍 Auto-indexing document: {doc_id}")
             
-            texts = []
-            cleaned_chunks = []
-            
-            for i, chunk in enumerate(result['parsed_data']['chunks']):
-                grounding_obj = chunk.get("grounding", {})
-                page = grounding_obj.get("page", 0)
-                box = grounding_obj.get("box", {})
-                text = chunk.get("markdown", "")
-                
-                cleaned_chunk = {
-                    "chunk_id": chunk.get("id", f"{doc_id}_chunk_{i}"),
-                    "chunk_type": chunk.get("type", "text"),
-                    "text": text,
-                    "page": page,
-                    "grounding": {
-                        "page": page,
-                        "box": box
-                    } if box else None
-                }
-                
-                texts.append(text)
-                cleaned_chunks.append(cleaned_chunk)
-            
-            embedding_service = get_embedding_service()
-            embeddings = embedding_service.embed_batch(texts)
-            
-            vector_store = get_vector_store()
-            vector_store.delete_document(doc_id)
-            chunks_added = vector_store.add_document_chunks(
-                doc_id=doc_id,
-                chunks=cleaned_chunks,
-                embeddings=embeddings
+            # Embeds and records the classification: off the loop, bounded like an extraction
+            chunks_added = await run_blocking(
+                index_document_chunks, doc_id, result['parsed_data']['chunks'], timeout=Config.EXTRACT_TIMEOUT_SECONDS
             )
             
             logger.info(f"✅ Auto-indexed {chunks_added} chunks")
-            doc_info["indexed"] = True
-            doc_info["indexed_chunks"] = chunks_added
+            index_status["indexed"] = True
+            index_status["indexed_chunks"] = chunks_added
             
         except Exception as index_error:
             logger.warning(f"⚠️ Auto-indexing failed: {index_error}")
-            doc_info["indexed"] = False
+            index_status["indexed"] = False
         
-        documents_store[doc_id] = doc_info
-        save_document_store(documents_store)
+        doc_info = await run_blocking(update_document_store, doc_id, index_status) or {**doc_info, **index_status}
         
         return DocumentResponse(**doc_info)
         
@@ -694,8 +1078,149 @@ async def upload_document(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
 
 
+def cached_extraction(doc_id: str, document_type: str) -> Optional[dict]:
+    """Saved extraction of a document, if it was extracted as this type"""
+    # Extractions made before document types existed are pre-trip checklists
+    extracted_path = OUTPUTS_DIR / doc_id / "extracted.json"
+    if not extracted_path.exists() or documents_store[doc_id].get('extracted_type', PRETRIP_CHECKLIST) != document_type:
+        return None
+    
+    with open(extracted_path, 'r') as f:
+        cached_data = json.load(f)
+    return {
+        "doc_id": doc_id,
+        "status": "extracted",
+        "document_type": document_type,
+        "extractor": documents_store[doc_id].get('extractor', 'landingai'),
+        "extracted_data": cached_data,
+        "cached": True,
+        "message": "Returning cached extraction (use force=true to re-extract)"
+    }
+
+
+def load_parsed_data(doc_id: str) -> dict:
+    """A document's parse output (metadata.json)"""
+    metadata_path = Path(documents_store[doc_id].get('metadata_path', ''))
+    
+    if not metadata_path.exists():
+        raise HTTPException(status_code=404, detail="Parsed data not found")
+    
+    with open(metadata_path, 'r') as f:
+        return json.load(f)
+
+
+def parse_content(parsed_data: dict) -> tuple:
+    """What extraction reads from a parse: its markdown and chunk contents (not chunk ids)"""
+    return (
+        parsed_data.get('markdown'),
+        [(chunk.get('type'), chunk.get('markdown')) for chunk in parsed_data.get('chunks') or []]
+    )
+
+
+def save_extraction(doc_id: str, document_type: str, extracted_data: dict, extractor: str, local: Optional[dict] = None) -> dict:
+    """
+    Save an extraction, mark the document extracted and build the /api/extract response
+    
+    Args:
+        doc_id: Document ID
+        document_type: Registered document type the data follows
+        extracted_data: Extracted fields
+        extractor: "template" (local) or "landingai"
+        local: Template extractor result (adds its confidences to the response)
+    """
+    extracted_path = OUTPUTS_DIR / doc_id / "extracted.json"
+    with open(extracted_path, 'w') as f:
+        json.dump(extracted_data, f, indent=2, default=str)
+    
+    # Update document status
+    update_document_store(doc_id, {
+        'status': 'extracted',
+        'extracted_path': str(extracted_path),
+        'extracted_type': document_type,
+        'extractor': extractor
+    })
+    
+    if SUPABASE_AVAILABLE:
+        SupabaseDB.update_document(doc_id, status='extracted')
+    
+    logger.info(f"✅ Data extracted successfully ({extractor}): {doc_id}")
+    
+    response = {
+        "doc_id": doc_id,
+        "status": "extracted",
+        "document_type": document_type,
+        "extractor": extractor,
+        "extracted_data": extracted_data,
+        "cached": False,
+        "message": "Document ready for validation"
+    }
+    if local is not None:
+        response["confidence"] = local["confidence"]
+        response["field_confidence"] = local["field_confidence"]
+    return response
+
+
+def local_extraction(doc_id: str, document_type: str) -> Optional[dict]:
+    """
+    Extract a fixed-layout checklist from its parsed tables, without a LandingAI call
+    
+    Returns:
+        /api/extract response body, or None when the document type has no
+        template or the result is below LOCAL_EXTRACTION_MIN_CONFIDENCE
+    """
+    if not Config.LOCAL_EXTRACTION or document_type != PRETRIP_CHECKLIST:
+        return None
+    
+    local = extract_pretrip_checklist(load_parsed_data(doc_id))
+    if local['confidence'] < Config.LOCAL_EXTRACTION_MIN_CONFIDENCE:
+        logger.info(
+            f"↪️ Template extraction confidence {local['confidence']} below "
+            f"{Config.LOCAL_EXTRACTION_MIN_CONFIDENCE} for {doc_id}, using LandingAI"
+        )
+        return None
+    
+    return save_extraction(doc_id, document_type, local['extracted_data'], "template", local)
+
+
+def run_extraction(doc_id: str, document_type: str) -> dict:
+    """
+    Extract a parsed document with LandingAI ADE and save the result
+    
+    Args:
+        doc_id: Document ID
+        document_type: Registered document type whose schema is used
+    
+    Returns:
+        /api/extract response body
+    """
+    markdown = load_parsed_data(doc_id).get('markdown')
+    if not markdown:
+        raise HTTPException(status_code=400, detail="No parsed markdown available")
+    
+    logger.info(f"🔍 Extracting {document_type} data from document: {doc_id}")
+    
+    # Precompiled JSON schema for the document type
+    schema = get_schema_registry().json_schema(document_type)
+    
+    # Extract using LandingAI ADE
+    extract_response = landing_client.extract(
+        schema=schema,
+        markdown=markdown,
+        model="extract-latest"
+    )
+    
+    # Convert extraction result to dict
+    extracted_data = extract_response.extraction
+    if hasattr(extracted_data, 'model_dump'):
+        extracted_data = extracted_data.model_dump()
+    elif hasattr(extracted_data, 'dict'):
+        extracted_data = extracted_data.dict()
+    
+    return save_extraction(doc_id, document_type, extracted_data, "landingai")
+
+
 @app.post("/api/extract")
-async def extract_document_data(doc_id: str, force: bool = False):
+async def extract_document_data(doc_id: str, force: bool = False, document_type: Optional[str] = None, remote: bool = False):
     """
     Step 2: Extract structured data using LandingAI ADE Extract
     Converts parsed markdown into structured fields
@@ -703,6 +1228,8 @@ async def extract_document_data(doc_id: str, force: bool = False):
     Args:
         doc_id: Document ID
         force: If True, re-extract even if cached data exists
+        document_type: Schema to extract with (default: the classified document type)
+        remote: If True, skip the template extractor and always call LandingAI
     """
     
     try:
@@ -710,77 +1237,25 @@ async def extract_document_data(doc_id: str, force: bool = False):
         if doc_id not in documents_store:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        doc_info = documents_store[doc_id]
+        # Classification and extraction save to the document index: off the loop
+        document_type = await run_blocking(resolve_document_type, doc_id, document_type)
         
         # Check for cached extraction (prevents redundant API calls)
-        extracted_path = OUTPUTS_DIR / doc_id / "extracted.json"
-        if not force and extracted_path.exists():
+        cached = None if force else cached_extraction(doc_id, document_type)
+        if cached is not None:
             logger.info(f"📦 Returning cached extraction for document: {doc_id}")
-            with open(extracted_path, 'r') as f:
-                cached_data = json.load(f)
-            return {
-                "doc_id": doc_id,
-                "status": "extracted",
-                "extracted_data": cached_data,
-                "cached": True,
-                "message": "Returning cached extraction (use force=true to re-extract)"
-            }
-        
-        metadata_path = Path(doc_info.get('metadata_path', ''))
-        
-        if not metadata_path.exists():
-            raise HTTPException(status_code=404, detail="Parsed data not found")
-        
-        with open(metadata_path, 'r') as f:
-            parsed_data = json.load(f)
-        
-        markdown = parsed_data.get('markdown')
-        if not markdown:
-            raise HTTPException(status_code=400, detail="No parsed markdown available")
-        
-        logger.info(f"🔍 Extracting structured data from document: {doc_id}")
-        
-        # Convert schema to JSON schema for LandingAI
-        schema = pydantic_to_json_schema(PreTripChecklistExtraction)
-        
-        # Extract using LandingAI ADE
-        extract_response = landing_client.extract(
-            schema=schema,
-            markdown=markdown,
-            model="extract-latest"
-        )
-        
-        # Convert extraction result to dict
-        extracted_data = extract_response.extraction
-        if hasattr(extracted_data, 'model_dump'):
-            extracted_data = extracted_data.model_dump()
-        elif hasattr(extracted_data, 'dict'):
-            extracted_data = extracted_data.dict()
-        
-        # Save extracted data
-        with open(extracted_path, 'w') as f:
-            json.dump(extracted_data, f, indent=2, default=str)
-        
-        # Update document status
-        documents_store[doc_id]['status'] = 'extracted'
-        documents_store[doc_id]['extracted_path'] = str(extracted_path)
-        save_document_store(documents_store)
-        
-        if SUPABASE_AVAILABLE:
-            SupabaseDB.update_document(doc_id, status='extracted')
-        
-        logger.info(f"✅ Data extracted successfully: {doc_id}")
+            return cached
         
-        return {
-            "doc_id": doc_id,
-            "status": "extracted",
-            "extracted_data": extracted_data,
-            "cached": False,
-            "message": "Document ready for validation"
-        }
+        # Fixed-layout forms are read from their parsed tables; the rest (and
+        # low-confidence reads) go to LandingAI
+        result = None if remote else await run_blocking(local_extraction, doc_id, document_type)
+        return result or await run_blocking(run_extraction, doc_id, document_type, timeout=Config.EXTRACT_TIMEOUT_SECONDS)
     
     except HTTPException:
         raise
+    except asyncio.TimeoutError:
+        logger.error(f"Extraction of {doc_id} timed out")
+        raise HTTPException(status_code=504, detail="Extraction timed out")
     except Exception as e:
         logger.error(f"❌ Extraction error: {e}")
         import traceback
@@ -788,6 +1263,94 @@ async def extract_document_data(doc_id: str, force: bool = False):
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
 
+@app.post("/api/extract/batch")
+async def extract_documents_batch(request: ExtractBatchRequest):
+    """
+    Extract many documents concurrently (Server-Sent Events)
+    
+    Documents are picked by doc_ids or by status (e.g. every "parsed" document).
+    Cached extractions are reused and checklists are read locally when the
+    template extractor is confident; LandingAI calls run at most
+    EXTRACT_CONCURRENCY at a time and EXTRACT_RATE_PER_MINUTE per minute,
+    shared by all batches in this worker.
+    
+    Events, in order:
+    - start:    {"total": n, "doc_ids": [...]}
+    - document: {"doc_id", "status": "extracted" | "cached" | "failed",
+                 "document_type", "extractor", "detail", "completed", "total"} as each finishes
+    - done:     {"extracted", "cached", "failed", "seconds"}
+    """
+    if bool(request.doc_ids) == bool(request.status):
+        raise HTTPException(status_code=400, detail="Provide either doc_ids or status")
+    
+    if request.doc_ids:
+        doc_ids = list(dict.fromkeys(request.doc_ids))
+    else:
+        doc_ids = [doc_id for doc_id, info in list(documents_store.items()) if info.get('status') == request.status]
+    
+    if len(doc_ids) > Config.MAX_BATCH_EXTRACT:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch too large: {len(doc_ids)} documents (max {Config.MAX_BATCH_EXTRACT})"
+        )
+    if request.document_type and request.document_type not in get_schema_registry().names():
+        raise HTTPException(status_code=400, detail=f"Unknown document_type '{request.document_type}'")
+    
+    async def extract_one(doc_id: str) -> dict:
+        event = {"doc_id": doc_id, "status": "failed", "document_type": None, "extractor": None, "detail": None}
+        try:
+            if doc_id not in documents_store:
+                raise HTTPException(status_code=404, detail="Document not found")
+            
+            document_type = await run_blocking(resolve_document_type, doc_id, request.document_type)
+            event["document_type"] = document_type
+            if not request.force and cached_extraction(doc_id, document_type) is not None:
+                event["status"] = "cached"
+                return event
+            
+            # Template extraction needs no LandingAI slot
+            result = await run_blocking(local_extraction, doc_id, document_type)
+            if result is None:
+                async with extract_semaphore:
+                    await extract_rate_limiter.acquire()
+                    result = await run_blocking(run_extraction, doc_id, document_type, timeout=Config.EXTRACT_TIMEOUT_SECONDS)
+            event["status"] = "extracted"
+            event["extractor"] = result["extractor"]
+        except HTTPException as e:
+            event["detail"] = e.detail
+        except asyncio.TimeoutError:
+            event["detail"] = "Extraction timed out"
+        except Exception as e:
+            logger.error(f"❌ Batch extraction error for {doc_id}: {e}")
+            event["detail"] = str(e)
+        return event
+    
+    async def generate():
+        started = time.perf_counter()
+        counts = {"extracted": 0, "cached": 0, "failed": 0}
+        yield sse_event("start", {"total": len(doc_ids), "doc_ids": doc_ids})
+        
+        tasks = [asyncio.create_task(extract_one(doc_id)) for doc_id in doc_ids]
+        try:
+            for completed, next_done in enumerate(asyncio.as_completed(tasks), 1):
+                event = await next_done
+                counts[event["status"]] += 1
+                yield sse_event("document", {**event, "completed": completed, "total": len(doc_ids)})
+        finally:
+            # Client went away: stop waiting for slots (calls already running finish in their threads)
+            for task in tasks:
+                task.cancel()
+        
+        logger.info(f"📦 Batch extraction: {counts} in {time.perf_counter() - started:.1f}s")
+        yield sse_event("done", {**counts, "seconds": round(time.perf_counter() - started, 2)})
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/api/validate")
 async def validate_document(doc_id: str, validated_by: str = "user", validated_data: dict = Body(...)):
     """
@@ -807,11 +1370,14 @@ async def validate_document(doc_id: str, validated_by: str = "user", validated_d
             validated_data=validated_data,
             validated_by=validated_by
         )
+        if documents_store[doc_id].get('document_type', PRETRIP_CHECKLIST) == PRETRIP_CHECKLIST:
+            inspection_index.upsert(doc_id, validated_data)
+            await run_blocking(fleet_rollups.upsert, doc_id, validated_data)
         
         # Update document status
-        documents_store[doc_id]['status'] = 'validated'
-        documents_store[doc_id]['validated_at'] = datetime.utcnow().isoformat()
-        save_document_store(documents_store)
+        await run_blocking(
+            update_document_store, doc_id, {'status': 'validated', 'validated_at': datetime.utcnow().isoformat()}
+        )
         
         if SUPABASE_AVAILABLE:
             SupabaseDB.update_document(doc_id, status='validated')
@@ -821,7 +1387,7 @@ async def validate_document(doc_id: str, validated_by: str = "user", validated_d
         return {
             "doc_id": doc_id,
             "status": "validated",
-            "storage": "supabase" if SUPABASE_AVAILABLE and supabase else "local",
+            "storage": "supabase" if supabase_journal else "local",
             "message": "Validation saved successfully"
         }
     
@@ -835,23 +1401,150 @@ async def validate_document(doc_id: str, validated_by: str = "user", validated_d
 
 
 @app.get("/api/inspections")
-async def get_inspections(limit: int = 100):
-    """Get validated vehicle inspections"""
+async def get_inspections(
+    limit: int = 100,
+    fields: Optional[str] = None,
+    offset: int = 0,
+    vehicle: Optional[str] = None,
+    driver: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    """
+    Get validated vehicle inspections
+    
+    fields: comma-separated columns to return (e.g. "vehicle_reg_no,drivers_name,inspection_date");
+    list views should pass it so the raw_validated_data JSONB is not fetched
+    
+    Without Supabase, inspections come from the local store, which also pages
+    (offset) and filters by vehicle, driver (name or its beginning) and
+    inspection date range (YYYY-MM-DD, inclusive).
+    """
     
     if SUPABASE_AVAILABLE:
-        inspections = SupabaseDB.get_inspections(Config.ORGANIZATION_ID, limit)
+        if offset or vehicle or driver or date_from or date_to:
+            raise HTTPException(
+                status_code=400,
+                detail="offset and vehicle/driver/date filters are only supported by the local inspections store"
+            )
+        columns = None
+        if fields:
+            columns = [name.strip() for name in fields.split(',') if name.strip()]
+            unknown = sorted(set(columns) - set(INSPECTION_COLUMNS))
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown inspection fields: {', '.join(unknown)}")
+        inspections = await SupabaseDB.get_inspections(Config.ORGANIZATION_ID, limit, columns)
         return {"inspections": inspections, "count": len(inspections)}
     else:
-        # Fallback: Read from local files
-        validated_dir = OUTPUTS_DIR / "validated"
-        inspections = []
-        
-        if validated_dir.exists():
-            for filepath in validated_dir.glob("*_validated.json"):
-                with open(filepath, 'r') as f:
-                    inspections.append(json.load(f))
-        
-        return {"inspections": inspections, "count": len(inspections), "storage": "local"}
+        # Fallback: Read from the local store
+        try:
+            day_from = date.fromisoformat(date_from) if date_from else None
+            day_to = date.fromisoformat(date_to) if date_to else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="date_from / date_to must be YYYY-MM-DD")
+        if limit > MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"limit can be at most {MAX_PAGE_SIZE}")
+        
+        inspections, total = await run_blocking(
+            local_inspections.page, limit=limit, offset=offset,
+            vehicle=vehicle, driver=driver, date_from=day_from, date_to=day_to
+        )
+        return {
+            "inspections": inspections,
+            "count": len(inspections),
+            "total": total,
+            "offset": offset,
+            "storage": "local"
+        }
+
+# =============================================================================
+# API ENDPOINTS - FLEET ANALYTICS
+# =============================================================================
+
+def analytics_filters(
+    bucket: Optional[str],
+    vehicle: Optional[str],
+    date_from: Optional[str],
+    date_to: Optional[str]
+) -> dict:
+    """Validate the common analytics query parameters into FleetRollups filters"""
+    if bucket == "all":
+        bucket = None
+    elif bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {', '.join(BUCKETS)}, all")
+    try:
+        day_from = date.fromisoformat(date_from) if date_from else None
+        day_to = date.fromisoformat(date_to) if date_to else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date_from / date_to must be YYYY-MM-DD")
+    vehicles = [name.strip() for name in vehicle.split(',') if name.strip()] if vehicle else None
+    return {'bucket': bucket, 'vehicles': vehicles, 'day_from': day_from, 'day_to': day_to}
+
+
+def analytics_phase(phase: Optional[str]) -> Optional[int]:
+    if phase is None:
+        return None
+    if phase not in PHASES:
+        raise HTTPException(status_code=400, detail=f"phase must be one of: {', '.join(PHASES)}")
+    return PHASES[phase]
+
+
+@app.get("/api/analytics/fuel")
+async def get_fuel_analytics(
+    bucket: str = "month",
+    phase: str = "before",
+    vehicle: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    """
+    Fuel level distribution over time
+    
+    bucket: day, week, month, year or all; vehicle: registration number(s), comma-separated;
+    date_from / date_to: YYYY-MM-DD, inclusive
+    """
+    filters = analytics_filters(bucket, vehicle, date_from, date_to)
+    series = await run_blocking(fleet_rollups.fuel_levels, phase=analytics_phase(phase), **filters)
+    return {"series": series, "bucket": bucket, "phase": phase}
+
+
+@app.get("/api/analytics/tyres")
+async def get_tyre_analytics(
+    bucket: str = "month",
+    phase: Optional[str] = None,
+    vehicle: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None
+):
+    """Tyre condition counts by position over time (both phases unless phase is given)"""
+    filters = analytics_filters(bucket, vehicle, date_from, date_to)
+    series = await run_blocking(fleet_rollups.tyre_conditions, phase=analytics_phase(phase), **filters)
+    return {"series": series, "bucket": bucket, "phase": phase}
+
+
+@app.get("/api/analytics/failed-items")
+async def get_failed_item_analytics(
+    phase: Optional[str] = None,
+    vehicle: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: int = 50
+):
+    """Checklist items marked NO per vehicle, vehicles with the most failures first"""
+    filters = analytics_filters("all", vehicle, date_from, date_to)
+    del filters['bucket']
+    vehicles = await run_blocking(fleet_rollups.failed_items, phase=analytics_phase(phase), **filters)
+    return {"vehicles": vehicles[:max(0, limit)], "count": len(vehicles)}
+
+
+@app.post("/api/admin/analytics/rebuild")
+async def rebuild_fleet_analytics():
+    """Recompute the analytics rollups from every validated inspection (e.g. after restoring a backup)"""
+    try:
+        inspections = await run_blocking(rebuild_fleet_rollups)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Rebuild failed: {str(e)}")
+    return {"inspections": inspections}
 
 # =============================================================================
 # API ENDPOINTS - DOCUMENT MANAGEMENT
@@ -927,6 +1620,63 @@ async def get_document_pdf(doc_id: str):
     )
 
 
+@app.post("/api/document/{doc_id}/reparse", response_model=DocumentResponse)
+async def reparse_document(doc_id: str):
+    """
+    Re-run parsing on a stored document and re-index only the chunks that changed
+    """
+    
+    if doc_id not in documents_store:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    doc_info = documents_store[doc_id]
+    file_path = Path(doc_info["file_path"])
+    
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    result = processor.process_document(str(file_path))
+    
+    if not result.get('success'):
+        raise HTTPException(status_code=500, detail=result.get('error', 'Processing failed'))
+    
+    metadata_path = Path(doc_info["metadata_path"])
+    try:
+        with open(metadata_path, 'r') as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    with open(metadata_path, 'w') as f:
+        json.dump(result['parsed_data'], f, indent=2, default=str)
+    
+    changes = {"num_chunks": result.get('num_chunks', 0)}
+    
+    # The saved extraction was made from the previous parse's text
+    if parse_content(previous) != parse_content(result['parsed_data']):
+        extracted_path = OUTPUTS_DIR / doc_id / "extracted.json"
+        if extracted_path.exists():
+            extracted_path.unlink()
+            logger.info(f"🧹 Dropped cached extraction of {doc_id} (parse changed)")
+        changes.update(extracted_path=None, extracted_type=None, extractor=None)
+        if doc_info.get('status') == 'extracted':
+            changes['status'] = 'parsed'
+    
+    try:
+        changes["indexed_chunks"] = await run_blocking(
+            index_document_chunks, doc_id, result['parsed_data']['chunks'], timeout=Config.EXTRACT_TIMEOUT_SECONDS
+        )
+        changes["indexed"] = True
+    except Exception as index_error:
+        logger.warning(f"⚠️ Re-indexing failed: {index_error}")
+        changes["indexed"] = False
+    
+    doc_info = await run_blocking(update_document_store, doc_id, changes) or {**doc_info, **changes}
+    
+    logger.info(f"🔁 Document re-parsed: {doc_id}")
+    
+    return DocumentResponse(**doc_info)
+
+
 @app.delete("/api/document/{doc_id}")
 async def delete_document(doc_id: str):
     """Delete a document"""
@@ -934,21 +1684,25 @@ async def delete_document(doc_id: str):
     if doc_id not in documents_store:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # Delete from vector store
+    # Delete from vector store (and from a migration target that is being built)
     try:
-        vector_store = get_vector_store()
-        vector_store.delete_document(doc_id)
+        for _, vector_store in get_index_targets():
+            vector_store.delete_document(doc_id, organization_id=Config.ORGANIZATION_ID)
     except Exception as e:
         logger.warning(f"Error deleting from vector store: {e}")
     
+    answer_cache.invalidate_documents([doc_id])
+    inspection_index.remove(doc_id)
+    local_inspections.remove(doc_id)
+    fleet_rollups.remove(doc_id)
+    
     # Delete files
     doc_dir = OUTPUTS_DIR / doc_id
     if doc_dir.exists():
         shutil.rmtree(doc_dir)
     
     # Remove from store
-    del documents_store[doc_id]
-    save_document_store(documents_store)
+    await run_blocking(update_document_store, doc_id, None)
     
     logger.info(f"🗑️ Deleted document: {doc_id}")
     
@@ -958,46 +1712,55 @@ async def delete_document(doc_id: str):
 # API ENDPOINTS - RAG SEARCH
 # =============================================================================
 
+def format_search_results(results: Dict) -> List[SearchResult]:
+    """Convert a vector store result dict into SearchResult models"""
+    search_results = []
+    
+    ids = results.get('ids', [])
+    documents = results.get('documents', [])
+    metadatas = results.get('metadatas', [])
+    distances = results.get('distances', [])
+    
+    for i in range(len(ids)):
+        metadata = metadatas[i] if i < len(metadatas) else {}
+        
+        search_result = SearchResult(
+            chunk_id=ids[i],
+            doc_id=metadata.get('doc_id', ''),
+            text=documents[i] if i < len(documents) else '',
+            page=metadata.get('page', 0),
+            chunk_type=metadata.get('chunk_type', 'text'),
+            similarity_score=1.0 - (distances[i] if i < len(distances) else 1.0),
+            grounding=metadata.get('grounding')
+        )
+        
+        search_results.append(search_result)
+    
+    return search_results
+
+
 @app.post("/api/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
     """Query documents using vector similarity search"""
     
     try:
         # Generate query embedding
-        embedding_service = get_embedding_service()
-        query_embedding = embedding_service.embed_text(request.query)
+        embedding_service, vector_store = get_active_index()
+        query_embedding = await run_blocking(embedding_service.embed_text, request.query)
         
         # Search vector store - pass doc_id and chunk_type directly (not as filter dict)
-        vector_store = get_vector_store()
-        results = vector_store.query(
+        results = await run_blocking(
+            vector_store.query,
             query_embedding=query_embedding,
             n_results=request.n_results,
             doc_id=request.doc_id,
-            chunk_type=request.chunk_type
+            chunk_type=request.chunk_type,
+            organization_id=Config.ORGANIZATION_ID,
+            mmr_lambda=request.mmr_lambda,
+            dedup=request.dedup
         )
         
-        # Format results
-        search_results = []
-        
-        ids = results.get('ids', [])
-        documents = results.get('documents', [])
-        metadatas = results.get('metadatas', [])
-        distances = results.get('distances', [])
-        
-        for i in range(len(ids)):
-            metadata = metadatas[i] if i < len(metadatas) else {}
-            
-            search_result = SearchResult(
-                chunk_id=ids[i],
-                doc_id=metadata.get('doc_id', ''),
-                text=documents[i] if i < len(documents) else '',
-                page=metadata.get('page', 0),
-                chunk_type=metadata.get('chunk_type', 'text'),
-                similarity_score=1.0 - (distances[i] if i < len(distances) else 1.0),
-                grounding=metadata.get('grounding')
-            )
-            
-            search_results.append(search_result)
+        search_results = format_search_results(results)
         
         return QueryResponse(
             query=request.query,
@@ -1005,6 +1768,9 @@ async def query_documents(request: QueryRequest):
             total_results=len(search_results)
         )
         
+    except asyncio.TimeoutError:
+        logger.error(f"Query timed out after {Config.SEARCH_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="Search timed out")
     except Exception as e:
         logger.error(f"Error querying documents: {e}")
         import traceback
@@ -1012,80 +1778,152 @@ async def query_documents(request: QueryRequest):
         raise HTTPException(status_code=500, detail=f"Failed to query: {str(e)}")
 
 
+@app.post("/api/query/batch", response_model=BatchQueryResponse)
+async def query_documents_batch(request: BatchQueryRequest):
+    """
+    Run many semantic searches in one request
+    All query texts are embedded in a single batch and searched with one
+    Qdrant batch call; results are returned in the same order as the queries
+    """
+    
+    if len(request.queries) > Config.MAX_BATCH_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries ({len(request.queries)}), max is {Config.MAX_BATCH_QUERIES}"
+        )
+    
+    if not request.queries:
+        return BatchQueryResponse(results=[], total_queries=0)
+    
+    try:
+        embedding_service, vector_store = get_active_index()
+        query_embeddings = await run_blocking(embedding_service.embed_batch, [q.query for q in request.queries])
+        
+        batch_results = await run_blocking(
+            vector_store.query_batch,
+            query_embeddings=query_embeddings,
+            searches=[
+                {
+                    'n_results': q.n_results,
+                    'doc_id': q.doc_id,
+                    'chunk_type': q.chunk_type,
+                    'organization_id': Config.ORGANIZATION_ID,
+                    'mmr_lambda': q.mmr_lambda,
+                    'dedup': q.dedup
+                }
+                for q in request.queries
+            ]
+        )
+        
+        responses = []
+        for q, results in zip(request.queries, batch_results):
+            search_results = format_search_results(results)
+            responses.append(QueryResponse(
+                query=q.query,
+                results=search_results,
+                total_results=len(search_results)
+            ))
+        
+        return BatchQueryResponse(results=responses, total_queries=len(responses))
+        
+    except asyncio.TimeoutError:
+        logger.error(f"Batch query timed out after {Config.SEARCH_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="Search timed out")
+    except Exception as e:
+        logger.error(f"Error running batch query: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Failed to run batch query: {str(e)}")
+
+
 # =============================================================================
 # API ENDPOINTS - CHAT (RAG-powered Q&A)
 # =============================================================================
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat_with_documents(request: ChatRequest):
+CHAT_MODEL = "gpt-4o-mini"
+
+
+def chat_history(request: ChatRequest) -> List[dict]:
+    """Conversation history sent to the LLM: last 3 exchanges, trimmed to CHAT_HISTORY_TOKENS"""
+    return trim_history(
+        [{"role": msg.role, "content": msg.content} for msg in (request.conversation_history or [])],
+        Config.CHAT_HISTORY_TOKENS,
+        model=CHAT_MODEL,
+        max_messages=6
+    )
+
+
+def retrieve_chat_sources(request: ChatRequest) -> tuple:
     """
-    RAG-based chat endpoint.
-    1. Semantic search for relevant document chunks
-    2. Send chunks + question to OpenAI LLM
-    3. Return answer with sources
+    Semantic search for the chunks a chat answer is grounded on
+    
+    Args:
+        request: Chat request (question and n_results are used)
+    
+    Returns:
+        (sources, context, query_embedding, evidence_key) - ChatSource list, the
+        LLM context packed into CHAT_CONTEXT_TOKENS, and the answer cache lookup keys
     """
+    embedding_service, vector_store = get_active_index()
+    query_embedding = embedding_service.embed_text(request.question)
     
-    try:
-        logger.info(f"💬 Chat query: {request.question[:100]}...")
+    # With CHAT_MMR_LAMBDA / CHAT_DEDUP set, over-fetch and keep distinct chunks
+    # so templated copies don't fill every slot
+    results = vector_store.query(
+        query_embedding=query_embedding,
+        n_results=request.n_results,
+        organization_id=Config.ORGANIZATION_ID,
+        mmr_lambda=Config.CHAT_MMR_LAMBDA,
+        dedup=Config.CHAT_DEDUP
+    )
+    
+    # Format retrieved chunks
+    sources = []
+    context_chunks = []
+    evidence = []
+    
+    ids = results.get('ids', [])
+    documents = results.get('documents', [])
+    metadatas = results.get('metadatas', [])
+    distances = results.get('distances', [])
+    
+    for i in range(len(ids)):
+        chunk_id = ids[i]
+        metadata = metadatas[i] if i < len(metadatas) else {}
+        text = documents[i] if i < len(documents) else ''
+        distance = distances[i] if i < len(distances) else 1.0
         
-        # Step 1: Retrieve relevant document chunks via semantic search
-        embedding_service = get_embedding_service()
-        query_embedding = embedding_service.embed_text(request.question)
+        doc_id = metadata.get('doc_id', '')
+        doc_info = documents_store.get(doc_id, {})
         
-        vector_store = get_vector_store()
-        results = vector_store.query(
-            query_embedding=query_embedding,
-            n_results=request.n_results
+        source = ChatSource(
+            doc_id=doc_id,
+            chunk_id=chunk_id,
+            filename=doc_info.get('filename', f'Document {doc_id[:8]}' if doc_id else 'Unknown'),
+            page=metadata.get('page', 0),
+            chunk_type=metadata.get('chunk_type', 'text'),
+            text=text[:500] if text else '',
+            similarity_score=round(1.0 - distance, 3)
         )
+        sources.append(source)
+        evidence.append((doc_id, chunk_id, metadata.get('text_hash', '')))
         
-        # Format retrieved chunks
-        sources = []
-        context_chunks = []
-        
-        ids = results.get('ids', [])
-        documents = results.get('documents', [])
-        metadatas = results.get('metadatas', [])
-        distances = results.get('distances', [])
-        
-        for i in range(len(ids)):
-            chunk_id = ids[i]
-            metadata = metadatas[i] if i < len(metadatas) else {}
-            text = documents[i] if i < len(documents) else ''
-            distance = distances[i] if i < len(distances) else 1.0
-            
-            doc_id = metadata.get('doc_id', '')
-            doc_info = documents_store.get(doc_id, {})
-            
-            source = ChatSource(
-                doc_id=doc_id,
-                chunk_id=chunk_id,
-                filename=doc_info.get('filename', f'Document {doc_id[:8]}' if doc_id else 'Unknown'),
-                page=metadata.get('page', 0),
-                chunk_type=metadata.get('chunk_type', 'text'),
-                text=text[:500] if text else '',
-                similarity_score=round(1.0 - distance, 3)
-            )
-            sources.append(source)
-            
-            # Build context for LLM
-            context_chunks.append(f"""
---- Source: {source.filename}, Page {source.page + 1} ---
-{text}
-""")
-        
-        # Step 2: Generate answer using LLM
-        if openai_client and sources:
-            context = "\n".join(context_chunks)
-            
-            # Build conversation history
-            history_messages = []
-            for msg in (request.conversation_history or [])[-6:]:  # Last 3 exchanges
-                history_messages.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
-            
-            system_prompt = f"""You are GroundTruth, an AI assistant that answers questions about transport documents, vehicle inspections, and fleet management.
+        # Build context for LLM
+        context_chunks.append((f"\n--- Source: {source.filename}, Page {source.page + 1} ---\n", text))
+    
+    # Most relevant first until the token budget is spent; only cite what the LLM sees
+    packed, _ = pack_chunks(context_chunks, Config.CHAT_CONTEXT_TOKENS, Config.CHAT_MAX_CHUNK_TOKENS, model=CHAT_MODEL)
+    sources = sources[:len(packed)]
+    evidence = evidence[:len(packed)]
+    
+    history = history_hash((m["role"], m["content"]) for m in chat_history(request))
+    evidence_key = AnswerCache.evidence_key(evidence, history, CHAT_MODEL)
+    return sources, "\n".join(packed), query_embedding, evidence_key
+
+
+def build_chat_messages(request: ChatRequest, context: str) -> List[dict]:
+    """OpenAI messages: grounding system prompt, recent history, then the question"""
+    system_prompt = f"""You are GroundTruth, an AI assistant that answers questions about transport documents, vehicle inspections, and fleet management.
 
 Use ONLY the information from these document excerpts to answer questions. If the answer cannot be found in the provided context, say so clearly.
 
@@ -1094,35 +1932,105 @@ Be concise, accurate, and helpful. When referencing information, mention which d
 CONTEXT FROM DOCUMENTS:
 {context}
 """
-            
-            messages = [
-                {"role": "system", "content": system_prompt},
-                *history_messages,
-                {"role": "user", "content": request.question}
-            ]
-            
+    
+    return [
+        {"role": "system", "content": system_prompt},
+        *chat_history(request),
+        {"role": "user", "content": request.question}
+    ]
+
+
+def fallback_chat_answer(sources: List[ChatSource]) -> str:
+    """Answer used when no LLM is configured (or nothing relevant was found)"""
+    if not sources:
+        return "I couldn't find any relevant information in your uploaded documents. Try rephrasing your question or ensure documents are uploaded and indexed."
+    
+    # Return relevant excerpts without LLM
+    answer = f"I found {len(sources)} relevant sections in your documents:\n\n"
+    for i, source in enumerate(sources[:3], 1):
+        answer += f"**{i}. {source.filename}** (Page {source.page + 1}):\n"
+        answer += f'"{source.text[:200]}..."\n\n'
+    answer += "\n_Configure OPENAI_API_KEY for AI-powered answers._"
+    return answer
+
+
+def answer_structured_question(request: ChatRequest) -> Optional[tuple]:
+    """
+    Answer aggregate / filter questions about inspections from the inspection index
+    
+    Returns:
+        (answer, sources) or None when the question should go through RAG
+    """
+    if not Config.CHAT_STRUCTURED_ROUTING:
+        return None
+    
+    result = answer_fleet_question(request.question, inspection_index)
+    if result is None:
+        return None
+    
+    sources = []
+    for inspection in result['inspections'][:MAX_LISTED]:
+        doc_id = inspection['doc_id']
+        sources.append(ChatSource(
+            doc_id=doc_id,
+            chunk_id='',
+            filename=documents_store.get(doc_id, {}).get('filename', f'Document {doc_id[:8]}'),
+            page=0,
+            chunk_type='inspection',
+            text=f"{inspection['vehicle_reg_no'] or 'Unknown vehicle'} — {inspection['date'] or 'no date'}",
+            similarity_score=1.0
+        ))
+    
+    logger.info(f"📊 Answered from inspection index: {result['count']}/{result['total']} inspections")
+    return result['answer'], sources
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat_with_documents(request: ChatRequest):
+    """
+    RAG-based chat endpoint.
+    1. Semantic search for relevant document chunks
+    2. Send chunks + question to OpenAI LLM
+    3. Return answer with sources
+    """
+    
+    try:
+        logger.info(f"💬 Chat query: {request.question[:100]}...")
+        
+        # Aggregate inspection questions are answered exactly, without retrieval or LLM
+        structured = await run_blocking(answer_structured_question, request)
+        if structured is not None:
+            answer, sources = structured
+            return ChatResponse(answer=answer, sources=sources, question=request.question)
+        
+        # Step 1: Retrieve relevant document chunks via semantic search
+        sources, context, query_embedding, evidence_key = await run_blocking(retrieve_chat_sources, request)
+        
+        # Step 2: Generate answer using LLM (unless this evidence already answered the question)
+        cached_answer = answer_cache.get(request.question, evidence_key, query_embedding) if sources else None
+        if cached_answer is not None:
+            answer = cached_answer
+            logger.info("⚡ Answer served from cache")
+        elif llm_client and sources:
             try:
-                completion = openai_client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
+                completion = await llm_client.chat.completions.create(
+                    model=CHAT_MODEL,
+                    messages=build_chat_messages(request, context),
                     max_tokens=1000,
                     temperature=0.3
                 )
                 answer = completion.choices[0].message.content
-                logger.info("✅ Generated answer using OpenAI")
+                logger.info(f"✅ Generated answer using {Config.CHAT_PROVIDER}")
+                answer_cache.put(
+                    request.question, evidence_key, answer,
+                    doc_ids={source.doc_id for source in sources},
+                    embedding=query_embedding
+                )
             except Exception as e:
                 logger.error(f"OpenAI API error: {e}")
                 answer = f"I found relevant documents but couldn't generate a response. OpenAI error: {str(e)}"
-                
-        elif sources:
-            # Fallback: Return relevant excerpts without LLM
-            answer = f"I found {len(sources)} relevant sections in your documents:\n\n"
-            for i, source in enumerate(sources[:3], 1):
-                answer += f"**{i}. {source.filename}** (Page {source.page + 1}):\n"
-                answer += f'"{source.text[:200]}..."\n\n'
-            answer += "\n_Configure OPENAI_API_KEY for AI-powered answers._"
         else:
-            answer = "I couldn't find any relevant information in your uploaded documents. Try rephrasing your question or ensure documents are uploaded and indexed."
+            answer = fallback_chat_answer(sources)
         
         return ChatResponse(
             answer=answer,
@@ -1130,11 +2038,107 @@ CONTEXT FROM DOCUMENTS:
             question=request.question
         )
         
+    except asyncio.TimeoutError:
+        logger.error(f"Chat retrieval timed out after {Config.SEARCH_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="Search timed out")
+    except Exception as e:
+        logger.error(f"Chat error: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+
+
+def sse_event(event: str, data) -> str:
+    """Encode one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_with_documents_stream(request: ChatRequest):
+    """
+    Streaming variant of /api/chat (Server-Sent Events)
+    
+    Events, in order:
+    - sources: {"sources": [...], "question": ...} as soon as retrieval is done
+    - token:   {"text": ...} for every generated piece of the answer
+    - done:    {"answer": ...} with the complete answer ("cached" / "structured": true
+               when reused from the answer cache / answered from the inspection index)
+    - error:   {"detail": ...} if generation fails after streaming started
+    """
+    
+    try:
+        logger.info(f"💬 Chat stream query: {request.question[:100]}...")
+        structured = await run_blocking(answer_structured_question, request)
+        if structured is None:
+            sources, context, query_embedding, evidence_key = await run_blocking(retrieve_chat_sources, request)
+        else:
+            sources, context, query_embedding, evidence_key = structured[1], "", None, None
+    except asyncio.TimeoutError:
+        logger.error(f"Chat retrieval timed out after {Config.SEARCH_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=504, detail="Search timed out")
     except Exception as e:
         logger.error(f"Chat error: {e}")
         import traceback
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+    
+    async def generate():
+        yield sse_event("sources", {
+            "sources": [source.model_dump() for source in sources],
+            "question": request.question
+        })
+        
+        if structured is not None:
+            yield sse_event("token", {"text": structured[0]})
+            yield sse_event("done", {"answer": structured[0], "structured": True})
+            return
+        
+        cached_answer = answer_cache.get(request.question, evidence_key, query_embedding) if sources else None
+        if cached_answer is not None:
+            logger.info("⚡ Answer served from cache")
+            yield sse_event("token", {"text": cached_answer})
+            yield sse_event("done", {"answer": cached_answer, "cached": True})
+            return
+        
+        if not (llm_client and sources):
+            answer = fallback_chat_answer(sources)
+            yield sse_event("token", {"text": answer})
+            yield sse_event("done", {"answer": answer})
+            return
+        
+        parts = []
+        try:
+            stream = await llm_client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=build_chat_messages(request, context),
+                max_tokens=1000,
+                temperature=0.3,
+                stream=True
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield sse_event("token", {"text": delta})
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            yield sse_event("error", {"detail": f"OpenAI error: {str(e)}"})
+            return
+        
+        answer = "".join(parts)
+        logger.info(f"✅ Streamed answer using {Config.CHAT_PROVIDER}")
+        answer_cache.put(
+            request.question, evidence_key, answer,
+            doc_ids={source.doc_id for source in sources},
+            embedding=query_embedding
+        )
+        yield sse_event("done", {"answer": answer})
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/api/vector-store/stats", response_model=VectorStoreStats)
@@ -1143,9 +2147,12 @@ async def get_vector_store_stats():
     
     try:
         vector_store = get_vector_store()
-        stats = vector_store.get_stats()
+        stats = vector_store.get_stats(organization_id=Config.ORGANIZATION_ID)
         
-        all_metadata = vector_store.collection.get(include=['metadatas'])
+        all_metadata = vector_store.collection.get(
+            where={'organization_id': Config.ORGANIZATION_ID},
+            include=['metadatas']
+        )
         doc_ids = sorted(set(m.get('doc_id') for m in all_metadata['metadatas'] if m.get('doc_id')))
         
         return VectorStoreStats(
@@ -1158,6 +2165,46 @@ async def get_vector_store_stats():
         logger.error(f"Error getting stats: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get stats: {str(e)}")
 
+# =============================================================================
+# API ENDPOINTS - EMBEDDING VERSIONS (ADMIN)
+# =============================================================================
+
+@app.get("/api/admin/embeddings")
+async def get_embedding_versions():
+    """List embedding versions, the active one and migration progress"""
+    return get_version_registry().state()
+
+
+@app.post("/api/admin/embeddings/migrate")
+async def migrate_embeddings(request: EmbeddingMigrationRequest):
+    """
+    Start re-embedding the corpus with a new model in the background
+    
+    Queries keep using the active version until the new one has caught up,
+    then the switch happens atomically.
+    """
+    try:
+        return start_migration(
+            provider=request.provider,
+            model_name=request.model_name,
+            batch_size=Config.MIGRATION_BATCH_SIZE,
+            pause_seconds=Config.MIGRATION_PAUSE_SECONDS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error starting embedding migration: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start migration: {str(e)}")
+
+
+@app.post("/api/admin/embeddings/activate/{version_key}")
+async def activate_embedding_version(version_key: str):
+    """Switch queries to an already built version (e.g. roll back after a migration)"""
+    try:
+        return activate_version(version_key)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 # =============================================================================
 # APPLICATION STARTUP
 # =============================================================================
@@ -1165,34 +2212,82 @@ async def get_vector_store_stats():
 @app.on_event("startup")
 async def startup_event():
     """Application startup"""
+    # Chunks indexed before tenant scoping have no organization_id; claim them
+    # for this deployment's organization so scoped searches still find them
+    try:
+        get_vector_store().backfill_organization(Config.ORGANIZATION_ID)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not backfill vector store organization: {e}")
+    
+    # Validations saved as JSON files before the local store existed
+    local_inspections.import_files(OUTPUTS_DIR / "validated")
+    
+    if supabase_journal:
+        try:
+            await supabase.start()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to initialize Supabase: {e} (writes stay journaled until restart)")
+        replay_local_fallbacks()
+        supabase_journal.start()
+    
+    # First start with analytics: backfill the rollups off the event loop
+    if fleet_rollups.count() == 0:
+        asyncio.get_running_loop().run_in_executor(None, rebuild_fleet_rollups)
+    
     logger.info("")
     logger.info("⚡ GROUNDTRUTH TRANSPORT EDITION v2.1")
     logger.info("=" * 60)
     logger.info("✅ LandingAI ADE extraction enabled")
     logger.info("✅ Pre-Trip Checklist schema configured")
-    logger.info(f"✅ Supabase integration: {SUPABASE_AVAILABLE}")
-    logger.info(f"✅ OpenAI chat: {openai_client is not None}")
+    logger.info(f"✅ Supabase integration: {SUPABASE_AVAILABLE} ({supabase.backend})")
+    if supabase_journal:
+        logger.info(f"✅ Supabase write-behind journal: {supabase_journal.stats()['pending']} pending")
+    logger.info(f"✅ Chat LLM ({Config.CHAT_PROVIDER}): {llm_client is not None}")
     logger.info("✅ Vector database ready")
     logger.info("")
     logger.info("🚀 Document Workflow:")
     logger.info("   POST   /api/upload       → Parse document")
     logger.info("   POST   /api/extract      → Extract structured data")
+    logger.info("   POST   /api/extract/batch → Extract many documents (SSE)")
     logger.info("   POST   /api/validate     → Human validation → Save to DB")
     logger.info("")
     logger.info("📄 Document Management:")
     logger.info("   GET    /api/documents")
     logger.info("   GET    /api/document/{doc_id}/chunks")
     logger.info("   GET    /api/document/{doc_id}/pdf")
+    logger.info("   POST   /api/document/{doc_id}/reparse")
     logger.info("   DELETE /api/document/{doc_id}")
     logger.info("")
     logger.info("🔍 Search & Chat:")
     logger.info("   POST   /api/query        → Semantic search")
+    logger.info("   POST   /api/query/batch  → Batched semantic search")
     logger.info("   POST   /api/chat         → RAG-powered Q&A")
+    logger.info("   POST   /api/chat/stream  → RAG-powered Q&A (SSE)")
     logger.info("   GET    /api/inspections")
     logger.info("")
+    logger.info("📈 Fleet Analytics:")
+    logger.info("   GET    /api/analytics/fuel")
+    logger.info("   GET    /api/analytics/tyres")
+    logger.info("   GET    /api/analytics/failed-items")
+    logger.info("   POST   /api/admin/analytics/rebuild")
+    logger.info("")
+    logger.info("🧬 Embedding Versions:")
+    logger.info("   GET    /api/admin/embeddings")
+    logger.info("   POST   /api/admin/embeddings/migrate")
+    logger.info("   POST   /api/admin/embeddings/activate/{version_key}")
+    logger.info("")
     logger.info(f"🌍 Server running on {Config.HOST}:{Config.PORT}")
     logger.info("")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued Supabase writes and close the Supabase client"""
+    if supabase_journal:
+        await asyncio.get_running_loop().run_in_executor(None, supabase_journal.stop)
+        logger.info(f"📤 Supabase write-behind journal stopped: {supabase_journal.stats()['pending']} pending")
+    await supabase.close()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,402 @@
+"""
+In-Memory Vector Store - NumPy Backend
+Brute-force cosine search over a contiguous float32 matrix
+No disk or server involved: intended for small tenants and test suites
+"""
+
+import logging
+import threading
+from typing import List, Dict, Optional, Set
+
+import numpy as np
+
+from vector_store import (
+    VectorBackend,
+    DEFAULT_COLLECTION_NAME,
+    DEFAULT_VECTOR_SIZE,
+    point_id_for,
+    build_chunk_payload,
+    check_doc_ids,
+)
+from diversity import candidate_count, diversify_results, diversify_search, search_candidate_count
+
+logger = logging.getLogger(__name__)
+
+# Payload fields with an exact-match row index (usable as query filters)
+INDEXED_FIELDS = ('organization_id', 'doc_id', 'chunk_type')
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so cosine similarity becomes a dot product"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class InMemoryVectorStore(VectorBackend):
+    """NumPy brute-force vector store with the same API as the Qdrant backend"""
+    
+    def __init__(
+        self,
+        collection_name: str = DEFAULT_COLLECTION_NAME,
+        vector_size: int = DEFAULT_VECTOR_SIZE,
+        initial_capacity: int = 1024
+    ):
+        """
+        Initialize an empty in-memory store
+        
+        Args:
+            collection_name: Name reported in stats
+            vector_size: Embedding dimension
+            initial_capacity: Rows preallocated before the first resize
+        """
+        self.collection_name = collection_name
+        self.vector_size = vector_size
+        self._lock = threading.RLock()
+        self._reset(initial_capacity)
+        
+        logger.info(f"✅ In-memory vector store created ({vector_size}d)")
+    
+    def _reset(self, capacity: int):
+        """Drop all rows and preallocate an empty matrix"""
+        # Rows [0, _count) are live; vectors are stored L2-normalized
+        self._vectors = np.zeros((max(capacity, 1), self.vector_size), dtype=np.float32)
+        self._count = 0
+        self._point_ids: List[str] = []
+        self._payloads: List[Dict] = []
+        self._row_by_point: Dict[str, int] = {}
+        self._indexes: Dict[str, Dict[str, Set[int]]] = {field: {} for field in INDEXED_FIELDS}
+    
+    def _ensure_capacity(self, needed: int):
+        """Grow the matrix geometrically so appends stay amortized O(1)"""
+        capacity = self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        
+        new_capacity = max(needed, capacity * 2)
+        grown = np.zeros((new_capacity, self.vector_size), dtype=np.float32)
+        grown[:self._count] = self._vectors[:self._count]
+        self._vectors = grown
+    
+    def _index_row(self, row: int, payload: Dict):
+        for field, index in self._indexes.items():
+            if payload.get(field) is not None:
+                index.setdefault(payload[field], set()).add(row)
+    
+    def _unindex_row(self, row: int, payload: Dict):
+        for field, index in self._indexes.items():
+            rows = index.get(payload.get(field))
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del index[payload[field]]
+    
+    def _remove_row(self, row: int):
+        """Remove a row by moving the last row into its slot (keeps the matrix dense)"""
+        last = self._count - 1
+        self._unindex_row(row, self._payloads[row])
+        del self._row_by_point[self._point_ids[row]]
+        
+        if row != last:
+            moved_payload = self._payloads[last]
+            self._unindex_row(last, moved_payload)
+            self._vectors[row] = self._vectors[last]
+            self._point_ids[row] = self._point_ids[last]
+            self._payloads[row] = moved_payload
+            self._row_by_point[self._point_ids[row]] = row
+            self._index_row(row, moved_payload)
+        
+        self._point_ids.pop()
+        self._payloads.pop()
+        self._count -= 1
+    
+    def add_document_chunks(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        embeddings: List[List[float]],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Add document chunks to vector store"""
+        if not chunks or not embeddings:
+            logger.warning(f"No chunks or embeddings provided for doc {doc_id}")
+            return 0
+        
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Chunks ({len(chunks)}) and embeddings ({len(embeddings)}) count mismatch")
+        
+        matrix = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if matrix.shape[1] != self.vector_size:
+            raise ValueError(f"Expected {self.vector_size}d embeddings, got {matrix.shape[1]}d")
+        
+        with self._lock:
+            self._ensure_capacity(self._count + len(chunks))
+            
+            for i, chunk in enumerate(chunks):
+                payload = build_chunk_payload(doc_id, chunk, i, organization_id)
+                point_id = point_id_for(doc_id, payload['chunk_id'])
+                
+                row = self._row_by_point.get(point_id)
+                if row is None:
+                    row = self._count
+                    self._count += 1
+                    self._point_ids.append(point_id)
+                    self._payloads.append(payload)
+                    self._row_by_point[point_id] = row
+                else:
+                    self._unindex_row(row, self._payloads[row])
+                    self._payloads[row] = payload
+                
+                self._vectors[row] = matrix[i]
+                self._index_row(row, payload)
+        
+        logger.info(f"✅ Added {len(chunks)} chunks from document {doc_id} to vector store")
+        return len(chunks)
+    
+    def _candidate_rows(self, filters: Dict) -> Optional[np.ndarray]:
+        """Rows passing the exact-match filters (None values are ignored), or None when unfiltered"""
+        selected = None
+        for field, value in filters.items():
+            if value is None:
+                continue
+            rows = self._indexes[field].get(value, set())
+            selected = set(rows) if selected is None else selected & rows
+        
+        if selected is None:
+            return None
+        return np.fromiter(selected, dtype=np.int64, count=len(selected))
+    
+    def _format_rows(self, rows: np.ndarray, scores: np.ndarray, with_vectors: bool = False) -> Dict:
+        """Format matched rows (match ChromaDB format)"""
+        payloads = [self._payloads[row] for row in rows]
+        results = {
+            'ids': [p['chunk_id'] for p in payloads],
+            'documents': [p['text'] for p in payloads],
+            'metadatas': payloads,
+            'distances': [1.0 - float(score) for score in scores]
+        }
+        if with_vectors:
+            results['embeddings'] = self._vectors[rows]
+        return results
+    
+    def _search(self, query: np.ndarray, n_results: int, filters: Dict, with_vectors: bool = False) -> Dict:
+        # Scoped searches only touch the matching rows, so per-tenant cost
+        # depends on that tenant's data rather than the whole store
+        rows = self._candidate_rows(filters)
+        if rows is None:
+            scores = self._vectors[:self._count] @ query
+            order = _top_k(scores, n_results)
+            return self._format_rows(order, scores[order], with_vectors)
+        
+        if rows.size == 0:
+            return self._format_rows(rows, rows, with_vectors)
+        
+        scores = self._vectors[rows] @ query
+        order = _top_k(scores, n_results)
+        return self._format_rows(rows[order], scores[order], with_vectors)
+    
+    def query(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        doc_id: Optional[str] = None,
+        chunk_type: Optional[str] = None,
+        organization_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+        dedup: bool = False
+    ) -> Dict:
+        """Query vector store for similar chunks"""
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        filters = {'organization_id': organization_id, 'doc_id': doc_id, 'chunk_type': chunk_type}
+        
+        with self._lock:
+            results = self._search(
+                query,
+                candidate_count(n_results, mmr_lambda, dedup),
+                filters,
+                with_vectors=mmr_lambda is not None
+            )
+        
+        if mmr_lambda is None and not dedup:
+            return results
+        return diversify_results(results, n_results, mmr_lambda, dedup)
+    
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        searches: List[Dict]
+    ) -> List[Dict]:
+        """
+        Run many searches; unfiltered ones share a single matrix multiply
+        
+        Args:
+            query_embeddings: One embedding per search
+            searches: Per-search options (n_results, doc_id, chunk_type, organization_id,
+                mmr_lambda, dedup)
+        
+        Returns:
+            One ChromaDB-style result dict per search, in input order
+        """
+        if len(query_embeddings) != len(searches):
+            raise ValueError(f"Embeddings ({len(query_embeddings)}) and searches ({len(searches)}) count mismatch")
+        
+        if not searches:
+            return []
+        
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        results: List[Optional[Dict]] = [None] * len(searches)
+        
+        with self._lock:
+            unfiltered = [i for i, s in enumerate(searches) if all(s.get(f) is None for f in INDEXED_FIELDS)]
+            if unfiltered:
+                # (count, dim) @ (dim, m) -> one column of scores per query
+                score_matrix = self._vectors[:self._count] @ queries[unfiltered].T
+                for column, i in enumerate(unfiltered):
+                    scores = score_matrix[:, column]
+                    order = _top_k(scores, search_candidate_count(searches[i]))
+                    results[i] = self._format_rows(order, scores[order], searches[i].get('mmr_lambda') is not None)
+            
+            for i, search in enumerate(searches):
+                if results[i] is None:
+                    results[i] = self._search(
+                        queries[i],
+                        search_candidate_count(search),
+                        {field: search.get(field) for field in INDEXED_FIELDS},
+                        with_vectors=search.get('mmr_lambda') is not None
+                    )
+        
+        return [diversify_search(result, search) for result, search in zip(results, searches)]
+    
+    def get_chunk_by_id(self, chunk_id: str, organization_id: Optional[str] = None) -> Optional[Dict]:
+        """Get a specific chunk by ID"""
+        with self._lock:
+            for payload in self._payloads:
+                if payload['chunk_id'] == chunk_id and (
+                    not organization_id or payload.get('organization_id') == organization_id
+                ):
+                    return {
+                        'chunk_id': payload['chunk_id'],
+                        'text': payload['text'],
+                        'metadata': payload
+                    }
+        return None
+    
+    def delete_document(self, doc_id: str, organization_id: Optional[str] = None) -> int:
+        """Delete all chunks for a document"""
+        check_doc_ids([doc_id])
+        with self._lock:
+            selected = self._candidate_rows({'organization_id': organization_id, 'doc_id': doc_id})
+            rows = sorted(selected.tolist(), reverse=True) if selected is not None else []
+            # Highest rows first so swap-removal never moves a row still pending deletion
+            for row in rows:
+                self._remove_row(row)
+        
+        if rows:
+            logger.info(f"🗑️ Deleted {len(rows)} chunks from document {doc_id}")
+        return len(rows)
+    
+    def update_chunk_payloads(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Overwrite payloads of stored chunks without touching their vectors"""
+        count = 0
+        with self._lock:
+            for i, chunk in enumerate(chunks):
+                payload = build_chunk_payload(doc_id, chunk, i, organization_id)
+                row = self._row_by_point.get(point_id_for(doc_id, payload['chunk_id']))
+                if row is None:
+                    continue
+                self._unindex_row(row, self._payloads[row])
+                self._payloads[row] = payload
+                self._index_row(row, payload)
+                count += 1
+        return count
+    
+    def delete_chunks(
+        self,
+        doc_id: str,
+        chunk_ids: List[str],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Delete specific chunks of a document"""
+        with self._lock:
+            rows = [self._row_by_point.get(point_id_for(doc_id, chunk_id)) for chunk_id in chunk_ids]
+            rows = sorted(
+                (row for row in rows
+                 if row is not None and (not organization_id or self._payloads[row].get('organization_id') == organization_id)),
+                reverse=True
+            )
+            for row in rows:
+                self._remove_row(row)
+        return len(rows)
+    
+    def get_chunk_vectors(
+        self,
+        doc_id: str,
+        chunk_ids: List[str],
+        organization_id: Optional[str] = None
+    ) -> Dict[str, List[float]]:
+        """Stored (normalized) vectors of a document's chunks"""
+        vectors = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                row = self._row_by_point.get(point_id_for(doc_id, chunk_id))
+                if row is not None and (not organization_id or self._payloads[row].get('organization_id') == organization_id):
+                    vectors[chunk_id] = self._vectors[row].copy()
+        return vectors
+    
+    def get_stats(self, organization_id: Optional[str] = None) -> Dict:
+        """Get vector store statistics"""
+        with self._lock:
+            if organization_id:
+                rows = self._indexes['organization_id'].get(organization_id, set())
+                total_chunks = len(rows)
+                total_documents = len({self._payloads[row]['doc_id'] for row in rows})
+            else:
+                total_chunks = self._count
+                total_documents = len(self._indexes['doc_id'])
+            
+            return {
+                'total_chunks': total_chunks,
+                'total_documents': total_documents,
+                'collection_name': self.collection_name,
+                'persist_directory': 'memory'
+            }
+    
+    def clear_all(self):
+        """Clear all data from vector store"""
+        with self._lock:
+            self._reset(self._vectors.shape[0])
+        logger.warning("⚠️ Vector store cleared!")
+    
+    def scroll_payloads(self, where: Optional[Dict] = None, limit: int = 10000) -> List[Dict]:
+        """Return stored payloads matching exact-value filters"""
+        where = where or {}
+        with self._lock:
+            matches = [
+                payload for payload in self._payloads
+                if all(payload.get(key) == value for key, value in where.items())
+            ]
+        return matches[:limit]
+    
+    def backfill_organization(self, organization_id: str) -> int:
+        """Assign organization_id to chunks stored before tenant scoping existed"""
+        count = 0
+        with self._lock:
+            for row, payload in enumerate(self._payloads[:self._count]):
+                if not payload.get('organization_id'):
+                    payload['organization_id'] = organization_id
+                    self._index_row(row, payload)
+                    count += 1
+        return count
@@ -0,0 +1,164 @@
+"""
+Offline Provider
+Deterministic local stand-ins for the OpenAI chat and embedding APIs
+
+Used for load testing and CI on machines without network access or API keys
+(CHAT_PROVIDER=offline, EMBEDDING_PROVIDER=offline). Nothing here is
+meaningful as an answer, but everything is repeatable and shaped like the
+real thing:
+
+- embeddings are feature-hashed bags of words and word pairs, unit length,
+  so texts that share words are close and retrieval behaves plausibly
+- chat answers are extracted from the context lines that share the most
+  words with the question, streamed word by word like a real completion
+- both sleep for a configurable latency so throughput numbers include a
+  realistic provider delay
+"""
+
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+OFFLINE_MODEL = "hashed-bow"
+OFFLINE_EMBEDDING_DIM = 384
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "did", "do", "does", "for", "from", "how",
+    "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "was", "what",
+    "when", "where", "which", "who", "with",
+}
+
+
+def _words(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def _bucket(feature: str, dim: int) -> tuple:
+    """Stable (index, sign) of a feature; hash() is salted per process, blake2b is not"""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+    return digest % dim, 1.0 if (digest >> 63) & 1 else -1.0
+
+
+def hash_embedding(text: str, dim: int = OFFLINE_EMBEDDING_DIM) -> List[float]:
+    """
+    Deterministic unit-length embedding of a text
+    
+    Args:
+        text: Text to embed
+        dim: Output dimension
+    
+    Returns:
+        Embedding vector (all zeros for text without words)
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    words = _words(text)
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for feature in features:
+        index, sign = _bucket(feature, dim)
+        vector[index] += sign
+    
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector.tolist()
+
+
+class OfflineEmbeddingModel:
+    """Embedding model with the sentence-transformers encode() interface"""
+    
+    def __init__(self, dim: int = OFFLINE_EMBEDDING_DIM, latency_ms: float = 0.0):
+        """
+        Args:
+            dim: Output dimension
+            latency_ms: Simulated latency per encode() call
+        """
+        self.dim = dim
+        self.latency_ms = latency_ms
+    
+    def encode(self, texts, **kwargs) -> np.ndarray:
+        """Embed one text (1-d array) or a list of texts (2-d array)"""
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if isinstance(texts, str):
+            return np.asarray(hash_embedding(texts, self.dim), dtype=np.float32)
+        return np.asarray([hash_embedding(text, self.dim) for text in texts], dtype=np.float32).reshape(len(texts), self.dim)
+
+
+def extractive_answer(messages: List[Dict[str, str]], max_words: int = 150) -> str:
+    """
+    Deterministic answer: the context lines that best overlap the last user message
+    
+    Args:
+        messages: OpenAI chat messages; the context is read from system messages
+        max_words: Cap on the answer length
+    """
+    question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    context = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    question_words = set(_words(question))
+    
+    scored = []
+    for position, line in enumerate(context.splitlines()):
+        line = line.strip()
+        overlap = len(question_words & set(_words(line)))
+        if overlap and not line.startswith("---"):
+            scored.append((-overlap, position, line))
+    
+    if not scored:
+        return "The provided documents do not contain an answer to this question."
+    
+    lines = [line for _, _, line in sorted(scored)[:3]]
+    words = " ".join(lines).split()
+    answer = " ".join(words[:max_words])
+    return f"Based on the documents: {answer}"
+
+
+class _Completions:
+    def __init__(self, client: "OfflineChatClient"):
+        self._client = client
+    
+    async def create(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: Optional[int] = None,
+        stream: bool = False,
+        **kwargs
+    ):
+        """chat.completions.create() with the AsyncOpenAI call signature and response shape"""
+        answer = extractive_answer(messages, max_words=max_tokens or 150)
+        await asyncio.sleep(self._client.latency_ms / 1000)
+        if stream:
+            return self._client._stream(answer)
+        message = SimpleNamespace(role="assistant", content=answer)
+        return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
+
+
+class OfflineChatClient:
+    """Drop-in for AsyncOpenAI's chat completions that never leaves the process"""
+    
+    def __init__(self, latency_ms: float = 0.0, token_latency_ms: float = 0.0):
+        """
+        Args:
+            latency_ms: Simulated delay before the response (or first token)
+            token_latency_ms: Simulated delay between streamed tokens
+        """
+        self.latency_ms = latency_ms
+        self.token_latency_ms = token_latency_ms
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        logger.info(f"✅ Offline chat provider initialized ({latency_ms:.0f}ms latency)")
+    
+    async def _stream(self, answer: str):
+        for i, word in enumerate(answer.split(" ")):
+            if i and self.token_latency_ms:
+                await asyncio.sleep(self.token_latency_ms / 1000)
+            delta = SimpleNamespace(content=word if i == 0 else f" {word}")
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
@@ -1,6 +1,9 @@
 """
 Pre-Trip Checklist Extraction Schema
 Matches Yarona Rustenburg Pool Vehicle Inspection Checklist
+
+This is the schema /api/extract sends to LandingAI (via schema_registry) and
+the shape the validation form reads.
 """
 
 from pydantic import BaseModel, Field
@@ -29,12 +32,8 @@ class InspectionItem(BaseModel):
 class ConsumableLevel(BaseModel):
     """Consumable/fluid level item with before and after readings"""
     item_name: Optional[str] = Field(None, description="Item name (e.g., Amount of Fuel, Brake Fluid, Engine Oil)")
-    # Before Trip columns (typically F, 3/4, 1/2, 1/4, E)
     before_trip_level: Optional[str] = Field(None, description="Level before trip (F, 3/4, 1/2, 1/4, E)")
-    before_trip_condition: Optional[str] = Field(None, description="Condition before trip")
-    # After Trip columns
     after_trip_level: Optional[str] = Field(None, description="Level after trip (F, 3/4, 1/2, 1/4, E)")
-    after_trip_condition: Optional[str] = Field(None, description="Condition after trip")
 
 
 class TyreCondition(BaseModel):
@@ -46,31 +45,10 @@ class TyreCondition(BaseModel):
     after_brand: Optional[str] = Field(None, description="Tyre brand after trip")
 
 
-class WheelStatus(BaseModel):
-    """Wheel caps and MAG wheels status"""
-    item_name: Optional[str] = Field(None, description="Item name (Wheel Caps, MAG Wheels)")
-    before_count_0: Optional[bool] = Field(None, description="Before trip: 0 checked")
-    before_count_1: Optional[bool] = Field(None, description="Before trip: 1 checked")
-    before_count_2: Optional[bool] = Field(None, description="Before trip: 2 checked")
-    before_count_3: Optional[bool] = Field(None, description="Before trip: 3 checked")
-    before_count_4: Optional[bool] = Field(None, description="Before trip: 4 checked")
-    after_count_0: Optional[bool] = Field(None, description="After trip: 0 checked")
-    after_count_1: Optional[bool] = Field(None, description="After trip: 1 checked")
-    after_count_2: Optional[bool] = Field(None, description="After trip: 2 checked")
-    after_count_3: Optional[bool] = Field(None, description="After trip: 3 checked")
-    after_count_4: Optional[bool] = Field(None, description="After trip: 4 checked")
-
-
 class Signatures(BaseModel):
     """Signature fields"""
-    receiver_driver_signature: Optional[str] = Field(None, description="Signature of Receiver/Driver - presence indicator")
     receiver_name: Optional[str] = Field(None, description="Name of Receiver")
-    corporate_service_signature: Optional[str] = Field(None, description="Signature of Corporate service/Fleet Section - presence indicator")
     dept_representative_name: Optional[str] = Field(None, description="Name of Dept Representative")
-
-
-class FuelCard(BaseModel):
-    """Fuel card and keys status"""
     fuel_card_issued: Optional[bool] = Field(None, description="Was fuel card issued?")
     keys_issued: Optional[bool] = Field(None, description="Were keys issued?")
 
@@ -80,38 +58,10 @@ class PreTripChecklistExtraction(BaseModel):
     Complete schema for Yarona Pool Vehicle Inspection Checklist
     Captures pre-trip and post-trip inspection data
     """
-    
-    # Header information
     vehicle_header: Optional[VehicleHeader] = Field(None, description="Vehicle and driver header information")
-    
-    # Main inspection items (Body Work through Seat Belts)
-    inspection_items: Optional[List[InspectionItem]] = Field(
-        None, 
-        description="List of inspection items with pre/post trip status"
-    )
-    
-    # Wheel status
-    wheel_status: Optional[List[WheelStatus]] = Field(
-        None,
-        description="Wheel caps and MAG wheels count"
-    )
-    
-    # Consumable levels (Fuel, Brake Fluid, Engine Oil, Water)
-    consumable_levels: Optional[List[ConsumableLevel]] = Field(
-        None,
-        description="Fluid/consumable levels before and after trip"
-    )
-    
-    # Tyre conditions
-    tyre_conditions: Optional[List[TyreCondition]] = Field(
-        None,
-        description="Tyre condition and brand for each position"
-    )
-    
-    # Fuel card and keys
-    fuel_card: Optional[FuelCard] = Field(None, description="Fuel card and keys issued status")
-    
-    # Signatures
+    inspection_items: Optional[List[InspectionItem]] = Field(None, description="List of inspection items with pre/post trip status")
+    consumable_levels: Optional[List[ConsumableLevel]] = Field(None, description="Fluid/consumable levels before and after trip")
+    tyre_conditions: Optional[List[TyreCondition]] = Field(None, description="Tyre condition and brand for each position")
     signatures: Optional[Signatures] = Field(None, description="Signature information")
 
 
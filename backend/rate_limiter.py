@@ -0,0 +1,33 @@
+"""
+Rate Limiter
+Async limiter spacing out calls to a paid / rate-limited API
+"""
+
+import time
+import asyncio
+
+
+class AsyncRateLimiter:
+    """Allows at most rate_per_minute acquisitions per minute, evenly spaced"""
+    
+    def __init__(self, rate_per_minute: float):
+        """
+        Args:
+            rate_per_minute: Calls allowed per minute (0 or less disables the limit)
+        """
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait for the next free slot"""
+        if not self.interval:
+            return
+        
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        
+        if slot > now:
+            await asyncio.sleep(slot - now)
@@ -0,0 +1,120 @@
+"""
+Read Cache
+Read-through cache for Supabase lookups
+
+Document and inspection lookups are cached per (table, query) for a short
+TTL in an LRU of bounded size. Our own writes invalidate every entry of the
+table they touch, both when a write is queued and when the write-behind
+journal has flushed it, so this process reads its own writes. Writes by
+other processes are picked up when the TTL expires.
+
+Concurrent misses for the same query share one Supabase call, and a load
+that was overtaken by a write to its table is returned but not cached.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ReadCache:
+    """Thread-safe LRU + TTL cache of query results, invalidated per table"""
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 30.0):
+        """
+        Args:
+            max_entries: LRU capacity (0 disables the cache)
+            ttl_seconds: Entry lifetime
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        # Loads in progress (only touched from the event loop)
+        self._loading: Dict[tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    async def get_or_load(self, table: str, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Cached result of a query, loading it on a miss
+        
+        Args:
+            table: Table the query reads (the invalidation unit)
+            key: Everything else that identifies the query (filters, columns, limit)
+            loader: Runs the query
+        
+        Returns:
+            The query result; callers must not mutate it
+        """
+        if not self.enabled:
+            return await loader()
+        
+        entry_key = (table, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and now - entry[0] <= self.ttl_seconds:
+                self._entries.move_to_end(entry_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generations.get(table, 0)
+        
+        # Loads started before a write to the table are not joined
+        load_key = (entry_key, generation)
+        pending = self._loading.get(load_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._loading[load_key] = future
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Waiters get the exception; mark it retrieved for the no-waiter case
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self._loading.pop(load_key, None)
+        
+        future.set_result(value)
+        with self._lock:
+            if self._generations.get(table, 0) == generation:
+                self._entries[entry_key] = (time.monotonic(), value)
+                self._entries.move_to_end(entry_key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+    
+    def invalidate(self, table: str) -> int:
+        """Drop every cached result of a table (safe to call from any thread)"""
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            keys = [key for key in self._entries if key[0] == table]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,344 @@
+"""
+Re-index Command
+Rebuilds the vector store from the parsed documents already on disk
+(outputs/<doc_id>/metadata.json) without calling LandingAI again
+
+Pipeline:
+- a thread pool reads and cleans metadata.json files ahead of the embedder
+- chunks from many documents are embedded in large batches
+- each batch is written with a single bulk upsert on a background writer
+  thread, so the next batch is embedded while the previous one is stored
+- finished doc_ids are appended to a checkpoint file, so an interrupted
+  run can continue with --resume
+
+Usage:
+    python reindex.py --recreate
+    python reindex.py --resume
+    python reindex.py --organization-id acme
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(dotenv_path=BASE_DIR / ".env")
+
+from vector_store import VectorBackend, create_vector_store, clean_parsed_chunks
+from embeddings import EmbeddingService, get_embedding_service
+from embedding_versions import get_version_registry
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("reindex")
+
+DEFAULT_OUTPUTS_DIR = BASE_DIR / "outputs"
+CHECKPOINT_FILENAME = ".reindex_checkpoint"
+
+
+def discover_documents(outputs_dir: Path) -> List[str]:
+    """Return the doc_ids (directory names) that have a metadata.json, sorted"""
+    return sorted(
+        entry.name for entry in os.scandir(outputs_dir)
+        if entry.is_dir() and os.path.isfile(os.path.join(entry.path, "metadata.json"))
+    )
+
+
+def load_document(outputs_dir: Path, doc_id: str) -> List[Dict]:
+    """Read one metadata.json and return its indexable chunks"""
+    with open(outputs_dir / doc_id / "metadata.json") as f:
+        parsed_data = json.load(f)
+    return clean_parsed_chunks(doc_id, parsed_data.get('chunks', []))
+
+
+def iter_documents(
+    outputs_dir: Path,
+    doc_ids: List[str],
+    workers: int
+) -> Iterator[Tuple[str, Optional[List[Dict]]]]:
+    """
+    Load documents on a thread pool, yielding them in order
+    
+    At most workers * 4 files are in flight, so memory stays bounded no
+    matter how far the readers get ahead of the embedder.
+    
+    Yields:
+        (doc_id, chunks) pairs; chunks is None when the file could not be read
+    """
+    window = workers * 4
+    pending: deque = deque()
+    remaining = iter(doc_ids)
+    
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reindex-read") as pool:
+        for doc_id in remaining:
+            pending.append((doc_id, pool.submit(load_document, outputs_dir, doc_id)))
+            if len(pending) >= window:
+                break
+        
+        while pending:
+            doc_id, future = pending.popleft()
+            next_doc_id = next(remaining, None)
+            if next_doc_id is not None:
+                pending.append((next_doc_id, pool.submit(load_document, outputs_dir, next_doc_id)))
+            
+            try:
+                yield doc_id, future.result()
+            except Exception as e:
+                logger.warning(f"⚠️ Skipping {doc_id}: {e}")
+                yield doc_id, None
+
+
+class Checkpoint:
+    """Append-only record of doc_ids whose chunks are safely stored"""
+    
+    def __init__(self, path: Path):
+        self.path = path
+    
+    def load(self) -> Set[str]:
+        """Return the doc_ids recorded by previous runs"""
+        if not self.path.exists():
+            return set()
+        with open(self.path) as f:
+            return {line.strip() for line in f if line.strip()}
+    
+    def reset(self):
+        """Forget previous runs"""
+        self.path.unlink(missing_ok=True)
+    
+    def record(self, doc_ids: List[str]):
+        """Durably append finished doc_ids"""
+        if not doc_ids:
+            return
+        with open(self.path, 'a') as f:
+            f.write("".join(f"{doc_id}\n" for doc_id in doc_ids))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class Progress:
+    """Periodic progress line with throughput and ETA"""
+    
+    def __init__(self, total_documents: int, interval: float = 5.0):
+        self.total_documents = total_documents
+        self.interval = interval
+        self.documents = 0
+        self.chunks = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+    
+    def update(self, documents: int, chunks: int):
+        self.documents += documents
+        self.chunks += chunks
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+    
+    def report(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.documents / elapsed
+        left = self.total_documents - self.documents
+        eta = f"{left / rate:.0f}s" if rate > 0 else "?"
+        percent = 100.0 * self.documents / self.total_documents if self.total_documents else 100.0
+        logger.info(
+            f"📈 {self.documents}/{self.total_documents} docs ({percent:.1f}%) | "
+            f"{self.chunks} chunks | {rate:.1f} docs/s | "
+            f"{self.chunks / elapsed:.0f} chunks/s | ETA {eta}"
+        )
+
+
+def _embed(embedding_service: EmbeddingService, texts: List[str], embed_batch_size: int) -> List[List[float]]:
+    """Embed texts in provider-sized sub-batches"""
+    embeddings = []
+    for start in range(0, len(texts), embed_batch_size):
+        embeddings.extend(
+            embedding_service.embed_batch(texts[start:start + embed_batch_size], show_progress=False)
+        )
+    return embeddings
+
+
+def _write_batch(
+    vector_store: VectorBackend,
+    documents: List[Tuple[str, List[Dict]]],
+    embeddings: List[List[float]],
+    organization_id: str,
+    replace: bool
+) -> int:
+    """Store one batch (runs on the writer thread)"""
+    if replace:
+        # Drop chunks that no longer exist in metadata.json
+        vector_store.delete_documents([doc_id for doc_id, _ in documents], organization_id=organization_id)
+    return vector_store.add_documents(documents, embeddings, organization_id=organization_id)
+
+
+def run_reindex(
+    vector_store: VectorBackend,
+    embedding_service: EmbeddingService,
+    outputs_dir: Path = DEFAULT_OUTPUTS_DIR,
+    organization_id: str = "default_org",
+    workers: int = 8,
+    batch_chunks: int = 2048,
+    embed_batch_size: int = 256,
+    recreate: bool = False,
+    resume: bool = False,
+    progress_interval: float = 5.0
+) -> Dict:
+    """
+    Rebuild the vector store from outputs/<doc_id>/metadata.json
+    
+    Args:
+        vector_store: Destination store
+        embedding_service: Embedder (must match the store's vector size)
+        outputs_dir: Directory holding one folder per document
+        organization_id: Owner assigned to every indexed chunk
+        workers: Reader threads
+        batch_chunks: Chunks per bulk upsert
+        embed_batch_size: Texts per embedding call
+        recreate: Clear the store first (fast path: no per-document deletes)
+        resume: Skip documents recorded in the checkpoint file
+        progress_interval: Seconds between progress lines
+    
+    Returns:
+        Summary with documents, chunks, failed, skipped and seconds
+    """
+    checkpoint = Checkpoint(outputs_dir / CHECKPOINT_FILENAME)
+    
+    doc_ids = discover_documents(outputs_dir)
+    done = checkpoint.load() if resume else set()
+    if not resume:
+        checkpoint.reset()
+    
+    todo = [doc_id for doc_id in doc_ids if doc_id not in done]
+    logger.info(f"📚 {len(doc_ids)} documents found, {len(todo)} to index ({len(doc_ids) - len(todo)} already done)")
+    
+    if recreate:
+        vector_store.clear_all()
+    
+    progress = Progress(len(todo), progress_interval)
+    batch: List[Tuple[str, List[Dict]]] = []
+    batch_size = 0
+    pending: Optional[Tuple[Future, List[str], int]] = None
+    
+    def finish_pending():
+        # Checkpoint only after the writer confirms the batch is stored
+        nonlocal pending
+        if pending is None:
+            return
+        future, batch_doc_ids, batch_chunk_count = pending
+        pending = None
+        future.result()
+        checkpoint.record(batch_doc_ids)
+        progress.update(len(batch_doc_ids), batch_chunk_count)
+    
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="reindex-write") as writer:
+        
+        def flush():
+            nonlocal batch, batch_size, pending
+            if not batch:
+                return
+            texts = [chunk["text"] for _, chunks in batch for chunk in chunks]
+            embeddings = _embed(embedding_service, texts, embed_batch_size)
+            
+            # One write in flight: embed batch N+1 while batch N is stored
+            finish_pending()
+            future = writer.submit(
+                _write_batch, vector_store, batch, embeddings, organization_id, not recreate
+            )
+            pending = (future, [doc_id for doc_id, _ in batch], batch_size)
+            batch, batch_size = [], 0
+        
+        for doc_id, chunks in iter_documents(outputs_dir, todo, workers):
+            if chunks is None:
+                progress.failed += 1
+                continue
+            
+            batch.append((doc_id, chunks))
+            batch_size += len(chunks)
+            if batch_size >= batch_chunks:
+                flush()
+        
+        flush()
+        finish_pending()
+    
+    progress.report()
+    summary = {
+        'documents': progress.documents,
+        'chunks': progress.chunks,
+        'failed': progress.failed,
+        'skipped': len(doc_ids) - len(todo),
+        'seconds': round(time.monotonic() - progress.started, 2)
+    }
+    logger.info(f"✅ Re-index complete: {summary}")
+    return summary
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rebuild the vector store from stored metadata.json files")
+    parser.add_argument("--outputs-dir", type=Path, default=DEFAULT_OUTPUTS_DIR,
+                        help="Directory with one folder per document (default: backend/outputs)")
+    parser.add_argument("--organization-id", default=os.getenv("ORGANIZATION_ID", "default_org"),
+                        help="Organization that owns the re-indexed chunks")
+    parser.add_argument("--backend", default=None,
+                        help="Vector backend (default: VECTOR_BACKEND env)")
+    parser.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 4) * 2),
+                        help="Reader threads")
+    parser.add_argument("--batch-chunks", type=int, default=2048,
+                        help="Chunks per bulk upsert")
+    parser.add_argument("--embed-batch-size", type=int, default=256,
+                        help="Texts per embedding call")
+    parser.add_argument("--progress-interval", type=float, default=5.0,
+                        help="Seconds between progress lines")
+    parser.add_argument("--recreate", action="store_true",
+                        help="Clear the vector store before indexing")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip documents finished by a previous run")
+    
+    args = parser.parse_args(argv)
+    if args.recreate and args.resume:
+        parser.error("--recreate and --resume cannot be combined")
+    if not args.outputs_dir.is_dir():
+        parser.error(f"outputs directory not found: {args.outputs_dir}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    
+    # Rebuild the collection of the active embedding version
+    active = get_version_registry().active()
+    embedding_service = get_embedding_service(active['provider'], active['model_name'])
+    vector_store = create_vector_store(
+        args.backend,
+        collection_name=active['collection'],
+        vector_size=active['dim']
+    )
+    
+    summary = run_reindex(
+        vector_store,
+        embedding_service,
+        outputs_dir=args.outputs_dir,
+        organization_id=args.organization_id,
+        workers=args.workers,
+        batch_chunks=args.batch_chunks,
+        embed_batch_size=args.embed_batch_size,
+        recreate=args.recreate,
+        resume=args.resume,
+        progress_interval=args.progress_interval
+    )
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Schema Registry
+Extraction schemas per document type, and embedding-based document classification
+
+Each document type has a Pydantic extraction model, compiled to a JSON
+schema once and reused by every /api/extract call. The type of a new
+document is picked without an LLM call. Its chunk embeddings, computed for
+the vector store anyway, are compared with embeddings of a few prototype
+phrases per type; the type whose prototypes the document's best-matching
+chunks are closest to wins.
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Type
+
+import numpy as np
+from pydantic import BaseModel
+
+from pretrip_schema import PreTripChecklistExtraction
+from incident_schema import TransportIncidentExtraction
+
+logger = logging.getLogger(__name__)
+
+try:
+    from landingai_ade.lib import pydantic_to_json_schema
+    LANDINGAI_SCHEMA_AVAILABLE = True
+except ImportError:
+    LANDINGAI_SCHEMA_AVAILABLE = False
+
+PRETRIP_CHECKLIST = "pretrip_checklist"
+TRANSPORT_INCIDENT = "transport_incident"
+DEFAULT_DOCUMENT_TYPE = PRETRIP_CHECKLIST
+
+# Best-matching chunks averaged into a type's score (a document is one or two
+# characteristic chunks surrounded by generic text)
+TOP_CHUNKS = 3
+# Softmax temperature turning cosine scores into a confidence
+CONFIDENCE_TEMPERATURE = 0.05
+
+
+class DocumentType:
+    """One document type: extraction model and classification prototypes"""
+    
+    def __init__(self, name: str, label: str, model: Type[BaseModel], prototypes: List[str]):
+        """
+        Args:
+            name: Identifier stored with documents (e.g. "pretrip_checklist")
+            label: Human-readable name
+            model: Pydantic extraction model
+            prototypes: Phrases typical of the document's text
+        """
+        self.name = name
+        self.label = label
+        self.model = model
+        self.prototypes = prototypes
+
+
+class SchemaRegistry:
+    """Document types with cached JSON schemas and prototype embeddings"""
+    
+    def __init__(self, schema_fn: Optional[Callable[[Type[BaseModel]], Dict]] = None):
+        """
+        Args:
+            schema_fn: Converts a Pydantic model to a JSON schema (default:
+                LandingAI's pydantic_to_json_schema, else model_json_schema)
+        """
+        if schema_fn is None:
+            schema_fn = pydantic_to_json_schema if LANDINGAI_SCHEMA_AVAILABLE else (lambda model: model.model_json_schema())
+        self.schema_fn = schema_fn
+        self._types: Dict[str, DocumentType] = {}
+        self._schemas: Dict[str, Dict] = {}
+        # version_key -> (type names, prototype owner per row, unit prototype matrix)
+        self._prototypes: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def register(self, document_type: DocumentType):
+        """Add a document type and compile its JSON schema"""
+        with self._lock:
+            self._types[document_type.name] = document_type
+            self._schemas[document_type.name] = self.schema_fn(document_type.model)
+            self._prototypes.clear()
+    
+    def names(self) -> List[str]:
+        return list(self._types)
+    
+    def get(self, name: str) -> DocumentType:
+        """Document type by name (KeyError for unknown types)"""
+        return self._types[name]
+    
+    def json_schema(self, name: str) -> Dict:
+        """Precompiled JSON schema for a document type"""
+        return self._schemas[name]
+    
+    def _prototype_matrix(self, embedding_service) -> tuple:
+        """Prototype embeddings for the service's vector space, embedded once per version"""
+        key = embedding_service.version_key
+        with self._lock:
+            cached = self._prototypes.get(key)
+            if cached is not None:
+                return cached
+            
+            names = list(self._types)
+            owners, texts = [], []
+            for index, name in enumerate(names):
+                for text in self._types[name].prototypes:
+                    owners.append(index)
+                    texts.append(text)
+            
+            matrix = np.asarray(embedding_service.embed_batch(texts, show_progress=False), dtype=np.float32)
+            matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+            cached = (names, np.asarray(owners), matrix)
+            self._prototypes[key] = cached
+            return cached
+    
+    def classify(self, embeddings: List[List[float]], embedding_service) -> Optional[Dict]:
+        """
+        Pick the document type for a document from its chunk embeddings
+        
+        Args:
+            embeddings: The document's chunk embeddings
+            embedding_service: Service that produced them (prototypes are embedded with it)
+        
+        Returns:
+            {'document_type', 'confidence', 'scores'}, or None without usable embeddings
+        """
+        if not self._types or not embeddings:
+            return None
+        
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors[norms[:, 0] > 0] / norms[norms[:, 0] > 0]
+        if not len(vectors):
+            return None
+        
+        names, owners, prototypes = self._prototype_matrix(embedding_service)
+        similarity = vectors @ prototypes.T
+        
+        scores = np.empty(len(names), dtype=np.float32)
+        for index in range(len(names)):
+            per_chunk = similarity[:, owners == index].max(axis=1)
+            top = np.sort(per_chunk)[-TOP_CHUNKS:]
+            scores[index] = top.mean()
+        
+        weights = np.exp((scores - scores.max()) / CONFIDENCE_TEMPERATURE)
+        best = int(np.argmax(scores))
+        return {
+            'document_type': names[best],
+            'confidence': round(float(weights[best] / weights.sum()), 3),
+            'scores': {name: round(float(score), 4) for name, score in zip(names, scores)}
+        }
+
+
+# Global instance
+_schema_registry = None
+
+
+def get_schema_registry() -> SchemaRegistry:
+    """Get or create the registry with the built-in document types"""
+    global _schema_registry
+    if _schema_registry is None:
+        registry = SchemaRegistry()
+        registry.register(DocumentType(
+            name=PRETRIP_CHECKLIST,
+            label="Pre-Trip Vehicle Inspection Checklist",
+            model=PreTripChecklistExtraction,
+            prototypes=[
+                "Pool vehicle inspection checklist",
+                "Pre-trip and post-trip inspection YES NO",
+                "Body work, license disk, window and windscreen, wiper blades, number plates",
+                "Brake lights, head lights, indicators, hooter, seat belts, warning triangle, jack",
+                "Amount of fuel, brake fluid, engine oil, water: F 3/4 1/2 1/4 E before and after trip",
+                "Tyres Front L Front R Rear L Rear R condition Good Fair Bad and brand",
+                "Signature of receiver/driver and corporate service fleet section; fuel card and keys issued",
+            ]
+        ))
+        registry.register(DocumentType(
+            name=TRANSPORT_INCIDENT,
+            label="Transport Incident Report",
+            model=TransportIncidentExtraction,
+            prototypes=[
+                "Vehicle accident / incident report form",
+                "Date, time and location of the incident; description of what happened",
+                "Collision with another vehicle, third party damage and estimated repair cost",
+                "Were any injuries reported? Medical attention required",
+                "Witness name and contact details",
+                "Reported to police: case number and police station",
+                "Driver name, driver ID, driver's license number and vehicle registration",
+            ]
+        ))
+        _schema_registry = registry
+    return _schema_registry
@@ -0,0 +1,780 @@
+"""
+Shared Vector Store - Multi-Process NumPy Backend
+Lets several API worker processes (uvicorn --workers N) share one index
+
+Layout on disk (VECTOR_SHARED_PATH):
+    manifest.json        generation, segment list and per-segment tombstones
+    seg-<gen>.npy        immutable float32 matrix (L2-normalized rows)
+    seg-<gen>.json       point IDs + payloads for the rows of that segment
+    seg-<gen>.q8.npy     optional int8 codes of the matrix (VECTOR_QUANTIZATION=int8)
+    seg-<gen>.q8.scale   dequantization scale for those codes
+    chunk_text.sqlite3   chunk text, kept out of the segment payloads (CHUNK_TEXT_STORE)
+    write.lock           flock'd by whichever process is writing
+    merge.lock           flock'd by whichever process is merging segments
+
+Every worker keeps a read-only replica: segment matrices are memory-mapped
+(so the OS page cache shares them between processes) and the replica is
+refreshed whenever manifest.json changes. Searches never take a lock and
+run entirely in the calling process, so search capacity scales with the
+number of workers. Writes are serialized with an exclusive file lock, add a
+new segment (or tombstones) and atomically swap the manifest.
+
+Segments are merged size-tiered: once MERGE_FACTOR segments of similar size
+exist they are merged into one of the next tier, so small per-upload
+segments are combined with each other and a row is rewritten only about
+log(N) times instead of on every compaction. Merges copy rows outside the
+write lock and only take it to swap the manifest (re-applying tombstones
+that landed in the meantime).
+
+With int8 quantization a search scans only the 4x smaller codes and then
+rescores the best candidates against the float32 originals, so only the codes
+have to stay resident; the originals are paged in for a handful of rows.
+"""
+
+import os
+import json
+import uuid
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from vector_store import (
+    VectorBackend,
+    DEFAULT_COLLECTION_NAME,
+    DEFAULT_VECTOR_SIZE,
+    point_id_for,
+    check_doc_ids,
+)
+from chunk_text_store import ChunkTextStore
+from diversity import candidate_count, diversify_results, diversify_search, search_candidate_count
+from memory_vector_store import INDEXED_FIELDS, _normalize, _top_k
+
+logger = logging.getLogger(__name__)
+
+# Rows dequantized per block while scanning int8 codes (bounds temporary memory)
+QUANTIZED_SCAN_BLOCK = 65536
+
+# Segments of similar size merged at once (one size tier spans this factor)
+MERGE_FACTOR = 8
+# Segments below this many live rows all share the lowest tier
+MERGE_FLOOR_ROWS = 1024
+# Rewrite a segment on its own once this fraction of its rows are tombstoned
+MAX_DELETED_RATIO = 0.3
+
+
+def _merge_tier(rows: int) -> int:
+    """Size tier of a segment: 0 below MERGE_FLOOR_ROWS, +1 per MERGE_FACTOR growth"""
+    tier = 0
+    limit = MERGE_FLOOR_ROWS
+    while rows >= limit:
+        tier += 1
+        limit *= MERGE_FACTOR
+    return tier
+
+
+def _quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Symmetric int8 scalar quantization clipped at the 0.99 quantile of |v|"""
+    if vectors.size == 0:
+        return np.zeros(vectors.shape, dtype=np.int8), 1.0
+    scale = float(np.quantile(np.abs(vectors), 0.99)) or 1.0
+    codes = np.clip(np.rint(vectors / scale * 127.0), -127, 127).astype(np.int8)
+    return codes, scale / 127.0
+
+
+class _Segment:
+    """One immutable segment loaded into this process"""
+    
+    def __init__(self, directory: Path, name: str, quantization: Optional[str] = None):
+        self.name = name
+        self.vectors = np.load(directory / f"{name}.npy", mmap_mode='r')
+        self.codes = None
+        self.code_scale = 1.0
+        if quantization == "int8":
+            self._load_codes(directory)
+        with open(directory / f"{name}.json", 'r') as f:
+            records = json.load(f)
+        self.point_ids = [r['point_id'] for r in records]
+        self.payloads = [r['payload'] for r in records]
+        
+        self.indexes: Dict[str, Dict[str, List[int]]] = {field: {} for field in INDEXED_FIELDS}
+        for row, payload in enumerate(self.payloads):
+            for field, index in self.indexes.items():
+                if payload.get(field) is not None:
+                    index.setdefault(payload[field], []).append(row)
+        
+        self.live = np.ones(len(self.payloads), dtype=bool)
+    
+    def _load_codes(self, directory: Path):
+        """Load int8 codes, building them on first use (this is how existing segments migrate)"""
+        codes_path = directory / f"{self.name}.q8.npy"
+        scale_path = directory / f"{self.name}.q8.scale"
+        
+        if not codes_path.exists():
+            codes, scale = _quantize_int8(np.asarray(self.vectors))
+            # Scale first: the codes file appearing means both are complete
+            tmp_suffix = f".{os.getpid()}.tmp"
+            with open(f"{scale_path}{tmp_suffix}", 'w') as f:
+                f.write(repr(scale))
+            os.replace(f"{scale_path}{tmp_suffix}", scale_path)
+            with open(f"{codes_path}{tmp_suffix}", 'wb') as f:
+                np.save(f, codes)
+            os.replace(f"{codes_path}{tmp_suffix}", codes_path)
+        
+        self.codes = np.load(codes_path, mmap_mode='r')
+        with open(scale_path, 'r') as f:
+            self.code_scale = float(f.read())
+    
+    def scores(self, query: np.ndarray, rows: np.ndarray, n_results: int, oversampling: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score candidate rows; returns (rows, scores) of the best n_results, best first
+        
+        Quantized segments rank on int8 codes, then rescore the top
+        n_results * oversampling candidates with the original vectors.
+        """
+        selective = rows.size * 4 < len(self.payloads)
+        
+        if self.codes is None:
+            if selective:
+                # Selective filter: gather just the candidate rows
+                scores = np.asarray(self.vectors[rows] @ query)
+            else:
+                # Score the whole mmapped matrix in place, no row copy
+                scores = np.asarray(self.vectors @ query)[rows]
+            order = _top_k(scores, n_results)
+            return rows[order], scores[order]
+        
+        if selective:
+            approx = (self.codes[rows].astype(np.float32) @ query) * self.code_scale
+        else:
+            approx = np.empty(len(self.payloads), dtype=np.float32)
+            for start in range(0, len(self.payloads), QUANTIZED_SCAN_BLOCK):
+                block = self.codes[start:start + QUANTIZED_SCAN_BLOCK]
+                approx[start:start + len(block)] = block.astype(np.float32) @ query
+            approx = approx[rows] * self.code_scale
+        
+        # Sorted rows read the mmapped originals front to back
+        candidates = np.sort(rows[_top_k(approx, max(n_results, int(np.ceil(n_results * oversampling))))])
+        exact = np.asarray(self.vectors[candidates] @ query)
+        order = _top_k(exact, n_results)
+        return candidates[order], exact[order]
+    
+    def set_deleted(self, deleted: List[int]):
+        self.live = np.ones(len(self.payloads), dtype=bool)
+        if deleted:
+            self.live[np.asarray(deleted, dtype=np.int64)] = False
+    
+    def candidate_rows(self, filters: Dict) -> np.ndarray:
+        """Live rows passing the exact-match filters (None values are ignored)"""
+        mask = self.live
+        for field, value in filters.items():
+            if value is None:
+                continue
+            rows = self.indexes[field].get(value)
+            if not rows:
+                return np.empty(0, dtype=np.int64)
+            field_mask = np.zeros_like(mask)
+            field_mask[rows] = True
+            mask = mask & field_mask
+        return np.flatnonzero(mask)
+
+
+class SharedVectorStore(VectorBackend):
+    """Segment-based NumPy store whose replicas are shared across processes"""
+    
+    def __init__(
+        self,
+        persist_directory: str = "./vector_shared",
+        collection_name: str = DEFAULT_COLLECTION_NAME,
+        vector_size: int = DEFAULT_VECTOR_SIZE,
+        quantization: Optional[str] = None,
+        oversampling: float = 2.0,
+        text_store_path: Optional[str] = None
+    ):
+        """
+        Open (or create) a shared index directory
+        
+        Args:
+            persist_directory: Directory shared by all worker processes
+            collection_name: Name reported in stats
+            vector_size: Embedding dimension
+            quantization: None or "int8" (search on int8 codes, rescore with originals)
+            oversampling: Candidates rescored per requested result when quantized
+            text_store_path: SQLite file for chunk text; None keeps text in the segment JSON
+        """
+        if quantization not in (None, "int8"):
+            raise ValueError(f"Shared backend supports quantization None or 'int8', got {quantization!r}")
+        
+        self.persist_directory = Path(persist_directory)
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self.collection_name = collection_name
+        self.vector_size = vector_size
+        self.quantization = quantization
+        self.oversampling = oversampling
+        self.text_store = ChunkTextStore(text_store_path, collection_name) if text_store_path else None
+        
+        self._manifest_path = self.persist_directory / "manifest.json"
+        self._lock_path = self.persist_directory / "write.lock"
+        self._merge_lock_path = self.persist_directory / "merge.lock"
+        self._thread_lock = threading.RLock()
+        
+        self._manifest: Dict = {'generation': 0, 'vector_size': vector_size, 'segments': []}
+        self._manifest_stamp = None
+        self._segments: Dict[str, _Segment] = {}
+        
+        with self._write_lock():
+            if not self._manifest_path.exists():
+                self._write_manifest(self._manifest)
+            self._refresh()
+        
+        if self._manifest.get('vector_size', vector_size) != vector_size:
+            logger.warning(
+                f"⚠️ Shared index has {self._manifest['vector_size']}d vectors, expected {vector_size}d"
+            )
+        
+        logger.info(f"✅ Shared vector store opened at {self.persist_directory}")
+        logger.info(f"📊 Current collection size: {self._live_count()} chunks")
+    
+    # ------------------------------------------------------------------
+    # Replica management
+    # ------------------------------------------------------------------
+    
+    @contextmanager
+    def _write_lock(self):
+        """Exclusive cross-process (flock) and in-process lock for writers"""
+        with self._manifest_lock():
+            yield
+        # Merge after releasing the lock so other writers are not held up by it
+        self._merge_segments()
+    
+    @contextmanager
+    def _manifest_lock(self):
+        with self._thread_lock:
+            with open(self._lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _refresh(self):
+        """Reload the replica if another process published a new manifest"""
+        try:
+            stat = self._manifest_path.stat()
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stamp == self._manifest_stamp:
+            return
+        
+        with self._thread_lock:
+            for _ in range(3):
+                with open(self._manifest_path, 'r') as f:
+                    manifest = json.load(f)
+                try:
+                    segments = {}
+                    for entry in manifest['segments']:
+                        segment = self._segments.get(entry['name']) or _Segment(
+                            self.persist_directory, entry['name'], self.quantization
+                        )
+                        segment.set_deleted(entry.get('deleted', []))
+                        segments[entry['name']] = segment
+                    break
+                except FileNotFoundError:
+                    # A writer compacted the segments between our reads; retry with the new manifest
+                    continue
+            else:
+                raise RuntimeError(f"Could not load a consistent manifest from {self.persist_directory}")
+            
+            self._manifest = manifest
+            self._segments = segments
+            self._manifest_stamp = stamp
+    
+    def _write_manifest(self, manifest: Dict):
+        """Atomically publish a new manifest (readers see old or new, never partial)"""
+        tmp_path = self._manifest_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._manifest_path)
+    
+    def _write_segment(self, name: str, vectors: np.ndarray, point_ids: List[str], payloads: List[Dict]):
+        np.save(self.persist_directory / f"{name}.npy", np.ascontiguousarray(vectors, dtype=np.float32))
+        with open(self.persist_directory / f"{name}.json", 'w') as f:
+            json.dump([{'point_id': pid, 'payload': p} for pid, p in zip(point_ids, payloads)], f)
+    
+    def _remove_segment_files(self, names: List[str]):
+        # Other processes may still have these mmapped; unlinking is safe on POSIX
+        for name in names:
+            for suffix in ('.npy', '.json', '.q8.npy', '.q8.scale'):
+                try:
+                    (self.persist_directory / f"{name}{suffix}").unlink()
+                except FileNotFoundError:
+                    pass
+    
+    def _live_count(self) -> int:
+        return sum(int(segment.live.sum()) for segment in self._segments.values())
+    
+    def _commit(self, manifest: Dict):
+        """Publish a manifest and refresh our replica"""
+        manifest['generation'] += 1
+        self._write_manifest(manifest)
+        self._refresh()
+    
+    def _merge_plan(self) -> List[str]:
+        """Segments to merge next: mostly-tombstoned ones, else a full size tier"""
+        tiers: Dict[int, List[str]] = {}
+        dirty = []
+        for name, segment in self._segments.items():
+            live = int(segment.live.sum())
+            if len(segment.payloads) and 1.0 - live / len(segment.payloads) > MAX_DELETED_RATIO:
+                dirty.append(name)
+            else:
+                tiers.setdefault(_merge_tier(live), []).append(name)
+        
+        if dirty:
+            return dirty
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= MERGE_FACTOR:
+                return tiers[tier]
+        return []
+    
+    def _merge_segments(self):
+        """Run pending size-tiered merges (one merging process at a time)"""
+        if not self._merge_plan():
+            return
+        
+        with open(self._merge_lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process (or thread) is merging and will pick this up
+                return
+            try:
+                self._refresh()
+                plan = self._merge_plan()
+                while plan:
+                    self._merge(plan)
+                    plan = self._merge_plan()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _merge(self, names: List[str]):
+        """Copy the live rows of the named segments into one new segment and swap it in"""
+        vectors, point_ids, payloads, origins = [], [], [], []
+        for name in names:
+            segment = self._segments[name]
+            rows = np.flatnonzero(segment.live)
+            if rows.size:
+                vectors.append(np.asarray(segment.vectors[rows]))
+                point_ids.extend(segment.point_ids[row] for row in rows)
+                payloads.extend(segment.payloads[row] for row in rows)
+                origins.extend((name, int(row)) for row in rows)
+        
+        # Written without the write lock; the name only has to be unique
+        merged = f"seg-{self._manifest['generation']:08d}-{uuid.uuid4().hex[:8]}"
+        if point_ids:
+            self._write_segment(merged, np.vstack(vectors), point_ids, payloads)
+        
+        with self._manifest_lock():
+            self._refresh()
+            manifest = self._manifest_copy()
+            # Rows deleted or upserted elsewhere while we were copying stay deleted
+            deleted = [
+                i for i, (name, row) in enumerate(origins)
+                if name not in self._segments or not self._segments[name].live[row]
+            ]
+            manifest['segments'] = [entry for entry in manifest['segments'] if entry['name'] not in names]
+            if len(deleted) < len(point_ids):
+                manifest['segments'].append({'name': merged, 'rows': len(point_ids), 'deleted': deleted})
+            self._commit(manifest)
+        
+        self._remove_segment_files([name for name in names + [merged] if name not in self._segments])
+        logger.info(f"🧹 Merged {len(names)} shared vector segment(s) ({len(point_ids) - len(deleted)} rows)")
+    
+    def _compact(self, default_organization_id: Optional[str] = None):
+        """Merge all live rows into a single segment"""
+        old_names = list(self._segments)
+        vectors, point_ids, payloads = [], [], []
+        for segment in self._segments.values():
+            rows = np.flatnonzero(segment.live)
+            if rows.size:
+                vectors.append(np.asarray(segment.vectors[rows]))
+                point_ids.extend(segment.point_ids[row] for row in rows)
+                payloads.extend(segment.payloads[row] for row in rows)
+        
+        if default_organization_id:
+            payloads = [
+                p if p.get('organization_id') else {**p, 'organization_id': default_organization_id}
+                for p in payloads
+            ]
+        
+        manifest = {
+            'generation': self._manifest['generation'] + 1,
+            'vector_size': self.vector_size,
+            'segments': []
+        }
+        if point_ids:
+            name = f"seg-{manifest['generation']:08d}"
+            self._write_segment(name, np.vstack(vectors), point_ids, payloads)
+            manifest['segments'].append({'name': name, 'rows': len(point_ids), 'deleted': []})
+        
+        self._write_manifest(manifest)
+        self._refresh()
+        self._remove_segment_files([n for n in old_names if n not in self._segments])
+        logger.info(f"🧹 Compacted shared vector store into {len(self._segments)} segment(s)")
+    
+    def _manifest_copy(self) -> Dict:
+        return json.loads(json.dumps(self._manifest))
+    
+    # ------------------------------------------------------------------
+    # VectorBackend API
+    # ------------------------------------------------------------------
+    
+    def add_document_chunks(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        embeddings: List[List[float]],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Add document chunks to vector store"""
+        if not chunks or not embeddings:
+            logger.warning(f"No chunks or embeddings provided for doc {doc_id}")
+            return 0
+        
+        if len(chunks) != len(embeddings):
+            raise ValueError(f"Chunks ({len(chunks)}) and embeddings ({len(embeddings)}) count mismatch")
+        
+        matrix = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if matrix.shape[1] != self.vector_size:
+            raise ValueError(f"Expected {self.vector_size}d embeddings, got {matrix.shape[1]}d")
+        
+        self._save_texts([(doc_id, chunks)])
+        payloads = [self._payload_for(doc_id, chunk, i, organization_id) for i, chunk in enumerate(chunks)]
+        self._append_segment(matrix, payloads)
+        
+        logger.info(f"✅ Added {len(chunks)} chunks from document {doc_id} to vector store")
+        return len(chunks)
+    
+    def add_documents(
+        self,
+        documents: List[Tuple[str, List[Dict]]],
+        embeddings: List[List[float]],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Add chunks from many documents as a single segment (one manifest commit)"""
+        payloads = [
+            self._payload_for(doc_id, chunk, i, organization_id)
+            for doc_id, chunks in documents
+            for i, chunk in enumerate(chunks)
+        ]
+        if not payloads:
+            return 0
+        
+        if len(payloads) != len(embeddings):
+            raise ValueError(f"Chunks ({len(payloads)}) and embeddings ({len(embeddings)}) count mismatch")
+        
+        matrix = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if matrix.shape[1] != self.vector_size:
+            raise ValueError(f"Expected {self.vector_size}d embeddings, got {matrix.shape[1]}d")
+        
+        self._save_texts(documents)
+        self._append_segment(matrix, payloads)
+        
+        logger.info(f"✅ Added {len(payloads)} chunks from {len(documents)} documents to vector store")
+        return len(payloads)
+    
+    def _append_segment(self, matrix: np.ndarray, payloads: List[Dict]):
+        """Write one segment holding the given rows, tombstoning older copies of the same points"""
+        with self._write_lock():
+            self._refresh()
+            self._append_rows_locked(matrix, payloads)
+    
+    def _append_rows_locked(self, matrix: np.ndarray, payloads: List[Dict]):
+        """Append a segment (caller holds the write lock and has refreshed)"""
+        point_ids = [point_id_for(p['doc_id'], p['chunk_id']) for p in payloads]
+        manifest = self._manifest_copy()
+        
+        # Upsert: tombstone existing rows for the same point IDs
+        new_ids = set(point_ids)
+        for entry in manifest['segments']:
+            segment = self._segments[entry['name']]
+            deleted = set(entry.get('deleted', []))
+            deleted.update(
+                row for row, pid in enumerate(segment.point_ids)
+                if pid in new_ids and segment.live[row]
+            )
+            entry['deleted'] = sorted(deleted)
+        
+        name = f"seg-{manifest['generation'] + 1:08d}"
+        self._write_segment(name, matrix, point_ids, payloads)
+        manifest['segments'].append({'name': name, 'rows': len(point_ids), 'deleted': []})
+        self._commit(manifest)
+    
+    def _search(self, query: np.ndarray, n_results: int, filters: Dict, with_vectors: bool = False) -> Dict:
+        """Top-k per segment, then merge"""
+        best_scores, best_payloads, best_vectors = [], [], []
+        for segment in self._segments.values():
+            rows = segment.candidate_rows(filters)
+            if rows.size == 0:
+                continue
+            top_rows, top_scores = segment.scores(query, rows, n_results, self.oversampling)
+            best_scores.append(top_scores)
+            best_payloads.extend(segment.payloads[row] for row in top_rows)
+            if with_vectors:
+                best_vectors.append(np.asarray(segment.vectors[top_rows]))
+        
+        if not best_payloads:
+            return {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        
+        scores = np.concatenate(best_scores)
+        order = _top_k(scores, n_results)
+        payloads = [best_payloads[i] for i in order]
+        results = {
+            'ids': [p['chunk_id'] for p in payloads],
+            'documents': [p.get('text', '') for p in payloads],
+            'metadatas': payloads,
+            'distances': [1.0 - float(scores[i]) for i in order]
+        }
+        if with_vectors:
+            results['embeddings'] = np.concatenate(best_vectors)[order]
+        return results
+    
+    def query(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        doc_id: Optional[str] = None,
+        chunk_type: Optional[str] = None,
+        organization_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+        dedup: bool = False
+    ) -> Dict:
+        """Query vector store for similar chunks"""
+        self._refresh()
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        filters = {'organization_id': organization_id, 'doc_id': doc_id, 'chunk_type': chunk_type}
+        results = self._search(
+            query,
+            candidate_count(n_results, mmr_lambda, dedup),
+            filters,
+            with_vectors=mmr_lambda is not None
+        )
+        
+        results = self._hydrate_results([results])[0]
+        if mmr_lambda is None and not dedup:
+            return results
+        return diversify_results(results, n_results, mmr_lambda, dedup)
+    
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        searches: List[Dict]
+    ) -> List[Dict]:
+        """Run many searches against one consistent replica"""
+        if len(query_embeddings) != len(searches):
+            raise ValueError(f"Embeddings ({len(query_embeddings)}) and searches ({len(searches)}) count mismatch")
+        
+        self._refresh()
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        results = self._hydrate_results([
+            self._search(
+                queries[i],
+                search_candidate_count(s),
+                {field: s.get(field) for field in INDEXED_FIELDS},
+                with_vectors=s.get('mmr_lambda') is not None
+            )
+            for i, s in enumerate(searches)
+        ])
+        return [diversify_search(result, search) for result, search in zip(results, searches)]
+    
+    def get_chunk_by_id(self, chunk_id: str, organization_id: Optional[str] = None) -> Optional[Dict]:
+        """Get a specific chunk by ID"""
+        self._refresh()
+        for segment in self._segments.values():
+            for row, payload in enumerate(segment.payloads):
+                if payload['chunk_id'] == chunk_id and segment.live[row] and (
+                    not organization_id or payload.get('organization_id') == organization_id
+                ):
+                    payload = self.hydrate_payloads([payload])[0]
+                    return {
+                        'chunk_id': payload['chunk_id'],
+                        'text': payload['text'],
+                        'metadata': payload
+                    }
+        return None
+    
+    def delete_document(self, doc_id: str, organization_id: Optional[str] = None) -> int:
+        """Delete all chunks for a document"""
+        return self.delete_documents([doc_id], organization_id)
+    
+    def delete_documents(self, doc_ids: List[str], organization_id: Optional[str] = None) -> int:
+        """Delete all chunks for several documents with a single manifest commit"""
+        check_doc_ids(doc_ids)
+        with self._write_lock():
+            self._refresh()
+            manifest = self._manifest_copy()
+            
+            deleted_points = []
+            for entry in manifest['segments']:
+                segment = self._segments[entry['name']]
+                rows = set()
+                for doc_id in doc_ids:
+                    rows.update(segment.candidate_rows({'organization_id': organization_id, 'doc_id': doc_id}).tolist())
+                if rows:
+                    entry['deleted'] = sorted(set(entry.get('deleted', [])) | rows)
+                    deleted_points.extend(segment.point_ids[row] for row in rows)
+            
+            count = len(deleted_points)
+            if count:
+                self._commit(manifest)
+                self._delete_texts(deleted_points)
+                target = f"document {doc_ids[0]}" if len(doc_ids) == 1 else f"{len(doc_ids)} documents"
+                logger.info(f"🗑️ Deleted {count} chunks from {target}")
+        
+        return count
+    
+    def update_chunk_payloads(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Rewrite payloads of stored chunks, reusing their stored vectors"""
+        # Legacy rows may still carry inline text; make sure the side store has it
+        self._save_texts([(doc_id, chunks)])
+        payloads = [self._payload_for(doc_id, chunk, i, organization_id) for i, chunk in enumerate(chunks)]
+        wanted = {point_id_for(doc_id, p['chunk_id']): p for p in payloads}
+        
+        with self._write_lock():
+            self._refresh()
+            vectors, updated = [], []
+            for segment in self._segments.values():
+                for row, pid in enumerate(segment.point_ids):
+                    if pid in wanted and segment.live[row]:
+                        vectors.append(np.asarray(segment.vectors[row]))
+                        updated.append(wanted.pop(pid))
+            
+            if updated:
+                self._append_rows_locked(np.vstack(vectors), updated)
+        
+        return len(updated)
+    
+    def delete_chunks(
+        self,
+        doc_id: str,
+        chunk_ids: List[str],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Delete specific chunks of a document"""
+        doomed = {point_id_for(doc_id, chunk_id) for chunk_id in chunk_ids}
+        
+        with self._write_lock():
+            self._refresh()
+            manifest = self._manifest_copy()
+            
+            deleted_points = []
+            for entry in manifest['segments']:
+                segment = self._segments[entry['name']]
+                rows = [
+                    row for row in segment.candidate_rows({'organization_id': organization_id, 'doc_id': doc_id}).tolist()
+                    if segment.point_ids[row] in doomed
+                ]
+                if rows:
+                    entry['deleted'] = sorted(set(entry.get('deleted', [])) | set(rows))
+                    deleted_points.extend(segment.point_ids[row] for row in rows)
+            
+            if deleted_points:
+                self._commit(manifest)
+                # Only texts of points that passed the organization scope
+                self._delete_texts(deleted_points)
+        
+        return len(deleted_points)
+    
+    def get_chunk_vectors(
+        self,
+        doc_id: str,
+        chunk_ids: List[str],
+        organization_id: Optional[str] = None
+    ) -> Dict[str, List[float]]:
+        """Stored (normalized) vectors of a document's chunks"""
+        wanted = {point_id_for(doc_id, chunk_id): chunk_id for chunk_id in chunk_ids}
+        
+        self._refresh()
+        vectors = {}
+        for segment in self._segments.values():
+            for row in segment.candidate_rows({'organization_id': organization_id, 'doc_id': doc_id}).tolist():
+                chunk_id = wanted.get(segment.point_ids[row])
+                if chunk_id is not None:
+                    vectors[chunk_id] = np.asarray(segment.vectors[row])
+        return vectors
+    
+    def _delete_texts(self, point_ids: List[str]):
+        if self.text_store is not None and point_ids:
+            self.text_store.delete_points(point_ids)
+    
+    def get_stats(self, organization_id: Optional[str] = None) -> Dict:
+        """Get vector store statistics"""
+        self._refresh()
+        total_chunks = 0
+        doc_ids = set()
+        for segment in self._segments.values():
+            rows = segment.candidate_rows({'organization_id': organization_id})
+            total_chunks += rows.size
+            doc_ids.update(segment.payloads[row]['doc_id'] for row in rows)
+        
+        return {
+            'total_chunks': total_chunks,
+            'total_documents': len(doc_ids),
+            'collection_name': self.collection_name,
+            'persist_directory': str(self.persist_directory)
+        }
+    
+    def clear_all(self):
+        """Clear all data from vector store"""
+        with self._write_lock():
+            self._refresh()
+            old_names = list(self._segments)
+            self._commit({
+                'generation': self._manifest['generation'],
+                'vector_size': self.vector_size,
+                'segments': []
+            })
+            self._remove_segment_files(old_names)
+            if self.text_store is not None:
+                self.text_store.clear()
+        logger.warning("⚠️ Vector store cleared!")
+    
+    def scroll_payloads(self, where: Optional[Dict] = None, limit: int = 10000) -> List[Dict]:
+        """Return stored payloads matching exact-value filters"""
+        self._refresh()
+        where = where or {}
+        matches = []
+        for segment in self._segments.values():
+            for row, payload in enumerate(segment.payloads):
+                if segment.live[row] and all(payload.get(k) == v for k, v in where.items()):
+                    matches.append(payload)
+                    if len(matches) >= limit:
+                        return matches
+        return matches
+    
+    def backfill_organization(self, organization_id: str) -> int:
+        """Assign organization_id to chunks stored before tenant scoping existed"""
+        with self._write_lock():
+            self._refresh()
+            count = sum(
+                1 for segment in self._segments.values()
+                for row in np.flatnonzero(segment.live)
+                if not segment.payloads[row].get('organization_id')
+            )
+            if count:
+                # Segments are immutable: rewrite them with the organization filled in
+                self._compact(default_organization_id=organization_id)
+                logger.info(f"🏷️ Assigned {count} legacy chunks to organization {organization_id}")
+        return count
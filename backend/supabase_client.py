@@ -1,29 +1,239 @@
 """
 Supabase client with helper functions for document management
 Multi-tenant database operations for GroundTruth platform
+
+Every Supabase call goes through one SupabaseGateway:
+- a single async client, created once, whose HTTP connections are reused
+- at most max_concurrency calls in flight, so a Supabase latency spike
+  queues our calls instead of piling up sockets
+- a timeout per call, so a hung request fails instead of holding a slot
+- nothing blocks the event loop; background threads (write-behind flusher,
+  index rebuilds) run their calls on the loop through call_sync()
+
+Lookups go through fetch(), a read-through cache (read_cache.py) that
+our own writes invalidate.
+
+SUPABASE_BACKEND=local swaps the client for the SQLite stand-in in
+local_supabase.py (no Supabase project or credentials needed).
 """
 
 import os
 import json
+import asyncio
+import logging
 from datetime import datetime
-from typing import Optional, Dict, List
-from supabase import create_client, Client
+from typing import Any, Callable, Dict, List, Optional
+
+from local_supabase import LocalSupabaseClient
+from read_cache import ReadCache
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_BACKEND, LOCAL_BACKEND = "supabase", "local"
+
+try:
+    from supabase import acreate_client, AsyncClient
+    SUPABASE_AVAILABLE = True
+except ImportError:
+    SUPABASE_AVAILABLE = False
+
+
+class SupabaseUnavailable(RuntimeError):
+    """Supabase is not configured or the gateway has not been started"""
+
+
+class SupabaseGateway:
+    """Shared async Supabase client with bounded concurrency and per-call timeouts"""
+    
+    def __init__(
+        self,
+        url: Optional[str],
+        key: Optional[str],
+        max_concurrency: int = 8,
+        timeout: float = 10.0,
+        backend: str = SUPABASE_BACKEND,
+        local_path: str = "./local_supabase.sqlite3",
+        local_latency_ms: float = 0.0,
+        cache: Optional[ReadCache] = None
+    ):
+        """
+        Args:
+            url: Supabase project URL
+            key: Service role key
+            max_concurrency: Calls allowed in flight at once (per worker process)
+            timeout: Default seconds per call
+            backend: "supabase", or "local" for the SQLite stand-in
+            local_path: SQLite file of the stand-in
+            local_latency_ms: Simulated round-trip per stand-in query
+            cache: Read-through cache for fetch() (default: disabled)
+        """
+        self.url = url
+        self.key = key
+        self.backend = backend
+        self.local_path = local_path
+        self.local_latency_ms = local_latency_ms
+        self.cache = cache or ReadCache(max_entries=0)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._client: Optional["AsyncClient"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+    
+    @property
+    def configured(self) -> bool:
+        if self.backend == LOCAL_BACKEND:
+            return True
+        return SUPABASE_AVAILABLE and bool(self.url and self.key)
+    
+    @property
+    def ready(self) -> bool:
+        """Started and usable"""
+        return self._client is not None
+    
+    async def start(self):
+        """Create the client on the running event loop (call once at startup)"""
+        if self._client is not None or not self.configured:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.backend == LOCAL_BACKEND:
+            self._client = LocalSupabaseClient(self.local_path, latency_ms=self.local_latency_ms)
+        else:
+            self._client = await acreate_client(self.url, self.key)
+        logger.info(f"✅ Supabase {self.backend} client initialized (max {self.max_concurrency} concurrent calls)")
+    
+    async def close(self):
+        """Release the client's pooled connections"""
+        client, self._client = self._client, None
+        if client is None:
+            return
+        try:
+            await client.postgrest.aclose()
+        except Exception as e:
+            logger.warning(f"⚠️ Error closing Supabase client: {e}")
+    
+    async def execute(self, build: Callable[["AsyncClient"], Any], timeout: Optional[float] = None) -> List[Dict]:
+        """
+        Run one query
+        
+        Args:
+            build: Builds the query from the client, e.g.
+                lambda db: db.table('documents').select('*').eq('doc_id', doc_id)
+            timeout: Seconds to wait (default: the gateway's timeout), including
+                time spent waiting for a free slot
+        
+        Returns:
+            The response rows
+        
+        Raises:
+            SupabaseUnavailable: The gateway is not started
+            asyncio.TimeoutError: The call did not finish in time
+        """
+        if self._client is None:
+            raise SupabaseUnavailable("Supabase client not started")
+        
+        async def call():
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    return await build(self._client).execute()
+                finally:
+                    self.in_flight -= 1
+        
+        result = await asyncio.wait_for(call(), timeout or self.timeout)
+        return result.data
+    
+    async def fetch(
+        self,
+        table: str,
+        key: tuple,
+        build: Callable[["AsyncClient"], Any],
+        timeout: Optional[float] = None
+    ) -> List[Dict]:
+        """
+        execute() for a read, through the cache
+        
+        Args:
+            table: Table the query reads
+            key: Identifies the query within the table (filters, columns, limit)
+            build: Builds the query, as for execute()
+            timeout: Seconds to wait on a miss
+        
+        Returns:
+            The response rows (shared with the cache: do not mutate)
+        """
+        return await self.cache.get_or_load(table, key, lambda: self.execute(build, timeout))
+    
+    def invalidate(self, table: str):
+        """Drop cached reads of a table after writing to it"""
+        self.cache.invalidate(table)
+    
+    def call_sync(self, build: Callable[["AsyncClient"], Any], timeout: Optional[float] = None) -> List[Dict]:
+        """
+        execute() for code running in a worker thread: the call runs on the
+        event loop and this thread waits for it
+        
+        Must not be called from the event loop thread itself.
+        """
+        if self._client is None:
+            raise SupabaseUnavailable("Supabase client not started")
+        if _running_loop() is self._loop:
+            raise RuntimeError("call_sync() called on the event loop thread; await execute() instead")
+        
+        future = asyncio.run_coroutine_threadsafe(self.execute(build, timeout), self._loop)
+        return future.result()
+    
+    def stats(self) -> Dict:
+        """Client state and current load (for /health)"""
+        return {
+            'backend': self.backend,
+            'ready': self.ready,
+            'in_flight': self.in_flight,
+            'max_concurrency': self.max_concurrency,
+            'timeout_seconds': self.timeout,
+            'cache': self.cache.stats(),
+        }
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")  # Use service key for backend
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_KEY must be set in .env")
+# Global instance
+_gateway = None
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+def get_supabase_gateway() -> SupabaseGateway:
+    """Get or create the gateway configured from the environment"""
+    global _gateway
+    if _gateway is None:
+        _gateway = SupabaseGateway(
+            url=os.getenv("SUPABASE_URL"),
+            # Service role key; SUPABASE_SERVICE_KEY is the older name
+            key=os.getenv("SUPABASE_KEY") or os.getenv("SUPABASE_SERVICE_KEY"),
+            max_concurrency=int(os.getenv("SUPABASE_MAX_CONCURRENCY", "8")),
+            timeout=float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "10")),
+            backend=os.getenv("SUPABASE_BACKEND", SUPABASE_BACKEND).lower(),
+            local_path=os.getenv("SUPABASE_LOCAL_PATH", "./local_supabase.sqlite3"),
+            local_latency_ms=float(os.getenv("SUPABASE_LOCAL_LATENCY_MS", "0")),
+            cache=ReadCache(
+                max_entries=int(os.getenv("SUPABASE_CACHE_SIZE", "1024")),
+                ttl_seconds=float(os.getenv("SUPABASE_CACHE_TTL_SECONDS", "30"))
+            )
+        )
+    return _gateway
 
 
 class DocumentDB:
     """Document management with Supabase"""
     
     @staticmethod
-    def create(org_id: str, filename: str, file_path: str, 
-               document_type: str, created_by: Optional[str] = None) -> str:
+    async def create(org_id: str, filename: str, file_path: str,
+                     document_type: str, created_by: Optional[str] = None) -> str:
         """Create new document record"""
         
         data = {
@@ -35,12 +245,14 @@ class DocumentDB:
             'created_by': created_by
         }
         
-        result = supabase.table('documents').insert(data).execute()
+        gateway = get_supabase_gateway()
+        rows = await gateway.execute(lambda db: db.table('documents').insert(data))
+        gateway.invalidate('documents')
         
-        return result.data[0]['id']
+        return rows[0]['id']
     
     @staticmethod
-    def update(doc_id: str, **kwargs):
+    async def update(doc_id: str, **kwargs):
         """Update document fields"""
         
         # Convert complex types to JSON strings
@@ -51,38 +263,42 @@ class DocumentDB:
         
         kwargs['updated_at'] = datetime.utcnow().isoformat()
         
-        supabase.table('documents').update(kwargs).eq('id', doc_id).execute()
+        gateway = get_supabase_gateway()
+        await gateway.execute(lambda db: db.table('documents').update(kwargs).eq('id', doc_id))
+        gateway.invalidate('documents')
     
     @staticmethod
-    def get(doc_id: str) -> Optional[Dict]:
-        """Get document by ID"""
+    async def get(doc_id: str, columns: str = '*') -> Optional[Dict]:
+        """Get document by ID (columns: comma-separated projection)"""
         
-        result = supabase.table('documents').select('*').eq('id', doc_id).execute()
+        rows = await get_supabase_gateway().fetch(
+            'documents', ('id', doc_id, columns),
+            lambda db: db.table('documents').select(columns).eq('id', doc_id)
+        )
         
-        if not result.data:
+        if not rows:
             return None
         
-        return result.data[0]
+        return rows[0]
     
     @staticmethod
-    def get_by_org(org_id: str, status: Optional[str] = None) -> List[Dict]:
-        """Get all documents for organization"""
-        
-        query = supabase.table('documents').select('*').eq('organization_id', org_id)
+    async def get_by_org(org_id: str, status: Optional[str] = None, columns: str = '*') -> List[Dict]:
+        """Get all documents for organization (columns: comma-separated projection)"""
         
-        if status:
-            query = query.eq('status', status)
+        def build(db):
+            query = db.table('documents').select(columns).eq('organization_id', org_id)
+            if status:
+                query = query.eq('status', status)
+            return query.order('created_at', desc=True)
         
-        result = query.order('created_at', desc=True).execute()
-        
-        return result.data
+        return await get_supabase_gateway().fetch('documents', ('organization_id', org_id, status, columns), build)
 
 
 class TransportIncidentDB:
     """Transport incident management"""
     
     @staticmethod
-    def create(org_id: str, document_id: str, validated_data: dict) -> str:
+    async def create(org_id: str, document_id: str, validated_data: dict) -> str:
         """Create incident from validated document data"""
         
         driver_info = validated_data.get('driver_info', {})
@@ -135,9 +351,11 @@ class TransportIncidentDB:
             'severity': classify_severity(incident_details, damage, injuries)
         }
         
-        result = supabase.table('transport_incidents').insert(data).execute()
+        gateway = get_supabase_gateway()
+        rows = await gateway.execute(lambda db: db.table('transport_incidents').insert(data))
+        gateway.invalidate('transport_incidents')
         
-        return result.data[0]['id']
+        return rows[0]['id']
 
 
 def classify_severity(incident: dict, damage: dict, injuries: dict) -> str:
@@ -0,0 +1,488 @@
+"""
+Template Extractor
+Local extraction of the fixed-layout pre-trip checklist from parsed chunks
+
+The Yarona checklist always has the same rows (DEFAULT_INSPECTION_ITEMS,
+DEFAULT_CONSUMABLES, DEFAULT_TYRES in pretrip_schema.py) and the same
+columns, so the parsed tables can be mapped onto PreTripChecklistExtraction
+directly instead of sending the markdown to LandingAI Extract:
+
+- chunks are read in layout order (page, then grounding box top/left)
+- header fields and signatures come from "Label: value" text and from
+  label/value pairs in table rows
+- table rows are matched to the template rows by fuzzy name, and column
+  roles (YES/NO, F..E levels, Good/Fair/Bad, Brand) come from the table's
+  header row, or the checklist's default column order without one
+
+Every field gets a confidence, and the result an overall confidence, so
+the caller can fall back to the remote extractor for forms that did not
+parse cleanly.
+"""
+
+import re
+import difflib
+import logging
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+from pretrip_schema import (
+    PreTripChecklistExtraction,
+    DEFAULT_INSPECTION_ITEMS,
+    DEFAULT_CONSUMABLES,
+    DEFAULT_TYRES,
+)
+from inspection_index import parse_day
+
+logger = logging.getLogger(__name__)
+
+# Minimum name similarity for a table row to count as a template row
+ROW_MATCH_THRESHOLD = 0.75
+# Fields the result is useless without; the overall confidence is capped by theirs
+REQUIRED_FIELDS = ("vehicle_header.vehicle_reg_no", "vehicle_header.date")
+
+MARKS = {"✓", "✔", "√", "☑", "☒", "✗", "✘", "x", "■", "●", "v", "tick", "checked", "[x]"}
+EMPTY = {"", "☐", "□", "-", "[ ]", "n/a"}
+LEVELS = ("f", "3/4", "1/2", "1/4", "e")
+CONDITIONS = ("good", "fair", "bad")
+
+HEADER_LABELS = {
+    "vehicle_header.vehicle_reg_no": r"vehicle\s*reg(?:istration)?\.?\s*(?:no|number|nr)?\.?",
+    "vehicle_header.drivers_name": r"driver'?s?\s*name",
+    "vehicle_header.date": r"(?<![a-z])date(?![a-z])",
+    "vehicle_header.vehicle_mileage": r"(?:vehicle\s*)?mileage|odometer(?:\s*reading)?",
+    "signatures.receiver_name": r"name\s*of\s*receiver|receiver'?s?\s*name",
+    "signatures.dept_representative_name": r"name\s*of\s*dep(?:t|artment)\.?\s*representative|dep(?:t|artment)\.?\s*representative'?s?\s*name",
+    "signatures.fuel_card_issued": r"fuel\s*card(?:\s*issued)?",
+    "signatures.keys_issued": r"keys(?:\s*issued)?",
+}
+_LABELS = {path: re.compile(pattern, re.IGNORECASE) for path, pattern in HEADER_LABELS.items()}
+_BOOLEAN_FIELDS = {"signatures.fuel_card_issued", "signatures.keys_issued"}
+_SEPARATORS = " :-_.\t"
+_NUMBERING = re.compile(r"^\s*\d+\s*[.)]\s*")
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+def _key(text: str) -> str:
+    """Comparison form of a row name: no numbering, case, punctuation or spaces"""
+    return re.sub(r"[^a-z0-9/]", "", _NUMBERING.sub("", text or "").lower())
+
+
+def _is_mark(text: str, label: Optional[str] = None) -> bool:
+    """Whether a cell is ticked (a tick / cross character, or the column's own label)"""
+    value = _clean(text).lower()
+    if value in EMPTY:
+        return False
+    return value in MARKS or (label is not None and value == label)
+
+
+class _TableParser(HTMLParser):
+    """Rows of cell texts from HTML tables; colspans are padded with empty cells"""
+    
+    def __init__(self):
+        super().__init__()
+        self.tables: List[List[List[str]]] = []
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+        self._colspan = 1
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.tables.append([])
+        elif tag == "tr" and self.tables:
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+            try:
+                self._colspan = max(int(dict(attrs).get("colspan") or 1), 1)
+            except ValueError:
+                self._colspan = 1
+    
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            self._row.append(_clean("".join(self._cell)))
+            self._row.extend([""] * (self._colspan - 1))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            if any(self._row):
+                self.tables[-1].append(self._row)
+            self._row = None
+    
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse_tables(markdown: str) -> List[List[List[str]]]:
+    """Tables in a chunk's markdown (HTML tables and pipe tables) as rows of cells"""
+    tables = []
+    if "<table" in markdown.lower():
+        parser = _TableParser()
+        parser.feed(markdown)
+        tables.extend(table for table in parser.tables if table)
+    
+    rows = []
+    for line in markdown.splitlines() + [""]:
+        line = line.strip()
+        if line.startswith("|"):
+            cells = [_clean(cell) for cell in line.strip("|").split("|")]
+            if not all(re.fullmatch(r":?-+:?", cell) for cell in cells if cell):
+                rows.append(cells)
+        elif rows:
+            tables.append(rows)
+            rows = []
+    return tables
+
+
+def _reading_order(chunks: List[Dict]) -> List[Dict]:
+    """Chunks sorted by page and grounding box (top, then left)"""
+    def position(chunk):
+        grounding = chunk.get("grounding") or {}
+        box = grounding.get("box") or {}
+        return (grounding.get("page", 0) or 0, round(box.get("top", 0) or 0, 2), box.get("left", 0) or 0)
+    return sorted(chunks, key=position)
+
+
+class _Fields:
+    """Extracted values with per-field confidence (first, most confident value wins)"""
+    
+    def __init__(self):
+        self.values: Dict[str, object] = {}
+        self.confidence: Dict[str, float] = {}
+    
+    def set(self, path: str, value, confidence: float):
+        if value in (None, "") or confidence <= self.confidence.get(path, 0.0):
+            return
+        self.values[path] = value
+        self.confidence[path] = round(confidence, 2)
+
+
+def _header_confidence(path: str, value: str) -> float:
+    """How plausible a header value is for its field"""
+    if path == "vehicle_header.vehicle_reg_no":
+        compact = re.sub(r"[\s\-]", "", value)
+        return 0.95 if re.fullmatch(r"(?=.*[A-Za-z])(?=.*\d)[A-Za-z0-9]{4,10}", compact) else 0.4
+    if path == "vehicle_header.date":
+        return 0.95 if parse_day(value) else 0.4
+    if path == "vehicle_header.vehicle_mileage":
+        return 0.95 if re.fullmatch(r"[\d\s,.]+(?:\s*km)?", value, re.IGNORECASE) else 0.5
+    return 0.9 if re.fullmatch(r"[A-Za-z][A-Za-z .'\-]{1,60}", value) else 0.5
+
+
+def _set_header(fields: _Fields, path: str, value: str, confidence: float):
+    value = _clean(value).strip(_SEPARATORS)
+    if path in _BOOLEAN_FIELDS:
+        lowered = value.lower()
+        if lowered in ("yes", "y") or _is_mark(lowered):
+            fields.set(path, True, confidence)
+        elif lowered in ("no", "n"):
+            fields.set(path, False, confidence)
+    elif value:
+        fields.set(path, value, confidence * _header_confidence(path, value))
+
+
+def _labels_in(text: str) -> List[Tuple[int, int, str]]:
+    """(start, end, path) of every header label in a line, left to right, non-overlapping"""
+    found = []
+    for path, pattern in _LABELS.items():
+        for match in pattern.finditer(text):
+            found.append((match.start(), match.end(), path))
+    found.sort(key=lambda f: (f[0], -(f[1] - f[0])))
+    
+    kept = []
+    for start, end, path in found:
+        if not kept or start >= kept[-1][1]:
+            kept.append((start, end, path))
+    return kept
+
+
+def _extract_text_headers(fields: _Fields, text: str):
+    """'Vehicle Reg No: KKJ 770 NW  Driver's Name: J Smith' -> one value per label"""
+    for line in re.sub(r"<[^>]+>", "\n", text).splitlines():
+        labels = _labels_in(line)
+        for i, (start, end, path) in enumerate(labels):
+            value_end = labels[i + 1][0] if i + 1 < len(labels) else len(line)
+            _set_header(fields, path, line[end:value_end], 1.0)
+
+
+def _extract_row_headers(fields: _Fields, row: List[str]):
+    """Label cells followed by value cells in a table row"""
+    for i, cell in enumerate(row):
+        labels = _labels_in(cell)
+        if not labels:
+            continue
+        start, end, path = labels[0]
+        inline = cell[end:].strip(_SEPARATORS)
+        if inline:
+            _set_header(fields, path, inline, 1.0)
+            continue
+        following = next((c for c in row[i + 1:] if c), "")
+        if following and not _labels_in(following):
+            _set_header(fields, path, following, 0.95)
+
+
+class _Template:
+    """Template rows of one checklist section, matched by fuzzy name"""
+    
+    def __init__(self, section: str, rows: List[Dict], name_field: str):
+        self.section = section
+        self.rows = rows
+        self.name_field = name_field
+        self.keys = [_key(row[name_field]) for row in rows]
+    
+    def match(self, name: str) -> Tuple[Optional[int], float]:
+        key = _key(name)
+        if not key:
+            return None, 0.0
+        best, best_ratio = None, 0.0
+        for index, template_key in enumerate(self.keys):
+            ratio = 1.0 if key == template_key else difflib.SequenceMatcher(None, key, template_key).ratio()
+            if ratio > best_ratio:
+                best, best_ratio = index, ratio
+        return (best, best_ratio) if best_ratio >= ROW_MATCH_THRESHOLD else (None, best_ratio)
+
+
+_TEMPLATES = [
+    _Template("inspection_items", DEFAULT_INSPECTION_ITEMS, "item_name"),
+    _Template("consumable_levels", DEFAULT_CONSUMABLES, "item_name"),
+    _Template("tyre_conditions", DEFAULT_TYRES, "position"),
+]
+
+
+def _column_groups(header: List[str], labels: Tuple[str, ...]) -> List[Dict[str, int]]:
+    """Repeated label columns in a header row, e.g. F..E twice -> [before, after] label->column maps"""
+    groups: List[Dict[str, int]] = []
+    for column, cell in enumerate(header):
+        label = _clean(cell).lower()
+        if label not in labels:
+            continue
+        if not groups or label in groups[-1]:
+            groups.append({})
+        groups[-1][label] = column
+    return groups
+
+
+def _marked_label(row: List[str], group: Dict[str, int]) -> Tuple[Optional[str], float]:
+    """Label of the single ticked column in a group, with confidence"""
+    marked = [label for label, column in group.items() if column < len(row) and _is_mark(row[column], label)]
+    if len(marked) == 1:
+        return marked[0], 1.0
+    if not marked:
+        return None, 0.6
+    return None, 0.3
+
+
+class _TableRoles:
+    """Column roles of one table, read from its header rows"""
+    
+    # Default checklist columns: name, condition, pre YES, pre NO, remarks, post YES, post NO
+    DEFAULT_ITEM_COLUMNS = {"condition": 1, "yes": [2, 5], "no": [3, 6], "remarks": 4}
+    
+    def __init__(self):
+        self.item = dict(self.DEFAULT_ITEM_COLUMNS)
+        self.levels: List[Dict[str, int]] = []
+        self.conditions: List[Dict[str, int]] = []
+        self.brands: List[int] = []
+    
+    def observe(self, row: List[str]) -> bool:
+        """Update roles from a header row; returns whether the row was a header"""
+        lowered = [_clean(cell).lower() for cell in row]
+        is_header = False
+        
+        yes = [i for i, cell in enumerate(lowered) if cell == "yes"]
+        no = [i for i, cell in enumerate(lowered) if cell == "no"]
+        if yes and no:
+            self.item["yes"], self.item["no"] = yes, no
+            is_header = True
+        for role in ("condition", "remarks"):
+            if role in lowered:
+                self.item[role] = lowered.index(role)
+                is_header = True
+        
+        levels = _column_groups(row, LEVELS)
+        if sum(len(group) for group in levels) >= 3:
+            self.levels = levels
+            is_header = True
+        conditions = _column_groups(row, CONDITIONS)
+        if sum(len(group) for group in conditions) >= 2:
+            self.conditions = conditions
+            is_header = True
+        brands = [i for i, cell in enumerate(lowered) if cell == "brand"]
+        if brands:
+            self.brands = brands
+            is_header = True
+        return is_header
+
+
+def _cell(row: List[str], column: Optional[int]) -> str:
+    return row[column] if column is not None and column < len(row) else ""
+
+
+def _item_row(row: List[str], name_column: int, roles: _TableRoles, template: Dict) -> Tuple[Dict, List[float]]:
+    """InspectionItem dict and phase confidences of a checklist row"""
+    item = {
+        "item_name": template["item_name"],
+        "condition": _cell(row, roles.item.get("condition")) or template.get("condition"),
+        "remarks": _cell(row, roles.item.get("remarks")) or None,
+    }
+    confidences = []
+    for phase, prefix in enumerate(("pre_trip", "post_trip")):
+        yes_columns, no_columns = roles.item["yes"], roles.item["no"]
+        if phase >= len(yes_columns) or phase >= len(no_columns):
+            item[f"{prefix}_yes"] = item[f"{prefix}_no"] = None
+            confidences.append(0.5)
+            continue
+        yes = _is_mark(_cell(row, yes_columns[phase]), "yes")
+        no = _is_mark(_cell(row, no_columns[phase]), "no")
+        item[f"{prefix}_yes"] = yes if yes or no else None
+        item[f"{prefix}_no"] = no if yes or no else None
+        # One tick is a clear answer, none is an unanswered row, both is ambiguous
+        confidences.append(1.0 if yes != no else (0.7 if not yes else 0.2))
+    return item, confidences
+
+
+def _consumable_row(row: List[str], name_column: int, roles: _TableRoles, template: Dict) -> Tuple[Dict, List[float]]:
+    """ConsumableLevel dict and before/after confidences"""
+    values, confidences = [], []
+    if roles.levels:
+        for group in roles.levels[:2]:
+            level, confidence = _marked_label(row, group)
+            values.append(level.upper() if level and len(level) == 1 else level)
+            confidences.append(confidence)
+    else:
+        # Levels written into the cells instead of ticked columns
+        written = [_clean(cell).upper() for cell in row[name_column + 1:] if _clean(cell).lower() in LEVELS]
+        values = written[:2]
+        confidences = [0.9] * len(values)
+    
+    values += [None] * (2 - len(values))
+    confidences += [0.5] * (2 - len(confidences))
+    return {"item_name": template["item_name"], "before_trip_level": values[0], "after_trip_level": values[1]}, confidences
+
+
+def _tyre_row(row: List[str], name_column: int, roles: _TableRoles, template: Dict) -> Tuple[Dict, List[float]]:
+    """TyreCondition dict and before/after confidences"""
+    conditions, confidences = [], []
+    if roles.conditions:
+        for group in roles.conditions[:2]:
+            condition, confidence = _marked_label(row, group)
+            conditions.append(condition.title() if condition else None)
+            confidences.append(confidence)
+    else:
+        written = [_clean(cell).title() for cell in row[name_column + 1:] if _clean(cell).lower() in CONDITIONS]
+        conditions = written[:2]
+        confidences = [0.9] * len(conditions)
+    
+    if roles.brands:
+        brands = [_cell(row, column) or None for column in roles.brands[:2]]
+    else:
+        brands = [
+            _clean(cell) for cell in row[name_column + 1:]
+            if _clean(cell) and _clean(cell).lower() not in CONDITIONS and not _is_mark(cell)
+        ][:2]
+    
+    conditions += [None] * (2 - len(conditions))
+    confidences += [0.5] * (2 - len(confidences))
+    brands += [None] * (2 - len(brands))
+    return {
+        "position": template["position"],
+        "before_condition": conditions[0],
+        "before_brand": brands[0],
+        "after_condition": conditions[1],
+        "after_brand": brands[1],
+    }, confidences
+
+
+_ROW_BUILDERS = {
+    "inspection_items": _item_row,
+    "consumable_levels": _consumable_row,
+    "tyre_conditions": _tyre_row,
+}
+_PHASE_NAMES = {
+    "inspection_items": ("pre_trip", "post_trip"),
+    "consumable_levels": ("before_trip", "after_trip"),
+    "tyre_conditions": ("before", "after"),
+}
+
+
+def _match_row(row: List[str]) -> Optional[Tuple[_Template, int, int, float]]:
+    """(template, template row, name column, similarity) of a checklist row, if any"""
+    # Row names are the first cell with letters (a leading cell may hold the item number)
+    name_column = next((i for i, cell in enumerate(row) if re.search(r"[A-Za-z]", cell)), None)
+    if name_column is None:
+        return None
+    for template in _TEMPLATES:
+        index, similarity = template.match(row[name_column])
+        if index is not None:
+            return template, index, name_column, similarity
+    return None
+
+
+def extract_pretrip_checklist(parsed_data: Dict) -> Dict:
+    """
+    Extract a pre-trip checklist from LandingAI parse output without a remote call
+    
+    Args:
+        parsed_data: metadata.json contents ('chunks' with markdown and grounding)
+    
+    Returns:
+        {'extracted_data', 'confidence', 'field_confidence'} - data shaped like
+        PreTripChecklistExtraction, the overall confidence (0-1) and the
+        confidence of every field path
+    """
+    fields = _Fields()
+    sections: Dict[str, Dict[int, Tuple[Dict, List[float], float]]] = {t.section: {} for t in _TEMPLATES}
+    
+    for chunk in _reading_order(parsed_data.get("chunks") or []):
+        markdown = chunk.get("markdown") or chunk.get("text") or ""
+        tables = parse_tables(markdown)
+        if not tables:
+            _extract_text_headers(fields, markdown)
+            continue
+        
+        for table in tables:
+            roles = _TableRoles()
+            for row in table:
+                matched = _match_row(row)
+                if matched is None:
+                    # Not a checklist row: a header row setting column roles, or label/value pairs
+                    if not roles.observe(row):
+                        _extract_row_headers(fields, row)
+                    continue
+                
+                template, index, name_column, similarity = matched
+                built, confidences = _ROW_BUILDERS[template.section](row, name_column, roles, template.rows[index])
+                previous = sections[template.section].get(index)
+                if previous is None or similarity > previous[2]:
+                    sections[template.section][index] = (built, [c * similarity for c in confidences], similarity)
+    
+    data: Dict = {"vehicle_header": {}, "signatures": {}}
+    for path, value in fields.values.items():
+        group, name = path.split(".")
+        data[group][name] = value
+    
+    field_confidence = dict(fields.confidence)
+    scores = [field_confidence.get(path, 0.0) for path in REQUIRED_FIELDS]
+    for template in _TEMPLATES:
+        found = sections[template.section]
+        data[template.section] = [found[index][0] for index in sorted(found)]
+        for index, row in enumerate(template.rows):
+            if index in found:
+                for phase, confidence in zip(_PHASE_NAMES[template.section], found[index][1]):
+                    field_confidence[f"{template.section}.{row[template.name_field]}.{phase}"] = round(confidence, 2)
+                scores.extend(found[index][1])
+            else:
+                # Missing template rows count against the result
+                scores.extend([0.0, 0.0])
+    
+    confidence = sum(scores) / len(scores)
+    confidence = min([confidence] + [field_confidence.get(path, 0.0) for path in REQUIRED_FIELDS])
+    
+    extracted = PreTripChecklistExtraction.model_validate(data).model_dump()
+    return {
+        "extracted_data": extracted,
+        "confidence": round(confidence, 3),
+        "field_confidence": field_confidence,
+    }
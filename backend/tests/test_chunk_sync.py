@@ -0,0 +1,145 @@
+import pytest
+
+from memory_vector_store import InMemoryVectorStore
+from offline_provider import hash_embedding
+from shared_vector_store import SharedVectorStore
+from vector_store import QdrantVectorStore
+
+DIM = 16
+ORG = 'org-1'
+
+
+@pytest.fixture(params=['memory', 'qdrant', 'shared'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return InMemoryVectorStore(vector_size=DIM)
+    if request.param == 'qdrant':
+        return QdrantVectorStore(
+            persist_directory=str(tmp_path / 'qdrant'),
+            vector_size=DIM,
+            text_store_path=str(tmp_path / 'text.sqlite3')
+        )
+    return SharedVectorStore(
+        persist_directory=str(tmp_path / 'shared'),
+        vector_size=DIM,
+        text_store_path=str(tmp_path / 'text.sqlite3')
+    )
+
+
+class Embedder:
+    """embed_fn that records which texts were (re-)embedded"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [hash_embedding(text, DIM) for text in texts]
+    
+    @property
+    def texts(self):
+        return [text for call in self.calls for text in call]
+
+
+def chunks(*pairs, page=0):
+    return [{'chunk_id': chunk_id, 'text': text, 'page': page} for chunk_id, text in pairs]
+
+
+def stored_texts(store):
+    payloads = store.hydrate_payloads(store.scroll_payloads(where={'doc_id': 'doc-1'}))
+    return {p['chunk_id']: p['text'] for p in payloads}
+
+
+def sync(store, new_chunks, embedder=None):
+    return store.sync_document_chunks('doc-1', new_chunks, embedder or Embedder(), organization_id=ORG)
+
+
+ORIGINAL = chunks(('c1', 'brake lights'), ('c2', 'wiper blades'), ('c3', 'tyre tread'), ('c4', 'fuel level'))
+
+
+def test_first_sync_adds_everything(store):
+    embedder = Embedder()
+    
+    counts = sync(store, ORIGINAL, embedder)
+    
+    assert counts == {'added': 4, 'changed': 0, 'moved': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    assert embedder.texts == ['brake lights', 'wiper blades', 'tyre tread', 'fuel level']
+
+
+def test_unchanged_and_metadata_only_changes_embed_nothing(store):
+    sync(store, ORIGINAL)
+    embedder = Embedder()
+    
+    assert sync(store, ORIGINAL, embedder)['unchanged'] == 4
+    counts = sync(store, chunks(*((c['chunk_id'], c['text']) for c in ORIGINAL), page=2), embedder)
+    
+    assert counts['updated'] == 4
+    assert embedder.calls == []
+    assert {p['page'] for p in store.scroll_payloads(where={'doc_id': 'doc-1'})} == {2}
+
+
+def test_changed_text_is_replaced_in_place(store, monkeypatch):
+    sync(store, ORIGINAL)
+    deleted = []
+    delete_chunks = store.delete_chunks
+    
+    def record_delete(doc_id, chunk_ids, organization_id=None):
+        deleted.extend(chunk_ids)
+        return delete_chunks(doc_id, chunk_ids, organization_id)
+    
+    monkeypatch.setattr(store, 'delete_chunks', record_delete)
+    embedder = Embedder()
+    
+    edited = [dict(chunk) for chunk in ORIGINAL]
+    edited[1]['text'] = 'wiper blades (torn)'
+    counts = sync(store, edited, embedder)
+    
+    assert counts == {'added': 0, 'changed': 1, 'moved': 0, 'updated': 0, 'unchanged': 3, 'deleted': 0}
+    assert embedder.texts == ['wiper blades (torn)']
+    # Overwritten by upsert, never deleted
+    assert deleted == []
+    assert stored_texts(store)['c2'] == 'wiper blades (torn)'
+    assert store.get_stats()['total_chunks'] == 4
+
+
+def test_added_deleted_and_changed_together(store):
+    sync(store, ORIGINAL)
+    embedder = Embedder()
+    
+    counts = sync(store, chunks(('c1', 'brake lights'), ('c2', 'mirrors'), ('c5', 'horn')), embedder)
+    
+    assert counts == {'added': 1, 'changed': 1, 'moved': 0, 'updated': 0, 'unchanged': 1, 'deleted': 2}
+    assert sorted(embedder.texts) == ['horn', 'mirrors']
+    assert stored_texts(store) == {'c1': 'brake lights', 'c2': 'mirrors', 'c5': 'horn'}
+
+
+def test_reparse_with_new_chunk_ids_reuses_vectors(store):
+    # LandingAI hands out fresh chunk ids on every parse
+    sync(store, ORIGINAL)
+    before = store.get_chunk_vectors('doc-1', ['c1', 'c3'], ORG)
+    embedder = Embedder()
+    
+    counts = sync(
+        store,
+        chunks(('n1', 'brake lights'), ('n2', 'wiper blades'), ('n3', 'tyre tread'), ('n4', 'horn')),
+        embedder
+    )
+    
+    assert counts == {'added': 1, 'changed': 0, 'moved': 3, 'updated': 0, 'unchanged': 0, 'deleted': 1}
+    assert embedder.texts == ['horn']
+    assert stored_texts(store) == {'n1': 'brake lights', 'n2': 'wiper blades', 'n3': 'tyre tread', 'n4': 'horn'}
+    after = store.get_chunk_vectors('doc-1', ['n1', 'n3'], ORG)
+    assert list(after['n1']) == pytest.approx(list(before['c1']))
+    assert list(after['n3']) == pytest.approx(list(before['c3']))
+
+
+def test_repeated_text_moves_by_occurrence_and_swaps_keep_every_point(store):
+    sync(store, chunks(('c1', 'OK'), ('c2', 'OK'), ('c3', 'Bad')))
+    embedder = Embedder()
+    
+    # One copy of "OK" gone, the other two chunks swap ids
+    counts = sync(store, chunks(('c3', 'OK'), ('c1', 'Bad')), embedder)
+    
+    assert counts == {'added': 0, 'changed': 0, 'moved': 2, 'updated': 0, 'unchanged': 0, 'deleted': 1}
+    assert embedder.calls == []
+    assert stored_texts(store) == {'c3': 'OK', 'c1': 'Bad'}
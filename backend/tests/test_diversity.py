@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from diversity import (
+    MAX_CANDIDATES,
+    candidate_count,
+    diversify_results,
+    diversify_search,
+    mmr_select,
+    search_candidate_count,
+    text_fingerprint,
+)
+from memory_vector_store import InMemoryVectorStore
+
+
+def results_for(texts, vectors, distances):
+    return {
+        'ids': [f"c{i}" for i in range(len(texts))],
+        'documents': list(texts),
+        'metadatas': [{'chunk_id': f"c{i}"} for i in range(len(texts))],
+        'distances': list(distances),
+        'embeddings': np.asarray(vectors, dtype=np.float32),
+    }
+
+
+def test_fingerprint_ignores_case_markup_and_punctuation():
+    assert text_fingerprint("<td>Brake Lights:</td> <td>OK</td>") == text_fingerprint("brake lights - ok")
+    assert text_fingerprint("Brake lights OK") != text_fingerprint("Brake lights faulty")
+
+
+@pytest.mark.parametrize("n_results, mmr_lambda, dedup, expected", [
+    (5, None, False, 5),
+    (5, 0.7, False, 20),
+    (5, None, True, 20),
+    (100, 0.5, True, MAX_CANDIDATES),
+    (300, 0.5, False, 300),
+])
+def test_candidate_count(n_results, mmr_lambda, dedup, expected):
+    assert candidate_count(n_results, mmr_lambda, dedup) == expected
+
+
+def test_search_candidate_count_uses_search_defaults():
+    assert search_candidate_count({}) == 5
+    assert search_candidate_count({'n_results': 3, 'dedup': True}) == 12
+
+
+def test_diversify_search_without_options_returns_results_unchanged():
+    results = results_for(['a', 'b'], np.eye(2), [0.1, 0.2])
+    
+    assert diversify_search(results, {'n_results': 1}) is results
+
+
+def test_dedup_keeps_first_copy_of_each_text():
+    results = results_for(
+        ['Tyres: OK', 'tyres ok', 'Lights: faulty', '<b>Tyres OK</b>', 'Horn: OK'],
+        np.eye(5),
+        [0.1, 0.2, 0.3, 0.4, 0.5]
+    )
+    
+    diversified = diversify_results(results, n_results=3, dedup=True)
+    
+    assert diversified['ids'] == ['c0', 'c2', 'c4']
+    assert diversified['distances'] == [0.1, 0.3, 0.5]
+    assert 'embeddings' not in diversified
+
+
+def test_mmr_with_lambda_one_ranks_by_relevance():
+    vectors = np.random.default_rng(0).normal(size=(6, 4))
+    relevance = np.asarray([0.2, 0.9, 0.5, 0.7, 0.1, 0.3])
+    
+    assert mmr_select(vectors, relevance, 4, 1.0) == [1, 3, 2, 5]
+
+
+def test_mmr_skips_near_duplicates_of_picked_results():
+    # c0 and c1 point the same way; c2 is less relevant but new
+    vectors = [[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]]
+    relevance = np.asarray([0.9, 0.89, 0.6])
+    
+    assert mmr_select(vectors, relevance, 2, 0.5) == [0, 2]
+    assert mmr_select(vectors, relevance, 2, 1.0) == [0, 1]
+
+
+def test_mmr_select_bounds():
+    assert mmr_select(np.eye(3), np.asarray([0.3, 0.2, 0.1]), 10, 0.5) == [0, 1, 2]
+    assert mmr_select(np.eye(3), np.asarray([0.3, 0.2, 0.1]), 0, 0.5) == []
+
+
+def test_diversify_results_applies_mmr_to_the_deduplicated_candidates():
+    results = results_for(
+        ['Tyres OK', 'tyres ok', 'Tyres fine', 'Lights faulty'],
+        [[1.0, 0.0], [1.0, 0.0], [0.98, 0.02], [0.0, 1.0]],
+        [0.1, 0.1, 0.12, 0.4]
+    )
+    
+    diversified = diversify_results(results, n_results=2, mmr_lambda=0.5, dedup=True)
+    
+    assert diversified['ids'] == ['c0', 'c3']
+
+
+def test_diversify_results_rejects_out_of_range_lambda():
+    with pytest.raises(ValueError):
+        diversify_results(results_for(['a'], [[1.0]], [0.0]), 1, mmr_lambda=1.5)
+
+
+def test_store_query_with_dedup_returns_distinct_texts():
+    store = InMemoryVectorStore(vector_size=2)
+    texts = ['Tyres OK'] * 6 + ['Lights faulty', 'Horn OK']
+    vectors = [[1.0, 0.01 * i] for i in range(6)] + [[0.6, 0.8], [0.0, 1.0]]
+    store.add_document_chunks('doc-1', [{'chunk_id': f"c{i}", 'text': t} for i, t in enumerate(texts)], vectors)
+    
+    plain = store.query([1.0, 0.0], n_results=3)
+    deduped = store.query([1.0, 0.0], n_results=3, dedup=True)
+    
+    assert plain['documents'] == ['Tyres OK'] * 3
+    assert deduped['documents'] == ['Tyres OK', 'Lights faulty', 'Horn OK']
@@ -0,0 +1,164 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+import embedding_versions
+import vector_store
+from embedding_versions import (
+    EmbeddingMigration,
+    activate_version,
+    get_index_targets,
+    get_version_registry,
+    start_migration,
+)
+from embeddings import EmbeddingProvider, get_embedding_service
+
+TARGET_MODEL = 'offline-test-b'
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setenv('EMBEDDING_PROVIDER', EmbeddingProvider.OFFLINE.value)
+    monkeypatch.delenv('EMBEDDING_MODEL', raising=False)
+    monkeypatch.setenv('EMBEDDING_REGISTRY_PATH', str(tmp_path / 'embedding_versions.json'))
+    monkeypatch.setenv('VECTOR_BACKEND', 'memory')
+    monkeypatch.setattr(vector_store, '_vector_stores', {})
+    monkeypatch.setattr(embedding_versions, '_registry', None)
+    monkeypatch.setattr(embedding_versions, '_migration', None)
+    return get_version_registry()
+
+
+def index(doc_id, texts):
+    """Write a document to every index target, as uploads do"""
+    chunks = [{'chunk_id': f"{doc_id}-c{i}", 'text': text} for i, text in enumerate(texts)]
+    for service, store in get_index_targets():
+        store.sync_document_chunks(doc_id, chunks, service.embed_batch, organization_id='org-1')
+
+
+def texts_in(version):
+    _, store = embedding_versions._index_for(version)
+    return sorted(p['text'] for p in store.scroll_payloads())
+
+
+def register_migration(monkeypatch):
+    """start_migration() without its background thread"""
+    monkeypatch.setattr(EmbeddingMigration, 'start', lambda self: None)
+    record = start_migration(EmbeddingProvider.OFFLINE, TARGET_MODEL, pause_seconds=0)
+    return embedding_versions._migration, record
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_migration_builds_target_and_activates_it(registry):
+    index('doc-1', ['brake lights ok', 'tyres worn'])
+    source = registry.active()
+    
+    record = start_migration(EmbeddingProvider.OFFLINE, TARGET_MODEL, pause_seconds=0)
+    embedding_versions._migration.thread.join(30)
+    
+    state = registry.state()
+    target = state['versions'][record['target']]
+    assert state['active'] == record['target']
+    assert state['migration']['status'] == 'completed'
+    assert target['status'] == 'active'
+    assert state['versions'][source['key']]['status'] == 'ready'
+    assert texts_in(target) == texts_in(source) == ['brake lights ok', 'tyres worn']
+    assert get_embedding_service(EmbeddingProvider.OFFLINE, TARGET_MODEL).version_key == target['key']
+
+
+def test_writes_reach_target_while_building(registry, monkeypatch):
+    migration, record = register_migration(monkeypatch)
+    
+    assert registry.migration_target()['key'] == record['target']
+    assert len(get_index_targets()) == 2
+    
+    index('doc-1', ['fuel full'])
+    
+    assert texts_in(migration.target) == ['fuel full']
+
+
+def test_catch_up_passes_copy_changes_until_nothing_changed(registry, monkeypatch):
+    index('doc-1', ['one', 'two', 'three'])
+    migration, _ = register_migration(monkeypatch)
+    # Start from an empty target: only the passes fill it
+    embedding_versions._index_for(migration.target)[1].clear_all()
+    
+    assert migration._sync_pass(1) == 3
+    
+    # The source changes behind the migration's back (e.g. a worker without dual writes)
+    _, source_store = embedding_versions._index_for(migration.source)
+    source_store.delete_chunks('doc-1', ['doc-1-c2'], 'org-1')
+    source_store.sync_document_chunks(
+        'doc-1',
+        [{'chunk_id': 'doc-1-c0', 'text': 'one'}, {'chunk_id': 'doc-1-c1', 'text': 'two (edited)'}],
+        get_embedding_service().embed_batch,
+        organization_id='org-1'
+    )
+    
+    assert migration._sync_pass(2) == 2
+    assert migration._sync_pass(3) == 0
+    assert texts_in(migration.target) == ['one', 'two (edited)']
+    assert registry.state()['migration']['passes'] == 3
+
+
+def test_rollback_reactivates_previous_version(registry):
+    index('doc-1', ['brake lights ok'])
+    source_key = registry.active()['key']
+    record = start_migration(EmbeddingProvider.OFFLINE, TARGET_MODEL, pause_seconds=0)
+    embedding_versions._migration.thread.join(30)
+    
+    activate_version(source_key)
+    
+    state = registry.state()
+    assert state['active'] == source_key
+    assert state['versions'][source_key]['status'] == 'active'
+    assert state['versions'][record['target']]['status'] == 'ready'
+
+
+def test_building_version_cannot_be_activated_by_the_api(registry, monkeypatch):
+    _, record = register_migration(monkeypatch)
+    
+    with pytest.raises(ValueError):
+        activate_version(record['target'])
+    with pytest.raises(ValueError, match="already running"):
+        start_migration(EmbeddingProvider.OFFLINE, TARGET_MODEL)
+
+
+@pytest.mark.parametrize("crash", [
+    {'pid': dead_pid()},
+    {'heartbeat_at': time.time() - 10 * embedding_versions.MIGRATION_STALE_SECONDS},
+])
+def test_crashed_migration_stops_dual_writes_and_allows_a_restart(registry, monkeypatch, crash):
+    _, record = register_migration(monkeypatch)
+    registry.update(lambda state: state['migration'].update(crash))
+    
+    assert registry.migration_target() is None
+    assert len(get_index_targets()) == 1
+    
+    state = registry.state()
+    assert state['migration']['status'] == 'failed'
+    assert state['versions'][record['target']]['status'] == 'failed'
+    
+    restarted = start_migration(EmbeddingProvider.OFFLINE, TARGET_MODEL, pause_seconds=0)
+    embedding_versions._migration._run()
+    
+    assert restarted['status'] == 'running'
+    assert registry.state()['active'] == record['target']
+
+
+def test_migration_failed_by_another_worker_does_not_activate(registry, monkeypatch):
+    migration, record = register_migration(monkeypatch)
+    registry.update(lambda state: state['migration'].update(heartbeat_at=0))
+    registry.migration_target()
+    
+    migration._run()
+    
+    state = registry.state()
+    assert state['active'] != record['target']
+    assert state['migration']['status'] == 'failed'
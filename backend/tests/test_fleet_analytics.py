@@ -0,0 +1,164 @@
+import random
+from collections import Counter
+from datetime import date
+
+import numpy as np
+import pytest
+
+from fleet_analytics import FleetRollups, ROLLUPS, bucket_labels, group_sum
+from inspection_index import ITEM, TYRE, BEFORE, AFTER, inspection_observations, normalize_reg_no
+
+VEHICLES = ['KKJ 770 NW', 'kkj-770-nw', 'BX 12 GP', 'CA 555']
+ITEMS = ['BODY WORK', 'BRAKE LIGHTS', 'HOOTER']
+POSITIONS = ['Front L', 'Front R', 'Rear L', 'Rear R']
+
+
+def random_inspection(rng):
+    day = date(2025, 12, 1).toordinal() + rng.randrange(75)
+    return {
+        'vehicle_reg_no': rng.choice(VEHICLES),
+        'date': date.fromordinal(day).isoformat(),
+        'inspection_items': [
+            {'item_name': name, 'pre_trip_yes': answer, 'pre_trip_no': not answer, 'post_trip_yes': rng.random() < 0.8}
+            for name in ITEMS for answer in [rng.random() < 0.7]
+        ],
+        'tyres': [
+            {'position': position, 'before_condition': rng.choice(['Good', 'Fair', 'Bad']), 'after_condition': rng.choice(['Good', None])}
+            for position in POSITIONS
+        ],
+        'consumables': [{'item_name': 'Amount of Fuel', 'before_level': rng.choice(['F', '3/4', '1/2', 'E'])}],
+    }
+
+
+def table_contents(rollups):
+    conn = rollups._connection()
+    return {
+        table: sorted(conn.execute(f"SELECT * FROM {table}").fetchall())
+        for table in ('inspections', 'contributions', 'inspection_rollup', *ROLLUPS)
+    }
+
+
+def rebuilt(tmp_path, records):
+    fresh = FleetRollups(str(tmp_path / 'fresh.sqlite3'))
+    fresh.rebuild({'doc_id': doc_id, 'validated_at': None, 'data': data} for doc_id, data in records.items())
+    return fresh
+
+
+@pytest.fixture
+def rollups(tmp_path):
+    return FleetRollups(str(tmp_path / 'rollups.sqlite3'))
+
+
+@pytest.mark.parametrize("day, bucket, label", [
+    ('2026-03-11', 'day', '2026-03-11'),
+    ('2026-03-11', 'week', '2026-03-09'),
+    ('2026-03-15', 'week', '2026-03-09'),
+    ('2026-03-16', 'week', '2026-03-16'),
+    ('1970-01-01', 'week', '1969-12-29'),
+    ('2026-03-31', 'month', '2026-03'),
+    ('2026-12-31', 'year', '2026'),
+    ('2026-03-11', None, 'all'),
+])
+def test_bucket_labels(day, bucket, label):
+    days = np.asarray([date.fromisoformat(day).toordinal()])
+    
+    assert list(bucket_labels(days, bucket)) == [label]
+
+
+def test_group_sum_matches_a_counter():
+    rng = np.random.default_rng(0)
+    buckets = np.asarray(rng.choice(['2026-01', '2026-02', '2026-03'], 500), dtype=object)
+    values = np.asarray(rng.choice(['yes', 'no'], 500), dtype=object)
+    counts = rng.integers(1, 5, 500)
+    
+    expected = Counter()
+    for bucket, value, count in zip(buckets, values, counts):
+        expected[(bucket, value)] += int(count)
+    
+    assert group_sum([buckets, values], counts) == [key + (expected[key],) for key in sorted(expected)]
+    assert group_sum([buckets], np.asarray([], dtype=np.int64)) == []
+
+
+def test_incremental_changes_equal_a_fresh_rebuild(rollups, tmp_path):
+    rng = random.Random(7)
+    records = {}
+    for _ in range(300):
+        action = rng.random()
+        if records and action < 0.2:
+            doc_id = rng.choice(sorted(records))
+            rollups.remove(doc_id)
+            del records[doc_id]
+        else:
+            # Re-validating an existing document replaces its contribution
+            doc_id = f"doc-{rng.randrange(80)}"
+            records[doc_id] = random_inspection(rng)
+            rollups.upsert(doc_id, records[doc_id])
+    
+    fresh = rebuilt(tmp_path, records)
+    
+    assert rollups.count() == fresh.count() == len(records)
+    assert table_contents(rollups) == table_contents(fresh)
+    for bucket in ('day', 'week', 'month', 'year', None):
+        assert rollups.fuel_levels(bucket=bucket) == fresh.fuel_levels(bucket=bucket)
+        assert rollups.tyre_conditions(bucket=bucket, vehicles=['BX12GP']) == fresh.tyre_conditions(bucket=bucket, vehicles=['BX12GP'])
+    assert rollups.failed_items() == fresh.failed_items()
+
+
+def test_removing_everything_leaves_no_zero_rows(rollups):
+    rng = random.Random(1)
+    for i in range(10):
+        rollups.upsert(f"doc-{i}", random_inspection(rng))
+    for i in range(10):
+        rollups.remove(f"doc-{i}")
+    rollups.remove('never-added')
+    
+    assert all(rows == [] for rows in table_contents(rollups).values())
+
+
+def test_aggregates_match_observations_counted_by_hand(rollups):
+    rng = random.Random(3)
+    records = {f"doc-{i}": random_inspection(rng) for i in range(60)}
+    for doc_id, data in records.items():
+        rollups.upsert(doc_id, data)
+    
+    expected = Counter()
+    inspections = Counter()
+    for data in records.values():
+        month = data['date'][:7]
+        inspections[month] += 1
+        for kind, subject, phase, value in inspection_observations(data):
+            if kind == TYRE and phase == AFTER:
+                expected[(month, subject, value)] += 1
+    
+    rows = rollups.aggregate(TYRE, phase=AFTER, bucket='month')
+    
+    assert {(row['bucket'], row['subject'], row['value']): row['count'] for row in rows} == dict(expected)
+    assert {row['bucket']: row['count'] for row in rollups.inspection_counts()} == dict(inspections)
+
+
+def test_vehicle_and_date_filters(rollups):
+    base = {'inspection_items': [{'item_name': 'HOOTER', 'pre_trip_no': True}]}
+    rollups.upsert('a', {**base, 'vehicle_reg_no': 'KKJ 770 NW', 'date': '2026-01-05'})
+    rollups.upsert('b', {**base, 'vehicle_reg_no': 'kkj-770-nw', 'date': '2026-02-05'})
+    rollups.upsert('c', {**base, 'vehicle_reg_no': 'CA 555', 'date': '2026-02-06'})
+    
+    failed = rollups.failed_items(phase=BEFORE)
+    in_february = rollups.aggregate(ITEM, values=['no'], day_from=date(2026, 2, 1), day_to=date(2026, 2, 28), bucket=None)
+    one_vehicle = rollups.inspection_counts(vehicles=['KKJ770NW'], bucket='month')
+    
+    assert [(entry['vehicle'], entry['inspections'], entry['failed']) for entry in failed] == [
+        (normalize_reg_no('KKJ 770 NW'), 2, 2), ('CA555', 1, 1)
+    ]
+    assert in_february == [{'bucket': 'all', 'subject': 'hooter', 'value': 'no', 'count': 2}]
+    assert one_vehicle == [{'bucket': '2026-01', 'count': 1}, {'bucket': '2026-02', 'count': 1}]
+
+
+def test_revalidation_moves_counts_to_the_new_day_and_vehicle(rollups, tmp_path):
+    data = {'vehicle_reg_no': 'CA 555', 'date': '2026-01-05', 'inspection_items': [{'item_name': 'HOOTER', 'pre_trip_no': True}]}
+    rollups.upsert('a', data)
+    
+    corrected = {**data, 'vehicle_reg_no': 'BX 12 GP', 'date': '2026-02-01'}
+    rollups.upsert('a', corrected)
+    
+    assert table_contents(rollups) == table_contents(rebuilt(tmp_path, {'a': corrected}))
+    assert rollups.inspection_counts(by_vehicle=True) == [{'bucket': '2026-02', 'vehicle': 'BX12GP', 'count': 1}]
@@ -0,0 +1,68 @@
+from datetime import date
+
+import pytest
+
+from fleet_query import answer_fleet_question, parse_fleet_question
+from inspection_index import InspectionIndex, CONSUMABLE, ITEM, TYRE
+
+TODAY = date(2026, 4, 15)
+
+INSPECTION = {
+    'doc_id': 'doc-1',
+    'validated_at': '2026-03-10T08:00:00',
+    'data': {
+        'vehicle_reg_no': 'KKJ 770 NW',
+        'drivers_name': 'Sipho Dlamini',
+        'date': '2026-03-10',
+        'inspection_items': [
+            {'item_name': 'Brake Lights', 'pre_trip_yes': False, 'pre_trip_no': True},
+            {'item_name': 'Wiper Blades', 'pre_trip_yes': True, 'pre_trip_no': False},
+        ],
+        'tyres': [
+            {'position': 'Rear Left', 'before_condition': 'Bad', 'brand': 'Bridgestone'},
+            {'position': 'Front Right', 'before_condition': 'Good'},
+        ],
+        'consumables': [
+            {'item_name': 'Amount of Fuel', 'before_level': '1/2', 'after_level': '1/4'},
+        ],
+    },
+}
+
+
+@pytest.fixture
+def index():
+    return InspectionIndex(lambda: [INSPECTION], refresh_seconds=3600)
+
+
+@pytest.mark.parametrize("question, kind, values", [
+    ("How many inspections had the rear-left tyre marked Bad in March?", TYRE, ["bad"]),
+    ("Which vehicles had brake lights marked no?", ITEM, ["no"]),
+    ("Which vehicles had an empty fuel tank before the trip?", CONSUMABLE, ["e"]),
+    ("How many tyre checks were done in March 2026?", TYRE, []),
+    ("List inspections for KKJ 770 NW", None, []),
+])
+def test_routes_aggregate_questions(index, question, kind, values):
+    query = parse_fleet_question(question, index, today=TODAY)
+    
+    assert query is not None
+    assert query.kind == kind
+    assert query.values == values
+
+
+@pytest.mark.parametrize("question", [
+    "Which tyre brand was fitted on KKJ 770 NW?",
+    "Show me the fuel level before the trip for KKJ 770 NW",
+    "What were the driver's remarks on KKJ 770 NW?",
+    "How many tyres does KKJ 770 NW have?",
+    "Which vehicles have Bridgestone tyres?",
+    "What is the odometer reading of KKJ 770 NW in March?",
+])
+def test_leaves_value_questions_to_rag(index, question):
+    assert parse_fleet_question(question, index, today=TODAY) is None
+
+
+def test_answers_count_from_index(index):
+    result = answer_fleet_question("How many inspections had the rear-left tyre marked Bad in March?", index, today=TODAY)
+    
+    assert result['count'] == 1
+    assert result['total'] == 1
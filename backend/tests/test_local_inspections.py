@@ -0,0 +1,148 @@
+import json
+from datetime import date
+
+import pytest
+
+from local_inspections import LocalInspectionStore, MAX_PAGE_SIZE, driver_key
+
+DRIVERS = ['Jane Smith', 'Jane  SMITHERS', 'John Moyo', 'Thabo Nkosi']
+VEHICLES = ['KKJ 770 NW', 'BX 12 GP']
+
+
+def inspection(i):
+    return {
+        'vehicle_reg_no': VEHICLES[i % 2],
+        'drivers_name': DRIVERS[i % 4],
+        'date': date(2026, 3, 1 + i % 10).isoformat(),
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalInspectionStore(str(tmp_path / 'inspections.sqlite3'))
+    for i in range(25):
+        store.save(f"doc-{i:02d}", inspection(i), validated_at=f"2026-03-20T10:{i:02d}:00")
+    return store
+
+
+def ids(records):
+    return [record['doc_id'] for record in records]
+
+
+def test_driver_key_ignores_case_and_spacing():
+    assert driver_key('  Jane   SMITH ') == 'jane smith'
+    assert driver_key(None) == ''
+
+
+def test_pages_are_newest_first_and_cover_every_row_once(store):
+    pages = [store.page(limit=10, offset=offset) for offset in (0, 10, 20, 30)]
+    
+    assert [total for _, total in pages] == [25] * 4
+    assert [len(records) for records, _ in pages] == [10, 10, 5, 0]
+    assert ids(pages[0][0])[:2] == ['doc-24', 'doc-23']
+    assert sum((ids(records) for records, _ in pages), []) == [f"doc-{i:02d}" for i in range(24, -1, -1)]
+
+
+def test_equal_validated_at_is_ordered_by_doc_id(store):
+    store.save('doc-b', inspection(0), validated_at='2026-04-01T00:00:00')
+    store.save('doc-a', inspection(0), validated_at='2026-04-01T00:00:00')
+    
+    assert ids(store.page(limit=2)[0]) == ['doc-b', 'doc-a']
+
+
+@pytest.mark.parametrize("limit, offset, expected", [
+    (0, 0, 0),
+    (-5, 0, 0),
+    (5, -3, 5),
+    (MAX_PAGE_SIZE + 1, 0, 25),
+])
+def test_page_bounds(store, limit, offset, expected):
+    records, total = store.page(limit=limit, offset=offset)
+    
+    assert len(records) == expected
+    assert total == 25
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({'vehicle': 'kkj-770-nw'}, [i for i in range(25) if i % 2 == 0]),
+    ({'driver': 'jane'}, [i for i in range(25) if i % 4 in (0, 1)]),
+    ({'driver': 'JANE SMITH'}, [i for i in range(25) if i % 4 in (0, 1)]),
+    ({'driver': 'jane smithe'}, [i for i in range(25) if i % 4 == 1]),
+    ({'driver': 'smith'}, []),
+    ({'date_from': date(2026, 3, 9)}, [i for i in range(25) if i % 10 >= 8]),
+    ({'date_from': date(2026, 3, 2), 'date_to': date(2026, 3, 3)}, [i for i in range(25) if i % 10 in (1, 2)]),
+    ({'vehicle': 'kkj770nw', 'driver': 'john', 'date_to': date(2026, 3, 5)}, [i for i in range(25) if i % 4 == 2 and i % 10 <= 4]),
+])
+def test_filters(store, filters, expected):
+    records, total = store.page(limit=100, **filters)
+    
+    assert sorted(ids(records)) == [f"doc-{i:02d}" for i in expected]
+    assert total == len(expected)
+
+
+def test_filtered_total_counts_beyond_the_page(store):
+    records, total = store.page(limit=2, offset=1, vehicle='KKJ 770 NW')
+    
+    assert ids(records) == ['doc-22', 'doc-20']
+    assert total == 13
+
+
+def test_save_replaces_and_re_indexes(store):
+    store.save('doc-00', {**inspection(0), 'vehicle_reg_no': 'CA 555'}, validated_at='2026-03-21T00:00:00')
+    
+    assert store.count() == 25
+    assert ids(store.page(vehicle='CA555')[0]) == ['doc-00']
+    assert 'doc-00' not in ids(store.page(limit=100, vehicle='KKJ770NW')[0])
+
+
+def test_inspection_without_a_date_is_only_excluded_by_date_filters(store):
+    store.save('undated', {'vehicle_reg_no': 'CA 555'})
+    
+    assert ids(store.page(vehicle='CA 555')[0]) == ['undated']
+    assert store.page(vehicle='CA 555', date_from=date(2000, 1, 1))[1] == 0
+
+
+def test_legacy_files_are_imported_once(tmp_path):
+    validated_dir = tmp_path / 'validated'
+    validated_dir.mkdir()
+    for i in range(3):
+        record = {'doc_id': f"doc-{i}", 'validated_at': f"2026-03-0{i + 1}T00:00:00", 'data': inspection(i)}
+        (validated_dir / f"doc-{i}_validated.json").write_text(json.dumps(record))
+    (validated_dir / 'broken_validated.json').write_text('{not json')
+    store = LocalInspectionStore(str(tmp_path / 'inspections.sqlite3'))
+    
+    assert store.import_files(validated_dir) == 3
+    assert store.import_files(validated_dir) == 0
+    assert store.import_files(tmp_path / 'missing') == 0
+    
+    assert sorted(path.name for path in validated_dir.iterdir()) == [
+        'broken_validated.json',
+        'doc-0_validated.json.imported',
+        'doc-1_validated.json.imported',
+        'doc-2_validated.json.imported',
+    ]
+    assert ids(store.page(driver='john')[0]) == ['doc-2']
+    assert [record['validated_at'] for record in store.iter_all()] == [
+        '2026-03-01T00:00:00', '2026-03-02T00:00:00', '2026-03-03T00:00:00'
+    ]
+
+
+def test_replay_marking(store):
+    assert len(store.unreplayed()) == 25
+    
+    store.mark_replayed([f"doc-{i:02d}" for i in range(20)])
+    
+    assert ids(store.unreplayed()) == [f"doc-{i:02d}" for i in range(20, 25)]
+    
+    # Saving again (a re-validation) needs replaying again
+    store.save('doc-00', inspection(0))
+    
+    assert 'doc-00' in ids(store.unreplayed())
+
+
+def test_remove(store):
+    store.remove('doc-24')
+    store.remove('missing')
+    
+    assert store.count() == 24
+    assert ids(store.page(limit=1)[0]) == ['doc-23']
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from local_supabase import LocalSupabaseClient
+
+
+@pytest.fixture
+def db(tmp_path):
+    client = LocalSupabaseClient(tmp_path / 'supabase.sqlite3')
+    run(client.table('vehicle_inspections').insert([
+        {'doc_id': 'd1', 'organization_id': 'org-1', 'validated_at': '2026-01-02', 'raw_validated_data': {'driver': 'Ann'}},
+        {'doc_id': 'd2', 'organization_id': 'org-1', 'validated_at': None, 'raw_validated_data': {}},
+        {'doc_id': 'd3', 'organization_id': 'org-1', 'validated_at': '2026-01-03', 'raw_validated_data': {'driver': 'Bo'}},
+        {'doc_id': 'd4', 'organization_id': 'org-2', 'validated_at': '2026-01-01', 'raw_validated_data': {}},
+    ]))
+    return client
+
+
+def run(query):
+    return asyncio.run(query.execute()).data
+
+
+def test_insert_returns_rows_with_column_defaults(db):
+    data = run(db.table('documents').insert({'doc_id': 'x1', 'status': 'parsing', 'is_demo': False}))
+    
+    assert len(data) == 1
+    row = data[0]
+    assert {'id', 'created_at'} <= row.keys()
+    assert {k: row[k] for k in ('doc_id', 'status', 'is_demo')} == {'doc_id': 'x1', 'status': 'parsing', 'is_demo': False}
+    assert run(db.table('documents').select('*').eq('id', row['id'])) == [row]
+
+
+def test_bulk_insert_returns_one_row_per_input(db):
+    data = run(db.table('documents').insert([{'doc_id': 'x1'}, {'doc_id': 'x2'}]))
+    
+    assert [row['doc_id'] for row in data] == ['x1', 'x2']
+    assert len({row['id'] for row in data}) == 2
+
+
+def test_select_projection_returns_only_requested_columns(db):
+    data = run(db.table('vehicle_inspections').select('doc_id, validated_at, raw_validated_data').eq('doc_id', 'd1'))
+    
+    assert data == [{'doc_id': 'd1', 'validated_at': '2026-01-02', 'raw_validated_data': {'driver': 'Ann'}}]
+
+
+def test_select_star_returns_every_column(db):
+    row = run(db.table('vehicle_inspections').select('*').eq('doc_id', 'd1'))[0]
+    
+    assert set(row) == {'id', 'created_at', 'doc_id', 'organization_id', 'validated_at', 'raw_validated_data'}
+
+
+@pytest.mark.parametrize("build, expected", [
+    (lambda q: q.eq('organization_id', 'org-1'), ['d1', 'd2', 'd3']),
+    (lambda q: q.eq('organization_id', 'org-1').eq('doc_id', 'd3'), ['d3']),
+    (lambda q: q.eq('organization_id', 'missing'), []),
+    (lambda q: q.in_('doc_id', ['d4', 'd2', 'nope']), ['d2', 'd4']),
+    (lambda q: q.in_('doc_id', []), []),
+])
+def test_filters(db, build, expected):
+    data = run(build(db.table('vehicle_inspections').select('doc_id')))
+    
+    assert sorted(row['doc_id'] for row in data) == expected
+
+
+def test_eq_matches_booleans(db):
+    run(db.table('documents').insert([{'doc_id': 'x1', 'is_demo': True}, {'doc_id': 'x2', 'is_demo': False}]))
+    
+    assert run(db.table('documents').select('doc_id').eq('is_demo', True)) == [{'doc_id': 'x1'}]
+
+
+def test_order_puts_nulls_like_postgres(db):
+    query = db.table('vehicle_inspections').select('doc_id').eq('organization_id', 'org-1')
+    descending = run(query.order('validated_at', desc=True))
+    
+    ascending = run(db.table('vehicle_inspections').select('doc_id').eq('organization_id', 'org-1').order('validated_at'))
+    
+    assert [row['doc_id'] for row in descending] == ['d2', 'd3', 'd1']
+    assert [row['doc_id'] for row in ascending] == ['d1', 'd3', 'd2']
+
+
+def test_limit_and_inclusive_range(db):
+    def page(build):
+        return [row['doc_id'] for row in run(build(db.table('vehicle_inspections').select('doc_id').order('doc_id')))]
+    
+    assert page(lambda q: q.limit(2)) == ['d1', 'd2']
+    assert page(lambda q: q.range(0, 1)) == ['d1', 'd2']
+    assert page(lambda q: q.range(2, 3)) == ['d3', 'd4']
+    assert page(lambda q: q.range(4, 5)) == []
+
+
+def test_update_returns_updated_rows(db):
+    data = run(
+        db.table('vehicle_inspections')
+        .update({'validated_at': '2026-02-01', 'raw_validated_data': {'driver': 'Cy'}})
+        .in_('doc_id', ['d1', 'd2'])
+    )
+    
+    assert sorted(row['doc_id'] for row in data) == ['d1', 'd2']
+    assert all(row['organization_id'] == 'org-1' and row['validated_at'] == '2026-02-01' for row in data)
+    assert run(db.table('vehicle_inspections').select('raw_validated_data').eq('doc_id', 'd2')) == [
+        {'raw_validated_data': {'driver': 'Cy'}}
+    ]
+
+
+def test_update_without_matches_returns_empty_list(db):
+    assert run(db.table('vehicle_inspections').update({'validated_at': 'x'}).eq('doc_id', 'nope')) == []
+
+
+def test_response_mirrors_postgrest(db):
+    response = asyncio.run(db.table('vehicle_inspections').select('doc_id', count='exact').limit(1).execute())
+    
+    assert isinstance(response.data, list)
+    assert response.count is None
+
+
+def test_tables_are_separate(db):
+    run(db.table('documents').insert({'doc_id': 'd1'}))
+    
+    assert len(run(db.table('documents').select('*'))) == 1
+    assert len(run(db.table('vehicle_inspections').select('*'))) == 4
+
+
+def test_invalid_column_name_is_rejected(db):
+    with pytest.raises(ValueError):
+        db.table('documents').select('*').eq("doc_id') OR 1=1 --", 'x')
+
+
+def test_paging_as_get_all_inspection_data_does(db):
+    rows, page_size = [], 2
+    while True:
+        start = len(rows)
+        page = run(
+            db.table('vehicle_inspections')
+            .select('doc_id, validated_at, raw_validated_data')
+            .eq('organization_id', 'org-1')
+            .order('validated_at')
+            .range(start, start + page_size - 1)
+        )
+        rows.extend(page)
+        if len(page) < page_size:
+            break
+    
+    assert [row['doc_id'] for row in rows] == ['d1', 'd3', 'd2']
+    assert all(set(row) == {'doc_id', 'validated_at', 'raw_validated_data'} for row in rows)
@@ -0,0 +1,141 @@
+import multiprocessing
+
+import numpy as np
+
+from shared_vector_store import SharedVectorStore, MERGE_FACTOR
+from vector_store import point_id_for
+
+DIM = 8
+
+
+def vectors(count, seed):
+    return np.random.default_rng(seed).normal(size=(count, DIM)).tolist()
+
+
+def chunks_for(doc_id, count):
+    return [{'chunk_id': f"{doc_id}-c{i}", 'text': f"{doc_id} chunk {i}"} for i in range(count)]
+
+
+def open_store(path, **kwargs):
+    return SharedVectorStore(persist_directory=str(path), vector_size=DIM, **kwargs)
+
+
+def segment_names(store):
+    store._refresh()
+    return [entry['name'] for entry in store._manifest['segments']]
+
+
+def test_other_instances_see_published_writes(tmp_path):
+    writer = open_store(tmp_path)
+    reader = open_store(tmp_path)
+    
+    writer.add_document_chunks('doc-1', chunks_for('doc-1', 3), vectors(3, 1), 'org-1')
+    
+    assert reader.get_stats()['total_chunks'] == 3
+    assert reader.query(vectors(1, 1)[0], n_results=1)['ids'] == ['doc-1-c0']
+    
+    writer.delete_document('doc-1')
+    
+    assert reader.get_stats()['total_chunks'] == 0
+    assert reader.query(vectors(1, 1)[0], n_results=1)['ids'] == []
+
+
+def _write_documents(path, worker, count):
+    store = open_store(path)
+    for i in range(count):
+        doc_id = f"w{worker}-doc{i}"
+        store.add_document_chunks(doc_id, chunks_for(doc_id, 2), vectors(2, worker * 1000 + i))
+
+
+def test_concurrent_writer_processes(tmp_path):
+    open_store(tmp_path)
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_write_documents, args=(tmp_path, w, 20)) for w in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+        assert process.exitcode == 0
+    
+    store = open_store(tmp_path)
+    payloads = store.scroll_payloads()
+    
+    assert len(payloads) == 4 * 20 * 2
+    assert len({(p['doc_id'], p['chunk_id']) for p in payloads}) == len(payloads)
+    assert len(segment_names(store)) < 2 * MERGE_FACTOR
+
+
+def test_small_segments_merge_without_rewriting_large_ones(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    store.add_documents([('big', chunks_for('big', 2000))], vectors(2000, 0))
+    big = segment_names(store)[0]
+    
+    written = []
+    original = SharedVectorStore._write_segment
+    
+    def record(self, name, matrix, point_ids, payloads):
+        written.append(len(point_ids))
+        original(self, name, matrix, point_ids, payloads)
+    
+    monkeypatch.setattr(SharedVectorStore, '_write_segment', record)
+    
+    for i in range(40):
+        store.add_document_chunks(f"doc-{i}", chunks_for(f"doc-{i}", 3), vectors(3, i + 1))
+        assert len(segment_names(store)) <= MERGE_FACTOR
+    
+    assert big in segment_names(store)
+    # 40 uploads of 3 rows plus merges of small segments only
+    assert sum(written) < 40 * 3 * 4
+    assert store.get_stats()['total_chunks'] == 2000 + 40 * 3
+    assert store.query(vectors(3, 7)[1], n_results=1)['ids'] == ['doc-6-c1']
+
+
+def test_mostly_deleted_segment_is_rewritten(tmp_path):
+    store = open_store(tmp_path)
+    store.add_documents(
+        [(f"doc-{i}", chunks_for(f"doc-{i}", 10)) for i in range(10)],
+        vectors(100, 0)
+    )
+    original = segment_names(store)
+    
+    store.delete_documents([f"doc-{i}" for i in range(4)])
+    
+    assert segment_names(store) != original
+    assert store._manifest['segments'][0]['deleted'] == []
+    assert store.get_stats()['total_chunks'] == 60
+    assert store.get_stats()['total_documents'] == 6
+
+
+def test_merge_keeps_deletes_made_while_copying(tmp_path, monkeypatch):
+    store = open_store(tmp_path)
+    other = open_store(tmp_path)
+    for i in range(MERGE_FACTOR - 1):
+        store.add_document_chunks(f"doc-{i}", chunks_for(f"doc-{i}", 2), vectors(2, i))
+    
+    original = SharedVectorStore._write_segment
+    
+    def write_then_delete(self, name, matrix, point_ids, payloads):
+        original(self, name, matrix, point_ids, payloads)
+        if self is store and len(point_ids) > 2:
+            # Another process deletes a document between the copy and the manifest swap
+            other.delete_document('doc-0')
+    
+    monkeypatch.setattr(SharedVectorStore, '_write_segment', write_then_delete)
+    store.add_document_chunks('doc-last', chunks_for('doc-last', 2), vectors(2, 99))
+    
+    assert len(segment_names(store)) == 1
+    assert store.scroll_payloads(where={'doc_id': 'doc-0'}) == []
+    assert other.get_stats()['total_chunks'] == (MERGE_FACTOR - 1) * 2
+    assert not list(tmp_path.glob('seg-00000001.*'))
+
+
+def test_delete_chunks_keeps_texts_of_other_organizations(tmp_path):
+    store = open_store(tmp_path, text_store_path=str(tmp_path / 'text.sqlite3'))
+    store.add_document_chunks('doc-1', chunks_for('doc-1', 2), vectors(2, 1), 'org-1')
+    
+    assert store.delete_chunks('doc-1', ['doc-1-c0', 'doc-1-c1'], organization_id='org-2') == 0
+    assert store.get_chunk_by_id('doc-1-c0')['text'] == 'doc-1 chunk 0'
+    
+    assert store.delete_chunks('doc-1', ['doc-1-c0'], organization_id='org-1') == 1
+    assert store.get_chunk_by_id('doc-1-c1')['text'] == 'doc-1 chunk 1'
+    assert store.text_store.get_many([point_id_for('doc-1', 'doc-1-c0')]) == {}
@@ -0,0 +1,135 @@
+import pytest
+
+from pretrip_schema import DEFAULT_INSPECTION_ITEMS, DEFAULT_CONSUMABLES, DEFAULT_TYRES
+from template_extractor import extract_pretrip_checklist, parse_tables
+
+# main.Config.LOCAL_EXTRACTION_MIN_CONFIDENCE default: below it, extraction goes to LandingAI
+LANDINGAI_FALLBACK_BELOW = 0.85
+
+HEADER = "Vehicle Reg No: KKJ 770 NW  Driver's Name: Jane Smith\nDate: 2026-03-14  Mileage: 120 345 km"
+SIGNATURES = [["Name of Receiver", "Tom Moyo", "Fuel Card Issued", "Yes"], ["Keys Issued", "✓", "", ""]]
+
+ITEMS = [["ITEM", "CONDITION", "YES", "NO", "REMARKS", "YES", "NO"]] + [
+    [row["item_name"], row["condition"], "✓", "", "", "✓", ""] for row in DEFAULT_INSPECTION_ITEMS
+]
+# WIPER BLADES failed both checks
+ITEMS[4] = ["WIPER BLADES", "Working", "", "✓", "Torn", "", "✓"]
+
+LEVEL_HEADER = ["F", "3/4", "1/2", "1/4", "E"]
+CONSUMABLES = [["ITEM"] + LEVEL_HEADER * 2] + [
+    [row["item_name"], "✓", "", "", "", "", "", "✓", "", "", ""] for row in DEFAULT_CONSUMABLES
+]
+TYRES = [["TYRE", "Good", "Fair", "Bad", "Brand", "Good", "Fair", "Bad", "Brand"]] + [
+    [row["position"], "✓", "", "", "Bridgestone", "", "✓", "", "Bridgestone"] for row in DEFAULT_TYRES
+]
+
+
+def html_table(rows):
+    return "<table>" + "".join("<tr>" + "".join(f"<td>{cell}</td>" for cell in row) + "</tr>" for row in rows) + "</table>"
+
+
+def pipe_table(rows):
+    lines = ["| " + " | ".join(rows[0]) + " |", "|" + "---|" * len(rows[0])]
+    lines += ["| " + " | ".join(row) + " |" for row in rows[1:]]
+    return "\n".join(lines)
+
+
+def chunk(markdown, top, page=0):
+    return {"markdown": markdown, "grounding": {"page": page, "box": {"top": top, "left": 0.0}}}
+
+
+def checklist(table, header=HEADER, items=ITEMS, consumables=CONSUMABLES, tyres=TYRES):
+    # Chunks deliberately out of order: reading order comes from the grounding boxes
+    return {"chunks": [
+        chunk(table(tyres), 0.8),
+        chunk(header, 0.05),
+        chunk(table(consumables), 0.6),
+        chunk(table(items), 0.2),
+        chunk(table(SIGNATURES), 0.95),
+    ]}
+
+
+@pytest.fixture(params=[html_table, pipe_table], ids=['html', 'pipe'])
+def extracted(request):
+    return extract_pretrip_checklist(checklist(request.param))
+
+
+def test_parse_tables_reads_html_and_pipe_forms():
+    rows = [["A", "B"], ["1", ""]]
+    
+    assert parse_tables(html_table(rows)) == [rows]
+    assert parse_tables(pipe_table(rows)) == [rows]
+    assert parse_tables('<table><tr><td colspan="2">Tyres</td><td>x</td></tr></table>') == [[["Tyres", "", "x"]]]
+
+
+def test_header_and_signature_fields(extracted):
+    data = extracted["extracted_data"]
+    
+    assert data["vehicle_header"] == {
+        "vehicle_reg_no": "KKJ 770 NW",
+        "drivers_name": "Jane Smith",
+        "date": "2026-03-14",
+        "vehicle_mileage": "120 345 km",
+    }
+    assert data["signatures"]["receiver_name"] == "Tom Moyo"
+    assert data["signatures"]["fuel_card_issued"] is True
+    assert data["signatures"]["keys_issued"] is True
+
+
+def test_checklist_rows(extracted):
+    data = extracted["extracted_data"]
+    items = {row["item_name"]: row for row in data["inspection_items"]}
+    
+    assert len(items) == len(DEFAULT_INSPECTION_ITEMS)
+    assert items["BODY WORK"] == {
+        "item_name": "BODY WORK", "condition": "Scratched/Dents", "remarks": None,
+        "pre_trip_yes": True, "pre_trip_no": False, "post_trip_yes": True, "post_trip_no": False,
+    }
+    assert items["WIPER BLADES"]["pre_trip_no"] is True
+    assert items["WIPER BLADES"]["post_trip_yes"] is False
+    assert items["WIPER BLADES"]["remarks"] == "Torn"
+    assert data["consumable_levels"][0] == {"item_name": "Amount of Fuel", "before_trip_level": "F", "after_trip_level": "3/4"}
+    assert data["tyre_conditions"][3] == {
+        "position": "Rear R", "before_condition": "Good", "before_brand": "Bridgestone",
+        "after_condition": "Fair", "after_brand": "Bridgestone",
+    }
+
+
+def test_confidences_of_a_clean_form(extracted):
+    confidence = extracted["field_confidence"]
+    
+    assert confidence["vehicle_header.vehicle_reg_no"] == 0.95
+    assert confidence["vehicle_header.date"] == 0.95
+    assert confidence["vehicle_header.drivers_name"] == 0.9
+    assert confidence["inspection_items.WIPER BLADES.pre_trip"] == 1.0
+    assert confidence["consumable_levels.Water.after_trip"] == 1.0
+    assert confidence["tyre_conditions.Front L.before"] == 1.0
+    # Capped by the required header fields
+    assert extracted["confidence"] == 0.95
+    assert extracted["confidence"] >= LANDINGAI_FALLBACK_BELOW
+
+
+def test_fuzzy_row_names_and_default_columns():
+    # No header row: the checklist's default column order applies
+    rows = [["1. Wiper Blade", "Working", "✓", "", "", "", "✓"], ["2) HEADLIGHTS", "Working", "", "✓", "dim", "✓", ""]]
+    
+    items = extract_pretrip_checklist({"chunks": [chunk(html_table(rows), 0.1)]})["extracted_data"]["inspection_items"]
+    
+    assert [row["item_name"] for row in items] == ["WIPER BLADES", "HEAD LIGHTS"]
+    assert (items[0]["pre_trip_yes"], items[0]["post_trip_no"]) == (True, True)
+    assert (items[1]["pre_trip_no"], items[1]["remarks"], items[1]["post_trip_yes"]) == (True, "dim", True)
+
+
+@pytest.mark.parametrize("table", [html_table, pipe_table], ids=['html', 'pipe'])
+def test_poor_scan_falls_back_to_landingai(table):
+    # Unreadable registration, no date, half the checklist missing and double ticks
+    items = ITEMS[:10]
+    items[3] = [items[3][0], items[3][1], "✓", "✓", "", "✓", "✓"]
+    header = "Vehicle Reg No: ??  Driver's Name: Jane Smith"
+    
+    result = extract_pretrip_checklist(checklist(table, header=header, items=items))
+    
+    assert result["field_confidence"]["vehicle_header.vehicle_reg_no"] == 0.4
+    assert "vehicle_header.date" not in result["field_confidence"]
+    assert result["field_confidence"]["inspection_items.WINDOW AND WINDSCREEN.pre_trip"] == 0.2
+    assert result["confidence"] < LANDINGAI_FALLBACK_BELOW
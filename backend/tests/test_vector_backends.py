@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+
+from memory_vector_store import InMemoryVectorStore
+from vector_store import QdrantVectorStore
+
+DIM = 8
+
+
+def vector(seed):
+    return np.random.default_rng(seed).normal(size=DIM).round(4).tolist()
+
+
+def chunks_for(doc_id, count, chunk_type='text'):
+    return [
+        {'chunk_id': f"{doc_id}-c{i}", 'chunk_type': chunk_type, 'text': f"{doc_id} chunk {i}", 'page': i}
+        for i in range(count)
+    ]
+
+
+# (doc_id, organization_id, chunk_type, number of chunks)
+DOCUMENTS = [
+    ('doc-a', 'org-1', 'text', 4),
+    ('doc-b', 'org-1', 'table', 3),
+    ('doc-c', 'org-2', 'text', 5),
+]
+
+
+@pytest.fixture(params=['memory', 'qdrant'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        backend = InMemoryVectorStore(vector_size=DIM)
+    else:
+        backend = QdrantVectorStore(
+            persist_directory=str(tmp_path / 'qdrant'),
+            vector_size=DIM,
+            text_store_path=str(tmp_path / 'text.sqlite3')
+        )
+    
+    seed = 0
+    for doc_id, organization_id, chunk_type, count in DOCUMENTS:
+        embeddings = [vector(seed + i) for i in range(count)]
+        seed += count
+        backend.add_document_chunks(doc_id, chunks_for(doc_id, count, chunk_type), embeddings, organization_id)
+    return backend
+
+
+@pytest.fixture
+def both(tmp_path):
+    stores = [
+        InMemoryVectorStore(vector_size=DIM),
+        QdrantVectorStore(
+            persist_directory=str(tmp_path / 'qdrant'),
+            vector_size=DIM,
+            text_store_path=str(tmp_path / 'text.sqlite3')
+        ),
+    ]
+    seed = 0
+    for doc_id, organization_id, chunk_type, count in DOCUMENTS:
+        embeddings = [vector(seed + i) for i in range(count)]
+        seed += count
+        for backend in stores:
+            backend.add_document_chunks(doc_id, chunks_for(doc_id, count, chunk_type), embeddings, organization_id)
+    return stores
+
+
+def assert_same_results(memory_result, qdrant_result):
+    assert memory_result['ids'] == qdrant_result['ids']
+    assert memory_result['documents'] == qdrant_result['documents']
+    assert memory_result['distances'] == pytest.approx(qdrant_result['distances'], abs=1e-4)
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {'doc_id': 'doc-a'},
+    {'chunk_type': 'table'},
+    {'organization_id': 'org-2'},
+    {'organization_id': 'org-1', 'chunk_type': 'text'},
+])
+def test_query_results_match_across_backends(both, filters):
+    memory, qdrant = both
+    
+    for seed in (100, 101, 102):
+        assert_same_results(
+            memory.query(vector(seed), n_results=4, **filters),
+            qdrant.query(vector(seed), n_results=4, **filters)
+        )
+
+
+def test_query_batch_matches_single_queries(both):
+    searches = [
+        {'n_results': 3},
+        {'n_results': 2, 'organization_id': 'org-1'},
+        {'n_results': 5, 'doc_id': 'doc-c'},
+    ]
+    embeddings = [vector(200 + i) for i in range(len(searches))]
+    
+    for backend in both:
+        batched = backend.query_batch(embeddings, searches)
+        for embedding, search, result in zip(embeddings, searches, batched):
+            assert_same_results(backend.query(embedding, **search), result)
+    
+    for memory_result, qdrant_result in zip(*(backend.query_batch(embeddings, searches) for backend in both)):
+        assert_same_results(memory_result, qdrant_result)
+
+
+def test_filters_scope_results(store):
+    result = store.query(vector(100), n_results=20, organization_id='org-1')
+    
+    assert {m['organization_id'] for m in result['metadatas']} == {'org-1'}
+    assert len(result['ids']) == 7
+    assert result['documents'] == [f"{m['doc_id']} chunk {m['page']}" for m in result['metadatas']]
+
+
+def test_empty_string_filter_matches_nothing(store):
+    # Only None means "no filter"; an empty value is a real (unmatched) filter
+    assert store.query(vector(100), n_results=5, organization_id='')['ids'] == []
+    assert store.query(vector(100), n_results=5, doc_id='')['ids'] == []
+    assert store.query_batch([vector(100)], [{'n_results': 5, 'doc_id': ''}])[0]['ids'] == []
+
+
+def test_get_chunk_by_id_respects_organization(store):
+    assert store.get_chunk_by_id('doc-a-c1')['text'] == 'doc-a chunk 1'
+    assert store.get_chunk_by_id('doc-a-c1', organization_id='org-2') is None
+
+
+def test_upsert_replaces_existing_chunk(store):
+    store.add_document_chunks(
+        'doc-a',
+        [{'chunk_id': 'doc-a-c0', 'chunk_type': 'text', 'text': 'rewritten', 'page': 0}],
+        [vector(0)],
+        'org-1'
+    )
+    
+    assert store.get_stats()['total_chunks'] == 12
+    assert store.get_chunk_by_id('doc-a-c0')['text'] == 'rewritten'
+
+
+def test_delete_document_is_scoped_to_organization(store):
+    assert store.delete_document('doc-a', organization_id='org-2') == 0
+    assert store.delete_document('doc-a', organization_id='org-1') == 4
+    
+    stats = store.get_stats()
+    assert stats['total_chunks'] == 8
+    assert stats['total_documents'] == 2
+    assert store.query(vector(100), n_results=5, doc_id='doc-a')['ids'] == []
+
+
+def test_delete_documents_and_chunks(store):
+    assert store.delete_chunks('doc-c', ['doc-c-c0', 'doc-c-c1', 'missing'], 'org-2') == 2
+    assert store.delete_documents(['doc-b', 'doc-c']) == 6
+    
+    stats = store.get_stats()
+    assert stats['total_chunks'] == 4
+    assert stats['total_documents'] == 1
+
+
+@pytest.mark.parametrize("doc_ids", [[''], ['doc-a', ''], [None]])
+def test_delete_rejects_empty_doc_ids(store, doc_ids):
+    with pytest.raises(ValueError):
+        store.delete_documents(doc_ids)
+    if len(doc_ids) == 1:
+        with pytest.raises(ValueError):
+            store.delete_document(doc_ids[0])
+    
+    assert store.get_stats()['total_chunks'] == 12
+
+
+def test_stats_per_organization(store):
+    assert store.get_stats(organization_id='org-1')['total_chunks'] == 7
+    assert store.get_stats(organization_id='org-1')['total_documents'] == 2
+    assert store.get_stats(organization_id='org-3')['total_chunks'] == 0
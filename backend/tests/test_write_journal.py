@@ -0,0 +1,183 @@
+import asyncio
+import time
+
+import pytest
+
+from local_supabase import LocalSupabaseClient
+from write_journal import WriteJournal, DEAD
+
+
+class StandInGateway:
+    """Journal gateway that runs requests on the SQLite Supabase stand-in, with injectable failures"""
+    
+    def __init__(self, path):
+        self.client = LocalSupabaseClient(path)
+        self.ready = True
+        self.down = False
+        self.requests = []
+        self.on_request = None
+    
+    def call_sync(self, build, timeout=None):
+        query = build(self.client)
+        payload = query._payload if isinstance(query._payload, list) else [query._payload]
+        self.requests.append((query.table_name, query._operation, [dict(row) for row in payload]))
+        if self.on_request:
+            self.on_request(query)
+        if self.down:
+            raise ConnectionError("Supabase unreachable")
+        if any(row.get('doc_id', '').startswith('bad') for row in payload):
+            raise ValueError("violates check constraint")
+        return asyncio.run(query.execute()).data
+    
+    def invalidate(self, table):
+        pass
+    
+    def rows(self, table):
+        return asyncio.run(self.client.table(table).select('*').execute()).data
+
+
+@pytest.fixture
+def gateway(tmp_path):
+    return StandInGateway(tmp_path / 'supabase.sqlite3')
+
+
+@pytest.fixture
+def journal(tmp_path, gateway):
+    return WriteJournal(str(tmp_path / 'journal.sqlite3'), gateway, flush_interval=0.01, max_attempts=3)
+
+
+def journal_rows(journal):
+    return journal._connection().execute("SELECT kind, key, state, attempts FROM journal ORDER BY id").fetchall()
+
+
+def test_status_updates_merge_into_the_queued_insert(journal, gateway):
+    journal.enqueue_insert('documents', {'doc_id': 'd1', 'status': 'parsing'}, key_column='doc_id')
+    journal.enqueue_update('documents', 'doc_id', 'd1', {'status': 'parsed'})
+    journal.enqueue_update('documents', 'doc_id', 'd1', {'status': 'extracted', 'num_pages': 2})
+    
+    assert len(journal_rows(journal)) == 1
+    assert journal.pending_rows('documents') == [{'doc_id': 'd1', 'status': 'extracted', 'num_pages': 2}]
+    
+    assert journal.flush() == {'sent': 1, 'failed': 0}
+    assert gateway.requests == [('documents', 'insert', [{'doc_id': 'd1', 'status': 'extracted', 'num_pages': 2}])]
+    assert [row['status'] for row in gateway.rows('documents')] == ['extracted']
+
+
+def test_updates_of_a_flushed_row_merge_with_each_other(journal, gateway):
+    journal.enqueue_insert('documents', {'doc_id': 'd1', 'status': 'parsing'}, key_column='doc_id')
+    journal.flush()
+    
+    journal.enqueue_update('documents', 'doc_id', 'd1', {'status': 'parsed'})
+    journal.enqueue_update('documents', 'doc_id', 'd1', {'status': 'validated'})
+    
+    assert journal_rows(journal) == [('update', 'd1', 0, 0)]
+    journal.flush()
+    assert gateway.rows('documents')[0]['status'] == 'validated'
+
+
+def test_consecutive_writes_are_coalesced(journal, gateway):
+    for i in range(5):
+        journal.enqueue_insert('documents', {'doc_id': f"d{i}", 'status': 'parsing'}, key_column='doc_id')
+    journal.flush()
+    gateway.requests.clear()
+    
+    journal.enqueue_insert('vehicle_inspections', {'doc_id': 'd0', 'data': {}}, key_column='doc_id')
+    journal.enqueue_insert('vehicle_inspections', {'doc_id': 'd1', 'data': {}}, key_column='doc_id')
+    for i in range(3):
+        journal.enqueue_update('documents', 'doc_id', f"d{i}", {'status': 'validated', 'updated_at': f"2026-01-0{i + 1}"})
+    journal.enqueue_update('documents', 'doc_id', 'd4', {'status': 'failed'})
+    
+    assert journal.flush() == {'sent': 6, 'failed': 0}
+    assert [(table, kind, len(rows)) for table, kind, rows in gateway.requests] == [
+        ('vehicle_inspections', 'insert', 2),
+        ('documents', 'update', 1),
+        ('documents', 'update', 1),
+    ]
+    statuses = {row['doc_id']: row['status'] for row in gateway.rows('documents')}
+    assert statuses == {'d0': 'validated', 'd1': 'validated', 'd2': 'validated', 'd3': 'parsing', 'd4': 'failed'}
+    # One update ... in (keys) carries the latest updated_at
+    assert gateway.requests[1][2][0]['updated_at'] == '2026-01-03'
+
+
+def test_failed_batch_is_retried_row_by_row(journal, gateway):
+    for doc_id in ('d1', 'bad1', 'd2'):
+        journal.enqueue_insert('documents', {'doc_id': doc_id}, key_column='doc_id')
+    
+    assert journal.flush() == {'sent': 2, 'failed': 1}
+    assert [row['doc_id'] for row in gateway.rows('documents')] == ['d1', 'd2']
+    assert journal_rows(journal) == [('insert', 'bad1', 0, 1)]
+
+
+def test_later_writes_of_a_failing_row_wait_for_it(journal, gateway):
+    journal.enqueue_insert('documents', {'doc_id': 'bad1', 'status': 'parsing'}, key_column='doc_id')
+    journal.enqueue_insert('documents', {'doc_id': 'd1'}, key_column='doc_id')
+    
+    def concurrent_update(query):
+        # A request updates the row while its insert is in flight: a separate journal row
+        gateway.on_request = None
+        journal.enqueue_update('documents', 'doc_id', 'bad1', {'status': 'parsed'})
+    
+    gateway.on_request = concurrent_update
+    journal.flush()
+    assert [kind for kind, *_ in journal_rows(journal)] == ['insert', 'update']
+    gateway.requests.clear()
+    
+    journal.flush()
+    
+    # The insert failed again, so its update was not sent ahead of it
+    assert [kind for _, kind, _ in gateway.requests] == ['insert']
+    assert [kind for kind, *_ in journal_rows(journal)] == ['insert', 'update']
+
+
+def test_rows_failing_while_others_succeed_are_parked_as_dead(journal, gateway):
+    journal.enqueue_insert('documents', {'doc_id': 'bad1'}, key_column='doc_id')
+    for i in range(3):
+        journal.enqueue_insert('documents', {'doc_id': f"d{i}"}, key_column='doc_id')
+        journal.flush()
+    
+    assert journal_rows(journal) == [('insert', 'bad1', DEAD, 3)]
+    assert journal.stats()['dead'] == 1
+    assert journal.stats()['pending'] == 0
+    assert journal.pending_rows('documents') == []
+
+
+def test_outage_keeps_every_write_and_replays_in_order(journal, gateway):
+    gateway.down = True
+    journal.enqueue_insert('documents', {'doc_id': 'd1', 'status': 'parsing'}, key_column='doc_id')
+    journal.enqueue_insert('vehicle_inspections', {'doc_id': 'd1'}, key_column='doc_id')
+    journal.enqueue_insert('documents', {'doc_id': 'd2', 'status': 'parsing'}, key_column='doc_id')
+    journal.enqueue_update('documents', 'doc_id', 'd1', {'status': 'validated'})
+    
+    for _ in range(journal.max_attempts + 2):
+        assert journal.flush()['sent'] == 0
+    
+    # Failures during an outage do not count towards parking a row
+    assert [attempts for *_, attempts in journal_rows(journal)] == [0, 0, 0]
+    assert journal.stats()['pending'] == 3
+    
+    gateway.down = False
+    assert journal.flush() == {'sent': 3, 'failed': 0}
+    assert [(row['doc_id'], row['status']) for row in gateway.rows('documents')] == [('d1', 'validated'), ('d2', 'parsing')]
+    assert [row['doc_id'] for row in gateway.rows('vehicle_inspections')] == ['d1']
+    assert journal.stats()['pending'] == 0
+
+
+def test_background_flusher_delivers_queued_writes(journal, gateway):
+    journal.start()
+    try:
+        journal.enqueue_insert('documents', {'doc_id': 'd1'}, key_column='doc_id')
+        deadline = time.time() + 5
+        while journal.stats()['pending'] and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        journal.stop()
+    
+    assert [row['doc_id'] for row in gateway.rows('documents')] == ['d1']
+
+
+def test_nothing_is_sent_before_the_gateway_is_ready(journal, gateway):
+    gateway.ready = False
+    journal.enqueue_insert('documents', {'doc_id': 'd1'}, key_column='doc_id')
+    
+    assert journal.flush() == {'sent': 0, 'failed': 0}
+    assert gateway.requests == []
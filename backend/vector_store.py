@@ -1,54 +1,720 @@
 """
-Vector Store Module - Qdrant Backend
-Handles Qdrant operations for document chunk storage and retrieval
-Uses qdrant-client (no SQLite dependency issues)
+Vector Store Module
+Handles document chunk storage and retrieval behind a pluggable backend:
+
+- qdrant_local:  embedded Qdrant persisted to disk (default)
+- qdrant_server: remote Qdrant server reached by URL
+- memory:        in-memory NumPy brute-force engine (small tenants, tests)
+- shared:        memory-mapped NumPy segments shared by several worker
+                 processes (uvicorn --workers N without a Qdrant server)
+
+Embedded Qdrant holds an exclusive lock on its directory, so multi-worker
+deployments must use either qdrant_server or shared.
+
+Select the backend with VECTOR_BACKEND; see create_vector_store().
+
+Memory options: VECTOR_QUANTIZATION (int8 or binary, with rescoring) for
+qdrant_server and shared (int8); QDRANT_ON_DISK / QDRANT_ON_DISK_PAYLOAD
+and QDRANT_HNSW_* for Qdrant. Qdrant keeps the global HNSW graph and adds
+per-organization graphs (payload_m); QDRANT_TENANT_INDEX_ONLY=true builds
+only the per-organization ones. An existing collection whose options
+differ is only reported at startup, unless QDRANT_MIGRATE_OPTIONS=true
+applies them.
 """
 
+import os
+import sys
+import uuid
+import hashlib
+import threading
 import logging
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from qdrant_client import QdrantClient
 from qdrant_client.models import Distance, VectorParams, PointStruct
 
+from chunk_text_store import ChunkTextStore
+from diversity import candidate_count, diversify_results, diversify_search, search_candidate_count
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_COLLECTION_NAME = "groundtruth_chunks"
+DEFAULT_VECTOR_SIZE = 384  # for all-MiniLM-L6-v2
+
+# Vector compression modes (see QdrantVectorStore / SharedVectorStore)
+QUANTIZATION_MODES = (None, "int8", "binary")
+
+
+def point_id_for(doc_id: str, chunk_id: str) -> str:
+    """Stable point ID for a chunk (identical across processes and restarts)"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"groundtruth/{doc_id}/{chunk_id}"))
+
+
+def check_doc_ids(doc_ids: List[str]):
+    """Refuse empty document IDs before a delete (an empty filter would match every chunk)"""
+    if any(not isinstance(doc_id, str) or not doc_id for doc_id in doc_ids):
+        raise ValueError("doc_id must be a non-empty string")
+
+
+def text_hash(text: str) -> str:
+    """Content hash stored with each chunk so re-indexing can skip unchanged text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
+
+
+def build_chunk_payload(
+    doc_id: str,
+    chunk: Dict,
+    index: int = 0,
+    organization_id: Optional[str] = None
+) -> Dict:
+    """Build the stored payload (metadata) for a single chunk"""
+    chunk_id = chunk.get('chunk_id', f"{doc_id}_chunk_{index}")
+    
+    payload = {
+        'organization_id': organization_id,
+        'doc_id': doc_id,
+        'chunk_id': chunk_id,
+        'chunk_type': chunk.get('chunk_type', 'text'),
+        'page': chunk.get('page', 0),
+        'text': chunk.get('text', ''),  # Store text in payload
+        'text_hash': text_hash(chunk.get('text', ''))
+    }
+    
+    # Add grounding box if available
+    if chunk.get('grounding') and chunk['grounding'].get('box'):
+        box = chunk['grounding']['box']
+        payload.update({
+            'box_left': box.get('left', 0),
+            'box_top': box.get('top', 0),
+            'box_right': box.get('right', 0),
+            'box_bottom': box.get('bottom', 0),
+        })
+    
+    return payload
+
+
+def chunk_from_payload(payload: Dict) -> Dict:
+    """Rebuild an indexable chunk from a stored payload (inverse of build_chunk_payload)"""
+    chunk = {
+        'chunk_id': payload['chunk_id'],
+        'chunk_type': payload.get('chunk_type', 'text'),
+        'text': payload.get('text', ''),
+        'page': payload.get('page', 0),
+        'grounding': None
+    }
+    
+    if 'box_left' in payload:
+        chunk['grounding'] = {
+            'page': chunk['page'],
+            'box': {
+                'left': payload['box_left'],
+                'top': payload['box_top'],
+                'right': payload['box_right'],
+                'bottom': payload['box_bottom'],
+            }
+        }
+    
+    return chunk
+
 
-class VectorStore:
+def clean_parsed_chunks(doc_id: str, parsed_chunks: List[Dict]) -> List[Dict]:
+    """
+    Convert LandingAI parsed chunks (as stored in metadata.json) into indexable chunks
+    
+    Args:
+        doc_id: Document the chunks belong to
+        parsed_chunks: The 'chunks' list of the parsed document
+    
+    Returns:
+        Chunks with chunk_id, chunk_type, text, page and grounding
+    """
+    cleaned_chunks = []
+    
+    for i, chunk in enumerate(parsed_chunks):
+        grounding_obj = chunk.get("grounding") or {}
+        page = grounding_obj.get("page", 0)
+        box = grounding_obj.get("box", {})
+        
+        cleaned_chunks.append({
+            "chunk_id": chunk.get("id", f"{doc_id}_chunk_{i}"),
+            "chunk_type": chunk.get("type", "text"),
+            "text": chunk.get("markdown", ""),
+            "page": page,
+            "grounding": {
+                "page": page,
+                "box": box
+            } if box else None
+        })
+    
+    return cleaned_chunks
+
+
+class VectorBackend(ABC):
+    """Interface implemented by every vector store backend"""
+    
+    collection_name: str
+    vector_size: int
+    
+    # Side store for chunk text; None keeps the text inline in the payload
+    text_store: Optional[ChunkTextStore] = None
+    
+    def _payload_for(
+        self,
+        doc_id: str,
+        chunk: Dict,
+        index: int = 0,
+        organization_id: Optional[str] = None
+    ) -> Dict:
+        """Payload as this backend stores it (without text when a text store is attached)"""
+        payload = build_chunk_payload(doc_id, chunk, index, organization_id)
+        if self.text_store is not None:
+            del payload['text']
+        return payload
+    
+    def _save_texts(self, documents: List[Tuple[str, List[Dict]]]):
+        """Write chunk texts to the side store (before the points become searchable)"""
+        if self.text_store is None:
+            return
+        self.text_store.put_many(
+            (point_id_for(doc_id, chunk.get('chunk_id', f"{doc_id}_chunk_{i}")), doc_id, chunk.get('text', ''))
+            for doc_id, chunks in documents
+            for i, chunk in enumerate(chunks)
+        )
+    
+    def hydrate_payloads(self, payloads: List[Dict]) -> List[Dict]:
+        """Return copies of payloads with 'text' filled in, using one side-store read"""
+        if self.text_store is None:
+            return payloads
+        
+        missing = [point_id_for(p['doc_id'], p['chunk_id']) for p in payloads if 'text' not in p]
+        texts = self.text_store.get_many(missing) if missing else {}
+        return [
+            p if 'text' in p else {**p, 'text': texts.get(point_id_for(p['doc_id'], p['chunk_id']), '')}
+            for p in payloads
+        ]
+    
+    def _hydrate_results(self, results: List[Dict]) -> List[Dict]:
+        """Fill 'documents' of formatted results, one side-store read for all of them"""
+        if self.text_store is None:
+            return results
+        
+        missing = [
+            point_id_for(m['doc_id'], m['chunk_id'])
+            for result in results for m in result['metadatas'] if 'text' not in m
+        ]
+        texts = self.text_store.get_many(missing) if missing else {}
+        for result in results:
+            result['documents'] = [
+                m['text'] if 'text' in m else texts.get(point_id_for(m['doc_id'], m['chunk_id']), '')
+                for m in result['metadatas']
+            ]
+        return results
+    
+    @abstractmethod
+    def add_document_chunks(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        embeddings: List[List[float]],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Add (upsert) document chunks owned by organization_id, returns number written"""
+    
+    def add_documents(
+        self,
+        documents: List[Tuple[str, List[Dict]]],
+        embeddings: List[List[float]],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """
+        Add chunks from many documents in one call (bulk indexing)
+        
+        Args:
+            documents: (doc_id, chunks) pairs
+            embeddings: One embedding per chunk, in document then chunk order
+            organization_id: Owner of every document in the batch
+        
+        Returns:
+            Number of chunks written
+        """
+        total = sum(len(chunks) for _, chunks in documents)
+        if total != len(embeddings):
+            raise ValueError(f"Chunks ({total}) and embeddings ({len(embeddings)}) count mismatch")
+        
+        written = 0
+        offset = 0
+        for doc_id, chunks in documents:
+            if chunks:
+                written += self.add_document_chunks(
+                    doc_id,
+                    chunks,
+                    embeddings[offset:offset + len(chunks)],
+                    organization_id
+                )
+            offset += len(chunks)
+        return written
+    
+    @abstractmethod
+    def query(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        doc_id: Optional[str] = None,
+        chunk_type: Optional[str] = None,
+        organization_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+        dedup: bool = False
+    ) -> Dict:
+        """
+        Query for similar chunks (scoped to organization_id when given)
+        
+        With mmr_lambda and/or dedup set, extra candidates are fetched and
+        reduced to n_results distinct ones (see diversity.diversify_results).
+        """
+    
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        searches: List[Dict]
+    ) -> List[Dict]:
+        """Run many searches (backends override this with a native batch path)"""
+        if len(query_embeddings) != len(searches):
+            raise ValueError(f"Embeddings ({len(query_embeddings)}) and searches ({len(searches)}) count mismatch")
+        
+        return [
+            self.query(
+                query_embedding=embedding,
+                n_results=search.get('n_results', 5),
+                doc_id=search.get('doc_id'),
+                chunk_type=search.get('chunk_type'),
+                organization_id=search.get('organization_id'),
+                mmr_lambda=search.get('mmr_lambda'),
+                dedup=search.get('dedup', False)
+            )
+            for embedding, search in zip(query_embeddings, searches)
+        ]
+    
+    @abstractmethod
+    def get_chunk_by_id(self, chunk_id: str, organization_id: Optional[str] = None) -> Optional[Dict]:
+        """Get a specific chunk by ID"""
+    
+    @abstractmethod
+    def delete_document(self, doc_id: str, organization_id: Optional[str] = None) -> int:
+        """Delete all chunks for a document, returns number deleted"""
+    
+    @abstractmethod
+    def update_chunk_payloads(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Overwrite payloads of already stored chunks, keeping their vectors"""
+    
+    @abstractmethod
+    def delete_chunks(
+        self,
+        doc_id: str,
+        chunk_ids: List[str],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Delete specific chunks of a document, returns number deleted"""
+    
+    @abstractmethod
+    def get_chunk_vectors(
+        self,
+        doc_id: str,
+        chunk_ids: List[str],
+        organization_id: Optional[str] = None
+    ) -> Dict[str, List[float]]:
+        """Stored vectors of a document's chunks by chunk_id (missing chunks are left out)"""
+    
+    def sync_document_chunks(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        organization_id: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Bring a document's stored chunks in line with a new parse
+        
+        LandingAI assigns new chunk ids on every parse, so chunks are matched
+        by chunk_id first and then by content: the n-th new chunk with a given
+        text hash takes over the n-th remaining stored chunk with that hash
+        ("moved"), re-keyed to its new chunk_id with the stored vector. Only
+        text not stored before is embedded; unchanged chunks whose metadata
+        moved (page, box, type) get a payload-only update, and stored chunks
+        left unmatched are deleted.
+        
+        New and changed points are upserted before anything is deleted, so a
+        chunk_id whose text changed never disappears from the index.
+        
+        Args:
+            doc_id: Document being re-indexed
+            chunks: The document's full, current chunk list
+            embed_fn: Embeds a list of texts (called at most once)
+            organization_id: Owner of the document
+        
+        Returns:
+            Counts of added, changed, moved (re-keyed, vector reused), updated
+            (payload only), unchanged and deleted chunks
+        """
+        where = {'doc_id': doc_id}
+        if organization_id:
+            where['organization_id'] = organization_id
+        stored = {p['chunk_id']: p for p in self.scroll_payloads(where=where)}
+        
+        counts = {'added': 0, 'changed': 0, 'moved': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+        to_update, unmatched = [], []
+        
+        # Same chunk_id, same text
+        for i, chunk in enumerate(chunks):
+            # Pin default chunk_ids so subsets keep the IDs of the full list
+            chunk = {**chunk, 'chunk_id': chunk.get('chunk_id', f"{doc_id}_chunk_{i}")}
+            payload = self._payload_for(doc_id, chunk, i, organization_id)
+            old = stored.get(payload['chunk_id'])
+            
+            if old is None or old.get('text_hash') != payload['text_hash']:
+                unmatched.append((chunk, payload))
+            elif old != payload:
+                counts['updated'] += 1
+                to_update.append(chunk)
+                del stored[payload['chunk_id']]
+            else:
+                counts['unchanged'] += 1
+                del stored[payload['chunk_id']]
+        
+        # Same text under a new chunk_id: (text_hash, occurrence) pairs up
+        # repeated text (e.g. identical table cells) in order
+        by_hash: Dict[str, List[str]] = {}
+        for chunk_id, old in stored.items():
+            by_hash.setdefault(old.get('text_hash'), []).append(chunk_id)
+        moves, to_embed = [], []
+        for chunk, payload in unmatched:
+            candidates = by_hash.get(payload['text_hash'])
+            if candidates:
+                moves.append((chunk, candidates.pop(0)))
+            else:
+                counts['changed' if payload['chunk_id'] in stored else 'added'] += 1
+                to_embed.append(chunk)
+        
+        # Read the vectors to reuse before their points are deleted
+        vectors = self.get_chunk_vectors(doc_id, [old_id for _, old_id in moves], organization_id)
+        to_add, add_vectors = [], []
+        for chunk, old_id in moves:
+            if old_id in vectors:
+                counts['moved'] += 1
+                to_add.append(chunk)
+                add_vectors.append(vectors[old_id])
+            else:
+                counts['added'] += 1
+                to_embed.append(chunk)
+        
+        if to_update:
+            self.update_chunk_payloads(doc_id, to_update, organization_id)
+        if to_embed:
+            to_add += to_embed
+            add_vectors += list(embed_fn([chunk.get('text', '') for chunk in to_embed]))
+        if to_add:
+            # Upsert: changed chunks are overwritten under their own point IDs
+            self.add_document_chunks(doc_id, to_add, add_vectors, organization_id)
+        
+        written = {chunk['chunk_id'] for chunk in to_add}
+        doomed = [chunk_id for chunk_id in stored if chunk_id not in written]
+        if doomed:
+            self.delete_chunks(doc_id, doomed, organization_id)
+        # Every leftover stored chunk was re-keyed (moved), rewritten under its
+        # own id (changed) or is gone; only the last kind counts as deleted
+        counts['deleted'] = len(stored) - counts['moved'] - counts['changed']
+        
+        logger.info(f"🔁 Synced document {doc_id}: {counts}")
+        return counts
+    
+    def delete_documents(self, doc_ids: List[str], organization_id: Optional[str] = None) -> int:
+        """Delete all chunks for several documents (backends override this with one bulk delete)"""
+        check_doc_ids(doc_ids)
+        return sum(self.delete_document(doc_id, organization_id) for doc_id in doc_ids)
+    
+    @abstractmethod
+    def get_stats(self, organization_id: Optional[str] = None) -> Dict:
+        """Get vector store statistics (for one organization when given)"""
+    
+    @abstractmethod
+    def clear_all(self):
+        """Clear all data from vector store"""
+    
+    @abstractmethod
+    def scroll_payloads(self, where: Optional[Dict] = None, limit: int = 10000) -> List[Dict]:
+        """Return stored payloads matching the exact-value filters in `where`"""
+    
+    def iter_payloads(self, batch_size: int = 1000) -> Iterator[List[Dict]]:
+        """Yield every stored payload, batch_size at a time"""
+        payloads = self.scroll_payloads(limit=sys.maxsize)
+        for start in range(0, len(payloads), batch_size):
+            yield payloads[start:start + batch_size]
+    
+    def backfill_organization(self, organization_id: str) -> int:
+        """Assign organization_id to chunks stored before tenant scoping existed"""
+        return 0
+    
+    @property
+    def collection(self) -> "CollectionView":
+        """ChromaDB-style collection accessor (compatibility)"""
+        return CollectionView(self)
+
+
+# One client per location: embedded Qdrant locks its directory, so every
+# collection stored there (one per embedding version) shares a client
+_qdrant_clients: Dict[str, QdrantClient] = {}
+_qdrant_clients_lock = threading.Lock()
+
+
+def _qdrant_client(path: Optional[str] = None, url: Optional[str] = None, api_key: Optional[str] = None) -> QdrantClient:
+    key = url or os.path.abspath(path)
+    with _qdrant_clients_lock:
+        if key not in _qdrant_clients:
+            _qdrant_clients[key] = QdrantClient(url=url, api_key=api_key) if url else QdrantClient(path=path)
+        return _qdrant_clients[key]
+
+
+class QdrantVectorStore(VectorBackend):
     """Qdrant wrapper for storing and retrieving document chunks with grounding"""
     
-    def __init__(self, persist_directory: str = "./qdrant_db"):
-        """Initialize Qdrant client"""
-        self.persist_directory = Path(persist_directory)
-        self.persist_directory.mkdir(parents=True, exist_ok=True)
+    def __init__(
+        self,
+        persist_directory: str = "./qdrant_db",
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        collection_name: str = DEFAULT_COLLECTION_NAME,
+        vector_size: int = DEFAULT_VECTOR_SIZE,
+        quantization: Optional[str] = None,
+        oversampling: float = 2.0,
+        rescore: bool = True,
+        on_disk: bool = False,
+        on_disk_payload: bool = False,
+        hnsw_m: int = 16,
+        hnsw_ef_construct: int = 100,
+        hnsw_ef: Optional[int] = None,
+        tenant_index_only: bool = False,
+        migrate_options: bool = False,
+        text_store_path: Optional[str] = None
+    ):
+        """
+        Initialize Qdrant client
+        
+        Args:
+            persist_directory: On-disk location used in embedded (local) mode
+            url: Qdrant server URL; when set, connects to the server instead
+            api_key: Optional API key for the Qdrant server
+            collection_name: Collection that stores the chunks
+            vector_size: Embedding dimension of the collection
+            quantization: None, "int8" (scalar, ~4x smaller) or "binary" (~32x smaller)
+            oversampling: Candidates fetched per result before rescoring quantized hits
+            rescore: Re-rank quantized candidates with the original vectors
+            on_disk: Keep original vectors on disk (memory-mapped) instead of RAM
+            on_disk_payload: Keep payloads on disk instead of RAM
+            hnsw_m: Edges per node of the HNSW graphs
+            hnsw_ef_construct: Build-time HNSW beam width
+            hnsw_ef: Search-time HNSW beam width (None: server default)
+            tenant_index_only: Build only per-organization HNSW graphs and no global
+                one (m=0); searches not scoped by organization_id then scan everything
+            migrate_options: Apply changed storage / HNSW options to an existing
+                collection at startup (otherwise differences are only logged)
+            text_store_path: SQLite file for chunk text; None keeps text in the payload
+        """
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization: {quantization} (expected one of {QUANTIZATION_MODES})")
+        
+        self.url = url
+        self.collection_name = collection_name
+        self.vector_size = vector_size
+        self.quantization = quantization
+        self.oversampling = oversampling
+        self.rescore = rescore
+        self.on_disk = on_disk
+        self.on_disk_payload = on_disk_payload
+        self.hnsw_m = hnsw_m
+        self.hnsw_ef_construct = hnsw_ef_construct
+        self.hnsw_ef = hnsw_ef
+        self.tenant_index_only = tenant_index_only
+        self.text_store = ChunkTextStore(text_store_path, collection_name) if text_store_path else None
         
-        # Initialize Qdrant in local mode (no server needed)
-        self.client = QdrantClient(path=str(self.persist_directory))
-        self.collection_name = "groundtruth_chunks"
-        self.vector_size = 384  # for all-MiniLM-L6-v2
+        if url:
+            self.persist_directory = None
+            self.client = _qdrant_client(url=url, api_key=api_key)
+            location = url
+        else:
+            self.persist_directory = Path(persist_directory)
+            self.persist_directory.mkdir(parents=True, exist_ok=True)
+            
+            # Initialize Qdrant in local mode (no server needed)
+            self.client = _qdrant_client(path=str(self.persist_directory))
+            location = self.persist_directory
         
         # Create collection if it doesn't exist
         try:
-            self.client.get_collection(self.collection_name)
-            logger.info(f"✅ Vector store loaded from {self.persist_directory}")
-        except Exception:
-            self.client.create_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(
-                    size=self.vector_size,
-                    distance=Distance.COSINE
+            info = self.client.get_collection(self.collection_name)
+            existing_size = info.config.params.vectors.size
+            if existing_size != self.vector_size:
+                logger.warning(
+                    f"⚠️ Collection {self.collection_name} has {existing_size}d vectors, "
+                    f"expected {self.vector_size}d"
                 )
+            logger.info(f"✅ Vector store loaded from {location}")
+        except Exception:
+            info = None
+            self._create_collection()
+            logger.info(f"✅ Vector store created at {location}")
+        
+        if self.url:
+            # Payload indexes only matter on a server (local mode always brute-forces)
+            self._ensure_payload_indexes()
+            if info is not None:
+                if migrate_options:
+                    self.apply_collection_options(info)
+                elif self._option_changes(info):
+                    logger.warning(
+                        f"⚠️ Collection {self.collection_name} options differ from the configuration "
+                        f"({', '.join(self._option_changes(info))}); set QDRANT_MIGRATE_OPTIONS=true to apply them"
+                    )
+        elif quantization or on_disk or on_disk_payload:
+            logger.warning(
+                "⚠️ Embedded Qdrant keeps every vector in RAM and ignores quantization/on-disk options; "
+                "use qdrant_server or the shared backend to reduce memory"
             )
-            logger.info(f"✅ Vector store created at {self.persist_directory}")
         
         # Get count
         info = self.client.get_collection(self.collection_name)
         logger.info(f"📊 Current collection size: {info.points_count} chunks")
     
+    def _create_collection(self):
+        """Create the chunk collection"""
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=VectorParams(
+                size=self.vector_size,
+                distance=Distance.COSINE,
+                on_disk=self.on_disk
+            ),
+            hnsw_config=self._hnsw_config(),
+            quantization_config=self._quantization_config(),
+            on_disk_payload=self.on_disk_payload
+        )
+    
+    def _hnsw_config(self):
+        from qdrant_client.models import HnswConfigDiff
+        
+        # Opt-in when every search is scoped to a tenant: per-organization
+        # HNSW graphs (payload_m) instead of one global graph (m=0)
+        if self.tenant_index_only:
+            return HnswConfigDiff(payload_m=self.hnsw_m, m=0, ef_construct=self.hnsw_ef_construct)
+        return HnswConfigDiff(m=self.hnsw_m, payload_m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+    
+    def _quantization_config(self):
+        from qdrant_client.models import (
+            ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+            BinaryQuantization, BinaryQuantizationConfig,
+        )
+        
+        # Quantized codes stay in RAM; originals (on disk if requested) are only read to rescore
+        if self.quantization == "int8":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+    
+    def _search_params(self):
+        """Per-query search parameters (None when the server defaults apply)"""
+        from qdrant_client.models import SearchParams, QuantizationSearchParams
+        
+        # Embedded Qdrant always brute-forces and warns about search params
+        if not self.url or (not self.quantization and self.hnsw_ef is None):
+            return None
+        
+        return SearchParams(
+            hnsw_ef=self.hnsw_ef,
+            quantization=QuantizationSearchParams(
+                rescore=self.rescore,
+                oversampling=self.oversampling
+            ) if self.quantization else None
+        )
+    
+    def apply_collection_options(self, info=None) -> bool:
+        """
+        Migrate an existing collection to the configured storage options
+        
+        Qdrant rebuilds quantized codes / moves vectors in the background;
+        the collection stays searchable meanwhile.
+        
+        Args:
+            info: Collection info already fetched by the caller
+        
+        Returns:
+            True if an update was sent
+        """
+        changes = self._option_changes(info or self.client.get_collection(self.collection_name))
+        if not changes:
+            return False
+        
+        self.client.update_collection(collection_name=self.collection_name, **changes)
+        logger.info(f"🔧 Updated collection {self.collection_name} options: {', '.join(changes)}")
+        return True
+    
+    def _option_changes(self, info) -> Dict:
+        """update_collection() arguments that would bring the collection in line with the configuration"""
+        from qdrant_client.models import (
+            VectorParamsDiff, CollectionParamsDiff, Disabled,
+            ScalarQuantization, BinaryQuantization,
+        )
+        
+        config = info.config
+        
+        current_quantization = {
+            ScalarQuantization: "int8",
+            BinaryQuantization: "binary",
+        }.get(type(config.quantization_config))
+        
+        changes = {}
+        if current_quantization != self.quantization:
+            changes['quantization_config'] = self._quantization_config() or Disabled.DISABLED
+        if bool(config.params.vectors.on_disk) != self.on_disk:
+            changes['vectors_config'] = {"": VectorParamsDiff(on_disk=self.on_disk)}
+        if bool(config.params.on_disk_payload) != self.on_disk_payload:
+            changes['collection_params'] = CollectionParamsDiff(on_disk_payload=self.on_disk_payload)
+        wanted = self._hnsw_config()
+        hnsw = config.hnsw_config
+        if (hnsw.m, hnsw.payload_m or hnsw.m, hnsw.ef_construct) != (wanted.m, wanted.payload_m, wanted.ef_construct):
+            changes['hnsw_config'] = wanted
+        return changes
+    
+    def _ensure_payload_indexes(self):
+        """Create the tenant and doc_id payload indexes (idempotent)"""
+        from qdrant_client.models import KeywordIndexParams, PayloadSchemaType
+        
+        try:
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="organization_id",
+                field_schema=KeywordIndexParams(type="keyword", is_tenant=True)
+            )
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name="doc_id",
+                field_schema=PayloadSchemaType.KEYWORD
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Could not create payload indexes: {e}")
+    
     def add_document_chunks(
         self,
         doc_id: str,
         chunks: List[Dict],
-        embeddings: List[List[float]]
+        embeddings: List[List[float]],
+        organization_id: Optional[str] = None
     ) -> int:
         """Add document chunks to vector store"""
         if not chunks or not embeddings:
@@ -58,35 +724,17 @@ class VectorStore:
         if len(chunks) != len(embeddings):
             raise ValueError(f"Chunks ({len(chunks)}) and embeddings ({len(embeddings)}) count mismatch")
         
+        self._save_texts([(doc_id, chunks)])
+        
         # Prepare points for Qdrant
         points = []
         
         for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk_id = chunk.get('chunk_id', f"{doc_id}_chunk_{i}")
-            text = chunk.get('text', '')
-            
-            # Build payload (metadata)
-            payload = {
-                'doc_id': doc_id,
-                'chunk_id': chunk_id,
-                'chunk_type': chunk.get('chunk_type', 'text'),
-                'page': chunk.get('page', 0),
-                'text': text  # Store text in payload
-            }
-            
-            # Add grounding box if available
-            if chunk.get('grounding') and chunk['grounding'].get('box'):
-                box = chunk['grounding']['box']
-                payload.update({
-                    'box_left': box.get('left', 0),
-                    'box_top': box.get('top', 0),
-                    'box_right': box.get('right', 0),
-                    'box_bottom': box.get('bottom', 0),
-                })
+            payload = self._payload_for(doc_id, chunk, i, organization_id)
             
             # Create point
             point = PointStruct(
-                id=hash(chunk_id) & 0x7FFFFFFF,  # Convert to positive int
+                id=point_id_for(doc_id, payload['chunk_id']),
                 vector=embedding,
                 payload=payload
             )
@@ -101,173 +749,537 @@ class VectorStore:
         logger.info(f"✅ Added {len(chunks)} chunks from document {doc_id} to vector store")
         return len(chunks)
     
+    def add_documents(
+        self,
+        documents: List[Tuple[str, List[Dict]]],
+        embeddings: List[List[float]],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Add chunks from many documents with a single upsert"""
+        total = sum(len(chunks) for _, chunks in documents)
+        if total != len(embeddings):
+            raise ValueError(f"Chunks ({total}) and embeddings ({len(embeddings)}) count mismatch")
+        
+        if not total:
+            return 0
+        
+        self._save_texts(documents)
+        
+        points = []
+        vectors = iter(embeddings)
+        for doc_id, chunks in documents:
+            for i, chunk in enumerate(chunks):
+                payload = self._payload_for(doc_id, chunk, i, organization_id)
+                points.append(PointStruct(
+                    id=point_id_for(doc_id, payload['chunk_id']),
+                    vector=next(vectors),
+                    payload=payload
+                ))
+        
+        self.client.upsert(
+            collection_name=self.collection_name,
+            points=points
+        )
+        
+        logger.info(f"✅ Added {total} chunks from {len(documents)} documents to vector store")
+        return total
+    
     def query(
         self,
         query_embedding: List[float],
         n_results: int = 5,
         doc_id: Optional[str] = None,
-        chunk_type: Optional[str] = None
+        chunk_type: Optional[str] = None,
+        organization_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+        dedup: bool = False
     ) -> Dict:
         """Query vector store for similar chunks"""
-        from qdrant_client.models import Filter, FieldCondition, MatchValue
-        
-        # Build filter
-        must_conditions = []
-        if doc_id:
-            must_conditions.append(
-                FieldCondition(key="doc_id", match=MatchValue(value=doc_id))
-            )
-        if chunk_type:
-            must_conditions.append(
-                FieldCondition(key="chunk_type", match=MatchValue(value=chunk_type))
-            )
-        
-        query_filter = Filter(must=must_conditions) if must_conditions else None
+        query_filter = self._build_filter(
+            organization_id=organization_id,
+            doc_id=doc_id,
+            chunk_type=chunk_type
+        )
+        with_vectors = mmr_lambda is not None
         
         # Search using correct Qdrant method
         results = self.client.query_points(
             collection_name=self.collection_name,
             query=query_embedding,
-            limit=n_results,
+            limit=candidate_count(n_results, mmr_lambda, dedup),
             query_filter=query_filter,
-            with_payload=True
+            search_params=self._search_params(),
+            with_payload=True,
+            with_vectors=with_vectors
         )
         
-        # Format results (match ChromaDB format)
-        formatted_results = {
-            'ids': [point.payload['chunk_id'] for point in results.points],
-            'documents': [point.payload['text'] for point in results.points],
-            'metadatas': [point.payload for point in results.points],
-            'distances': [1.0 - point.score for point in results.points]
-        }
+        result = self._hydrate_results([self._format_points(results.points, with_vectors)])[0]
+        if mmr_lambda is None and not dedup:
+            return result
+        return diversify_results(result, n_results, mmr_lambda, dedup)
+    
+    def query_batch(
+        self,
+        query_embeddings: List[List[float]],
+        searches: List[Dict]
+    ) -> List[Dict]:
+        """
+        Run many similarity searches in a single Qdrant round-trip
+        
+        Args:
+            query_embeddings: One embedding per search
+            searches: Per-search options (n_results, doc_id, chunk_type, organization_id,
+                mmr_lambda, dedup)
         
-        return formatted_results
+        Returns:
+            One ChromaDB-style result dict per search, in input order
+        """
+        from qdrant_client.models import QueryRequest
+        
+        if len(query_embeddings) != len(searches):
+            raise ValueError(f"Embeddings ({len(query_embeddings)}) and searches ({len(searches)}) count mismatch")
+        
+        if not searches:
+            return []
+        
+        requests = [
+            QueryRequest(
+                query=embedding,
+                filter=self._build_filter(
+                    organization_id=search.get('organization_id'),
+                    doc_id=search.get('doc_id'),
+                    chunk_type=search.get('chunk_type')
+                ),
+                limit=search_candidate_count(search),
+                params=self._search_params(),
+                with_payload=True,
+                with_vector=search.get('mmr_lambda') is not None
+            )
+            for embedding, search in zip(query_embeddings, searches)
+        ]
+        
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=requests
+        )
+        
+        results = self._hydrate_results([
+            self._format_points(response.points, search.get('mmr_lambda') is not None)
+            for response, search in zip(responses, searches)
+        ])
+        return [diversify_search(result, search) for result, search in zip(results, searches)]
     
-    def get_chunk_by_id(self, chunk_id: str) -> Optional[Dict]:
+    @staticmethod
+    def _build_filter(**where):
+        """Build a Qdrant payload filter from exact-value conditions (None values are ignored)"""
+        from qdrant_client.models import Filter, FieldCondition, MatchValue
+        
+        must_conditions = [
+            FieldCondition(key=key, match=MatchValue(value=value))
+            for key, value in where.items()
+            if value is not None
+        ]
+        
+        return Filter(must=must_conditions) if must_conditions else None
+    
+    @staticmethod
+    def _format_points(points, with_vectors: bool = False) -> Dict:
+        """Format scored points (match ChromaDB format)"""
+        results = {
+            'ids': [point.payload['chunk_id'] for point in points],
+            'documents': [point.payload.get('text', '') for point in points],
+            'metadatas': [point.payload for point in points],
+            'distances': [1.0 - point.score for point in points]
+        }
+        if with_vectors:
+            results['embeddings'] = [point.vector for point in points]
+        return results
+    
+    def get_chunk_by_id(self, chunk_id: str, organization_id: Optional[str] = None) -> Optional[Dict]:
         """Get a specific chunk by ID"""
-        # Qdrant uses numeric IDs, so we need to search by chunk_id in payload
+        # Point IDs are derived from (doc_id, chunk_id), so search by chunk_id in payload
         results = self.client.scroll(
             collection_name=self.collection_name,
-            scroll_filter={
-                "must": [{"key": "chunk_id", "match": {"value": chunk_id}}]
-            },
+            scroll_filter=self._build_filter(organization_id=organization_id, chunk_id=chunk_id),
             limit=1
         )
         
         if results[0]:
-            point = results[0][0]
+            payload = self.hydrate_payloads([results[0][0].payload])[0]
             return {
-                'chunk_id': point.payload['chunk_id'],
-                'text': point.payload['text'],
-                'metadata': point.payload
+                'chunk_id': payload['chunk_id'],
+                'text': payload['text'],
+                'metadata': payload
             }
         return None
     
-    def delete_document(self, doc_id: str) -> int:
+    def delete_document(self, doc_id: str, organization_id: Optional[str] = None) -> int:
         """Delete all chunks for a document"""
+        check_doc_ids([doc_id])
         try:
-            # Get all points for this document
-            results, _ = self.client.scroll(
+            from qdrant_client.models import FilterSelector
+            
+            # Count all points for this document
+            doc_filter = self._build_filter(organization_id=organization_id, doc_id=doc_id)
+            count = self.client.count(
                 collection_name=self.collection_name,
-                scroll_filter={
-                    "must": [{"key": "doc_id", "match": {"value": doc_id}}]
-                },
-                limit=10000
-            )
+                count_filter=doc_filter,
+                exact=True
+            ).count
             
-            if results:
-                # Delete by IDs
-                ids = [p.id for p in results]
+            if count:
+                # Delete by filter (no scroll page limit)
                 self.client.delete(
                     collection_name=self.collection_name,
-                    points_selector={"points": ids}
+                    points_selector=FilterSelector(filter=doc_filter)
                 )
-                logger.info(f"🗑️ Deleted {len(ids)} chunks from document {doc_id}")
-                return len(ids)
+                if self.text_store is not None:
+                    self.text_store.delete_documents([doc_id])
+                logger.info(f"🗑️ Deleted {count} chunks from document {doc_id}")
+                return count
             
             return 0
-            
+        
         except Exception as e:
             logger.error(f"Error deleting document {doc_id}: {e}")
             return 0
     
-    def get_stats(self) -> Dict:
+    def update_chunk_payloads(
+        self,
+        doc_id: str,
+        chunks: List[Dict],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Overwrite payloads of stored chunks in one batched request (vectors untouched)"""
+        from qdrant_client.models import OverwritePayloadOperation, SetPayload
+        
+        if not chunks:
+            return 0
+        
+        # Legacy points may still carry inline text; make sure the side store has it
+        self._save_texts([(doc_id, chunks)])
+        
+        operations = []
+        for i, chunk in enumerate(chunks):
+            payload = self._payload_for(doc_id, chunk, i, organization_id)
+            operations.append(OverwritePayloadOperation(
+                overwrite_payload=SetPayload(
+                    payload=payload,
+                    points=[point_id_for(doc_id, payload['chunk_id'])]
+                )
+            ))
+        
+        self.client.batch_update_points(
+            collection_name=self.collection_name,
+            update_operations=operations
+        )
+        return len(operations)
+    
+    def delete_chunks(
+        self,
+        doc_id: str,
+        chunk_ids: List[str],
+        organization_id: Optional[str] = None
+    ) -> int:
+        """Delete specific chunks of a document"""
+        from qdrant_client.models import Filter, FieldCondition, MatchAny, FilterSelector
+        
+        if not chunk_ids:
+            return 0
+        
+        scope = self._build_filter(organization_id=organization_id, doc_id=doc_id)
+        chunks_filter = Filter(
+            must=scope.must + [FieldCondition(key="chunk_id", match=MatchAny(any=list(chunk_ids)))]
+        )
+        count = self.client.count(
+            collection_name=self.collection_name,
+            count_filter=chunks_filter,
+            exact=True
+        ).count
+        
+        if count:
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(filter=chunks_filter)
+            )
+            if self.text_store is not None:
+                self.text_store.delete_points([point_id_for(doc_id, chunk_id) for chunk_id in chunk_ids])
+        return count
+    
+    def get_chunk_vectors(
+        self,
+        doc_id: str,
+        chunk_ids: List[str],
+        organization_id: Optional[str] = None
+    ) -> Dict[str, List[float]]:
+        """Stored vectors of a document's chunks, retrieved by point ID in one request"""
+        if not chunk_ids:
+            return {}
+        
+        by_point = {point_id_for(doc_id, chunk_id): chunk_id for chunk_id in chunk_ids}
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=list(by_point),
+            with_payload=['organization_id'],
+            with_vectors=True
+        )
+        return {
+            by_point[str(point.id)]: point.vector
+            for point in points
+            if point.vector is not None
+            and (not organization_id or (point.payload or {}).get('organization_id') == organization_id)
+        }
+    
+    def delete_documents(self, doc_ids: List[str], organization_id: Optional[str] = None) -> int:
+        """Delete all chunks for several documents with a single filtered delete"""
+        from qdrant_client.models import Filter, FieldCondition, MatchAny, FilterSelector
+        
+        if not doc_ids:
+            return 0
+        check_doc_ids(doc_ids)
+        
+        scope = self._build_filter(organization_id=organization_id)
+        docs_filter = Filter(
+            must=(scope.must if scope else []) + [FieldCondition(key="doc_id", match=MatchAny(any=list(doc_ids)))]
+        )
+        
+        try:
+            count = self.client.count(
+                collection_name=self.collection_name,
+                count_filter=docs_filter,
+                exact=True
+            ).count
+            
+            if count:
+                self.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=FilterSelector(filter=docs_filter)
+                )
+                if self.text_store is not None:
+                    self.text_store.delete_documents(list(doc_ids))
+                logger.info(f"🗑️ Deleted {count} chunks from {len(doc_ids)} documents")
+            return count
+        
+        except Exception as e:
+            logger.error(f"Error deleting {len(doc_ids)} documents: {e}")
+            return 0
+    
+    def get_stats(self, organization_id: Optional[str] = None) -> Dict:
         """Get vector store statistics"""
-        info = self.client.get_collection(self.collection_name)
+        stats_filter = self._build_filter(organization_id=organization_id)
+        total_chunks = self.client.count(
+            collection_name=self.collection_name,
+            count_filter=stats_filter,
+            exact=True
+        ).count
         
         # Get all unique doc_ids
         all_points, _ = self.client.scroll(
             collection_name=self.collection_name,
+            scroll_filter=stats_filter,
             limit=10000,
-            with_payload=True,
+            with_payload=["doc_id"],
             with_vectors=False
         )
         
         doc_ids = set(p.payload.get('doc_id') for p in all_points if p.payload.get('doc_id'))
         
         return {
-            'total_chunks': info.points_count,
+            'total_chunks': total_chunks,
             'total_documents': len(doc_ids),
             'collection_name': self.collection_name,
-            'persist_directory': str(self.persist_directory)
+            'persist_directory': str(self.persist_directory or self.url)
         }
     
     def clear_all(self):
         """Clear all data from vector store"""
         self.client.delete_collection(self.collection_name)
-        self.client.create_collection(
+        self._create_collection()
+        if self.text_store is not None:
+            self.text_store.clear()
+        logger.warning("⚠️ Vector store cleared!")
+    
+    def scroll_payloads(self, where: Optional[Dict] = None, limit: int = 10000) -> List[Dict]:
+        """Return stored payloads matching exact-value filters"""
+        results, _ = self.client.scroll(
             collection_name=self.collection_name,
-            vectors_config=VectorParams(
-                size=self.vector_size,
-                distance=Distance.COSINE
-            )
+            scroll_filter=self._build_filter(**(where or {})),
+            limit=limit,
+            with_payload=True
         )
-        logger.warning("⚠️ Vector store cleared!")
+        
+        return [p.payload for p in results]
+    
+    def iter_payloads(self, batch_size: int = 1000) -> Iterator[List[Dict]]:
+        """Yield every stored payload using paginated scrolling"""
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False
+            )
+            if points:
+                yield [p.payload for p in points]
+            if offset is None:
+                break
+    
+    def backfill_organization(self, organization_id: str) -> int:
+        """Assign organization_id to chunks stored before tenant scoping existed"""
+        from qdrant_client.models import Filter, IsEmptyCondition, PayloadField
+        
+        legacy_filter = Filter(must=[IsEmptyCondition(is_empty=PayloadField(key="organization_id"))])
+        count = self.client.count(
+            collection_name=self.collection_name,
+            count_filter=legacy_filter,
+            exact=True
+        ).count
+        
+        if count:
+            self.client.set_payload(
+                collection_name=self.collection_name,
+                payload={'organization_id': organization_id},
+                points=legacy_filter
+            )
+            logger.info(f"🏷️ Assigned {count} legacy chunks to organization {organization_id}")
+        return count
+
+
+# Backwards-compatible name for the Qdrant backend
+VectorStore = QdrantVectorStore
 
 
 # Access to collection attribute for compatibility
-class QdrantCollectionWrapper:
-    def __init__(self, client, collection_name):
-        self.client = client
-        self.name = collection_name
+class CollectionView:
+    def __init__(self, store: VectorBackend):
+        self.store = store
+        self.name = store.collection_name
     
     def get(self, **kwargs):
-        """Compatibility method for ChromaDB-style get"""
-        where = kwargs.get('where', {})
-        
-        must_conditions = []
-        for key, value in where.items():
-            must_conditions.append({
-                "key": key,
-                "match": {"value": value}
-            })
-        
-        query_filter = {"must": must_conditions} if must_conditions else None
-        
-        results, _ = self.client.scroll(
-            collection_name=self.name,
-            scroll_filter=query_filter,
-            limit=kwargs.get('limit', 10000),
-            with_payload=True
+        """Compatibility method for ChromaDB-style get (include=['metadatas'] skips text)"""
+        payloads = self.store.scroll_payloads(
+            where=kwargs.get('where', {}),
+            limit=kwargs.get('limit', 10000)
         )
         
+        include = kwargs.get('include', ['documents', 'metadatas'])
+        if 'documents' in include:
+            payloads = self.store.hydrate_payloads(payloads)
+        
         return {
-            'ids': [p.payload.get('chunk_id', str(p.id)) for p in results],
-            'documents': [p.payload.get('text', '') for p in results],
-            'metadatas': [p.payload for p in results]
+            'ids': [p.get('chunk_id', '') for p in payloads],
+            'documents': [p.get('text', '') for p in payloads] if 'documents' in include else None,
+            'metadatas': payloads
         }
 
 
-# Add collection property to VectorStore
-VectorStore.collection = property(lambda self: QdrantCollectionWrapper(self.client, self.collection_name))
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def create_vector_store(backend: Optional[str] = None, **kwargs) -> VectorBackend:
+    """
+    Create a vector store for the given backend
+    
+    Args:
+        backend: qdrant_local, qdrant_server, memory or shared (default: VECTOR_BACKEND env)
+        **kwargs: Overrides passed to the backend constructor
+    
+    Returns:
+        VectorBackend instance
+    """
+    backend = (backend or os.getenv("VECTOR_BACKEND", "qdrant_local")).lower()
+    vector_size = kwargs.pop('vector_size', int(os.getenv("VECTOR_SIZE", str(DEFAULT_VECTOR_SIZE))))
+    
+    # Storage options: VECTOR_QUANTIZATION / VECTOR_OVERSAMPLING apply to qdrant_* and shared
+    quantization = os.getenv("VECTOR_QUANTIZATION", "").lower() or None
+    if quantization == "none":
+        quantization = None
+    kwargs.setdefault('quantization', quantization)
+    kwargs.setdefault('oversampling', float(os.getenv("VECTOR_OVERSAMPLING", "2.0")))
+    
+    # Chunk text side store: CHUNK_TEXT_STORE=sqlite (default) or payload (inline, legacy)
+    text_in_payload = os.getenv("CHUNK_TEXT_STORE", "sqlite").lower() == "payload"
+    
+    if backend in ("qdrant_local", "qdrant_server"):
+        kwargs.setdefault('rescore', _env_flag("VECTOR_RESCORE", True))
+        kwargs.setdefault('on_disk', _env_flag("QDRANT_ON_DISK", False))
+        kwargs.setdefault('on_disk_payload', _env_flag("QDRANT_ON_DISK_PAYLOAD", False))
+        kwargs.setdefault('hnsw_m', int(os.getenv("QDRANT_HNSW_M", "16")))
+        kwargs.setdefault('hnsw_ef_construct', int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100")))
+        if os.getenv("QDRANT_HNSW_EF"):
+            kwargs.setdefault('hnsw_ef', int(os.getenv("QDRANT_HNSW_EF")))
+        kwargs.setdefault('tenant_index_only', _env_flag("QDRANT_TENANT_INDEX_ONLY", False))
+        kwargs.setdefault('migrate_options', _env_flag("QDRANT_MIGRATE_OPTIONS", False))
+    
+    if backend == "qdrant_local":
+        persist_directory = kwargs.pop('persist_directory', os.getenv("QDRANT_PATH", "./qdrant_db"))
+        if not text_in_payload:
+            kwargs.setdefault('text_store_path', os.getenv("CHUNK_TEXT_PATH", f"{persist_directory}_text.sqlite3"))
+        return QdrantVectorStore(
+            persist_directory=persist_directory,
+            vector_size=vector_size,
+            **kwargs
+        )
+    elif backend == "qdrant_server":
+        url = kwargs.pop('url', os.getenv("QDRANT_URL"))
+        if not url:
+            raise ValueError("QDRANT_URL must be set for the qdrant_server backend")
+        if not text_in_payload:
+            kwargs.setdefault('text_store_path', os.getenv("CHUNK_TEXT_PATH", "./chunk_text.sqlite3"))
+        return QdrantVectorStore(
+            url=url,
+            api_key=kwargs.pop('api_key', os.getenv("QDRANT_API_KEY")),
+            vector_size=vector_size,
+            **kwargs
+        )
+    elif backend == "memory":
+        from memory_vector_store import InMemoryVectorStore
+        kwargs.pop('quantization')
+        kwargs.pop('oversampling')
+        # Text stays inline: payloads are plain in-process objects, nothing is serialized
+        return InMemoryVectorStore(vector_size=vector_size, **kwargs)
+    elif backend == "shared":
+        from shared_vector_store import SharedVectorStore
+        persist_directory = Path(kwargs.pop('persist_directory', os.getenv("VECTOR_SHARED_PATH", "./vector_shared")))
+        collection_name = kwargs.get('collection_name', DEFAULT_COLLECTION_NAME)
+        if not text_in_payload:
+            kwargs.setdefault('text_store_path', os.getenv("CHUNK_TEXT_PATH", str(persist_directory / "chunk_text.sqlite3")))
+        if collection_name != DEFAULT_COLLECTION_NAME:
+            # Each extra collection (embedding version) gets its own segment directory
+            persist_directory = persist_directory / collection_name
+        return SharedVectorStore(
+            persist_directory=str(persist_directory),
+            vector_size=vector_size,
+            **kwargs
+        )
+    else:
+        raise ValueError(f"Unknown vector backend: {backend}")
+
+
+# One store per collection (the active embedding version plus any migration target)
+_vector_stores: Dict[str, VectorBackend] = {}
+_vector_stores_lock = threading.Lock()
 
 
-# Singleton instance
-_vector_store = None
+def get_collection_store(collection_name: str, vector_size: int) -> VectorBackend:
+    """Get or create the store for a specific collection"""
+    with _vector_stores_lock:
+        if collection_name not in _vector_stores:
+            _vector_stores[collection_name] = create_vector_store(
+                collection_name=collection_name,
+                vector_size=vector_size
+            )
+        return _vector_stores[collection_name]
+
 
-def get_vector_store() -> VectorStore:
-    """Get or create vector store singleton"""
-    global _vector_store
-    if _vector_store is None:
-        _vector_store = VectorStore()
-    return _vector_store
+def get_vector_store() -> VectorBackend:
+    """Get the store for the active embedding version"""
+    from embedding_versions import get_version_registry
+    active = get_version_registry().active()
+    return get_collection_store(active['collection'], active['dim'])
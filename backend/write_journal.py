@@ -0,0 +1,332 @@
+"""
+Write Journal
+Durable write-behind queue for Supabase writes
+
+Request handlers append writes to a local SQLite journal (one fsync'd
+transaction, well under a millisecond on local disk) instead of making an
+HTTP round-trip. A background thread flushes the journal to Supabase:
+
+- status updates to a row that is still queued are coalesced into the
+  queued insert or update, so an upload's insert plus 2-3 status changes
+  becomes one insert
+- consecutive inserts to the same table go out as one bulk insert, and
+  updates with identical changes as one update ... in (keys)
+- during an outage nothing is lost; the flusher backs off and replays the
+  journal in order once Supabase answers again. Rows that keep failing
+  while others succeed (bad data) are parked as dead after max_attempts.
+
+Delivery is at-least-once: a write whose response was lost is sent again.
+Worker processes share the journal; a file lock lets one flush at a time.
+"""
+
+import json
+import time
+import fcntl
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INSERT, UPDATE = "insert", "update"
+PENDING, INFLIGHT, DEAD = 0, 1, 2
+
+
+class WriteJournal:
+    """SQLite-backed write-behind queue for a Supabase client"""
+    
+    def __init__(
+        self,
+        db_path: str,
+        gateway,
+        flush_interval: float = 1.0,
+        batch_size: int = 100,
+        max_attempts: int = 10,
+        max_backoff: float = 300.0
+    ):
+        """
+        Open (or create) the journal
+        
+        Args:
+            db_path: SQLite journal file (shared by all worker processes)
+            gateway: SupabaseGateway the writes are sent through (call_sync from this thread)
+            flush_interval: Seconds between flushes while healthy
+            batch_size: Journal rows sent per flush pass
+            max_attempts: Failures (while other writes succeed) before a row is parked as dead
+            max_backoff: Longest wait between flushes during an outage
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_path = self.db_path.with_name(f"{self.db_path.name}.lock")
+        self.gateway = gateway
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.last_flush_at: Optional[float] = None
+        
+        conn = self._connection()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS journal (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name  TEXT NOT NULL,
+                kind        TEXT NOT NULL,
+                key_column  TEXT NOT NULL,
+                key         TEXT NOT NULL,
+                payload     TEXT NOT NULL,
+                state       INTEGER NOT NULL DEFAULT 0,
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                last_error  TEXT,
+                created_at  REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS journal_key ON journal (table_name, key, state)")
+    
+    def _connection(self) -> sqlite3.Connection:
+        """Per-thread connection (sqlite3 connections are not shareable across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Every enqueue is fsync'd: a write acknowledged to the client survives a crash
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+    
+    def enqueue_insert(self, table: str, row: Dict, key_column: str):
+        """Queue an insert of row (key_column identifies it for later coalescing)"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO journal (table_name, kind, key_column, key, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (table, INSERT, key_column, str(row[key_column]), json.dumps(row, default=str), time.time())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._wake.set()
+    
+    def enqueue_update(self, table: str, key_column: str, key: str, changes: Dict):
+        """
+        Queue an update of the row whose key_column equals key
+        
+        Merged into a still-queued insert or update of the same row when there
+        is one, so repeated status changes cost a single write.
+        """
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            queued = conn.execute(
+                "SELECT id, payload FROM journal WHERE table_name = ? AND key = ? AND key_column = ? AND state = ? "
+                "ORDER BY id DESC LIMIT 1",
+                (table, str(key), key_column, PENDING)
+            ).fetchone()
+            if queued is not None:
+                payload = {**json.loads(queued[1]), **changes}
+                conn.execute("UPDATE journal SET payload = ? WHERE id = ?", (json.dumps(payload, default=str), queued[0]))
+            else:
+                conn.execute(
+                    "INSERT INTO journal (table_name, kind, key_column, key, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (table, UPDATE, key_column, str(key), json.dumps(changes, default=str), time.time())
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._wake.set()
+    
+    def pending_rows(self, table: str) -> List[Dict]:
+        """Queued (not yet flushed) inserts for a table, newest first, with queued updates applied"""
+        rows = self._connection().execute(
+            "SELECT kind, key, payload FROM journal WHERE table_name = ? AND state != ? ORDER BY id",
+            (table, DEAD)
+        ).fetchall()
+        
+        inserts: Dict[str, Dict] = {}
+        for kind, key, payload in rows:
+            if kind == INSERT:
+                inserts[key] = json.loads(payload)
+            elif key in inserts:
+                inserts[key].update(json.loads(payload))
+        return list(reversed(list(inserts.values())))
+    
+    def stats(self) -> Dict:
+        """Queue depth and last flush outcome (for /health)"""
+        counts = dict(self._connection().execute("SELECT state, COUNT(*) FROM journal GROUP BY state").fetchall())
+        return {
+            'pending': counts.get(PENDING, 0) + counts.get(INFLIGHT, 0),
+            'dead': counts.get(DEAD, 0),
+            'last_flush_at': self.last_flush_at,
+            'last_error': self.last_error,
+        }
+    
+    def flush(self) -> Dict[str, int]:
+        """
+        Send one batch of queued writes to Supabase
+        
+        Returns:
+            Counts of sent and failed journal rows (both 0 when another process is flushing)
+        """
+        counts = {'sent': 0, 'failed': 0}
+        if not self.gateway.ready:
+            return counts
+        
+        with open(self._lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return counts
+            try:
+                return self._flush_locked(counts)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _flush_locked(self, counts: Dict[str, int]) -> Dict[str, int]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        # Rows still in flight under the lock belong to a pass that crashed
+        conn.execute("UPDATE journal SET state = ? WHERE state = ?", (PENDING, INFLIGHT))
+        rows = conn.execute(
+            "SELECT id, table_name, kind, key_column, key, payload FROM journal WHERE state = ? ORDER BY id LIMIT ?",
+            (PENDING, self.batch_size)
+        ).fetchall()
+        conn.executemany("UPDATE journal SET state = ? WHERE id = ?", [(INFLIGHT, row[0]) for row in rows])
+        conn.execute("COMMIT")
+        
+        failed: List[Tuple[int, str]] = []
+        blocked_keys = set()
+        for group in self._groups(rows):
+            # Keep per-row order: nothing is sent for a row after one of its writes failed
+            group = [row for row in group if (row[1], row[4]) not in blocked_keys]
+            if not group:
+                continue
+            try:
+                self._send(group)
+                conn.executemany("DELETE FROM journal WHERE id = ?", [(row[0],) for row in group])
+                counts['sent'] += len(group)
+                continue
+            except Exception as e:
+                if len(group) == 1:
+                    failed.append((group[0][0], str(e)))
+                    blocked_keys.add((group[0][1], group[0][4]))
+                    continue
+            
+            # A failed batch is retried row by row so one bad row does not hold back the rest
+            for row in group:
+                try:
+                    self._send([row])
+                    conn.execute("DELETE FROM journal WHERE id = ?", (row[0],))
+                    counts['sent'] += 1
+                except Exception as e:
+                    failed.append((row[0], str(e)))
+                    blocked_keys.add((row[1], row[4]))
+        
+        counts['failed'] = len(failed)
+        # Failures only count against rows while Supabase is reachable (something else got through)
+        attempt = 1 if counts['sent'] else 0
+        conn.execute("BEGIN IMMEDIATE")
+        for row_id, error in failed:
+            conn.execute(
+                "UPDATE journal SET state = CASE WHEN attempts + ? >= ? THEN ? ELSE ? END, "
+                "attempts = attempts + ?, last_error = ? WHERE id = ?",
+                (attempt, self.max_attempts, DEAD, PENDING, attempt, error[:500], row_id)
+            )
+        conn.execute("UPDATE journal SET state = ? WHERE state = ?", (PENDING, INFLIGHT))
+        conn.execute("COMMIT")
+        
+        if failed:
+            self.last_error = failed[0][1]
+            logger.warning(f"⚠️ Supabase write-behind: {counts['failed']} writes failed, will retry ({self.last_error})")
+        self.last_flush_at = time.time()
+        return counts
+    
+    @staticmethod
+    def _groups(rows: List[tuple]) -> List[List[tuple]]:
+        """Consecutive rows that can be sent as one request"""
+        groups: List[List[tuple]] = []
+        for row in rows:
+            _, table, kind, key_column, _, payload = row
+            if groups:
+                last = groups[-1][-1]
+                same_target = (last[1], last[2], last[3]) == (table, kind, key_column)
+                if same_target and (kind == INSERT or _without_timestamp(last[5]) == _without_timestamp(payload)):
+                    groups[-1].append(row)
+                    continue
+            groups.append([row])
+        return groups
+    
+    def _send(self, group: List[tuple]):
+        """One Supabase request for a group from _groups()"""
+        _, table, kind, key_column, _, _ = group[0]
+        payloads = [json.loads(row[5]) for row in group]
+        if kind == INSERT:
+            self.gateway.call_sync(lambda db: db.table(table).insert(payloads))
+            self.gateway.invalidate(table)
+            return
+        
+        # Identical changes apart from updated_at: keep the latest timestamp
+        changes = max(payloads, key=lambda p: p.get('updated_at') or '')
+        keys = [row[4] for row in group]
+        
+        def build(db):
+            query = db.table(table).update(changes)
+            return query.eq(key_column, keys[0]) if len(keys) == 1 else query.in_(key_column, keys)
+        
+        self.gateway.call_sync(build)
+        self.gateway.invalidate(table)
+    
+    def start(self):
+        """Start the background flusher thread"""
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="supabase-write-behind", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 10.0):
+        """Stop the flusher after a final flush attempt"""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+    
+    def _run(self):
+        delay = self.flush_interval
+        while True:
+            self._wake.wait(delay)
+            self._wake.clear()
+            # Let a burst of enqueues (one upload) land in the same pass
+            time.sleep(min(0.05, self.flush_interval))
+            try:
+                counts = self.flush()
+                while counts['sent'] == self.batch_size and not counts['failed']:
+                    counts = self.flush()
+                outage = counts['failed'] and not counts['sent']
+            except Exception as e:
+                logger.error(f"❌ Supabase write-behind flush error: {e}")
+                self.last_error = str(e)
+                outage = True
+            
+            if self._stopping.is_set():
+                return
+            delay = min(delay * 2, self.max_backoff) if outage else self.flush_interval
+
+
+def _without_timestamp(payload: str) -> Dict:
+    changes = json.loads(payload)
+    changes.pop('updated_at', None)
+    return changes
@@ -22,6 +22,37 @@ const ChatInterface = ({ onClose, onDocumentClick }) => {
     scrollToBottom();
   }, [messages]);
 
+  const updateLastMessage = (update) => {
+    setMessages(prev => [...prev.slice(0, -1), update(prev[prev.length - 1])]);
+  };
+
+  // Parse a text/event-stream response body, calling onEvent(event, data) per event
+  const readEventStream = async (response, onEvent) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (data) onEvent(event, JSON.parse(data));
+      }
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     if (!input.trim() || isLoading) return;
@@ -37,7 +68,7 @@ const ChatInterface = ({ onClose, onDocumentClick }) => {
     setIsLoading(true);
 
     try {
-      const response = await fetch('/api/chat', {
+      const response = await fetch('/api/chat/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
@@ -46,20 +77,29 @@ const ChatInterface = ({ onClose, onDocumentClick }) => {
         })
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`Query failed: ${response.statusText}`);
       }
 
-      const data = await response.json();
-
-      const assistantMessage = {
-        role: 'assistant',
-        content: data.answer,
-        sources: data.sources || [],
-        timestamp: new Date()
-      };
-
-      setMessages(prev => [...prev, assistantMessage]);
+      // Sources arrive first, then the answer token by token
+      await readEventStream(response, (event, data) => {
+        if (event === 'sources') {
+          setIsLoading(false);
+          setMessages(prev => [...prev, {
+            role: 'assistant',
+            content: '',
+            sources: data.sources || [],
+            streaming: true,
+            timestamp: new Date()
+          }]);
+        } else if (event === 'token') {
+          updateLastMessage(message => ({ ...message, content: message.content + data.text }));
+        } else if (event === 'done') {
+          updateLastMessage(message => ({ ...message, content: data.answer, streaming: false }));
+        } else if (event === 'error') {
+          throw new Error(data.detail);
+        }
+      });
 
     } catch (error) {
       console.error('Chat error:', error);
@@ -71,7 +111,12 @@ const ChatInterface = ({ onClose, onDocumentClick }) => {
         timestamp: new Date()
       };
 
-      setMessages(prev => [...prev, errorMessage]);
+      // Replace a half-streamed answer rather than leaving it dangling
+      setMessages(prev => (
+        prev[prev.length - 1]?.streaming
+          ? [...prev.slice(0, -1), { ...errorMessage, sources: prev[prev.length - 1].sources }]
+          : [...prev, errorMessage]
+      ));
     } finally {
       setIsLoading(false);
     }